@@ -1,7 +1,10 @@
 from django.contrib import admin
+from django.db import transaction
+from django.utils import timezone
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
+from . import historico_status
 from .models import Necessidade, AnuncioImagem, Disputa
 
 
@@ -206,8 +209,13 @@ class DisputaAdmin(admin.ModelAdmin):
     
     # Actions customizadas
     def marcar_em_analise(self, request, queryset):
-        """Marcar disputas selecionadas como em análise."""
-        updated = queryset.filter(status='aberta').update(status='em_analise')
+        """Marcar disputas selecionadas como em análise (com o histórico de status)."""
+        with transaction.atomic():
+            linhas = list(queryset.filter(status='aberta').select_for_update().values_list('pk', 'status'))
+            updated = Disputa.objects.filter(pk__in=[pk for pk, _ in linhas]).update(
+                status='em_analise', data_modificacao=timezone.now()
+            )
+            historico_status.registrar_lote(Disputa, linhas, 'em_analise', usuario=request.user)
         self.message_user(
             request,
             f'{updated} disputa(s) marcada(s) como em análise.'
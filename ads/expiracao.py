@@ -0,0 +1,171 @@
+"""
+Varredura em lote de anúncios expirados.
+
+Substitui a transição individual (state machine + notificações uma a uma)
+por operações de conjunto, em lotes percorridos por chave (id crescente):
+
+- um SELECT ... FOR UPDATE trava as necessidades do lote (mesma ordem de
+  travamento do state machine: necessidade antes dos orçamentos);
+- um UPDATE para as necessidades e um para os orçamentos ainda em aberto,
+  com rollups e histórico de status atualizados em lote (`ads.rollups`);
+- um envio (bulk_create) com as notificações do cliente e dos fornecedores
+  (`notifications.fanout`).
+
+Cada lote é uma transação. O checkpoint (último id e data de corte) fica no
+cache: uma varredura interrompida é retomada de onde parou com o mesmo corte.
+"""
+
+from datetime import datetime, timedelta
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from ads import feed, prazos, recomendacoes, rollups
+from ads.models import Necessidade
+
+logger = logging.getLogger(__name__)
+
+STATUS_EXPIRAVEIS = ['ativo', 'analisando_orcamentos', 'aguardando_confirmacao']
+STATUS_ORCAMENTOS_ABERTOS = ['enviado', 'aceito_pelo_cliente']
+DIAS_ANUNCIO_ANTIGO = 60
+
+# Critérios de expiração: {nome: (status elegíveis, campo de data, notificar)}
+CRITERIOS = {
+    # Passaram da data de validade
+    'validade': (STATUS_EXPIRAVEIS, 'data_validade', True),
+    # Anúncios ativos muito antigos (manutenção)
+    'antigos': (['ativo'], 'data_criacao', False),
+}
+
+
+def _chave_checkpoint(criterio):
+    return f"ads:expiracao:{criterio}"
+
+
+def _candidatos(criterio, corte):
+    status, campo_data, _ = CRITERIOS[criterio]
+    return Necessidade.objects.filter(status__in=status, **{f'{campo_data}__lt': corte})
+
+
+def _notificacoes(necessidades, fornecedores):
+    """Notificações do cliente e de cada fornecedor (uma por anúncio) com orçamento expirado."""
+    from notifications.fanout import montar
+
+    titulos = {}
+    notificacoes = []
+    for pk, cliente_id, titulo in necessidades:
+        titulos[pk] = titulo
+        notificacoes.append(montar(cliente_id, 'anuncio_expirado_cliente', {'titulo': titulo}, necessidade_id=pk))
+    for anuncio_id, fornecedor_id in fornecedores:
+        notificacoes.append(montar(
+            fornecedor_id, 'anuncio_expirado_fornecedor', {'titulo': titulos[anuncio_id]}, necessidade_id=anuncio_id
+        ))
+    return notificacoes
+
+
+def _expirar_lote(criterio, corte, ultimo_id, tamanho):
+    """
+    Expira um lote (uma transação).
+
+    Returns:
+        (ids expirados, último id visitado, orçamentos atualizados, notificações criadas)
+    """
+    from budgets.models import Orcamento
+    from notifications.fanout import enviar
+    from search import sugestoes
+
+    notificar = CRITERIOS[criterio][2]
+    with transaction.atomic():
+        necessidades = list(
+            _candidatos(criterio, corte)
+            .filter(pk__gt=ultimo_id)
+            .order_by('pk')
+            .select_for_update()
+            .values_list('pk', 'cliente_id', 'titulo')[:tamanho]
+        )
+        if not necessidades:
+            return [], ultimo_id, 0, 0
+
+        ids = [pk for pk, _, _ in necessidades]
+        rollups.atualizar_status_necessidades(Necessidade.objects.filter(pk__in=ids), 'expirado')
+        # O UPDATE em lote também não passa pelo post_save que invalida o feed da home,
+        # os candidatos de recomendação e as sugestões do autocomplete
+        feed.invalidar()
+        recomendacoes.agendar_atualizacao_ids(ids)
+        sugestoes.invalidar(sugestoes.TITULOS)
+        # O UPDATE em lote não passa pelo post_save que cancela os prazos de confirmação
+        prazos.cancelar_prazos(ids)
+        orcamentos = rollups.atualizar_status_orcamentos(
+            Orcamento.objects.filter(anuncio_id__in=ids, status__in=STATUS_ORCAMENTOS_ABERTOS),
+            'anuncio_expirado',
+        )
+
+        criadas = []
+        if notificar:
+            fornecedores = (
+                Orcamento.objects.filter(anuncio_id__in=ids, status='anuncio_expirado')
+                .order_by('anuncio_id', 'fornecedor_id')
+                .values_list('anuncio_id', 'fornecedor_id')
+                .distinct()
+            )
+            criadas = enviar(_notificacoes(necessidades, fornecedores))
+
+    return ids, ids[-1], orcamentos, len(criadas)
+
+
+def expirar_anuncios(criterio='validade', tamanho_lote=None, corte=None, retomar=True):
+    """
+    Expira em lotes os anúncios que atendem ao critério (ver CRITERIOS).
+
+    Args:
+        corte: data limite (padrão: agora para 'validade', DIAS_ANUNCIO_ANTIGO atrás para 'antigos');
+               ignorada ao retomar um checkpoint, que mantém o corte original
+        retomar: continua uma varredura interrompida a partir do checkpoint
+
+    Returns:
+        dict com expirados, orcamentos, notificacoes, lotes, segundos e por_segundo
+    """
+    tamanho_lote = max(1, tamanho_lote or settings.EXPIRACAO_LOTE)
+    chave = _chave_checkpoint(criterio)
+    checkpoint = cache.get(chave) if retomar else None
+
+    if checkpoint:
+        ultimo_id = checkpoint['ultimo_id']
+        corte = datetime.fromisoformat(checkpoint['corte'])
+        logger.info(f"Expiração '{criterio}': retomando após o id {ultimo_id}")
+    else:
+        ultimo_id = 0
+        if corte is None:
+            corte = timezone.now()
+            if criterio == 'antigos':
+                corte -= timedelta(days=DIAS_ANUNCIO_ANTIGO)
+
+    inicio = time.monotonic()
+    resultado = {'expirados': 0, 'orcamentos': 0, 'notificacoes': 0, 'lotes': 0}
+    while True:
+        ids, ultimo_id, orcamentos, notificacoes = _expirar_lote(criterio, corte, ultimo_id, tamanho_lote)
+        if not ids:
+            break
+        resultado['expirados'] += len(ids)
+        resultado['orcamentos'] += orcamentos
+        resultado['notificacoes'] += notificacoes
+        resultado['lotes'] += 1
+        cache.set(
+            chave, {'ultimo_id': ultimo_id, 'corte': corte.isoformat()},
+            settings.EXPIRACAO_CHECKPOINT_TTL,
+        )
+
+    cache.delete(chave)
+    segundos = time.monotonic() - inicio
+    resultado['segundos'] = round(segundos, 3)
+    resultado['por_segundo'] = round(resultado['expirados'] / segundos, 1) if segundos else 0.0
+    logger.info(
+        f"Expiração '{criterio}': {resultado['expirados']} anúncios, {resultado['orcamentos']} orçamentos, "
+        f"{resultado['notificacoes']} notificações em {resultado['lotes']} lotes "
+        f"({resultado['segundos']}s, {resultado['por_segundo']} anúncios/s)"
+    )
+    return resultado
@@ -0,0 +1,158 @@
+"""
+Feed da home (HomeView).
+
+- Seções anônimas (categorias e anúncios populares, anúncios ativos mais
+  antigos usados como fallback) ficam em uma entrada de cache versionada:
+  qualquer escrita em Necessidade incrementa a versão (`invalidar`), então
+  entradas antigas simplesmente deixam de ser lidas e expiram pelo TTL.
+- Anúncios próximos: lista de ids com chave pela versão e pelos parâmetros
+  (coordenadas arredondadas, cidade/UF), compartilhada entre usuários iguais.
+- "Baseados nas suas categorias": ids de `ads.recomendacoes` (candidatos
+  pré-calculados por categoria e UF).
+- Os anúncios de todas as seções são hidratados juntos: uma consulta com
+  cliente e categoria (select_related) mais as imagens (prefetch).
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from categories.models import Categoria
+from core.services.geo_service import GeoService
+
+from . import recomendacoes
+from .models import Necessidade
+
+CHAVE_VERSAO = 'ads:feed:versao'
+RAIO_PROXIMOS_KM = 50
+STATUS_PROXIMOS = ['ativo', 'analisando_orcamentos', 'em_atendimento']
+
+
+# ==================== VERSÃO ====================
+
+def versao():
+    valor = cache.get(CHAVE_VERSAO)
+    if valor is None:
+        valor = 1
+        cache.add(CHAVE_VERSAO, valor, None)
+    return valor
+
+
+def _incrementar_versao():
+    try:
+        cache.incr(CHAVE_VERSAO)
+    except ValueError:
+        cache.set(CHAVE_VERSAO, 1, None)
+
+
+def invalidar():
+    """Nova versão do feed após o commit da escrita em Necessidade."""
+    transaction.on_commit(_incrementar_versao)
+
+
+def _em_cache(chave, calcular):
+    valor = cache.get(chave)
+    if valor is None:
+        valor = calcular()
+        cache.set(chave, valor, settings.FEED_CACHE_TTL)
+    return valor
+
+
+# ==================== SEÇÕES ====================
+
+def _secoes_anonimas():
+    return {
+        # 24 categorias → 2 slides de 12
+        'categorias': list(Categoria.objects.order_by('-id')[:24]),
+        # 8 anúncios → 2 slides de 4
+        'populares': list(
+            Necessidade.objects.exclude(status__in=['finalizado', 'cancelado'])
+            .order_by('-data_criacao').values_list('pk', flat=True)[:8]
+        ),
+        'ativos_antigos': list(
+            Necessidade.objects.filter(status='ativo')
+            .order_by('data_criacao').values_list('pk', flat=True)[:8]
+        ),
+    }
+
+
+def _ids_proximos(v, user):
+    """Raio → cidade → estado (mesma ordem de fallback da home original)."""
+    lat, lon = user.lat, user.lon
+    cidade, estado = getattr(user, 'cidade', '') or '', getattr(user, 'estado', '') or ''
+    if lat is None or lon is None:
+        lat = lon = None
+    else:
+        # ~1 km: usuários vizinhos compartilham a entrada
+        lat, lon = round(lat, 2), round(lon, 2)
+
+    def calcular():
+        ids = []
+        if lat is not None:
+            ids = list(
+                GeoService.filtrar_por_raio(
+                    Necessidade.objects.filter(status__in=STATUS_PROXIMOS), lat, lon, RAIO_PROXIMOS_KM,
+                ).order_by('distancia_km', '-data_criacao').values_list('pk', flat=True)[:5]
+            )
+        if not ids and cidade:
+            ids = list(
+                Necessidade.objects.filter(status__in=STATUS_PROXIMOS, cliente__cidade=cidade)
+                .order_by('-data_criacao').values_list('pk', flat=True)[:5]
+            )
+            if not ids and estado:
+                ids = list(
+                    Necessidade.objects.filter(status__in=STATUS_PROXIMOS, cliente__estado=estado)
+                    .order_by('-data_criacao').values_list('pk', flat=True)[:5]
+                )
+        return ids
+
+    if lat is None and not cidade:
+        return []
+    return _em_cache(f"ads:feed:{v}:proximos:{lat}:{lon}:{cidade}:{estado}", calcular)
+
+
+# ==================== MONTAGEM ====================
+
+def _hidratar(ids):
+    """Anúncios por id com o que os cards usam (cliente, categoria, imagens)."""
+    if not ids:
+        return {}
+    return Necessidade.objects.select_related('cliente', 'categoria').prefetch_related('imagens').in_bulk(ids)
+
+
+def _slides(itens, tamanho):
+    return [itens[i:i + tamanho] for i in range(0, len(itens), tamanho)]
+
+
+def montar(user):
+    """
+    Contexto da home para o usuário (anônimo ou autenticado).
+
+    Returns:
+        dict com categorias_populares, categorias, anuncios_populares,
+        anuncios_preferidos e anuncios_proximos (listas de slides)
+    """
+    v = versao()
+    anonimo = _em_cache(f"ads:feed:{v}:anonimo", _secoes_anonimas)
+
+    preferidos, proximos = [], []
+    if user.is_authenticated:
+        preferidos = recomendacoes.recomendar(user)
+        proximos = _ids_proximos(v, user)
+    # Visitantes (ou nenhum anúncio ativo): anúncios ativos mais antigos
+    preferidos = preferidos or anonimo['ativos_antigos']
+
+    anuncios = _hidratar(set(anonimo['populares']) | set(preferidos) | set(proximos))
+
+    def cards(ids):
+        return [anuncios[pk] for pk in ids if pk in anuncios]
+
+    categorias = anonimo['categorias']
+    return {
+        'categorias_populares': _slides(categorias, 12),
+        # Lista simples para a versão mobile
+        'categorias': categorias,
+        'anuncios_populares': _slides(cards(anonimo['populares']), 4),
+        'anuncios_preferidos': _slides(cards(preferidos), 4),
+        'anuncios_proximos': _slides(cards(proximos), 4),
+    }
@@ -0,0 +1,180 @@
+"""
+Fornecedores compatíveis com um anúncio novo.
+
+Índice invertido por categoria (em cache, uma consulta por categoria ao
+montar): fornecedores ativos que marcaram a categoria nas preferências,
+separados por UF, por célula de geohash (com as coordenadas) e os sem
+localização (atendem todo o país):
+
+    {'ufs': {uf: [ids]}, 'celulas': {celula: [(id, lat, lon)]}, 'nacionais': [ids]}
+
+Um fornecedor é compatível com o anúncio quando atende a categoria e está
+na mesma UF do serviço ou a até FORNECEDORES_RAIO_KM dele (células vizinhas
++ haversine), ou não informou localização. O índice da categoria é
+descartado quando um fornecedor muda preferências, localização ou perfil.
+
+`notificar_compativeis` (task após a criação do anúncio) resolve os
+fornecedores pelo índice e os notifica em lotes de FORNECEDORES_LOTE: uma
+consulta por lote aplica o limite diário (FORNECEDORES_AVISOS_POR_DIA) e
+descarta quem já foi avisado do anúncio; um bulk_create por lote
+(`notifications.fanout`).
+"""
+
+from collections import defaultdict
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from core.services.geo_service import GeoService
+
+from .models import Necessidade
+from .rollups import estado_de
+
+logger = logging.getLogger(__name__)
+
+ORIGEM = 'fornecedores_compativeis'
+# Célula de ~156 km: a célula do anúncio e as 8 vizinhas cobrem raios de até ~70 km no Brasil
+PRECISAO_CELULA = 3
+
+
+# ==================== ÍNDICE ====================
+
+def _chave(categoria_id):
+    return f"ads:fornecedores:{categoria_id}"
+
+
+def _montar_indice(categoria_id):
+    from users.models import User
+
+    indice = {'ufs': defaultdict(list), 'celulas': defaultdict(list), 'nacionais': []}
+    fornecedores = (
+        User.preferred_categories.through.objects.filter(
+            categoria_id=categoria_id, user__is_supplier=True, user__is_active=True,
+        )
+        .values_list('user_id', 'user__estado', 'user__lat', 'user__lon')
+        .order_by('user_id')
+    )
+    for user_id, uf, lat, lon in fornecedores.iterator(chunk_size=5000):
+        uf = (uf or '')[:2].upper()
+        if uf:
+            indice['ufs'][uf].append(user_id)
+        if lat is not None and lon is not None:
+            indice['celulas'][GeoService.encode(lat, lon, PRECISAO_CELULA)].append((user_id, lat, lon))
+        elif not uf:
+            indice['nacionais'].append(user_id)
+    return {'ufs': dict(indice['ufs']), 'celulas': dict(indice['celulas']), 'nacionais': indice['nacionais']}
+
+
+def indice(categoria_id):
+    chave = _chave(categoria_id)
+    valor = cache.get(chave)
+    if valor is None:
+        valor = _montar_indice(categoria_id)
+        cache.set(chave, valor, settings.FORNECEDORES_INDICE_TTL)
+    return valor
+
+
+def invalidar(categoria_ids):
+    cache.delete_many([_chave(categoria_id) for categoria_id in categoria_ids])
+
+
+def invalidar_fornecedor(user):
+    """Descarta os índices das categorias do fornecedor (localização ou perfil alterados)."""
+    invalidar(user.preferred_categories.values_list('pk', flat=True))
+
+
+# ==================== CORRESPONDÊNCIA ====================
+
+def compativeis(necessidade):
+    """Ids dos fornecedores compatíveis com o anúncio (sem consultas com o índice em cache)."""
+    entrada = indice(necessidade.categoria_id)
+    ids = set(entrada['nacionais'])
+    uf = estado_de(necessidade)
+    if uf:
+        ids.update(entrada['ufs'].get(uf, ()))
+
+    lat, lon = necessidade.geo_lat, necessidade.geo_lon
+    if lat is not None and lon is not None:
+        raio = settings.FORNECEDORES_RAIO_KM
+        for celula in GeoService.celulas_vizinhas(lat, lon, PRECISAO_CELULA):
+            ids.update(
+                user_id for user_id, lat_fornecedor, lon_fornecedor in entrada['celulas'].get(celula, ())
+                if GeoService.distancia_km(lat, lon, lat_fornecedor, lon_fornecedor) <= raio
+            )
+
+    ids.discard(necessidade.cliente_id)
+    return sorted(ids)
+
+
+# ==================== ENVIO ====================
+
+def _aptos(lote, necessidade_id, desde):
+    """Fornecedores do lote abaixo do limite diário e ainda não avisados do anúncio (uma consulta)."""
+    from notifications.models import Notification
+
+    avisos = (
+        Notification.objects.filter(user_id__in=lote, created_at__gte=desde, metadata__origem=ORIGEM)
+        .values_list('user_id')
+        .annotate(hoje=Count('id'), anuncio=Count('id', filter=Q(necessidade_id=necessidade_id)))
+        .order_by()
+    )
+    bloqueados = {
+        user_id for user_id, hoje, anuncio in avisos
+        if anuncio or hoje >= settings.FORNECEDORES_AVISOS_POR_DIA
+    }
+    return [user_id for user_id in lote if user_id not in bloqueados]
+
+
+def notificar_compativeis(necessidade_id):
+    """
+    Avisa os fornecedores compatíveis com um anúncio ativo. Reexecutar não
+    duplica avisos.
+
+    Returns:
+        int: fornecedores notificados
+    """
+    from notifications.fanout import montar, enviar
+
+    necessidade = (
+        Necessidade.objects.select_related('categoria', 'cliente')
+        .filter(pk=necessidade_id, status='ativo').first()
+    )
+    if necessidade is None:
+        return 0
+
+    ids = compativeis(necessidade)
+    contexto = {
+        'titulo': necessidade.titulo,
+        'categoria': necessidade.categoria.nome,
+        'local': necessidade.get_cidade_estado_servico(),
+    }
+    desde = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    tamanho = settings.FORNECEDORES_LOTE
+
+    total = 0
+    for inicio in range(0, len(ids), tamanho):
+        with transaction.atomic():
+            total += len(enviar([
+                montar(user_id, 'anuncio_compativel', contexto, necessidade=necessidade, metadata={'origem': ORIGEM})
+                for user_id in _aptos(ids[inicio:inicio + tamanho], necessidade.pk, desde)
+            ]))
+
+    logger.info(f"Anúncio {necessidade_id}: {total} de {len(ids)} fornecedores compatíveis notificados")
+    return total
+
+
+def agendar_notificacao(necessidade):
+    """Dispara a task após o commit da criação do anúncio."""
+    from .tasks import notificar_fornecedores_compativeis
+
+    def disparar():
+        try:
+            notificar_fornecedores_compativeis.delay(necessidade.pk)
+        except Exception as e:
+            logger.warning(f"Não foi possível agendar o aviso aos fornecedores do anúncio {necessidade.pk}: {e}")
+
+    transaction.on_commit(disparar)
@@ -0,0 +1,180 @@
+"""
+Histórico de status (StateTransitionLog): gravação e consultas.
+
+As transições são registradas pelos receivers de post_save (na mesma
+transação do save feito pelo state machine) e em lote pelas atualizações
+de status em massa (`registrar_lote`). Histórico, tempo em cada status e
+métricas de funil consultam apenas o log, pelos índices
+(entidade, objeto, data) e (entidade, status, data).
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+import logging
+
+from django.db import connection
+from django.utils import timezone
+
+from ads.models import StateTransitionLog
+
+logger = logging.getLogger(__name__)
+
+ENTIDADES = {
+    'ads.necessidade': StateTransitionLog.NECESSIDADE,
+    'budgets.orcamento': StateTransitionLog.ORCAMENTO,
+    'ads.disputa': StateTransitionLog.DISPUTA,
+}
+
+
+def entidade_de(instance_ou_model):
+    return ENTIDADES[instance_ou_model._meta.label_lower]
+
+
+# ==================== ESCRITA ====================
+
+def _nova_transicao(entidade, objeto_id, status_anterior, status, usuario_id=None, criado_em=None):
+    try:
+        de = StateTransitionLog.codificar(entidade, status_anterior)
+        para = StateTransitionLog.codificar(entidade, status)
+    except ValueError:
+        logger.warning(
+            f"Status fora do histórico ignorado: entidade {entidade}, objeto {objeto_id}, "
+            f"{status_anterior} -> {status}"
+        )
+        return None
+    return StateTransitionLog(
+        entidade=entidade, objeto_id=objeto_id, de=de, para=para,
+        usuario_id=usuario_id, criado_em=criado_em or timezone.now(),
+    )
+
+
+def registrar(instance, status_anterior, criado=False, usuario=None):
+    """
+    Registra a transição de um objeto salvo (chamado pelos receivers de post_save).
+    Nada é gravado se o status não mudou.
+    """
+    if not criado and status_anterior == instance.status:
+        return None
+    if usuario is None:
+        # Definido pelo state machine antes do save
+        usuario = getattr(instance, '_transicao_usuario', None)
+    transicao = _nova_transicao(
+        entidade_de(instance), instance.pk, None if criado else status_anterior, instance.status,
+        usuario_id=getattr(usuario, 'pk', usuario),
+    )
+    if transicao is not None:
+        transicao.save()
+    return transicao
+
+
+def registrar_lote(model, linhas, novo_status, usuario=None):
+    """
+    Registra em um único INSERT as transições de uma atualização em massa.
+
+    Args:
+        linhas: iterável de (pk, status_anterior), lido antes do UPDATE
+    """
+    entidade = entidade_de(model)
+    agora = timezone.now()
+    usuario_id = getattr(usuario, 'pk', usuario)
+    transicoes = [
+        transicao for transicao in (
+            _nova_transicao(entidade, pk, status_anterior, novo_status, usuario_id, agora)
+            for pk, status_anterior in linhas if status_anterior != novo_status
+        )
+        if transicao is not None
+    ]
+    return StateTransitionLog.objects.bulk_create(transicoes, batch_size=1000)
+
+
+# ==================== CONSULTAS ====================
+
+def historico(instance):
+    """
+    Transições do objeto em ordem cronológica.
+
+    Returns:
+        list[dict]: de, para (status), usuario_id e criado_em
+    """
+    entidade = entidade_de(instance)
+    linhas = (
+        StateTransitionLog.objects.filter(entidade=entidade, objeto_id=instance.pk)
+        .order_by('criado_em', 'id')
+        .values_list('de', 'para', 'usuario_id', 'criado_em')
+    )
+    return [
+        {
+            'de': StateTransitionLog.decodificar(entidade, de),
+            'para': StateTransitionLog.decodificar(entidade, para),
+            'usuario_id': usuario_id,
+            'criado_em': criado_em,
+        }
+        for de, para, usuario_id, criado_em in linhas
+    ]
+
+
+def tempo_em_status(instance, agora=None):
+    """
+    Tempo total que o objeto passou em cada status (o atual conta até `agora`).
+
+    Returns:
+        dict {status: timedelta}
+    """
+    agora = agora or timezone.now()
+    tempos = defaultdict(timedelta)
+    transicoes = historico(instance)
+    for atual, seguinte in zip(transicoes, transicoes[1:] + [None]):
+        fim = seguinte['criado_em'] if seguinte else agora
+        tempos[atual['para']] += fim - atual['criado_em']
+    return dict(tempos)
+
+
+def duracao_entre_status(entidade, status_inicial, status_final, desde, ate):
+    """
+    Tempo entre entrar em `status_inicial` e entrar em `status_final`, para os
+    objetos que chegaram a `status_final` no período [desde, ate). Usa a
+    entrada mais recente em `status_inicial` anterior à chegada.
+
+    Returns:
+        dict com quantidade, media, p50, p90 e maximo (timedelta ou None)
+    """
+    tabela = StateTransitionLog._meta.db_table
+    sql = f"""
+        SELECT COUNT(*),
+               AVG(fim.criado_em - inicio.criado_em),
+               percentile_cont(0.5) WITHIN GROUP (ORDER BY fim.criado_em - inicio.criado_em),
+               percentile_cont(0.9) WITHIN GROUP (ORDER BY fim.criado_em - inicio.criado_em),
+               MAX(fim.criado_em - inicio.criado_em)
+        FROM {tabela} fim
+        CROSS JOIN LATERAL (
+            SELECT criado_em FROM {tabela} anterior
+            WHERE anterior.entidade = fim.entidade AND anterior.objeto_id = fim.objeto_id
+              AND anterior.para = %s AND anterior.criado_em <= fim.criado_em
+            ORDER BY anterior.criado_em DESC
+            LIMIT 1
+        ) inicio
+        WHERE fim.entidade = %s AND fim.para = %s AND fim.criado_em >= %s AND fim.criado_em < %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [
+            StateTransitionLog.codificar(entidade, status_inicial),
+            entidade,
+            StateTransitionLog.codificar(entidade, status_final),
+            desde, ate,
+        ])
+        quantidade, media, p50, p90, maximo = cursor.fetchone()
+    return {'quantidade': quantidade, 'media': media, 'p50': p50, 'p90': p90, 'maximo': maximo}
+
+
+# ==================== FUNIL ====================
+
+def tempo_ate_primeiro_orcamento(desde, ate):
+    """Da publicação (ativo) ao primeiro orçamento recebido (analisando_orcamentos)."""
+    return duracao_entre_status(StateTransitionLog.NECESSIDADE, 'ativo', 'analisando_orcamentos', desde, ate)
+
+
+def latencia_confirmacao(desde, ate):
+    """Do aceite do cliente (aguardando_confirmacao) à confirmação do fornecedor (em_atendimento)."""
+    return duracao_entre_status(
+        StateTransitionLog.NECESSIDADE, 'aguardando_confirmacao', 'em_atendimento', desde, ate
+    )
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ads.models import Necessidade
+from core.services.geo_service import GeoService
+
+
+class Command(BaseCommand):
+    help = "Preenche geo_lat/geo_lon/geohash das necessidades a partir das coordenadas do serviço"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Quantidade de anúncios atualizados por transação (padrão: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        total = 0
+        ultimo_id = 0
+
+        self.stdout.write("Atualizando geolocalização das necessidades...")
+
+        while True:
+            linhas = list(
+                Necessidade.objects.filter(id__gt=ultimo_id)
+                .order_by('id')
+                .values_list(
+                    'id', 'usar_endereco_usuario', 'lat_servico', 'lon_servico',
+                    'cliente__lat', 'cliente__lon',
+                )[:batch_size]
+            )
+            if not linhas:
+                break
+
+            atualizar = []
+            for pk, usar_usuario, lat_servico, lon_servico, lat_cliente, lon_cliente in linhas:
+                lat, lon = (lat_cliente, lon_cliente) if usar_usuario else (lat_servico, lon_servico)
+                if lat is None or lon is None:
+                    lat = lon = None
+                atualizar.append(Necessidade(
+                    pk=pk, geo_lat=lat, geo_lon=lon, geohash=GeoService.encode_or_empty(lat, lon)
+                ))
+
+            with transaction.atomic():
+                Necessidade.objects.bulk_update(atualizar, ['geo_lat', 'geo_lon', 'geohash'])
+
+            total += len(atualizar)
+            ultimo_id = linhas[-1][0]
+
+        self.stdout.write(self.style.SUCCESS(f"✓ {total} necessidades atualizadas."))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from ads.expiracao import CRITERIOS, expirar_anuncios
+
+
+class Command(BaseCommand):
+    help = "Expira em lotes os anúncios vencidos (mesma varredura das tasks do Celery)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--criterio',
+            choices=sorted(CRITERIOS),
+            default='validade',
+            help="'validade': passaram da data de validade; 'antigos': ativos há muito tempo",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Quantidade de anúncios expirados por transação (padrão: EXPIRACAO_LOTE)',
+        )
+        parser.add_argument(
+            '--reiniciar',
+            action='store_true',
+            help='Ignora o checkpoint de uma varredura interrompida e começa do início',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Expirando anúncios (critério '{options['criterio']}')...")
+        resultado = expirar_anuncios(
+            options['criterio'],
+            tamanho_lote=options['batch_size'],
+            retomar=not options['reiniciar'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {resultado['expirados']} anúncios expirados, {resultado['orcamentos']} orçamentos, "
+            f"{resultado['notificacoes']} notificações em {resultado['lotes']} lotes "
+            f"({resultado['segundos']}s, {resultado['por_segundo']} anúncios/s)."
+        ))
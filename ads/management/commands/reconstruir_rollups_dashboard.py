@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from ads.rollups import reconstruir_rollups
+
+
+class Command(BaseCommand):
+    help = "Reconstrói as tabelas de rollup usadas pelo dashboard administrativo"
+
+    def handle(self, *args, **options):
+        self.stdout.write("Reconstruindo rollups do dashboard...")
+        reconstruir_rollups()
+        self.stdout.write(self.style.SUCCESS("✓ Rollups reconstruídos."))
@@ -0,0 +1,128 @@
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+SQL_FUNCOES = """
+CREATE OR REPLACE FUNCTION ads_necessidade_search_vector(
+    p_titulo text, p_descricao text, p_categoria_id bigint, p_subcategoria_id bigint
+) RETURNS tsvector AS $$
+    SELECT
+        setweight(to_tsvector('portuguese_unaccent', coalesce(p_titulo, '')), 'A') ||
+        setweight(to_tsvector('portuguese_unaccent', coalesce(
+            (SELECT nome FROM categories_categoria WHERE id = p_categoria_id), '')), 'B') ||
+        setweight(to_tsvector('portuguese_unaccent', coalesce(
+            (SELECT nome FROM categories_subcategoria WHERE id = p_subcategoria_id), '')), 'C') ||
+        setweight(to_tsvector('portuguese_unaccent', coalesce(p_descricao, '')), 'D');
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION ads_necessidade_search_vector_trigger() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := ads_necessidade_search_vector(
+        NEW.titulo, NEW.descricao, NEW.categoria_id, NEW.subcategoria_id
+    );
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION ads_necessidade_taxonomia_renomeada() RETURNS trigger AS $$
+BEGIN
+    IF NEW.nome IS DISTINCT FROM OLD.nome THEN
+        IF TG_TABLE_NAME = 'categories_categoria' THEN
+            UPDATE ads_necessidade
+               SET search_vector = ads_necessidade_search_vector(titulo, descricao, categoria_id, subcategoria_id)
+             WHERE categoria_id = NEW.id;
+        ELSE
+            UPDATE ads_necessidade
+               SET search_vector = ads_necessidade_search_vector(titulo, descricao, categoria_id, subcategoria_id)
+             WHERE subcategoria_id = NEW.id;
+        END IF;
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS ads_necessidade_search_vector_update ON ads_necessidade;
+CREATE TRIGGER ads_necessidade_search_vector_update
+    BEFORE INSERT OR UPDATE OF titulo, descricao, categoria_id, subcategoria_id
+    ON ads_necessidade
+    FOR EACH ROW EXECUTE FUNCTION ads_necessidade_search_vector_trigger();
+
+DROP TRIGGER IF EXISTS categoria_search_vector_update ON categories_categoria;
+CREATE TRIGGER categoria_search_vector_update
+    AFTER UPDATE OF nome ON categories_categoria
+    FOR EACH ROW EXECUTE FUNCTION ads_necessidade_taxonomia_renomeada();
+
+DROP TRIGGER IF EXISTS subcategoria_search_vector_update ON categories_subcategoria;
+CREATE TRIGGER subcategoria_search_vector_update
+    AFTER UPDATE OF nome ON categories_subcategoria
+    FOR EACH ROW EXECUTE FUNCTION ads_necessidade_taxonomia_renomeada();
+"""
+
+SQL_REMOVER_FUNCOES = """
+DROP TRIGGER IF EXISTS subcategoria_search_vector_update ON categories_subcategoria;
+DROP TRIGGER IF EXISTS categoria_search_vector_update ON categories_categoria;
+DROP TRIGGER IF EXISTS ads_necessidade_search_vector_update ON ads_necessidade;
+DROP FUNCTION IF EXISTS ads_necessidade_taxonomia_renomeada();
+DROP FUNCTION IF EXISTS ads_necessidade_search_vector_trigger();
+DROP FUNCTION IF EXISTS ads_necessidade_search_vector(text, text, bigint, bigint);
+DROP TEXT SEARCH CONFIGURATION IF EXISTS portuguese_unaccent;
+"""
+
+
+def criar_configuracao_busca(apps, schema_editor):
+    """
+    Cria a configuração 'portuguese_unaccent' (stemming em português sem acentos).
+    Em bancos sem a extensão unaccent (contrib ausente) a configuração é criada
+    apenas com o stemming, mantendo as consultas funcionais.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'unaccent'")
+        tem_unaccent = cursor.fetchone() is not None
+        if tem_unaccent:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+        else:
+            print("  ⚠️ Extensão unaccent indisponível: busca textual ficará sensível a acentos")
+
+        cursor.execute("SELECT 1 FROM pg_ts_config WHERE cfgname = 'portuguese_unaccent'")
+        if cursor.fetchone() is None:
+            cursor.execute("CREATE TEXT SEARCH CONFIGURATION portuguese_unaccent (COPY = portuguese)")
+            if tem_unaccent:
+                cursor.execute(
+                    "ALTER TEXT SEARCH CONFIGURATION portuguese_unaccent "
+                    "ALTER MAPPING FOR hword, hword_part, word WITH unaccent, portuguese_stem"
+                )
+
+    schema_editor.execute(SQL_FUNCOES)
+
+
+def remover_configuracao_busca(apps, schema_editor):
+    schema_editor.execute(SQL_REMOVER_FUNCOES)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ads", "0018_remove_em_andamento_status"),
+        ("categories", "0003_categoria_icone"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="necessidade",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="necessidade",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="ads_necessidade_search_gin"
+            ),
+        ),
+        # Os vetores das linhas existentes são preenchidos pelo comando
+        # `python manage.py rebuild_search_vectors` (em lotes).
+        migrations.RunPython(criar_configuracao_busca, remover_configuracao_busca),
+    ]
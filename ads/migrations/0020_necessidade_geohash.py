@@ -0,0 +1,39 @@
+# Generated by Django 5.1.14 on 2026-10-17 19:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ads", "0019_necessidade_search_vector"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="necessidade",
+            name="geo_lat",
+            field=models.FloatField(
+                blank=True, editable=False, null=True, verbose_name="Latitude efetiva"
+            ),
+        ),
+        migrations.AddField(
+            model_name="necessidade",
+            name="geo_lon",
+            field=models.FloatField(
+                blank=True, editable=False, null=True, verbose_name="Longitude efetiva"
+            ),
+        ),
+        migrations.AddField(
+            model_name="necessidade",
+            name="geohash",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                editable=False,
+                help_text="Célula geográfica das coordenadas efetivas (pré-filtro por prefixo)",
+                max_length=12,
+                verbose_name="Geohash",
+            ),
+        ),
+    ]
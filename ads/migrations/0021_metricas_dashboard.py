@@ -0,0 +1,134 @@
+# Generated by Django 5.1.14 on 2026-10-17 19:25
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ads", "0020_necessidade_geohash"),
+        ("categories", "0003_categoria_icone"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MetricaUsuarios",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("is_client", models.BooleanField()),
+                ("is_supplier", models.BooleanField()),
+                ("quantidade", models.IntegerField(default=0)),
+            ],
+            options={
+                "verbose_name": "Métrica de usuários",
+                "verbose_name_plural": "Métricas de usuários",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("is_client", "is_supplier"),
+                        name="metrica_usuarios_chave_unica",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="MetricaMensalNecessidade",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("mes", models.DateField(verbose_name="Mês (primeiro dia)")),
+                (
+                    "estado",
+                    models.CharField(blank=True, max_length=2, verbose_name="UF"),
+                ),
+                ("status", models.CharField(max_length=30)),
+                ("quantidade", models.IntegerField(default=0)),
+                (
+                    "categoria",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="categories.categoria",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Métrica mensal de necessidades",
+                "verbose_name_plural": "Métricas mensais de necessidades",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("mes", "categoria", "estado", "status"),
+                        name="metrica_necessidade_chave_unica",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="MetricaMensalOrcamento",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("mes", models.DateField(verbose_name="Mês (primeiro dia)")),
+                (
+                    "estado",
+                    models.CharField(blank=True, max_length=2, verbose_name="UF"),
+                ),
+                ("status", models.CharField(max_length=50)),
+                ("status_anuncio", models.CharField(max_length=30)),
+                ("quantidade", models.IntegerField(default=0)),
+                (
+                    "valor",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=16
+                    ),
+                ),
+                (
+                    "categoria",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="categories.categoria",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Métrica mensal de orçamentos",
+                "verbose_name_plural": "Métricas mensais de orçamentos",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=(
+                            "mes",
+                            "categoria",
+                            "estado",
+                            "status",
+                            "status_anuncio",
+                        ),
+                        name="metrica_orcamento_chave_unica",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.1.14 on 2026-10-17 19:50
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ads", "0021_metricas_dashboard"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StateTransitionLog",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "entidade",
+                    models.PositiveSmallIntegerField(
+                        choices=[(1, "Necessidade"), (2, "Orçamento"), (3, "Disputa")]
+                    ),
+                ),
+                ("objeto_id", models.BigIntegerField()),
+                (
+                    "de",
+                    models.PositiveSmallIntegerField(
+                        default=0, verbose_name="Status anterior"
+                    ),
+                ),
+                ("para", models.PositiveSmallIntegerField(verbose_name="Novo status")),
+                ("criado_em", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "usuario",
+                    models.ForeignKey(
+                        blank=True,
+                        db_constraint=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Transição de status",
+                "verbose_name_plural": "Transições de status",
+                "indexes": [
+                    models.Index(
+                        fields=["entidade", "objeto_id", "criado_em"],
+                        name="transicao_objeto_idx",
+                    ),
+                    models.Index(
+                        fields=["entidade", "para", "criado_em"],
+                        name="transicao_estado_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.1.14 on 2026-10-17 19:56
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def agendar_prazos_pendentes(apps, schema_editor):
+    """
+    Agenda aviso (+36h) e timeout (+48h) das necessidades que já estão
+    aguardando confirmação; as novas são agendadas pelo signal de post_save.
+    """
+    Necessidade = apps.get_model('ads', 'Necessidade')
+    PrazoAgendado = apps.get_model('ads', 'PrazoAgendado')
+
+    prazos = []
+    pendentes = Necessidade.objects.filter(
+        status='aguardando_confirmacao', aguardando_confirmacao_desde__isnull=False
+    ).values_list('pk', 'aguardando_confirmacao_desde')
+    for pk, desde in pendentes.iterator():
+        for tipo, horas in (('aviso_confirmacao', 36), ('timeout_confirmacao', 48)):
+            prazos.append(PrazoAgendado(
+                chave=f"necessidade:{pk}:{tipo}", tipo=tipo, necessidade_id=pk,
+                referencia=desde, vence_em=desde + timedelta(hours=horas),
+            ))
+    PrazoAgendado.objects.bulk_create(prazos, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ads", "0022_state_transition_log"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PrazoAgendado",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "chave",
+                    models.CharField(max_length=100, unique=True, verbose_name="Chave"),
+                ),
+                (
+                    "tipo",
+                    models.CharField(
+                        choices=[
+                            ("aviso_confirmacao", "Aviso de confirmação"),
+                            ("timeout_confirmacao", "Timeout de confirmação"),
+                        ],
+                        max_length=30,
+                        verbose_name="Tipo",
+                    ),
+                ),
+                ("referencia", models.DateTimeField(verbose_name="Referência")),
+                ("vence_em", models.DateTimeField(verbose_name="Vence em")),
+                (
+                    "tentativas",
+                    models.PositiveSmallIntegerField(
+                        default=0, verbose_name="Tentativas"
+                    ),
+                ),
+                (
+                    "necessidade",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="prazos",
+                        to="ads.necessidade",
+                        verbose_name="Necessidade",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Prazo agendado",
+                "verbose_name_plural": "Prazos agendados",
+                "indexes": [
+                    models.Index(fields=["vence_em"], name="prazo_vencimento_idx")
+                ],
+            },
+        ),
+        migrations.RunPython(agendar_prazos_pendentes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.14 on 2026-10-17 20:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ads", "0023_prazo_agendado"),
+        ("categories", "0003_categoria_icone"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="necessidade",
+            index=models.Index(
+                fields=["status", "-data_criacao"], name="necessidade_status_data_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="necessidade",
+            index=models.Index(
+                fields=["categoria", "status", "-data_criacao"],
+                name="necessidade_cat_status_idx",
+            ),
+        ),
+    ]
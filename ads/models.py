@@ -2,6 +2,8 @@ from django.db import models
 from django.urls import reverse
 from django.utils import timezone
 from django.core.exceptions import ValidationError
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from users.models import User
 from categories.models import Categoria, SubCategoria
 from decimal import Decimal
@@ -129,6 +131,18 @@ class Necessidade(models.Model):
     # Coordenadas do local do serviço
     lat_servico = models.FloatField("Latitude do serviço", null=True, blank=True)
     lon_servico = models.FloatField("Longitude do serviço", null=True, blank=True)
+
+    # Coordenadas efetivas (get_coordenadas_servico) desnormalizadas para busca por proximidade
+    geo_lat = models.FloatField("Latitude efetiva", null=True, blank=True, editable=False)
+    geo_lon = models.FloatField("Longitude efetiva", null=True, blank=True, editable=False)
+    geohash = models.CharField(
+        "Geohash",
+        max_length=12,
+        blank=True,
+        db_index=True,
+        editable=False,
+        help_text="Célula geográfica das coordenadas efetivas (pré-filtro por prefixo)"
+    )
     
     # Campo para armazenar dados completos da API
     endereco_completo_json = models.JSONField(
@@ -166,6 +180,18 @@ class Necessidade(models.Model):
     data_criacao = models.DateTimeField(auto_now_add=True)
     modificado_em = models.DateTimeField(blank=True, null=True, auto_now=True)
 
+    # Vetor de busca textual ponderado (título A, categoria B, subcategoria C, descrição D).
+    # Mantido por trigger no banco (ver migração 0019), inclusive em updates em lote.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='ads_necessidade_search_gin'),
+            # Feed da home e baldes de recomendação (ativos mais recentes, por categoria)
+            models.Index(fields=['status', '-data_criacao'], name='necessidade_status_data_idx'),
+            models.Index(fields=['categoria', 'status', '-data_criacao'], name='necessidade_cat_status_idx'),
+        ]
+
     def get_absolute_url(self):
         return reverse('ads:necessidade_detail', args=[str(self.pk)])
     
@@ -229,6 +255,17 @@ class Necessidade(models.Model):
             return (self.cliente.lat, self.cliente.lon)
         return (self.lat_servico, self.lon_servico)
     
+    def atualizar_geolocalizacao(self):
+        """Sincroniza geo_lat/geo_lon/geohash com as coordenadas efetivas do serviço"""
+        from core.services.geo_service import GeoService
+
+        lat, lon = self.get_coordenadas_servico()
+        if lat is None or lon is None:
+            lat = lon = None
+        self.geo_lat = lat
+        self.geo_lon = lon
+        self.geohash = GeoService.encode_or_empty(lat, lon)
+
     def get_cep_servico(self):
         """Retorna CEP do local do serviço"""
         if self.usar_endereco_usuario:
@@ -349,16 +386,33 @@ class Necessidade(models.Model):
                 'data_validade': 'A data de validade deve ser no futuro.'
             })
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Status carregado do banco, usado para calcular deltas dos rollups sem re-consultar
+        if 'status' in field_names:
+            instance._status_original = instance.status
+        # Título carregado do banco (sugestões do autocomplete)
+        if 'titulo' in field_names:
+            instance._titulo_original = instance.titulo
+        return instance
+
     def save(self, *args, **kwargs):
         """Override do save para definir data_validade automaticamente se não informada."""
         # Se é uma nova instância e não tem data_validade definida, define para 30 dias
         if not self.pk and not self.data_validade:
             self.data_validade = timezone.now() + timedelta(days=30)
+
+        # Saves parciais (update_fields) não mexem no endereço
+        if kwargs.get('update_fields') is None:
+            self.atualizar_geolocalizacao()
         
         # Chama validação antes de salvar (apenas se não for para pular)
         if not kwargs.pop('skip_validation', False):
             self.clean()
         super().save(*args, **kwargs)
+        self._status_original = self.status
+        self._titulo_original = self.titulo
     
     def dias_restantes(self):
         """Calcula quantos dias restam até a expiração."""
@@ -594,6 +648,8 @@ class Disputa(models.Model):
         if not is_new:
             old_instance = Disputa.objects.get(pk=self.pk)
             old_status = old_instance.status
+        # Usado pelo histórico de status (post_save)
+        self._status_original = old_status
         
         # Definir data de resolução quando status muda para resolvida
         if self.status == 'resolvida' and old_status != 'resolvida':
@@ -604,6 +660,7 @@ class Disputa(models.Model):
         # Chama validação antes de salvar
         self.clean()
         super().save(*args, **kwargs)
+        self._status_original = self.status
         
         # Se é nova disputa, atualizar status da necessidade
         if is_new:
@@ -642,26 +699,14 @@ class Disputa(models.Model):
     def _enviar_notificacoes_resolucao(self):
         """Envia notificações quando disputa é resolvida."""
         try:
-            from notifications.models import Notification, NotificationType
-            
-            # Notificar cliente
-            Notification.objects.create(
-                user=self.necessidade.cliente,
-                title='Disputa Resolvida',
-                message=f'A disputa sobre "{self.necessidade.titulo}" foi resolvida pela administração.',
-                notification_type=NotificationType.SYSTEM_MESSAGE,
-                necessidade=self.necessidade,
-                metadata={'disputa_id': self.pk, 'resolucao': self.resolucao}
-            )
+            from notifications.fanout import notificar
             
-            # Notificar fornecedor
-            Notification.objects.create(
-                user=self.orcamento.fornecedor,
-                title='Disputa Resolvida',
-                message=f'A disputa sobre "{self.necessidade.titulo}" foi resolvida pela administração.',
-                notification_type=NotificationType.SYSTEM_MESSAGE,
+            # Notificar cliente e fornecedor
+            notificar(
+                [self.necessidade.cliente_id, self.orcamento.fornecedor_id],
+                'disputa_resolvida', {'titulo': self.necessidade.titulo},
                 necessidade=self.necessidade,
-                metadata={'disputa_id': self.pk, 'resolucao': self.resolucao}
+                metadata={'disputa_id': self.pk, 'resolucao': self.resolucao},
             )
             
         except ImportError:
@@ -731,3 +776,196 @@ class Disputa(models.Model):
         # Disputas abertas há mais de 48 horas precisam de atenção
         from django.utils import timezone
         return (timezone.now() - self.data_abertura).total_seconds() > 48 * 3600
+
+
+# ==================== ROLLUPS DO DASHBOARD ====================
+# Tabelas-fato agregadas por mês/categoria/UF/status. São mantidas de forma
+# incremental (ads.rollups) e reconstruídas periodicamente pelo Celery beat.
+
+class MetricaMensalNecessidade(models.Model):
+    """Quantidade de necessidades por mês de criação, categoria, UF e status."""
+    mes = models.DateField("Mês (primeiro dia)")
+    categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE, related_name="+")
+    estado = models.CharField("UF", max_length=2, blank=True)
+    status = models.CharField(max_length=30)
+    quantidade = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Métrica mensal de necessidades'
+        verbose_name_plural = 'Métricas mensais de necessidades'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['mes', 'categoria', 'estado', 'status'],
+                name='metrica_necessidade_chave_unica',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.mes:%m/%Y} {self.categoria_id} {self.estado} {self.status}: {self.quantidade}"
+
+
+class MetricaMensalOrcamento(models.Model):
+    """Quantidade e valor (itens sem impostos) de orçamentos por mês de criação e status."""
+    mes = models.DateField("Mês (primeiro dia)")
+    categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE, related_name="+")
+    estado = models.CharField("UF", max_length=2, blank=True)
+    status = models.CharField(max_length=50)
+    status_anuncio = models.CharField(max_length=30)
+    quantidade = models.IntegerField(default=0)
+    valor = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        verbose_name = 'Métrica mensal de orçamentos'
+        verbose_name_plural = 'Métricas mensais de orçamentos'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['mes', 'categoria', 'estado', 'status', 'status_anuncio'],
+                name='metrica_orcamento_chave_unica',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.mes:%m/%Y} {self.categoria_id} {self.estado} {self.status}: {self.quantidade}"
+
+
+class MetricaUsuarios(models.Model):
+    """Quantidade de usuários por perfil (cliente/fornecedor)."""
+    is_client = models.BooleanField()
+    is_supplier = models.BooleanField()
+    quantidade = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Métrica de usuários'
+        verbose_name_plural = 'Métricas de usuários'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['is_client', 'is_supplier'],
+                name='metrica_usuarios_chave_unica',
+            ),
+        ]
+
+    def __str__(self):
+        return f"cliente={self.is_client} fornecedor={self.is_supplier}: {self.quantidade}"
+
+
+# ==================== HISTÓRICO DE STATUS ====================
+
+class StateTransitionLog(models.Model):
+    """
+    Log append-only das transições de status (Necessidade, Orçamento, Disputa).
+
+    Codificação compacta: entidade e status são inteiros pequenos (ver
+    `ESTADOS`); `de = 0` indica a criação do objeto. Não há FK para os
+    objetos: o log sobrevive à exclusão e não pesa nas tabelas principais.
+    Gravação e consultas em `ads.historico_status`.
+    """
+    NECESSIDADE = 1
+    ORCAMENTO = 2
+    DISPUTA = 3
+    ENTIDADE_CHOICES = [
+        (NECESSIDADE, 'Necessidade'),
+        (ORCAMENTO, 'Orçamento'),
+        (DISPUTA, 'Disputa'),
+    ]
+
+    # Código = posição + 1. Somente acrescente status novos ao final (os códigos já gravados não mudam).
+    ESTADOS = {
+        NECESSIDADE: (
+            'ativo', 'analisando_orcamentos', 'aguardando_confirmacao', 'em_atendimento',
+            'finalizado', 'cancelado', 'expirado', 'em_disputa',
+        ),
+        ORCAMENTO: (
+            'enviado', 'aceito_pelo_cliente', 'confirmado', 'rejeitado_pelo_cliente',
+            'recusado_pelo_fornecedor', 'cancelado_pelo_fornecedor', 'finalizado',
+            'anuncio_cancelado', 'anuncio_expirado',
+        ),
+        DISPUTA: ('aberta', 'em_analise', 'resolvida', 'cancelada'),
+    }
+
+    entidade = models.PositiveSmallIntegerField(choices=ENTIDADE_CHOICES)
+    objeto_id = models.BigIntegerField()
+    de = models.PositiveSmallIntegerField("Status anterior", default=0)
+    para = models.PositiveSmallIntegerField("Novo status")
+    usuario = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='+', db_constraint=False,
+    )
+    criado_em = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Transição de status'
+        verbose_name_plural = 'Transições de status'
+        indexes = [
+            models.Index(fields=['entidade', 'objeto_id', 'criado_em'], name='transicao_objeto_idx'),
+            models.Index(fields=['entidade', 'para', 'criado_em'], name='transicao_estado_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_entidade_display()} {self.objeto_id}: {self.status_de or '-'} -> {self.status_para}"
+
+    @classmethod
+    def codificar(cls, entidade, status):
+        """Código do status (0 para None/criação); ValueError para status desconhecido."""
+        if status is None:
+            return 0
+        return cls.ESTADOS[entidade].index(status) + 1
+
+    @classmethod
+    def decodificar(cls, entidade, codigo):
+        return cls.ESTADOS[entidade][codigo - 1] if codigo else None
+
+    @property
+    def status_de(self):
+        return self.decodificar(self.entidade, self.de)
+
+    @property
+    def status_para(self):
+        return self.decodificar(self.entidade, self.para)
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("StateTransitionLog é append-only")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("StateTransitionLog é append-only")
+
+
+# ==================== PRAZOS AGENDADOS ====================
+
+class PrazoAgendado(models.Model):
+    """
+    Prazo pendente de uma necessidade (aviso e timeout da confirmação do fornecedor).
+
+    A chave identifica o prazo (`necessidade:<id>:<tipo>`): reagendar atualiza
+    a mesma linha. As linhas são excluídas ao disparar ou ao cancelar, então
+    a tabela só contém prazos pendentes e o índice por vencimento responde
+    "o que venceu agora" sem varrer necessidades. Ver `ads.prazos`.
+    """
+    AVISO_CONFIRMACAO = 'aviso_confirmacao'
+    TIMEOUT_CONFIRMACAO = 'timeout_confirmacao'
+    TIPO_CHOICES = [
+        (AVISO_CONFIRMACAO, 'Aviso de confirmação'),
+        (TIMEOUT_CONFIRMACAO, 'Timeout de confirmação'),
+    ]
+
+    chave = models.CharField('Chave', max_length=100, unique=True)
+    tipo = models.CharField('Tipo', max_length=30, choices=TIPO_CHOICES)
+    necessidade = models.ForeignKey(
+        Necessidade, on_delete=models.CASCADE, related_name='prazos', verbose_name='Necessidade'
+    )
+    # Início do período que gerou o prazo (ex.: aguardando_confirmacao_desde);
+    # um prazo cuja referência não confere mais com a necessidade é descartado
+    referencia = models.DateTimeField('Referência')
+    vence_em = models.DateTimeField('Vence em')
+    tentativas = models.PositiveSmallIntegerField('Tentativas', default=0)
+
+    class Meta:
+        verbose_name = 'Prazo agendado'
+        verbose_name_plural = 'Prazos agendados'
+        indexes = [
+            models.Index(fields=['vence_em'], name='prazo_vencimento_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.chave} em {self.vence_em}"
@@ -0,0 +1,159 @@
+"""
+Agendador de prazos das necessidades (PrazoAgendado).
+
+Ao entrar em `aguardando_confirmacao`, a necessidade recebe dois prazos:
+o aviso ao fornecedor (AVISO_ANTECEDENCIA_HORAS antes do fim) e o timeout
+(NecessidadeStateMachine.CONFIRMATION_TIMEOUT). Eles são gravados pelo
+signal de post_save, na mesma transação da mudança de status, e excluídos
+quando a necessidade sai do status.
+
+`processar_vencidos` (task `ads.tasks.handle_confirmation_timeouts`, a cada
+PRAZOS_INTERVALO_SEGUNDOS) lê só os prazos vencidos pelo índice de
+vencimento. Disparar é idempotente: o prazo é excluído na mesma transação
+da ação, e prazos cuja referência não confere mais são descartados.
+"""
+
+from collections import Counter
+from datetime import timedelta
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from ads.models import Necessidade, PrazoAgendado
+from core.state_machine import NecessidadeStateMachine, StateTransitionError
+
+logger = logging.getLogger(__name__)
+
+AVISO_ANTECEDENCIA_HORAS = 12
+MAX_TENTATIVAS = 5
+
+
+def chave_prazo(necessidade_id, tipo):
+    return f"necessidade:{necessidade_id}:{tipo}"
+
+
+def _horas_confirmacao():
+    timeout = NecessidadeStateMachine.CONFIRMATION_TIMEOUT
+    return {
+        PrazoAgendado.AVISO_CONFIRMACAO: timeout - AVISO_ANTECEDENCIA_HORAS,
+        PrazoAgendado.TIMEOUT_CONFIRMACAO: timeout,
+    }
+
+
+# ==================== AGENDAMENTO ====================
+
+def agendar_confirmacao(necessidade):
+    """Agenda (ou reagenda, pela chave) o aviso e o timeout da confirmação."""
+    desde = necessidade.aguardando_confirmacao_desde
+    PrazoAgendado.objects.bulk_create(
+        [
+            PrazoAgendado(
+                chave=chave_prazo(necessidade.pk, tipo), tipo=tipo, necessidade_id=necessidade.pk,
+                referencia=desde, vence_em=desde + timedelta(hours=horas),
+            )
+            for tipo, horas in _horas_confirmacao().items()
+        ],
+        update_conflicts=True,
+        unique_fields=['chave'],
+        update_fields=['referencia', 'vence_em', 'tentativas'],
+    )
+
+
+def cancelar_prazos(necessidade_ids):
+    PrazoAgendado.objects.filter(necessidade_id__in=necessidade_ids).delete()
+
+
+def sincronizar_prazos(necessidade, status_anterior=None, criada=False):
+    """Agenda ou cancela os prazos conforme a mudança de status (chamado no post_save)."""
+    if not criada and status_anterior == necessidade.status:
+        return
+    if necessidade.status == 'aguardando_confirmacao' and necessidade.aguardando_confirmacao_desde:
+        agendar_confirmacao(necessidade)
+    elif status_anterior == 'aguardando_confirmacao':
+        cancelar_prazos([necessidade.pk])
+
+
+# ==================== DISPARO ====================
+
+def _avisar_fornecedor(necessidade, prazo):
+    from notifications.fanout import notificar
+
+    aceito = necessidade.orcamentos.filter(status='aceito_pelo_cliente').only('fornecedor_id').first()
+    if aceito is None:
+        return
+    limite = prazo.referencia + timedelta(hours=NecessidadeStateMachine.CONFIRMATION_TIMEOUT)
+    notificar(
+        [aceito.fornecedor_id], 'aviso_confirmacao',
+        {'titulo': necessidade.titulo, 'limite': timezone.localtime(limite).strftime('%d/%m/%Y %H:%M')},
+        necessidade=necessidade,
+    )
+
+
+def _disparar(prazo_id, necessidade_id, agora):
+    """Executa um prazo vencido (uma transação). Retorna o resultado para o resumo."""
+    with transaction.atomic():
+        # Mesma ordem de travamento das transições: necessidade antes do prazo
+        necessidade = Necessidade.objects.select_for_update().filter(pk=necessidade_id).first()
+        prazo = (
+            PrazoAgendado.objects.select_for_update(skip_locked=True)
+            .filter(pk=prazo_id, vence_em__lte=agora)
+            .first()
+        )
+        if necessidade is None or prazo is None:
+            # Cancelado, reagendado ou em processamento por outro worker
+            return 'ignorados'
+
+        if (necessidade.status != 'aguardando_confirmacao'
+                or necessidade.aguardando_confirmacao_desde != prazo.referencia):
+            prazo.delete()
+            return 'descartados'
+
+        if prazo.tipo == PrazoAgendado.AVISO_CONFIRMACAO:
+            _avisar_fornecedor(necessidade, prazo)
+        elif not necessidade.handle_timeout():
+            raise StateTransitionError(f"Timeout da necessidade {necessidade_id} não aplicado")
+
+        # O timeout muda o status e o signal já exclui os prazos; o filtro não falha se sumiram
+        PrazoAgendado.objects.filter(pk=prazo_id).delete()
+        return 'disparados'
+
+
+def processar_vencidos(limite=None, agora=None):
+    """
+    Dispara os prazos vencidos, do mais antigo ao mais recente.
+
+    Prazos com erro são reagendados com backoff (1, 2, 4... minutos) e
+    descartados após MAX_TENTATIVAS.
+
+    Returns:
+        dict com disparados, descartados, ignorados e erros
+    """
+    limite = limite or settings.PRAZOS_LOTE
+    agora = agora or timezone.now()
+    vencidos = list(
+        PrazoAgendado.objects.filter(vence_em__lte=agora)
+        .order_by('vence_em')
+        .values_list('pk', 'necessidade_id', 'tentativas')[:limite]
+    )
+
+    resultado = Counter({'disparados': 0, 'descartados': 0, 'ignorados': 0, 'erros': 0})
+    for prazo_id, necessidade_id, tentativas in vencidos:
+        try:
+            resultado[_disparar(prazo_id, necessidade_id, agora)] += 1
+        except Exception as e:
+            resultado['erros'] += 1
+            logger.error(f"Erro ao disparar prazo {prazo_id} da necessidade {necessidade_id}: {e}")
+            if tentativas + 1 >= MAX_TENTATIVAS:
+                PrazoAgendado.objects.filter(pk=prazo_id).delete()
+            else:
+                PrazoAgendado.objects.filter(pk=prazo_id).update(
+                    tentativas=F('tentativas') + 1,
+                    vence_em=agora + timedelta(minutes=2 ** tentativas),
+                )
+
+    if vencidos:
+        logger.info(f"Prazos processados: {dict(resultado)}")
+    return dict(resultado)
@@ -0,0 +1,205 @@
+"""
+Recomendações de anúncios ("baseados nas suas categorias" da home).
+
+Candidatos: listas em cache por balde (categoria, UF), com os
+RECOMENDACAO_CANDIDATOS anúncios ativos mais recentes do balde, já
+ordenados. Cada anúncio entra em quatro baldes: (categoria, UF),
+(categoria, BR), (todas, UF) e (todas, BR). Salvar um anúncio recalcula
+os seus baldes após o commit (uma vez por balde na transação); a varredura
+de expiração faz o mesmo para os anúncios expirados.
+
+Perfil do usuário (em cache, descartado quando as preferências, anúncios
+ou orçamentos do usuário mudam): afinidade por categoria (preferidas
+pesam RECOMENDACAO_PESO_PREFERIDA; categorias dos próprios anúncios e dos
+anúncios orçados, 1 por ocorrência) e anúncios já orçados.
+
+Servir é juntar os baldes das categorias de maior afinidade, mais os de
+todas as categorias (exploração), e pontuar cada candidato:
+
+    score = (RECOMENDACAO_PESO_BASE + afinidade normalizada)
+            * 0.5 ^ (idade / RECOMENDACAO_MEIA_VIDA_DIAS)
+            * proximidade (1 + RECOMENDACAO_PESO_PROXIMIDADE * fator)
+
+com fator pela distância (até RAIO_KM) quando há coordenadas, ou metade
+do peso quando só a UF coincide.
+"""
+
+from collections import Counter
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from core.services.geo_service import GeoService
+
+from .models import Necessidade
+from .rollups import estado_de, expressao_estado
+
+TODAS = 'todas'
+TODO_PAIS = 'BR'
+RAIO_KM = 50
+CATEGORIAS_POR_USUARIO = 5
+
+
+# ==================== CANDIDATOS ====================
+
+def _chave_balde(categoria_id, uf):
+    return f"ads:recomendacoes:{categoria_id or TODAS}:{uf or TODO_PAIS}"
+
+
+def _baldes(categoria_id, uf):
+    baldes = [(categoria_id, None), (None, None)]
+    if uf:
+        baldes += [(categoria_id, uf), (None, uf)]
+    return baldes
+
+
+def _calcular_balde(categoria_id, uf):
+    """(id, categoria, cliente, criação em timestamp, lat, lon, UF) dos ativos mais recentes do balde."""
+    consulta = Necessidade.objects.filter(status='ativo')
+    if categoria_id:
+        consulta = consulta.filter(categoria_id=categoria_id)
+    consulta = consulta.annotate(uf=expressao_estado())
+    if uf:
+        consulta = consulta.filter(uf=uf)
+    return [
+        (pk, categoria, cliente, criacao.timestamp(), lat, lon, estado)
+        for pk, categoria, cliente, criacao, lat, lon, estado in consulta.order_by('-data_criacao').values_list(
+            'pk', 'categoria_id', 'cliente_id', 'data_criacao', 'geo_lat', 'geo_lon', 'uf'
+        )[:settings.RECOMENDACAO_CANDIDATOS]
+    ]
+
+
+def _candidatos(baldes):
+    """Listas dos baldes (um get_many; baldes ausentes são calculados e gravados)."""
+    chaves = {_chave_balde(*balde): balde for balde in baldes}
+    listas = cache.get_many(chaves)
+    faltando = {chave: _calcular_balde(*chaves[chave]) for chave in chaves if chave not in listas}
+    if faltando:
+        cache.set_many(faltando, settings.RECOMENDACAO_CACHE_TTL)
+        listas.update(faltando)
+    return listas.values()
+
+
+_pendentes = threading.local()
+
+
+def _baldes_pendentes():
+    if not hasattr(_pendentes, 'baldes'):
+        _pendentes.baldes = set()
+    return _pendentes.baldes
+
+
+def _recalcular_pendentes():
+    baldes = _baldes_pendentes()
+    listas = {}
+    while baldes:
+        balde = baldes.pop()
+        listas[_chave_balde(*balde)] = _calcular_balde(*balde)
+    if listas:
+        cache.set_many(listas, settings.RECOMENDACAO_CACHE_TTL)
+
+
+def agendar_atualizacao(necessidade):
+    """Recalcula os baldes do anúncio após o commit."""
+    _baldes_pendentes().update(_baldes(necessidade.categoria_id, estado_de(necessidade)))
+    transaction.on_commit(_recalcular_pendentes)
+
+
+def agendar_atualizacao_ids(ids):
+    """Mesmo que `agendar_atualizacao`, para alterações em lote (UPDATE sem post_save)."""
+    pares = (
+        Necessidade.objects.filter(pk__in=ids)
+        .annotate(uf=expressao_estado())
+        .values_list('categoria_id', 'uf')
+        .distinct()
+    )
+    for categoria_id, uf in pares:
+        _baldes_pendentes().update(_baldes(categoria_id, uf))
+    transaction.on_commit(_recalcular_pendentes)
+
+
+# ==================== PERFIL ====================
+
+def _chave_perfil(user_id):
+    return f"ads:recomendacoes:perfil:{user_id}"
+
+
+def invalidar_perfil(user_id):
+    cache.delete(_chave_perfil(user_id))
+
+
+def _calcular_perfil(user):
+    from budgets.models import Orcamento
+
+    afinidade = Counter()
+    for categoria_id in user.preferred_categories.values_list('pk', flat=True):
+        afinidade[categoria_id] += settings.RECOMENDACAO_PESO_PREFERIDA
+    afinidade.update(
+        Necessidade.objects.filter(cliente=user)
+        .order_by('-data_criacao').values_list('categoria_id', flat=True)[:50]
+    )
+    orcados = list(
+        Orcamento.objects.filter(fornecedor=user)
+        .order_by('-pk').values_list('anuncio_id', 'anuncio__categoria_id')[:200]
+    )
+    afinidade.update(categoria_id for _, categoria_id in orcados[:50])
+
+    maior = max(afinidade.values(), default=0)
+    return {
+        'afinidade': {categoria_id: peso / maior for categoria_id, peso in afinidade.most_common()},
+        'orcados': {anuncio_id for anuncio_id, _ in orcados},
+    }
+
+
+def _perfil(user):
+    chave = _chave_perfil(user.pk)
+    perfil = cache.get(chave)
+    if perfil is None:
+        perfil = _calcular_perfil(user)
+        cache.set(chave, perfil, settings.RECOMENDACAO_CACHE_TTL)
+    return perfil
+
+
+# ==================== RECOMENDAÇÃO ====================
+
+def _proximidade(user, uf, lat, lon):
+    peso = settings.RECOMENDACAO_PESO_PROXIMIDADE
+    if user.lat is not None and user.lon is not None and lat is not None and lon is not None:
+        distancia = GeoService.distancia_km(user.lat, user.lon, lat, lon)
+        return 1 + peso * max(0.0, 1 - distancia / RAIO_KM)
+    if uf and (user.estado or '').upper() == uf:
+        return 1 + peso / 2
+    return 1.0
+
+
+def recomendar(user, limite=8):
+    """
+    Ids dos anúncios ativos recomendados para o usuário, do mais ao menos relevante.
+
+    Sem consultas quando o perfil e os baldes estão em cache.
+    """
+    perfil = _perfil(user)
+    afinidade = perfil['afinidade']
+    uf = (user.estado or '')[:2].upper()
+
+    baldes = []
+    for categoria_id in list(afinidade)[:CATEGORIAS_POR_USUARIO] + [None]:
+        baldes += _baldes(categoria_id, uf)
+
+    agora = timezone.now().timestamp()
+    meia_vida = settings.RECOMENDACAO_MEIA_VIDA_DIAS * 86400
+    base = settings.RECOMENDACAO_PESO_BASE
+    pontuados = {}
+    for candidatos in _candidatos(baldes):
+        for pk, categoria_id, cliente_id, criacao, lat, lon, uf_anuncio in candidatos:
+            if pk in pontuados or cliente_id == user.pk or pk in perfil['orcados']:
+                continue
+            pontuados[pk] = (
+                (base + afinidade.get(categoria_id, 0))
+                * 0.5 ** (max(agora - criacao, 0) / meia_vida)
+                * _proximidade(user, uf_anuncio, lat, lon)
+            )
+    return sorted(pontuados, key=pontuados.get, reverse=True)[:limite]
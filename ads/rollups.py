@@ -0,0 +1,349 @@
+"""
+Manutenção das tabelas de rollup do dashboard administrativo.
+
+As tabelas (MetricaMensalNecessidade, MetricaMensalOrcamento, MetricaUsuarios)
+recebem deltas incrementais a cada criação, transição de status, mudança de
+papéis do usuário e exclusão, e são
+reconstruídas periodicamente pela task `ads.tasks.atualizar_rollups_dashboard`,
+que corrige qualquer desvio (ex.: alterações feitas fora do ORM).
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+import logging
+
+from django.db import connection, transaction
+from django.db.models import Case, CharField, Count, DateField, F, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncMonth, Upper
+from django.utils import timezone
+
+from ads import historico_status
+from ads.models import (
+    MetricaMensalNecessidade, MetricaMensalOrcamento, MetricaUsuarios, Necessidade,
+)
+
+logger = logging.getLogger(__name__)
+
+CHAVE_NECESSIDADE = ['mes', 'categoria', 'estado', 'status']
+CHAVE_ORCAMENTO = ['mes', 'categoria', 'estado', 'status', 'status_anuncio']
+CHAVE_USUARIOS = ['is_client', 'is_supplier']
+
+
+# ==================== CHAVES ====================
+
+def mes_de(data):
+    """Primeiro dia do mês (no fuso do projeto) de um datetime."""
+    return timezone.localtime(data).date().replace(day=1)
+
+
+def estado_de(necessidade):
+    """UF efetiva do serviço (endereço do cliente ou do anúncio)."""
+    return (necessidade.get_estado_mapa() or '')[:2].upper()
+
+
+def expressao_estado(prefixo=''):
+    """UF efetiva do serviço em SQL (mesma regra de Necessidade.get_estado_mapa)."""
+    return Upper(Coalesce(
+        Case(
+            When(**{f'{prefixo}usar_endereco_usuario': True}, then=F(f'{prefixo}cliente__estado')),
+            default=F(f'{prefixo}estado_servico'),
+            output_field=CharField(),
+        ),
+        Value(''),
+    ))
+
+
+# ==================== ESCRITA ====================
+
+def _aplicar_deltas(model, campos_chave, campos_soma, deltas):
+    """
+    Soma os deltas nas linhas do rollup com um único INSERT ... ON CONFLICT.
+
+    Args:
+        deltas: dict {tupla da chave: [delta de cada campo de soma]}
+    """
+    deltas = {chave: valores for chave, valores in deltas.items() if any(valores)}
+    if not deltas:
+        return
+
+    tabela = model._meta.db_table
+    colunas_chave = [model._meta.get_field(campo).column for campo in campos_chave]
+    colunas_soma = [model._meta.get_field(campo).column for campo in campos_soma]
+    colunas = colunas_chave + colunas_soma
+
+    linha = '(' + ', '.join(['%s'] * len(colunas)) + ')'
+    sql = (
+        f"INSERT INTO {tabela} ({', '.join(colunas)}) "
+        f"VALUES {', '.join([linha] * len(deltas))} "
+        f"ON CONFLICT ({', '.join(colunas_chave)}) DO UPDATE SET "
+        + ', '.join(f"{coluna} = {tabela}.{coluna} + EXCLUDED.{coluna}" for coluna in colunas_soma)
+    )
+    parametros = []
+    for chave, valores in deltas.items():
+        parametros.extend(chave)
+        parametros.extend(valores)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, parametros)
+
+
+def _agrupar_orcamentos(queryset):
+    """Agrupa orçamentos pela chave do rollup: retorna {chave: [quantidade, valor]}."""
+    linhas = (
+        queryset.order_by()
+        .annotate(
+            _mes=TruncMonth('data_criacao', output_field=DateField()),
+            _estado=expressao_estado('anuncio__'),
+        )
+        .values('_mes', 'anuncio__categoria_id', '_estado', 'status', 'anuncio__status')
+        .annotate(_quantidade=Count('id'), _valor=Sum('total_itens'))
+    )
+    return {
+        (l['_mes'], l['anuncio__categoria_id'], l['_estado'], l['status'], l['anuncio__status']):
+            [l['_quantidade'], l['_valor'] or Decimal('0.00')]
+        for l in linhas
+    }
+
+
+def _agrupar_necessidades(queryset):
+    """Agrupa necessidades pela chave do rollup: retorna {chave: quantidade}."""
+    linhas = (
+        queryset.order_by()
+        .annotate(
+            _mes=TruncMonth('data_criacao', output_field=DateField()),
+            _estado=expressao_estado(),
+        )
+        .values('_mes', 'categoria_id', '_estado', 'status')
+        .annotate(_quantidade=Count('id'))
+    )
+    return {
+        (l['_mes'], l['categoria_id'], l['_estado'], l['status']): l['_quantidade']
+        for l in linhas
+    }
+
+
+def registrar_necessidade(necessidade, status_anterior=None, criada=False):
+    """
+    Aplica o delta de uma necessidade criada ou que mudou de status.
+    Ao mudar o status do anúncio, os orçamentos dele mudam de `status_anuncio`.
+    """
+    if not criada and (status_anterior is None or status_anterior == necessidade.status):
+        return
+
+    mes = mes_de(necessidade.data_criacao)
+    estado = estado_de(necessidade)
+    deltas = defaultdict(lambda: [0])
+    deltas[(mes, necessidade.categoria_id, estado, necessidade.status)][0] += 1
+    if not criada:
+        deltas[(mes, necessidade.categoria_id, estado, status_anterior)][0] -= 1
+    _aplicar_deltas(MetricaMensalNecessidade, CHAVE_NECESSIDADE, ['quantidade'], deltas)
+
+    if criada:
+        return
+
+    deltas_orcamentos = defaultdict(lambda: [0, Decimal('0.00')])
+    for chave, (quantidade, valor) in _agrupar_orcamentos(necessidade.orcamentos.all()).items():
+        chave_anterior = chave[:4] + (status_anterior,)
+        deltas_orcamentos[chave_anterior][0] -= quantidade
+        deltas_orcamentos[chave_anterior][1] -= valor
+        deltas_orcamentos[chave][0] += quantidade
+        deltas_orcamentos[chave][1] += valor
+    _aplicar_deltas(MetricaMensalOrcamento, CHAVE_ORCAMENTO, ['quantidade', 'valor'], deltas_orcamentos)
+
+
+def registrar_orcamento(orcamento, status_anterior=None, valor_anterior=None, criado=False, status=None):
+    """
+    Aplica o delta de um orçamento criado, que mudou de status ou de valor.
+
+    Args:
+        status: status atual quando diferente do que está em memória
+                (ex.: recálculo de totais feito direto no banco)
+    """
+    status = status or orcamento.status
+    anuncio = orcamento.anuncio
+    base = (mes_de(orcamento.data_criacao), anuncio.categoria_id, estado_de(anuncio))
+
+    deltas = defaultdict(lambda: [0, Decimal('0.00')])
+    nova_chave = base + (status, anuncio.status)
+    deltas[nova_chave][0] += 1
+    deltas[nova_chave][1] += orcamento.total_itens
+    if not criado:
+        if status_anterior is None:
+            return
+        chave_anterior = base + (status_anterior, anuncio.status)
+        deltas[chave_anterior][0] -= 1
+        deltas[chave_anterior][1] -= valor_anterior if valor_anterior is not None else orcamento.total_itens
+    _aplicar_deltas(MetricaMensalOrcamento, CHAVE_ORCAMENTO, ['quantidade', 'valor'], deltas)
+
+
+def registrar_necessidade_removida(necessidade):
+    """Retira do rollup uma necessidade excluída (seus orçamentos saem pelo próprio post_delete)."""
+    status = getattr(necessidade, '_status_original', None) or necessidade.status
+    _aplicar_deltas(
+        MetricaMensalNecessidade, CHAVE_NECESSIDADE, ['quantidade'],
+        {(mes_de(necessidade.data_criacao), necessidade.categoria_id, estado_de(necessidade), status): [-1]},
+    )
+
+
+def registrar_orcamento_removido(orcamento):
+    """Retira do rollup um orçamento excluído (direto ou em cascata, antes do anúncio)."""
+    anuncio = orcamento.anuncio
+    status = getattr(orcamento, '_status_original', None) or orcamento.status
+    valor = getattr(orcamento, '_total_itens_original', None)
+    chave = (mes_de(orcamento.data_criacao), anuncio.categoria_id, estado_de(anuncio), status, anuncio.status)
+    _aplicar_deltas(
+        MetricaMensalOrcamento, CHAVE_ORCAMENTO, ['quantidade', 'valor'],
+        {chave: [-1, -(valor if valor is not None else orcamento.total_itens)]},
+    )
+
+
+def atualizar_status_orcamentos(queryset, novo_status):
+    """
+    Substitui `queryset.update(status=...)` mantendo o rollup de orçamentos
+    e o histórico de status (um INSERT em lote).
+
+    Returns:
+        int: quantidade de orçamentos atualizados
+    """
+    from budgets.models import Orcamento
+
+    with transaction.atomic():
+        alterados = queryset.exclude(status=novo_status)
+        agrupados = _agrupar_orcamentos(alterados)
+        linhas = list(alterados.values_list('pk', 'status'))
+        atualizados = queryset.update(status=novo_status)
+        historico_status.registrar_lote(Orcamento, linhas, novo_status)
+
+        deltas = defaultdict(lambda: [0, Decimal('0.00')])
+        for chave, (quantidade, valor) in agrupados.items():
+            nova_chave = chave[:3] + (novo_status,) + chave[4:]
+            deltas[chave][0] -= quantidade
+            deltas[chave][1] -= valor
+            deltas[nova_chave][0] += quantidade
+            deltas[nova_chave][1] += valor
+        _aplicar_deltas(MetricaMensalOrcamento, CHAVE_ORCAMENTO, ['quantidade', 'valor'], deltas)
+    return atualizados
+
+
+def atualizar_status_necessidades(queryset, novo_status):
+    """
+    Substitui `queryset.update(status=...)` para necessidades mantendo os
+    rollups (inclusive o `status_anuncio` dos orçamentos delas) e o histórico
+    de status. O status dos orçamentos não muda; use `atualizar_status_orcamentos`.
+
+    Returns:
+        int: quantidade de necessidades atualizadas
+    """
+    from budgets.models import Orcamento
+
+    with transaction.atomic():
+        alteradas = queryset.exclude(status=novo_status)
+        agrupadas = _agrupar_necessidades(alteradas)
+        orcamentos = _agrupar_orcamentos(Orcamento.objects.filter(anuncio__in=alteradas.values('pk')))
+        linhas = list(alteradas.values_list('pk', 'status'))
+        atualizadas = queryset.filter(pk__in=[pk for pk, _ in linhas]).update(
+            status=novo_status, modificado_em=timezone.now()
+        )
+        historico_status.registrar_lote(Necessidade, linhas, novo_status)
+
+        deltas = defaultdict(lambda: [0])
+        for chave, quantidade in agrupadas.items():
+            deltas[chave][0] -= quantidade
+            deltas[chave[:3] + (novo_status,)][0] += quantidade
+        _aplicar_deltas(MetricaMensalNecessidade, CHAVE_NECESSIDADE, ['quantidade'], deltas)
+
+        deltas_orcamentos = defaultdict(lambda: [0, Decimal('0.00')])
+        for chave, (quantidade, valor) in orcamentos.items():
+            nova_chave = chave[:4] + (novo_status,)
+            deltas_orcamentos[chave][0] -= quantidade
+            deltas_orcamentos[chave][1] -= valor
+            deltas_orcamentos[nova_chave][0] += quantidade
+            deltas_orcamentos[nova_chave][1] += valor
+        _aplicar_deltas(MetricaMensalOrcamento, CHAVE_ORCAMENTO, ['quantidade', 'valor'], deltas_orcamentos)
+    return atualizadas
+
+
+def papeis_de(user):
+    return bool(user.is_client), bool(user.is_supplier)
+
+
+def registrar_usuario_criado(user):
+    _aplicar_deltas(MetricaUsuarios, CHAVE_USUARIOS, ['quantidade'], {papeis_de(user): [1]})
+
+
+def registrar_papeis_usuario(user, papeis_anteriores):
+    """Move o usuário entre as linhas do rollup quando is_client/is_supplier mudam."""
+    papeis = papeis_de(user)
+    if papeis_anteriores is None or papeis_anteriores == papeis:
+        return
+    _aplicar_deltas(MetricaUsuarios, CHAVE_USUARIOS, ['quantidade'], {papeis: [1], papeis_anteriores: [-1]})
+
+
+def registrar_usuario_removido(user):
+    papeis = getattr(user, '_papeis_originais', None) or papeis_de(user)
+    _aplicar_deltas(MetricaUsuarios, CHAVE_USUARIOS, ['quantidade'], {papeis: [-1]})
+
+
+# ==================== RECONSTRUÇÃO ====================
+
+def reconstruir_rollups():
+    """
+    Recalcula todas as tabelas de rollup a partir das tabelas principais.
+
+    As tabelas de rollup ficam travadas (EXCLUSIVE) durante a reconstrução:
+    deltas concorrentes aguardam e são aplicados sobre o resultado novo.
+    """
+    from budgets.models import Orcamento
+    from users.models import User
+
+    tabelas = [
+        MetricaMensalNecessidade._meta.db_table,
+        MetricaMensalOrcamento._meta.db_table,
+        MetricaUsuarios._meta.db_table,
+    ]
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {', '.join(tabelas)} IN EXCLUSIVE MODE")
+
+        necessidades = (
+            Necessidade.objects.order_by()
+            .annotate(
+                _mes=TruncMonth('data_criacao', output_field=DateField()),
+                _estado=expressao_estado(),
+            )
+            .values('_mes', 'categoria_id', '_estado', 'status')
+            .annotate(_quantidade=Count('id'))
+        )
+        MetricaMensalNecessidade.objects.all().delete()
+        MetricaMensalNecessidade.objects.bulk_create([
+            MetricaMensalNecessidade(
+                mes=l['_mes'], categoria_id=l['categoria_id'], estado=l['_estado'],
+                status=l['status'], quantidade=l['_quantidade'],
+            )
+            for l in necessidades
+        ], batch_size=1000)
+
+        orcamentos = _agrupar_orcamentos(Orcamento.objects.all())
+        MetricaMensalOrcamento.objects.all().delete()
+        MetricaMensalOrcamento.objects.bulk_create([
+            MetricaMensalOrcamento(
+                mes=mes, categoria_id=categoria_id, estado=estado, status=status,
+                status_anuncio=status_anuncio, quantidade=quantidade, valor=valor,
+            )
+            for (mes, categoria_id, estado, status, status_anuncio), (quantidade, valor) in orcamentos.items()
+        ], batch_size=1000)
+
+        usuarios = User.objects.order_by().values('is_client', 'is_supplier').annotate(_quantidade=Count('id'))
+        MetricaUsuarios.objects.all().delete()
+        MetricaUsuarios.objects.bulk_create([
+            MetricaUsuarios(
+                is_client=l['is_client'], is_supplier=l['is_supplier'], quantidade=l['_quantidade'],
+            )
+            for l in usuarios
+        ])
+
+    logger.info(
+        f"Rollups do dashboard reconstruídos: {len(necessidades)} linhas de necessidades, "
+        f"{len(orcamentos)} de orçamentos"
+    )
@@ -1,15 +1,20 @@
 # ads/signals.py
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
-from django.core.mail import send_mail
-from django.conf import settings
-from .models import Necessidade
+from core.services.geo_service import GeoService
+from notifications.digest import enviar_email_usuario
+from notifications.models import NotificationType
+from users.models import User
+from .models import Disputa, Necessidade
+from categories.models import Categoria
+from budgets.models import Orcamento
+from . import feed, fornecedores, historico_status, prazos, recomendacoes, rollups
 
 @receiver(post_save, sender=Necessidade)
 def enviar_email_criacao_anuncio(sender, instance, created, **kwargs):
     """
     Sempre que um Necessidade é criado (created=True),
-    enviamos um e-mail ao cliente.
+    enviamos um e-mail ao cliente (imediato ou no resumo, conforme as preferências).
     """
     if created:
         user = instance.cliente
@@ -19,14 +24,145 @@ def enviar_email_criacao_anuncio(sender, instance, created, **kwargs):
             "Seu novo anúncio foi criado com sucesso. "
             f"Título do anúncio: {instance.titulo}\n"
             "Muito obrigado por usar nossa plataforma.\n\n"
-            "Atenciosamente,\Indicaai"
+            "Atenciosamente,\nIndicaai"
         )
-        destinatario = [user.email]
-
-        send_mail(
-            subject=assunto,
-            message=corpo,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=destinatario,
-            fail_silently=False
+        enviar_email_usuario(
+            user, assunto, corpo,
+            notification_type=NotificationType.NEW_AD,
+            resumo=f"Anúncio '{instance.titulo}' criado",
+            dedup_key=f"necessidade:{instance.pk}:criada",
         )
+
+
+@receiver(post_save, sender=User)
+def sincronizar_geolocalizacao_anuncios(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Quando as coordenadas do usuário mudam, atualiza a geolocalização
+    desnormalizada dos anúncios que usam o endereço do próprio usuário.
+    """
+    if created:
+        return
+    if update_fields is not None and not {'lat', 'lon'} & set(update_fields):
+        return
+
+    lat, lon = instance.lat, instance.lon
+    if lat is None or lon is None:
+        lat = lon = None
+
+    alterados = Necessidade.objects.filter(cliente=instance, usar_endereco_usuario=True).update(
+        geo_lat=lat,
+        geo_lon=lon,
+        geohash=GeoService.encode_or_empty(lat, lon),
+    )
+    if alterados:
+        feed.invalidar()
+
+
+@receiver(post_save, sender=Necessidade)
+def atualizar_rollup_necessidade(sender, instance, created, **kwargs):
+    """Aplica no rollup do dashboard o delta de necessidades criadas/com novo status."""
+    rollups.registrar_necessidade(
+        instance,
+        status_anterior=getattr(instance, '_status_original', None),
+        criada=created,
+    )
+
+
+@receiver(post_save, sender=Necessidade)
+@receiver(post_save, sender=Disputa)
+def registrar_historico_status(sender, instance, created, **kwargs):
+    """Acrescenta a transição ao histórico (mesma transação do save)."""
+    historico_status.registrar(
+        instance, getattr(instance, '_status_original', None), criado=created
+    )
+
+
+@receiver(post_save, sender=Necessidade)
+def agendar_prazos_confirmacao(sender, instance, created, **kwargs):
+    """Agenda aviso/timeout ao entrar em aguardando_confirmacao e os cancela ao sair."""
+    prazos.sincronizar_prazos(
+        instance, status_anterior=getattr(instance, '_status_original', None), criada=created
+    )
+
+
+@receiver(post_delete, sender=Necessidade)
+def retirar_rollup_necessidade(sender, instance, **kwargs):
+    rollups.registrar_necessidade_removida(instance)
+
+
+@receiver(post_delete, sender=Orcamento)
+def retirar_rollup_orcamento(sender, instance, **kwargs):
+    rollups.registrar_orcamento_removido(instance)
+
+
+@receiver(post_save, sender=User)
+def atualizar_rollup_usuarios(sender, instance, created, **kwargs):
+    if created:
+        rollups.registrar_usuario_criado(instance)
+    else:
+        rollups.registrar_papeis_usuario(instance, getattr(instance, '_papeis_originais', None))
+    instance._papeis_originais = rollups.papeis_de(instance)
+
+
+@receiver(post_delete, sender=User)
+def retirar_rollup_usuarios(sender, instance, **kwargs):
+    rollups.registrar_usuario_removido(instance)
+
+
+@receiver(post_save, sender=Necessidade)
+@receiver(post_delete, sender=Necessidade)
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+def invalidar_feed_home(sender, **kwargs):
+    """Nova versão do feed da home (seções em cache deixam de ser lidas)."""
+    feed.invalidar()
+
+
+@receiver(m2m_changed, sender=User.preferred_categories.through)
+def invalidar_perfil_categorias_preferidas(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        # A partir da categoria: usuários em pk_set (no clear, lidos antes de limpar)
+        if action == 'pre_clear':
+            pk_set = instance.users_preferred.values_list('pk', flat=True)
+        elif action not in ('post_add', 'post_remove'):
+            return
+        for user_id in pk_set:
+            recomendacoes.invalidar_perfil(user_id)
+        fornecedores.invalidar([instance.pk])
+    elif action == 'pre_clear':
+        fornecedores.invalidar_fornecedor(instance)
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        recomendacoes.invalidar_perfil(instance.pk)
+        if pk_set:
+            fornecedores.invalidar(pk_set)
+
+
+@receiver(post_save, sender=Necessidade)
+def atualizar_candidatos_recomendacao(sender, instance, created, **kwargs):
+    """Recalcula os baldes de candidatos do anúncio; o autor ganha afinidade pela categoria."""
+    recomendacoes.agendar_atualizacao(instance)
+    if created:
+        recomendacoes.invalidar_perfil(instance.cliente_id)
+
+
+@receiver(post_save, sender=Orcamento)
+def invalidar_perfil_fornecedor(sender, instance, created, **kwargs):
+    """Anúncio orçado sai das recomendações do fornecedor e conta na afinidade."""
+    if created:
+        recomendacoes.invalidar_perfil(instance.fornecedor_id)
+
+
+@receiver(post_save, sender=Necessidade)
+def avisar_fornecedores_compativeis(sender, instance, created, **kwargs):
+    if created and instance.status == 'ativo':
+        fornecedores.agendar_notificacao(instance)
+
+
+@receiver(post_save, sender=User)
+def atualizar_indice_fornecedores(sender, instance, created, update_fields=None, **kwargs):
+    """Localização ou perfil de fornecedor alterados: descarta os índices das categorias dele."""
+    if created:
+        return
+    if update_fields is not None and not {'is_supplier', 'is_active', 'estado', 'lat', 'lon'} & set(update_fields):
+        return
+    fornecedores.invalidar_fornecedor(instance)
@@ -0,0 +1,548 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib import admin
+from django.core.cache import cache
+from django.db.models import F
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from ads.admin import DisputaAdmin
+from ads import expiracao, feed, fornecedores, historico_status, prazos, recomendacoes, rollups
+from ads.metrics import get_ads_metrics, get_quantidade_usuarios_por_tipo, get_valores_metrics
+from ads.models import (
+    Disputa, MetricaMensalNecessidade, MetricaMensalOrcamento, MetricaUsuarios, Necessidade, PrazoAgendado,
+    StateTransitionLog,
+)
+from budgets.models import Orcamento, OrcamentoItem
+from categories.models import Categoria, SubCategoria
+from notifications.models import Notification
+from users.models import User
+
+
+def _snapshot_rollups():
+    necessidades = {
+        (m.mes, m.categoria_id, m.estado, m.status): m.quantidade
+        for m in MetricaMensalNecessidade.objects.all() if m.quantidade
+    }
+    orcamentos = {
+        (m.mes, m.categoria_id, m.estado, m.status, m.status_anuncio): (m.quantidade, m.valor)
+        for m in MetricaMensalOrcamento.objects.all() if m.quantidade or m.valor
+    }
+    usuarios = {(m.is_client, m.is_supplier): m.quantidade for m in MetricaUsuarios.objects.all() if m.quantidade}
+    return necessidades, orcamentos, usuarios
+
+
+class RollupsDashboardTest(TestCase):
+    """
+    Os deltas incrementais devem produzir o mesmo resultado da reconstrução completa.
+    """
+
+    def setUp(self):
+        self.cliente = User.objects.create_user(
+            email='cliente@exemplo.com', password='senha123',
+            first_name='Cliente', last_name='Teste', is_client=True, estado='CE'
+        )
+        self.fornecedor = User.objects.create_user(
+            email='fornecedor@exemplo.com', password='senha123',
+            first_name='Fornecedor', last_name='Teste', is_supplier=True
+        )
+        categoria = Categoria.objects.create(nome='Construção')
+        subcategoria = SubCategoria.objects.create(nome='Alvenaria', categoria=categoria)
+        self.anuncio = Necessidade.objects.create(
+            titulo='Muro', descricao='Construir muro', cliente=self.cliente,
+            categoria=categoria, subcategoria=subcategoria, quantidade=1, unidade='un'
+        )
+        self.outro = Necessidade.objects.create(
+            titulo='Piso', descricao='Assentar piso', cliente=self.cliente,
+            categoria=categoria, subcategoria=subcategoria, quantidade=1, unidade='un',
+            usar_endereco_usuario=False, estado_servico='SP'
+        )
+
+    def _criar_orcamento(self, anuncio, valor):
+        orcamento = Orcamento.objects.create(
+            fornecedor=self.fornecedor, anuncio=anuncio,
+            prazo_validade=timezone.now().date() + timedelta(days=10),
+            prazo_entrega=timezone.now().date() + timedelta(days=20),
+        )
+        OrcamentoItem.objects.create(
+            orcamento=orcamento, tipo=OrcamentoItem.SERVICO, descricao='Serviço',
+            quantidade=Decimal('1'), unidade='sv', valor_unitario=valor, cnae='4399103',
+        )
+        return orcamento
+
+    def test_incremental_igual_a_reconstrucao(self):
+        aceito = self._criar_orcamento(self.anuncio, Decimal('300.00'))
+        self._criar_orcamento(self.anuncio, Decimal('120.00'))
+        self._criar_orcamento(self.outro, Decimal('50.00'))
+
+        self.anuncio = Necessidade.objects.get(pk=self.anuncio.pk)
+        self.anuncio.status = 'em_atendimento'
+        self.anuncio.save(update_fields=['status'])
+
+        aceito = Orcamento.objects.get(pk=aceito.pk)
+        aceito.status = 'confirmado'
+        aceito.save()
+        rollups.atualizar_status_orcamentos(
+            self.anuncio.orcamentos.exclude(pk=aceito.pk), 'rejeitado_pelo_cliente'
+        )
+
+        incremental = _snapshot_rollups()
+        rollups.reconstruir_rollups()
+        self.assertEqual(incremental, _snapshot_rollups())
+
+        metricas = get_ads_metrics()
+        self.assertEqual(metricas['total_ads'], 2)
+        self.assertEqual(metricas['total_budgets'], 3)
+        self.assertEqual(get_valores_metrics()['valor_total_orcamentos_enviados'], '470,00')
+        self.assertEqual(get_quantidade_usuarios_por_tipo()['total'], 2)
+
+        # Exclusões (inclusive em cascata) e mudanças de papel também geram deltas
+        self._criar_orcamento(self.outro, Decimal('80.00'))
+        Orcamento.objects.filter(anuncio=self.outro).first().delete()
+        fornecedor = User.objects.get(pk=self.fornecedor.pk)
+        fornecedor.is_client = True
+        fornecedor.save()
+        descartado = User.objects.create_user(email='descartado@exemplo.com', password='senha123', is_client=True)
+        Necessidade.objects.create(
+            titulo='Telhado', descricao='Trocar telhas', cliente=descartado,
+            categoria=self.anuncio.categoria, subcategoria=self.anuncio.subcategoria, quantidade=1, unidade='un'
+        )
+        descartado.delete()
+        self.outro.delete()
+        incremental = _snapshot_rollups()
+        rollups.reconstruir_rollups()
+        self.assertEqual(incremental, _snapshot_rollups())
+
+    def test_dashboard_com_numero_constante_de_consultas(self):
+        for _ in range(5):
+            self._criar_orcamento(self.anuncio, Decimal('10.00'))
+        with self.assertNumQueries(2):
+            get_ads_metrics()
+
+
+class HistoricoStatusTest(TestCase):
+    """
+    Histórico de status gravado pelas transições e métricas de funil lidas só do log.
+    """
+
+    def setUp(self):
+        self.cliente = User.objects.create_user(
+            email='cliente@exemplo.com', password='senha123', is_client=True
+        )
+        self.fornecedores = [
+            User.objects.create_user(email=f'fornecedor{i}@exemplo.com', password='senha123', is_supplier=True)
+            for i in range(2)
+        ]
+        categoria = Categoria.objects.create(nome='Construção')
+        self.anuncio = Necessidade.objects.create(
+            titulo='Muro', descricao='Construir muro', cliente=self.cliente, categoria=categoria,
+            subcategoria=SubCategoria.objects.create(nome='Alvenaria', categoria=categoria),
+            quantidade=1, unidade='un'
+        )
+        self.orcamentos = [
+            Orcamento.objects.create(
+                fornecedor=fornecedor, anuncio=self.anuncio,
+                prazo_validade=timezone.now().date() + timedelta(days=10),
+                prazo_entrega=timezone.now().date() + timedelta(days=20),
+            )
+            for fornecedor in self.fornecedores
+        ]
+
+    def test_transicoes_registradas_com_usuario_e_em_lote(self):
+        self.anuncio.transition_to('analisando_orcamentos')
+        escolhido, outro = self.orcamentos
+        escolhido.transition_to('aceito_pelo_cliente', user=self.cliente)
+
+        self.assertEqual(
+            [(t['de'], t['para']) for t in historico_status.historico(self.anuncio)],
+            [(None, 'ativo'), ('ativo', 'analisando_orcamentos'), ('analisando_orcamentos', 'aguardando_confirmacao')],
+        )
+        self.assertEqual(historico_status.historico(self.anuncio)[-1]['usuario_id'], self.cliente.pk)
+        # O outro orçamento foi rejeitado pela atualização em massa
+        self.assertEqual(
+            [t['para'] for t in escolhido.get_state_machine().get_transition_history()],
+            ['enviado', 'aceito_pelo_cliente'],
+        )
+        self.assertEqual([t['para'] for t in historico_status.historico(outro)], ['enviado', 'rejeitado_pelo_cliente'])
+
+        tempos = historico_status.tempo_em_status(self.anuncio)
+        self.assertEqual(set(tempos), {'ativo', 'analisando_orcamentos', 'aguardando_confirmacao'})
+
+    def test_acao_em_massa_do_admin_registra_disputas(self):
+        Necessidade.objects.filter(pk=self.anuncio.pk).update(status='em_atendimento')
+        Orcamento.objects.filter(pk=self.orcamentos[0].pk).update(status='confirmado')
+        disputa = Disputa.objects.create(
+            necessidade=Necessidade.objects.get(pk=self.anuncio.pk),
+            orcamento=Orcamento.objects.get(pk=self.orcamentos[0].pk),
+            usuario_abertura=self.cliente, motivo='Atraso',
+        )
+        admin_disputas = DisputaAdmin(Disputa, admin.site)
+        request = RequestFactory().post('/')
+        request.user = self.cliente
+        with mock.patch.object(admin_disputas, 'message_user'):
+            admin_disputas.marcar_em_analise(request, Disputa.objects.all())
+            admin_disputas.marcar_em_analise(request, Disputa.objects.all())
+
+        self.assertEqual(
+            [(t['de'], t['para'], t['usuario_id']) for t in historico_status.historico(disputa)],
+            [(None, 'aberta', None), ('aberta', 'em_analise', self.cliente.pk)],
+        )
+
+    def test_funil_calculado_pelo_log(self):
+        self.anuncio.transition_to('analisando_orcamentos')
+        log = StateTransitionLog.objects.filter(
+            entidade=StateTransitionLog.NECESSIDADE, objeto_id=self.anuncio.pk
+        )
+        inicio = timezone.now() - timedelta(hours=5)
+        log.filter(de=0).update(criado_em=inicio)
+        log.exclude(de=0).update(criado_em=inicio + timedelta(hours=2))
+
+        with self.assertNumQueries(1):
+            funil = historico_status.tempo_ate_primeiro_orcamento(inicio, timezone.now())
+        self.assertEqual(funil['quantidade'], 1)
+        self.assertEqual(funil['p50'], timedelta(hours=2))
+        self.assertEqual(historico_status.latencia_confirmacao(inicio, timezone.now())['quantidade'], 0)
+
+
+class ExpiracaoEmLoteTest(TestCase):
+    """
+    Varredura de expiração em lotes: mesmo efeito da transição individual
+    (status, orçamentos, notificações, histórico e rollups) e retomada pelo checkpoint.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.cliente = User.objects.create_user(
+            email='cliente@exemplo.com', password='senha123', is_client=True, estado='CE'
+        )
+        self.fornecedores = [
+            User.objects.create_user(email=f'fornecedor{i}@exemplo.com', password='senha123', is_supplier=True)
+            for i in range(2)
+        ]
+        categoria = Categoria.objects.create(nome='Construção')
+        subcategoria = SubCategoria.objects.create(nome='Alvenaria', categoria=categoria)
+        self.anuncios = [
+            Necessidade.objects.create(
+                titulo=f'Anúncio {i}', descricao='Descrição', cliente=self.cliente,
+                categoria=categoria, subcategoria=subcategoria, quantidade=1, unidade='un', status=status,
+            )
+            for i, status in enumerate(['ativo', 'analisando_orcamentos', 'em_atendimento', 'analisando_orcamentos'])
+        ]
+        for anuncio in self.anuncios[1:]:
+            for fornecedor in self.fornecedores:
+                Orcamento.objects.create(
+                    fornecedor=fornecedor, anuncio=anuncio,
+                    prazo_validade=timezone.now().date() + timedelta(days=10),
+                    prazo_entrega=timezone.now().date() + timedelta(days=20),
+                )
+        # Vencidos: todos menos o último
+        Necessidade.objects.filter(pk__in=[a.pk for a in self.anuncios[:3]]).update(
+            data_validade=timezone.now() - timedelta(days=1)
+        )
+        rollups.reconstruir_rollups()
+
+    def test_expira_em_lotes_com_notificacoes_historico_e_rollups(self):
+        resultado = expiracao.expirar_anuncios(tamanho_lote=1)
+
+        status = dict(Necessidade.objects.values_list('titulo', 'status'))
+        self.assertEqual(status, {
+            'Anúncio 0': 'expirado', 'Anúncio 1': 'expirado',
+            'Anúncio 2': 'em_atendimento', 'Anúncio 3': 'analisando_orcamentos',
+        })
+        self.assertEqual(
+            set(Orcamento.objects.filter(anuncio=self.anuncios[1]).values_list('status', flat=True)),
+            {'anuncio_expirado'},
+        )
+        self.assertFalse(Orcamento.objects.filter(anuncio=self.anuncios[3], status='anuncio_expirado').exists())
+        self.assertEqual((resultado['expirados'], resultado['orcamentos'], resultado['lotes']), (2, 2, 2))
+
+        # Cliente (por anúncio) e cada fornecedor do anúncio com orçamento expirado
+        self.assertEqual(Notification.objects.filter(user=self.cliente).count(), 2)
+        for fornecedor in self.fornecedores:
+            self.assertEqual(Notification.objects.filter(user=fornecedor).count(), 1)
+
+        self.assertEqual(
+            [t['para'] for t in historico_status.historico(self.anuncios[1])][-1], 'expirado'
+        )
+        orcamento = Orcamento.objects.filter(anuncio=self.anuncios[1]).first()
+        self.assertEqual([t['para'] for t in historico_status.historico(orcamento)][-1], 'anuncio_expirado')
+
+        incremental = _snapshot_rollups()
+        rollups.reconstruir_rollups()
+        self.assertEqual(incremental, _snapshot_rollups())
+        self.assertIsNone(cache.get(expiracao._chave_checkpoint('validade')))
+
+    def test_retoma_do_checkpoint_com_o_corte_original(self):
+        corte = timezone.now()
+        cache.set(
+            expiracao._chave_checkpoint('validade'),
+            {'ultimo_id': self.anuncios[0].pk, 'corte': corte.isoformat()},
+        )
+        resultado = expiracao.expirar_anuncios()
+
+        self.assertEqual(resultado['expirados'], 1)
+        self.anuncios[0].refresh_from_db()
+        self.anuncios[1].refresh_from_db()
+        self.assertEqual(self.anuncios[0].status, 'ativo')
+        self.assertEqual(self.anuncios[1].status, 'expirado')
+
+        # Sem checkpoint, a próxima varredura começa do início
+        self.assertEqual(expiracao.expirar_anuncios()['expirados'], 1)
+
+
+class PrazosConfirmacaoTest(TestCase):
+    """
+    Aviso e timeout da confirmação agendados na transição e disparados pelo
+    vencimento, uma única vez, sem varrer necessidades.
+    """
+
+    def setUp(self):
+        self.cliente = User.objects.create_user(
+            email='cliente@exemplo.com', password='senha123', is_client=True
+        )
+        self.fornecedor = User.objects.create_user(
+            email='fornecedor@exemplo.com', password='senha123', is_supplier=True
+        )
+        categoria = Categoria.objects.create(nome='Construção')
+        self.anuncio = Necessidade.objects.create(
+            titulo='Muro', descricao='Construir muro', cliente=self.cliente, categoria=categoria,
+            subcategoria=SubCategoria.objects.create(nome='Alvenaria', categoria=categoria),
+            quantidade=1, unidade='un', status='analisando_orcamentos',
+        )
+        self.orcamento = Orcamento.objects.create(
+            fornecedor=self.fornecedor, anuncio=self.anuncio,
+            prazo_validade=timezone.now().date() + timedelta(days=10),
+            prazo_entrega=timezone.now().date() + timedelta(days=20),
+        )
+        self.orcamento.transition_to('aceito_pelo_cliente', user=self.cliente)
+        self.anuncio.refresh_from_db()
+
+    def _avisos(self):
+        return Notification.objects.filter(user=self.fornecedor, message__contains='expirará em breve')
+
+    def test_aviso_e_timeout_disparados_uma_vez(self):
+        desde = self.anuncio.aguardando_confirmacao_desde
+        self.assertEqual(
+            dict(PrazoAgendado.objects.values_list('tipo', 'vence_em')),
+            {
+                PrazoAgendado.AVISO_CONFIRMACAO: desde + timedelta(hours=36),
+                PrazoAgendado.TIMEOUT_CONFIRMACAO: desde + timedelta(hours=48),
+            },
+        )
+        self.assertEqual(prazos.processar_vencidos()['disparados'], 0)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(prazos.processar_vencidos(agora=desde + timedelta(hours=1))['disparados'], 0)
+
+        prazos.processar_vencidos(agora=desde + timedelta(hours=37))
+        prazos.processar_vencidos(agora=desde + timedelta(hours=38))
+        self.assertEqual(self._avisos().count(), 1)
+
+        # Simula a passagem das 48h
+        recuo = timedelta(hours=49)
+        Necessidade.objects.filter(pk=self.anuncio.pk).update(aguardando_confirmacao_desde=desde - recuo)
+        PrazoAgendado.objects.update(referencia=desde - recuo, vence_em=F('vence_em') - recuo)
+        self.assertEqual(prazos.processar_vencidos()['disparados'], 1)
+
+        self.anuncio.refresh_from_db()
+        self.orcamento.refresh_from_db()
+        self.assertEqual(self.anuncio.status, 'analisando_orcamentos')
+        self.assertIsNone(self.anuncio.aguardando_confirmacao_desde)
+        self.assertEqual(self.orcamento.status, 'enviado')
+        self.assertFalse(PrazoAgendado.objects.exists())
+
+    def test_confirmacao_cancela_prazos(self):
+        self.orcamento.transition_to('confirmado', user=self.fornecedor)
+        self.assertFalse(PrazoAgendado.objects.exists())
+
+        # Prazo que ficou para trás (ex.: alteração fora do ORM) é descartado sem efeito
+        PrazoAgendado.objects.create(
+            chave=prazos.chave_prazo(self.anuncio.pk, PrazoAgendado.TIMEOUT_CONFIRMACAO),
+            tipo=PrazoAgendado.TIMEOUT_CONFIRMACAO, necessidade=self.anuncio,
+            referencia=self.anuncio.aguardando_confirmacao_desde, vence_em=timezone.now(),
+        )
+        self.assertEqual(prazos.processar_vencidos()['descartados'], 1)
+        self.anuncio.refresh_from_db()
+        self.assertEqual(self.anuncio.status, 'em_atendimento')
+
+
+class FeedHomeTest(TestCase):
+    """
+    Feed da home: seções em cache versionado, invalidadas por escritas em
+    Necessidade, e anúncios hidratados em uma única consulta.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.cliente = User.objects.create_user(
+            email='cliente@exemplo.com', password='senha123', is_client=True,
+            cidade='Fortaleza', estado='CE',
+        )
+        self.usuario = User.objects.create_user(
+            email='usuario@exemplo.com', password='senha123', is_supplier=True,
+            cidade='Fortaleza', estado='CE',
+        )
+        self.construcao = Categoria.objects.create(nome='Construção')
+        self.pintura = Categoria.objects.create(nome='Pintura')
+        self.usuario.preferred_categories.add(self.pintura)
+        self.anuncios = [
+            self._criar_anuncio(f'Anúncio {i}', self.construcao if i % 2 else self.pintura)
+            for i in range(3)
+        ]
+
+    def _criar_anuncio(self, titulo, categoria, **campos):
+        subcategoria, _ = SubCategoria.objects.get_or_create(nome=f'Sub {categoria.nome}', categoria=categoria)
+        with self.captureOnCommitCallbacks(execute=True):
+            return Necessidade.objects.create(
+                titulo=titulo, descricao='Descrição', cliente=self.cliente, categoria=categoria,
+                subcategoria=subcategoria, quantidade=1, unidade='un', status='ativo', **campos,
+            )
+
+    @staticmethod
+    def _ids(slides):
+        return [anuncio.pk for slide in slides for anuncio in slide]
+
+    def test_secoes_do_usuario(self):
+        a0, a1, a2 = self.anuncios
+        contexto = feed.montar(self.usuario)
+        self.assertEqual(self._ids(contexto['anuncios_populares']), [a2.pk, a1.pk, a0.pk])
+        # Categoria preferida primeiro (mais recente antes); as demais como exploração
+        self.assertEqual(self._ids(contexto['anuncios_preferidos']), [a2.pk, a0.pk, a1.pk])
+        # Sem coordenadas: anúncios da cidade do usuário
+        self.assertEqual(len(self._ids(contexto['anuncios_proximos'])), 3)
+        self.assertEqual(contexto['categorias'], [self.pintura, self.construcao])
+
+        # Cache quente: só a hidratação (anúncios + imagens)
+        with self.assertNumQueries(2):
+            feed.montar(self.usuario)
+
+        self.client.force_login(self.usuario)
+        resposta = self.client.get(reverse('ads:home'))
+        self.assertEqual(resposta.status_code, 200)
+        self.assertContains(resposta, 'Anúncio 2')
+
+    def test_escritas_invalidam_o_feed(self):
+        feed.montar(self.usuario)
+        novo = self._criar_anuncio('Novo', self.pintura)
+        contexto = feed.montar(self.usuario)
+        self.assertEqual(self._ids(contexto['anuncios_populares'])[0], novo.pk)
+        self.assertEqual(self._ids(contexto['anuncios_preferidos'])[0], novo.pk)
+
+        # Varredura de expiração (UPDATE em lote, sem post_save)
+        with self.captureOnCommitCallbacks(execute=True):
+            Necessidade.objects.filter(pk=novo.pk).update(
+                data_validade=timezone.now() - timedelta(days=1)
+            )
+            expiracao.expirar_anuncios()
+        self.assertNotIn(novo.pk, self._ids(feed.montar(self.usuario)['anuncios_preferidos']))
+
+        # Categorias preferidas alteradas
+        self.usuario.preferred_categories.set([self.construcao])
+        self.assertEqual(self._ids(feed.montar(self.usuario)['anuncios_preferidos'])[0], self.anuncios[1].pk)
+
+    def test_anonimo(self):
+        from django.contrib.auth.models import AnonymousUser
+
+        contexto = feed.montar(AnonymousUser())
+        # Sem perfil: anúncios ativos mais antigos
+        self.assertEqual(self._ids(contexto['anuncios_preferidos']), [a.pk for a in self.anuncios])
+        self.assertEqual(contexto['anuncios_proximos'], [])
+
+    def test_recomendacoes(self):
+        a0, a1, a2 = self.anuncios
+        perto = User.objects.create_user(
+            email='perto@exemplo.com', password='senha123', estado='CE', lat=-3.73, lon=-38.52,
+        )
+        outro = self._criar_anuncio(
+            'Longe', self.pintura, usar_endereco_usuario=False,
+            cidade_servico='São Paulo', estado_servico='SP',
+        )
+        # a0: um dia mais antigo, mas no mesmo ponto que `perto`
+        Necessidade.objects.filter(pk=a0.pk).update(
+            geo_lat=-3.73, geo_lon=-38.52, data_criacao=timezone.now() - timedelta(days=1)
+        )
+        Necessidade.objects.filter(pk=outro.pk).update(cliente=perto)
+        with self.captureOnCommitCallbacks(execute=True):
+            recomendacoes.agendar_atualizacao_ids([a0.pk, outro.pk])
+
+        # O próprio anúncio fica de fora (mas dá afinidade pela categoria); a proximidade compensa a idade
+        recomendados = recomendacoes.recomendar(perto)
+        self.assertEqual(recomendados[0], a0.pk)
+        self.assertEqual(set(recomendados), {a0.pk, a1.pk, a2.pk})
+        self.assertEqual(recomendacoes.recomendar(self.cliente), [outro.pk])
+
+        # Anúncio orçado sai das recomendações do fornecedor
+        Orcamento.objects.create(
+            fornecedor=self.usuario, anuncio=a2,
+            prazo_validade=timezone.now().date() + timedelta(days=10),
+            prazo_entrega=timezone.now().date() + timedelta(days=20),
+        )
+        self.assertEqual(recomendacoes.recomendar(self.usuario), [a0.pk, outro.pk, a1.pk])
+
+
+class FornecedoresCompativeisTest(TestCase):
+    """
+    Aviso de anúncios novos: fornecedores resolvidos pelo índice invertido
+    (categoria → UF/célula), sem duplicar avisos e com limite diário.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.categoria = Categoria.objects.create(nome='Construção')
+        self.subcategoria = SubCategoria.objects.create(nome='Alvenaria', categoria=self.categoria)
+        outra = Categoria.objects.create(nome='Pintura')
+        self.cliente = User.objects.create_user(
+            email='cliente@exemplo.com', password='senha123', is_client=True,
+            cidade='Fortaleza', estado='CE', lat=-3.73, lon=-38.52,
+        )
+
+        def fornecedor(nome, categoria=self.categoria, **campos):
+            usuario = User.objects.create_user(email=f'{nome}@exemplo.com', password='senha123', is_supplier=True, **campos)
+            usuario.preferred_categories.add(categoria)
+            return usuario
+
+        self.mesma_uf = fornecedor('mesma_uf', estado='CE')
+        # Outra UF, mas a ~30 km do anúncio
+        self.perto = fornecedor('perto', estado='RN', lat=-3.50, lon=-38.40)
+        self.nacional = fornecedor('nacional')
+        self.longe = fornecedor('longe', estado='SP', lat=-23.55, lon=-46.63)
+        self.outra_categoria = fornecedor('outra_categoria', categoria=outra, estado='CE')
+        self.inativo = fornecedor('inativo', estado='CE', is_active=False)
+
+    def _criar_anuncio(self, titulo='Muro'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Necessidade.objects.create(
+                titulo=titulo, descricao='Descrição', cliente=self.cliente, categoria=self.categoria,
+                subcategoria=self.subcategoria, quantidade=1, unidade='un',
+            )
+
+    def _avisados(self, anuncio):
+        return set(
+            Notification.objects.filter(necessidade=anuncio, metadata__origem=fornecedores.ORIGEM)
+            .values_list('user_id', flat=True)
+        )
+
+    def test_avisa_fornecedores_compativeis(self):
+        anuncio = self._criar_anuncio()
+        self.assertEqual(self._avisados(anuncio), {self.mesma_uf.pk, self.perto.pk, self.nacional.pk})
+
+        # Reexecução (retry da task) não duplica; com o índice em cache, consultas fixas
+        with self.assertNumQueries(4):
+            self.assertEqual(fornecedores.notificar_compativeis(anuncio.pk), 0)
+
+        # Mudança de localização descarta o índice da categoria
+        self.longe.estado = 'CE'
+        self.longe.save()
+        self.assertIn(self.longe.pk, self._avisados(self._criar_anuncio('Piso')))
+
+    @override_settings(FORNECEDORES_AVISOS_POR_DIA=1)
+    def test_limite_diario(self):
+        self._criar_anuncio()
+        novo_fornecedor = User.objects.create_user(
+            email='novo@exemplo.com', password='senha123', is_supplier=True, estado='CE'
+        )
+        novo_fornecedor.preferred_categories.add(self.categoria)
+        self.assertEqual(self._avisados(self._criar_anuncio('Piso')), {novo_fornecedor.pk})
@@ -1,6 +1,5 @@
 from django.utils import timezone
 from pyexpat.errors import messages
-from itertools import islice
 import logging
 from django.contrib.auth.mixins import LoginRequiredMixin
 
@@ -13,14 +12,14 @@ from django.urls import reverse_lazy, reverse
 from django.contrib import messages
 import requests
 from ads.forms import AdsForms, DisputaForm, DisputaResolverForm
-from django.core.mail import send_mail
 from budgets.models import Orcamento
-from notifications.models import Notification
+from notifications.fanout import notificar
+from notifications.outbox import enfileirar_email
 from rankings.forms import AvaliacaoForm
 from rankings.models import Avaliacao
+from . import feed
 from .models import AnuncioImagem, Necessidade, Disputa
 from categories.models import Categoria
-from itertools import islice
 from django.views.generic import TemplateView
 from categories.models import Categoria
 from .models import Necessidade
@@ -31,89 +30,15 @@ from django.core.files.base import ContentFile
 # Importar os novos mixins e validadores de permissão
 from core.mixins import ClientRequiredMixin, EmailVerifiedRequiredMixin, AdminRequiredMixin, OwnerRequiredMixin
 from core.permissions import PermissionValidator
+from core.state_machine import StateTransitionConflict
 
 class HomeView(TemplateView):
     template_name = "home.html"
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-
-        # ──────────────────────────────────────────────
-        # 1) Categorias populares (24 → 2 slides de 12)
-        # ──────────────────────────────────────────────
-        categorias_populares = Categoria.objects.order_by("-id")[:24]
-        context["categorias_populares"] = [
-            list(islice(categorias_populares, i, i + 12))
-            for i in range(0, len(categorias_populares), 12)
-        ]
-
-        # 👇 Adicionado: lista simples para versão mobile adaptada
-        context["categorias"] = categorias_populares
-
-        # ──────────────────────────────────────────────
-        # 2) Anúncios populares (8 → 2 slides de 4)
-        # ──────────────────────────────────────────────
-        anuncios_populares = (
-            Necessidade.objects.exclude(status__in=["finalizado", "cancelado"])
-            .order_by("-data_criacao")[:8]
-        )
-        context["anuncios_populares"] = [
-            list(islice(anuncios_populares, i, i + 4))
-            for i in range(0, len(anuncios_populares), 4)
-        ]
-
-        # ──────────────────────────────────────────────
-        # 3) Anúncios "baseados nas suas categorias"
-        #    → agora NUNCA fica vazio
-        # ──────────────────────────────────────────────
-        user = self.request.user
-        qs_preferidos = Necessidade.objects.none()
-
-        if user.is_authenticated:
-            preferred_cats = user.preferred_categories.all()
-            if preferred_cats.exists():
-                qs_preferidos = Necessidade.objects.filter(
-                    categoria__in=preferred_cats,
-                    status="ativo",
-                ).order_by("-data_criacao")[:8]
-
-        if not qs_preferidos.exists():
-            qs_preferidos = (
-                Necessidade.objects.filter(status="ativo")
-                .order_by("data_criacao")[:8]
-            )
-
-        context["anuncios_preferidos"] = [
-            list(islice(qs_preferidos, i, i + 4))
-            for i in range(0, len(qs_preferidos), 4)
-        ]
-
-        # ──────────────────────────────────────────────
-        # 4) Anúncios próximos (cidade ou estado)
-        # ──────────────────────────────────────────────
-        anuncios_proximos = Necessidade.objects.none()
-        anuncios_estado = Necessidade.objects.none()
-
-        if user.is_authenticated and getattr(user, "cidade", None):
-            anuncios_proximos = Necessidade.objects.filter(
-                status__in=["ativo", "analisando_orcamentos", "em_atendimento"],
-                cliente__cidade=user.cidade,
-            ).order_by("-data_criacao")[:5]
-
-            if not anuncios_proximos.exists() and getattr(user, "estado", None):
-                anuncios_estado = Necessidade.objects.filter(
-                    status__in=["ativo", "analisando_orcamentos", "em_atendimento"],
-                    cliente__estado=user.estado,
-                ).order_by("-data_criacao")[:5]
-
-        anuncios_final = (
-            anuncios_proximos if anuncios_proximos.exists() else anuncios_estado
-        )
-        context["anuncios_proximos"] = [
-            list(islice(anuncios_final, i, i + 4))
-            for i in range(0, len(anuncios_final), 4)
-        ]
-
+        # Seções em cache versionado; anúncios hidratados em uma consulta (ads.feed)
+        context.update(feed.montar(self.request.user))
         return context
 
 
@@ -127,7 +52,7 @@ class NecessidadeListView(ListView):
         if not self.request.user.is_authenticated:
             return Necessidade.objects.none()
         queryset = Necessidade.objects.filter(
-            cliente=self.request.user).order_by('-data_criacao')
+            cliente=self.request.user).select_related('cliente__reputacao').order_by('-data_criacao')
 
         # Aplica filtro de descrição, se fornecido
         search_query = self.request.GET.get('search', None)
@@ -192,16 +117,7 @@ class NecessidadeCreateView(ClientRequiredMixin, EmailVerifiedRequiredMixin, Cre
         #     dias_str = f"Há {dias_diff} dias"
 
         # Cria a notificação com HTML embutido
-        Notification.objects.create(
-            user=self.request.user,
-            message=(
-                f"<strong>Novo Anúncio Criado</strong><br>"
-                # f"<strong>{self.object.titulo}</strong><br>"
-                # f"<strong>{self.object.id}</strong><br>"
-                # f"<i class='fas fa-clock'></i> {dias_str}"
-            ),
-            necessidade=self.object
-        )
+        notificar([self.request.user], 'anuncio_criado', necessidade=self.object)
 
         messages.success(self.request, "Anúncio criado com sucesso!")
         return super().form_valid(form)
@@ -401,6 +317,8 @@ class FinalizarAnuncioView(LoginRequiredMixin, View):
             try:
                 anuncio.transition_to('finalizado', user=request.user)
                 logger.info(f"Anúncio {anuncio.id} finalizado usando state machine")
+            except StateTransitionConflict as e:
+                return JsonResponse({'success': False, 'error': str(e)}, status=409)
             except Exception as e:
                 logger.error(f"Erro ao finalizar anúncio usando state machine: {e}")
                 # Fallback para método antigo
@@ -536,18 +454,18 @@ def enviar_mensagem(request, pk):
         email = request.POST.get('email')
         mensagem = request.POST.get('mensagem')
         
-        necessidade = Necessidade.objects.get(pk=pk)
+        necessidade = get_object_or_404(Necessidade, pk=pk)
         destinatario = necessidade.cliente.email
         
         assunto = f"Contato sobre o anúncio '{necessidade.titulo}' no Indicai.com"
         mensagem_completa = f"De: {nome}\nTelefone: {telefone}\nEmail: {email}\n\n{mensagem}"
         
-        send_mail(
+        # Remetente é o da plataforma; respostas vão direto para quem escreveu
+        enfileirar_email(
+            [destinatario],
             assunto,
             mensagem_completa,
-            email,  # Remetente
-            [destinatario],  # Destinatário
-            fail_silently=False
+            reply_to=[email] if email else None,
         )
         
         messages.success(request, 'Mensagem enviada com sucesso!')
@@ -7,6 +7,7 @@ from drf_spectacular.utils import extend_schema, OpenApiExample
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from .serializers import LoginRequestSerializer, LoginResponseSerializer, ErrorResponseSerializer
+from .throttles import AuthRateThrottle
 
 @method_decorator(csrf_exempt, name='dispatch')
 class CustomLoginView(APIView):
@@ -15,6 +16,7 @@ class CustomLoginView(APIView):
     """
     permission_classes = [AllowAny]
     authentication_classes = []  # Sem autenticação para login
+    throttle_classes = [AuthRateThrottle]
 
     @extend_schema(
         tags=['07 - AUTENTICAÇÃO - ACESSO AO SISTEMA'],
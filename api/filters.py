@@ -53,8 +53,8 @@ class OrcamentoFilter(django_filters.FilterSet):
     """
     Filtros personalizados para o modelo Orcamento.
     """
-    valor_min = django_filters.NumberFilter(field_name='valor', lookup_expr='gte')
-    valor_max = django_filters.NumberFilter(field_name='valor', lookup_expr='lte')
+    valor_min = django_filters.NumberFilter(field_name='total_geral', lookup_expr='gte')
+    valor_max = django_filters.NumberFilter(field_name='total_geral', lookup_expr='lte')
     
     class Meta:
         model = Orcamento
@@ -113,8 +113,9 @@ class OrcamentoSerializer(serializers.ModelSerializer):
         fields = ['id', 'fornecedor', 'fornecedor_nome', 'anuncio', 'anuncio_titulo',
                   'prazo_entrega', 'prazo_validade', 'observacao', 'tipo_frete', 
                   'valor_frete', 'forma_pagamento', 'condicao_pagamento', 
-                  'tipo_venda', 'status', 'data_criacao', 'valor_total']
-        read_only_fields = ['id', 'data_criacao', 'valor_total']
+                  'tipo_venda', 'status', 'data_criacao', 'valor_total',
+                  'total_impostos', 'total_geral']
+        read_only_fields = ['id', 'data_criacao', 'valor_total', 'total_impostos', 'total_geral']
     
     def get_fornecedor_nome(self, obj):
         return obj.fornecedor.get_full_name()
@@ -0,0 +1,29 @@
+from rest_framework.throttling import BaseThrottle
+
+from core.services.rate_limit_service import RateLimitService
+
+
+class GrupoRateThrottle(BaseThrottle):
+    """
+    Throttle do DRF com as políticas de settings.RATE_LIMIT_POLITICAS.
+    O grupo vem do atributo `rate_limit_grupo` da view (padrão: 'api').
+    """
+
+    grupo_padrao = 'api'
+
+    def allow_request(self, request, view):
+        grupo = getattr(view, 'rate_limit_grupo', self.grupo_padrao)
+        self.resultado = RateLimitService.verificar(request, grupo)
+        return self.resultado.permitido
+
+    def wait(self):
+        return self.resultado.reset
+
+    def get_ident(self, request):
+        return RateLimitService.ip_cliente(request)
+
+
+class AuthRateThrottle(GrupoRateThrottle):
+    """Endpoints de autenticação (login, registro, senha): política 'auth'."""
+
+    grupo_padrao = 'auth'
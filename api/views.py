@@ -142,11 +142,14 @@ class NecessidadeViewSet(BaseModelViewSet):
     destroy=extend_schema(tags=['05 - ORÇAMENTOS - PROPOSTAS DE FORNECEDORES']),
 )
 class OrcamentoViewSet(BaseModelViewSet):
-    queryset = Orcamento.objects.all()
+    queryset = Orcamento.objects.select_related('fornecedor', 'anuncio')
     serializer_class = OrcamentoSerializer
     permission_classes = [OrcamentoPermission]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_class = OrcamentoFilter
-    search_fields = ['descricao']
+    search_fields = ['observacao']
+    ordering_fields = ['data_criacao', 'total_geral', 'total_itens', 'prazo_entrega']
+    ordering = ['-data_criacao']
 
     def _filter_for_regular_user(self, queryset):
         return queryset.filter(
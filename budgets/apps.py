@@ -6,4 +6,5 @@ class BudgetsConfig(AppConfig):
     name = 'budgets'
 
     def ready(self):
-        import budgets.email_signals  # Importa os signals de e-mail
\ No newline at end of file
+        import budgets.email_signals  # Importa os signals de e-mail
+        import budgets.signals  # Totais desnormalizados do orçamento
@@ -1,9 +1,8 @@
 # budgets/email_signals.py
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_save
 from django.dispatch import receiver
-from django.core.mail import send_mail
-from django.conf import settings
-from django.db import transaction
+from notifications.digest import enviar_email_usuario
+from notifications.models import NotificationType
 from .models import Orcamento
 
 @receiver(post_save, sender=Orcamento)
@@ -15,7 +14,7 @@ def enviar_email_novo_orcamento(sender, instance, created, **kwargs):
         anuncio = instance.anuncio
         cliente = anuncio.cliente
 
-        # Enviar e-mail
+        # E-mail imediato (outbox, após o commit) ou acumulado no resumo, conforme as preferências
         assunto = "Novo Orçamento Recebido"
         corpo = (
             f"Olá, {cliente.first_name}!\n\n"
@@ -23,32 +22,27 @@ def enviar_email_novo_orcamento(sender, instance, created, **kwargs):
             "Acesse a plataforma para visualizar os detalhes e responder.\n\n"
             "Atenciosamente,\nIndicaai"
         )
-        send_mail(
-            subject=assunto,
-            message=corpo,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[cliente.email],
-            fail_silently=False
+        enviar_email_usuario(
+            cliente, assunto, corpo,
+            notification_type=NotificationType.NEW_BUDGET,
+            resumo=f"Novo orçamento para '{anuncio.titulo}'",
+            dedup_key=f"orcamento:{instance.pk}:novo",
         )
 
-@receiver(pre_save, sender=Orcamento)
-def enviar_email_orcamento_aceito_pelo_cliente(sender, instance, **kwargs):
+@receiver(post_save, sender=Orcamento)
+def enviar_email_orcamento_aceito_pelo_cliente(sender, instance, created, **kwargs):
     """
     Envia e-mail quando um orçamento é aceito pelo cliente (aguardando confirmação do fornecedor),
     garantindo envio apenas quando houver transição de status.
     """
     # Somente para updates (não no create)
-    if not instance.pk:
-        return
-
-    # Busca o valor anterior do status para detectar transição
-    try:
-        previous = Orcamento.objects.get(pk=instance.pk)
-    except Orcamento.DoesNotExist:
+    if created:
         return
 
+    # Status carregado do banco (Orcamento.from_db) evita uma consulta extra por save
+    status_anterior = getattr(instance, '_status_original', None)
     mudou_para_aceito_pelo_cliente = (
-        previous.status != 'aceito_pelo_cliente' and instance.status == 'aceito_pelo_cliente'
+        status_anterior != 'aceito_pelo_cliente' and instance.status == 'aceito_pelo_cliente'
     )
 
     if mudou_para_aceito_pelo_cliente:
@@ -63,11 +57,10 @@ def enviar_email_orcamento_aceito_pelo_cliente(sender, instance, **kwargs):
             "Atenciosamente,\nIndicaai"
         )
 
-        # Garante que o e-mail será enviado somente após o commit da transação
-        transaction.on_commit(lambda: send_mail(
-            subject=assunto,
-            message=corpo,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[fornecedor.email],
-            fail_silently=False
-        ))
\ No newline at end of file
+        # Gravado na mesma transação do save: rollback descarta o e-mail
+        enviar_email_usuario(
+            fornecedor, assunto, corpo,
+            notification_type=NotificationType.BUDGET_ACCEPTED,
+            resumo=f"Orçamento para '{anuncio.titulo}' aceito pelo cliente",
+            dedup_key=f"orcamento:{instance.pk}:aceito_pelo_cliente",
+        )
@@ -0,0 +1,65 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Round
+
+from budgets.models import Orcamento, OrcamentoItem
+
+
+class Command(BaseCommand):
+    help = "Recalcula os totais desnormalizados (itens, impostos, total geral) dos orçamentos"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Quantidade de orçamentos atualizados por transação (padrão: 1000)',
+        )
+
+    def _soma_itens(self, expressao):
+        soma = (
+            OrcamentoItem.objects.filter(orcamento=OuterRef('pk'))
+            .values('orcamento')
+            .annotate(total=Sum(expressao))
+            .values('total')
+        )
+        return Coalesce(
+            Round(Subquery(soma), 2),
+            Value(Decimal('0.00')),
+            output_field=DecimalField(max_digits=14, decimal_places=2),
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        total = 0
+        ultimo_id = 0
+
+        self.stdout.write("Recalculando totais dos orçamentos...")
+
+        while True:
+            ids = list(
+                Orcamento.objects.filter(id__gt=ultimo_id)
+                .order_by('id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+
+            with transaction.atomic():
+                lote = Orcamento.objects.filter(id__gte=ids[0], id__lte=ids[-1])
+                lote.update(
+                    total_itens=self._soma_itens(OrcamentoItem.expressao_subtotal()),
+                    total_impostos=self._soma_itens(OrcamentoItem.expressao_impostos()),
+                )
+                lote.update(
+                    total_geral=F('total_itens') + F('total_impostos')
+                    + Coalesce('valor_frete', Value(Decimal('0.00'))),
+                )
+
+            total += len(ids)
+            ultimo_id = ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(f"✓ Totais recalculados para {total} orçamentos."))
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.14 on 2026-10-17 19:21
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("budgets", "0013_alter_orcamento_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="orcamento",
+            name="total_geral",
+            field=models.DecimalField(
+                db_index=True,
+                decimal_places=2,
+                default=Decimal("0.00"),
+                editable=False,
+                max_digits=14,
+                verbose_name="Total geral (itens + impostos + frete)",
+            ),
+        ),
+        migrations.AddField(
+            model_name="orcamento",
+            name="total_impostos",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=Decimal("0.00"),
+                editable=False,
+                max_digits=14,
+                verbose_name="Total de impostos",
+            ),
+        ),
+        migrations.AddField(
+            model_name="orcamento",
+            name="total_itens",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=Decimal("0.00"),
+                editable=False,
+                max_digits=14,
+                verbose_name="Total dos itens (sem impostos)",
+            ),
+        ),
+    ]
@@ -2,7 +2,9 @@ from django.db import models
 from decimal import Decimal
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
-from django.db.models import Sum, F
+from django.db import transaction
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, Sum, Value, When
+from django.db.models.functions import Coalesce
 from users.models import User
 from ads.models import Necessidade
 
@@ -91,31 +93,111 @@ class Orcamento(models.Model):
     data_criacao = models.DateTimeField(auto_now_add=True)
     modificado_em = models.DateTimeField(auto_now=True)
 
+    # Totais desnormalizados (recalculados sempre que os itens mudam)
+    total_itens = models.DecimalField(
+        "Total dos itens (sem impostos)", max_digits=14, decimal_places=2,
+        default=Decimal('0.00'), editable=False
+    )
+    total_impostos = models.DecimalField(
+        "Total de impostos", max_digits=14, decimal_places=2,
+        default=Decimal('0.00'), editable=False
+    )
+    total_geral = models.DecimalField(
+        "Total geral (itens + impostos + frete)", max_digits=14, decimal_places=2,
+        default=Decimal('0.00'), editable=False, db_index=True
+    )
+
     # Manager personalizado
     objects = OrcamentoManager()
 
     def valor_total(self):
-        """Calcula o valor total do orçamento baseado nos itens"""
-        return self.itens.aggregate(
-            total=Sum(F('quantidade') * F('valor_unitario'))
-        )['total'] or Decimal('0.00')
+        """Valor total dos itens (quantidade × valor unitário, sem impostos)"""
+        return self.total_itens
 
     def valor_total_com_impostos(self):
-        """Calcula o valor total com impostos aplicados"""
-        total = Decimal('0.00')
-        for item in self.itens.all():
-            total += item.total
-        return total
+        """Valor total dos itens com impostos aplicados"""
+        return self.total_itens + self.total_impostos
 
     def get_subtotal(self):
-        """Calcula o subtotal do orçamento (sem frete)"""
+        """Subtotal do orçamento (sem frete)"""
         return self.valor_total_com_impostos()
     
     def get_total_geral(self):
-        """Calcula o total geral do orçamento (subtotal + frete)"""
-        subtotal = self.get_subtotal()
-        frete = self.valor_frete or Decimal('0.00')
-        return subtotal + frete
+        """Total geral do orçamento (subtotal + frete)"""
+        return self.total_geral
+
+    def _calcular_totais_itens(self):
+        """Soma itens e impostos no banco; retorna (total_itens, total_impostos)"""
+        if not self.pk:
+            return Decimal('0.00'), Decimal('0.00')
+        totais = self.itens.aggregate(
+            itens=Sum(OrcamentoItem.expressao_subtotal()),
+            impostos=Sum(OrcamentoItem.expressao_impostos()),
+        )
+        centavos = Decimal('0.01')
+        return (
+            (totais['itens'] or Decimal('0.00')).quantize(centavos),
+            (totais['impostos'] or Decimal('0.00')).quantize(centavos),
+        )
+
+    def _atualizar_total_geral(self):
+        self.total_geral = self.total_itens + self.total_impostos + (self.valor_frete or Decimal('0.00'))
+
+    def recalcular_totais(self):
+        """
+        Recalcula e grava os totais a partir dos itens.
+        A linha do orçamento fica travada durante o cálculo para serializar
+        alterações concorrentes de itens.
+        """
+        from ads import rollups
+
+        with transaction.atomic():
+            atual = (
+                Orcamento.objects.select_for_update()
+                .filter(pk=self.pk)
+                .values('valor_frete', 'total_itens', 'status')
+                .first()
+            )
+            if atual is None:
+                return
+            self.valor_frete = atual['valor_frete']
+            self.total_itens, self.total_impostos = self._calcular_totais_itens()
+            self._atualizar_total_geral()
+            Orcamento.objects.filter(pk=self.pk).update(
+                total_itens=self.total_itens,
+                total_impostos=self.total_impostos,
+                total_geral=self.total_geral,
+            )
+            if self.total_itens != atual['total_itens']:
+                rollups.registrar_orcamento(
+                    self, status_anterior=atual['status'], valor_anterior=atual['total_itens'],
+                    status=atual['status'],
+                )
+            self._total_itens_original = self.total_itens
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Estado carregado do banco, usado para calcular deltas dos rollups sem re-consultar
+        if 'status' in field_names and 'total_itens' in field_names:
+            instance._status_original = instance.status
+            instance._total_itens_original = instance.total_itens
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Aceito por compatibilidade com o state machine (Orcamento não valida no save)
+        kwargs.pop('skip_validation', None)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            # Nunca grava totais desatualizados que estejam em memória
+            self.total_itens, self.total_impostos = self._calcular_totais_itens()
+            self._atualizar_total_geral()
+        elif 'valor_frete' in update_fields:
+            self._atualizar_total_geral()
+            kwargs['update_fields'] = list(update_fields) + ['total_geral']
+        super().save(*args, **kwargs)
+        self._status_original = self.status
+        self._total_itens_original = self.total_itens
 
     def clean(self):
         super().clean()
@@ -231,6 +313,29 @@ class OrcamentoItem(models.Model):
         help_text="ISS em percentual (0-100%)"
     )
 
+    @staticmethod
+    def expressao_subtotal():
+        """Expressão SQL de quantidade × valor unitário (sem impostos)"""
+        return ExpressionWrapper(
+            F('quantidade') * F('valor_unitario'),
+            output_field=DecimalField(max_digits=26, decimal_places=5),
+        )
+
+    @classmethod
+    def expressao_impostos(cls):
+        """Expressão SQL do valor de impostos do item (mesma regra de preco_com_impostos)"""
+        zero = Value(Decimal('0'))
+        percentual_material = (
+            Coalesce('icms_percentual', zero) + Coalesce('ipi_percentual', zero) +
+            Coalesce('st_percentual', zero) + Coalesce('difal_percentual', zero)
+        )
+        return Case(
+            When(tipo=cls.MATERIAL, then=cls.expressao_subtotal() * percentual_material / Value(Decimal('100'))),
+            When(tipo=cls.SERVICO, then=cls.expressao_subtotal() * Coalesce('aliquota_iss', zero) / Value(Decimal('100'))),
+            default=zero,
+            output_field=DecimalField(max_digits=30, decimal_places=9),
+        )
+
     @property
     def preco_com_impostos(self):
         """Calcula o preço unitário com impostos aplicados"""
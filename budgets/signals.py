@@ -0,0 +1,48 @@
+# budgets/signals.py
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Orcamento, OrcamentoItem
+
+
+@receiver(post_save, sender=OrcamentoItem)
+def recalcular_totais_apos_salvar_item(sender, instance, **kwargs):
+    """Mantém os totais do orçamento em dia quando um item é criado/alterado."""
+    instance.orcamento.recalcular_totais()
+
+
+@receiver(post_delete, sender=OrcamentoItem)
+def recalcular_totais_apos_remover_item(sender, instance, origin=None, **kwargs):
+    """
+    Recalcula os totais quando um item é removido.
+    Ignora exclusões em cascata (orçamento/anúncio removidos junto com os itens).
+    """
+    if origin is not None and getattr(origin, 'model', type(origin)) is not OrcamentoItem:
+        return
+    instance.orcamento.recalcular_totais()
+
+
+@receiver(post_save, sender=Orcamento)
+def atualizar_rollup_orcamento(sender, instance, created, **kwargs):
+    """Aplica no rollup do dashboard o delta de orçamentos criados/alterados."""
+    from ads import rollups
+
+    if created:
+        rollups.registrar_orcamento(instance, criado=True)
+        return
+
+    status_anterior = getattr(instance, '_status_original', None)
+    valor_anterior = getattr(instance, '_total_itens_original', None)
+    if status_anterior != instance.status or valor_anterior != instance.total_itens:
+        rollups.registrar_orcamento(
+            instance, status_anterior=status_anterior, valor_anterior=valor_anterior
+        )
+
+
+@receiver(post_save, sender=Orcamento)
+def registrar_historico_status(sender, instance, created, **kwargs):
+    """Acrescenta a transição ao histórico (mesma transação do save)."""
+    from ads import historico_status
+
+    historico_status.registrar(
+        instance, getattr(instance, '_status_original', None), criado=created
+    )
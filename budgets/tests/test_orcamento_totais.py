@@ -0,0 +1,101 @@
+"""
+Testes dos totais desnormalizados do orçamento.
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ads.models import Necessidade
+from budgets.models import Orcamento, OrcamentoItem
+from categories.models import Categoria, SubCategoria
+from users.models import User
+
+
+class OrcamentoTotaisTest(TestCase):
+    """Totais gravados no orçamento acompanham os itens."""
+
+    def setUp(self):
+        cliente = User.objects.create_user(
+            email='cliente@exemplo.com', password='senha123',
+            first_name='Cliente', last_name='Teste', is_client=True
+        )
+        fornecedor = User.objects.create_user(
+            email='fornecedor@exemplo.com', password='senha123',
+            first_name='Fornecedor', last_name='Teste', is_supplier=True
+        )
+        categoria = Categoria.objects.create(nome='Construção')
+        subcategoria = SubCategoria.objects.create(nome='Alvenaria', categoria=categoria)
+        anuncio = Necessidade.objects.create(
+            titulo='Muro', descricao='Construir muro', cliente=cliente,
+            categoria=categoria, subcategoria=subcategoria, quantidade=1, unidade='un'
+        )
+        self.orcamento = Orcamento.objects.create(
+            fornecedor=fornecedor, anuncio=anuncio,
+            prazo_validade=timezone.now().date() + timedelta(days=10),
+            prazo_entrega=timezone.now().date() + timedelta(days=20),
+            valor_frete=Decimal('15.00'),
+        )
+        self.material = OrcamentoItem.objects.create(
+            orcamento=self.orcamento, tipo=OrcamentoItem.MATERIAL, descricao='Tijolo',
+            quantidade=Decimal('100'), unidade='un', valor_unitario=Decimal('1.50'),
+            ncm='69041000', icms_percentual=Decimal('18'), ipi_percentual=Decimal('2'),
+        )
+        self.servico = OrcamentoItem.objects.create(
+            orcamento=self.orcamento, tipo=OrcamentoItem.SERVICO, descricao='Mão de obra',
+            quantidade=Decimal('1'), unidade='sv', valor_unitario=Decimal('200.00'),
+            cnae='4399103', aliquota_iss=Decimal('5'),
+        )
+
+    def _totais_python(self):
+        itens = list(self.orcamento.itens.all())
+        total_itens = sum(item.valor_unitario * item.quantidade for item in itens)
+        total_com_impostos = sum(item.total for item in itens)
+        return total_itens, total_com_impostos
+
+    def test_totais_gravados_ao_salvar_itens(self):
+        self.orcamento.refresh_from_db()
+        total_itens, total_com_impostos = self._totais_python()
+
+        self.assertEqual(self.orcamento.total_itens, Decimal('350.00'))
+        self.assertEqual(self.orcamento.valor_total(), total_itens)
+        self.assertEqual(self.orcamento.valor_total_com_impostos(), total_com_impostos)
+        self.assertEqual(self.orcamento.get_total_geral(), total_com_impostos + Decimal('15.00'))
+
+    def test_totais_recalculados_ao_remover_item(self):
+        self.servico.delete()
+        self.orcamento.refresh_from_db()
+        self.assertEqual(self.orcamento.total_itens, Decimal('150.00'))
+        self.assertEqual(self.orcamento.total_impostos, Decimal('30.00'))
+        self.assertEqual(self.orcamento.total_geral, Decimal('195.00'))
+
+    def test_frete_atualiza_total_geral(self):
+        self.orcamento.refresh_from_db()
+        self.orcamento.valor_frete = Decimal('0.00')
+        self.orcamento.save(update_fields=['valor_frete'])
+        self.orcamento.refresh_from_db()
+        self.assertEqual(self.orcamento.total_geral, Decimal('390.00'))
+
+    def test_comando_de_backfill(self):
+        Orcamento.objects.update(total_itens=0, total_impostos=0, total_geral=0)
+        call_command('recalcular_totais_orcamentos', stdout=open('/dev/null', 'w'))
+        self.orcamento.refresh_from_db()
+        self.assertEqual(self.orcamento.total_geral, Decimal('405.00'))
+
+    def test_filtro_da_api_por_valor(self):
+        client = APIClient()
+        client.force_authenticate(self.orcamento.fornecedor)
+        url = reverse('orcamento-list')
+
+        response = client.get(url, {'valor_min': '400', 'ordering': '-total_geral'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([o['id'] for o in response.data['results']], [self.orcamento.pk])
+        self.assertEqual(response.data['results'][0]['total_geral'], '405.00')
+
+        response = client.get(url, {'valor_max': '100'})
+        self.assertEqual(response.data['results'], [])
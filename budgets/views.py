@@ -16,6 +16,7 @@ import logging
 # Importar os novos decorators e validadores de permissão
 from core.decorators import supplier_required
 from core.permissions import PermissionValidator
+from core.state_machine import StateTransitionConflict
 from core.mixins import SupplierRequiredMixin, BudgetOwnerMixin
 
 logger = logging.getLogger(__name__)
@@ -118,6 +119,9 @@ class OrcamentoAceitarView(LoginRequiredMixin, View):
         try:
             orcamento.transition_to('aceito_pelo_cliente', user=request.user, budget=orcamento)
             logger.info(f"Orçamento {orcamento.id} aceito usando state machine")
+        except StateTransitionConflict as e:
+            # Outra requisição alterou o orçamento/anúncio ao mesmo tempo
+            return JsonResponse({'error': str(e)}, status=409)
         except Exception as e:
             logger.error(f"Erro ao aceitar orçamento usando state machine: {e}")
             # Fallback para método antigo
@@ -148,6 +152,9 @@ class OrcamentoFornecedorAceitarView(LoginRequiredMixin, View):
         try:
             orcamento.transition_to('confirmado', user=request.user)
             logger.info(f"Orçamento {orcamento.id} confirmado usando state machine")
+        except StateTransitionConflict as e:
+            # Outra requisição alterou o orçamento/anúncio ao mesmo tempo
+            return JsonResponse({'error': str(e)}, status=409)
         except Exception as e:
             logger.error(f"Erro ao confirmar orçamento usando state machine: {e}")
             # Fallback para método antigo
@@ -174,6 +181,9 @@ class OrcamentoRejeitarView(LoginRequiredMixin, View):
         try:
             orcamento.transition_to('rejeitado_pelo_cliente', user=request.user)
             logger.info(f"Orçamento {orcamento.id} rejeitado usando state machine")
+        except StateTransitionConflict as e:
+            # Outra requisição alterou o orçamento/anúncio ao mesmo tempo
+            return JsonResponse({'error': str(e)}, status=409)
         except Exception as e:
             logger.error(f"Erro ao rejeitar orçamento usando state machine: {e}")
             # Fallback para método antigo
@@ -190,7 +200,11 @@ class budgetListView(SupplierRequiredMixin, ListView):
 
     def get_queryset(self):
         # Filtra os orçamentos pelo fornecedor logado
-        queryset = Orcamento.objects.filter(fornecedor=self.request.user).order_by('-data_criacao')
+        queryset = (
+            Orcamento.objects.filter(fornecedor=self.request.user)
+            .select_related('anuncio__cliente__reputacao')
+            .order_by('-data_criacao')
+        )
 
         # Aplica filtro de descrição, se fornecido
         search_query = self.request.GET.get('search', None)
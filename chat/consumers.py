@@ -1,11 +1,16 @@
 # chat/consumers.py
 
+import asyncio
 import json
 import logging
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
 from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from .models import ChatRoom, ChatMessage
+from .realtime import PresenceRegistry, registrar_servidor
+from .write_behind import ChatWriteBehind
 from .serializers import ChatMessageSerializer
 import socketio
 
@@ -16,12 +21,97 @@ logger = logging.getLogger(__name__)
 
 class ChatNamespace(socketio.AsyncNamespace):
     """
-    Namespace para gerenciar conexões de chat em tempo real
+    Namespace para gerenciar conexões de chat em tempo real.
+
+    Não guarda estado entre conexões no processo: o usuário de cada sid fica
+    na sessão do Socket.IO e a presença no PresenceRegistry (compartilhado),
+    então qualquer worker atende uma reconexão sem sticky session.
+
+    A sessão da conexão é carregada uma vez no connect (id/nome do usuário e
+    o outro participante de cada chat) e as salas `chat_<id>` em que o socket
+    está são o conjunto de chats autorizados. Eventos de digitação e o envio
+    de mensagens não consultam o banco; desativar/remover um chat fecha a sala
+    em todos os workers (chat.realtime.revogar_sala).
+
+    Mensagens recebem uma sequência por sala e são transmitidas antes de
+    gravadas (chat.write_behind); `message_saved` confirma a gravação.
     """
     
-    def __init__(self, namespace=None):
+    def __init__(self, namespace=None, presence=None, write_behind=None):
         super().__init__(namespace)
-        self.user_rooms = {}  # Mapeia session_id -> user_id
+        self.presence = presence or PresenceRegistry()
+        self.write_behind = write_behind or ChatWriteBehind(ao_persistir=self._emitir_confirmacoes)
+        self._tarefas_iniciadas = False
+        
+    async def _get_session(self, sid):
+        """Contexto da conexão: user_id, nome, email e chats {chat_id: outro_user_id}"""
+        try:
+            return await self.get_session(sid)
+        except KeyError:
+            return {}
+    
+    async def _get_user_id(self, sid):
+        """Usuário autenticado da conexão (sessão do Socket.IO)"""
+        return (await self._get_session(sid)).get('user_id')
+    
+    async def _autorizar_chat(self, sid, session, chat_id):
+        """
+        Retorna o id do outro participante se a conexão pode usar o chat.
+        Caminho quente só em memória (sala do socket); o banco é consultado
+        apenas para chats que ainda não estão na sessão (ex.: criados depois
+        do connect) e o resultado é guardado na sessão.
+        """
+        try:
+            chat_id = int(chat_id)
+        except (TypeError, ValueError):
+            return None
+        chats = session.get('chats', {})
+        if chat_id in chats and f"chat_{chat_id}" in self.rooms(sid):
+            return chats[chat_id]
+        
+        user_id = session.get('user_id')
+        try:
+            chat_room = await ChatRoom.objects.aget(id=chat_id, ativo=True)
+        except ChatRoom.DoesNotExist:
+            return None
+        if user_id not in (chat_room.cliente_id, chat_room.fornecedor_id):
+            return None
+        
+        outro_id = chat_room.fornecedor_id if user_id == chat_room.cliente_id else chat_room.cliente_id
+        chats[chat_id] = outro_id
+        session['chats'] = chats
+        await self.save_session(sid, session)
+        await self.enter_room(sid, f"chat_{chat_id}")
+        return outro_id
+    
+    def _iniciar_tarefas_de_fundo(self):
+        if not self._tarefas_iniciadas:
+            self._tarefas_iniciadas = True
+            registrar_servidor(self.server, asyncio.get_running_loop())
+            self.server.start_background_task(self.presence.loop_heartbeat)
+            if self.write_behind.ativo:
+                self.server.start_background_task(self.write_behind.loop_flush)
+    
+    async def _emitir_confirmacoes(self, mensagens):
+        """Ack durável: sequências gravadas no banco, agrupadas por sala"""
+        por_sala = {}
+        for mensagem in mensagens:
+            por_sala.setdefault(mensagem.chat_room_id, []).append({'seq': mensagem.seq, 'id': mensagem.id})
+        for chat_id, gravadas in por_sala.items():
+            await self.emit('message_saved', {
+                'chat_id': chat_id,
+                'mensagens': gravadas,
+            }, room=f"chat_{chat_id}")
+    
+    async def _emitir_presenca(self, sid, user_id, online):
+        """Avisa as salas de chat da conexão que o usuário entrou/saiu"""
+        for room in self.rooms(sid):
+            if room.startswith('chat_'):
+                await self.emit('presence', {
+                    'user_id': user_id,
+                    'online': online,
+                    'timestamp': self._get_timestamp()
+                }, room=room, skip_sid=sid)
         
     async def on_connect(self, sid, environ, auth):
         """Usuário conectou ao WebSocket"""
@@ -32,15 +122,25 @@ class ChatNamespace(socketio.AsyncNamespace):
                 logger.warning(f"Conexão rejeitada - usuário não autenticado: {sid}")
                 return False
             
-            self.user_rooms[sid] = user.id
             logger.info(f"Usuário {user.email} conectado: {sid}")
             
-            # Entrar nas salas de chat do usuário
-            await self._join_user_chat_rooms(sid, user)
+            # Entrar nas salas de chat do usuário e guardar o contexto da conexão
+            chats = await self._join_user_chat_rooms(sid, user)
+            await self.save_session(sid, {
+                'user_id': user.id,
+                'nome': user.get_full_name(),
+                'email': user.email,
+                'chats': chats,
+            })
             
             # Entrar na sala pessoal do usuário para receber notificações
             await self.enter_room(sid, f"user_{user.id}")
             
+            self._iniciar_tarefas_de_fundo()
+            primeira_conexao = await self.presence.registrar(sid, user.id)
+            if primeira_conexao:
+                await self._emitir_presenca(sid, user.id, True)
+            
             return True
             
         except Exception as e:
@@ -49,45 +149,38 @@ class ChatNamespace(socketio.AsyncNamespace):
     
     async def on_disconnect(self, sid):
         """Usuário desconectou"""
-        user_id = self.user_rooms.get(sid)
+        try:
+            user_id, ficou_offline = await self.presence.remover(sid)
+        except Exception as e:
+            logger.error(f"Erro ao remover presença de {sid}: {e}")
+            return
         if user_id:
-            try:
-                user = await User.objects.aget(id=user_id)
-                logger.info(f"Usuário {user.email} desconectado: {sid}")
-            except User.DoesNotExist:
-                pass
-            del self.user_rooms[sid]
+            logger.info(f"Usuário {user_id} desconectado: {sid}")
+            if ficou_offline:
+                await self._emitir_presenca(sid, user_id, False)
     
     async def on_join_chat(self, sid, data):
         """Usuário entrou em uma sala de chat específica"""
         try:
             chat_id = data.get('chat_id')
-            user_id = self.user_rooms.get(sid)
+            session = await self._get_session(sid)
             
-            if not user_id or not chat_id:
+            if not session.get('user_id') or not chat_id:
                 return
             
-            # Verificar permissões
-            user = await User.objects.aget(id=user_id)
-            chat_room = await ChatRoom.objects.select_related(
-                'cliente', 'fornecedor'
-            ).aget(id=chat_id, ativo=True)
-            
-            if user not in [chat_room.cliente, chat_room.fornecedor]:
+            # Verificar permissões (entra na sala se autorizado)
+            if await self._autorizar_chat(sid, session, chat_id) is None:
                 await self.emit('error', {
                     'message': 'Permissão negada para acessar este chat'
                 }, room=sid)
                 return
             
-            # Entrar na sala
             room_name = f"chat_{chat_id}"
-            await self.enter_room(sid, room_name)
-            
-            logger.info(f"Usuário {user.email} entrou no chat {chat_id}")
+            logger.info(f"Usuário {session['email']} entrou no chat {chat_id}")
             
             # Notificar entrada na sala
             await self.emit('user_joined', {
-                'user': user.get_full_name(),
+                'user': session['nome'],
                 'timestamp': self._get_timestamp()
             }, room=room_name, skip_sid=sid)
             
@@ -107,14 +200,13 @@ class ChatNamespace(socketio.AsyncNamespace):
             room_name = f"chat_{chat_id}"
             await self.leave_room(sid, room_name)
             
-            user_id = self.user_rooms.get(sid)
-            if user_id:
-                user = await User.objects.aget(id=user_id)
-                logger.info(f"Usuário {user.email} saiu do chat {chat_id}")
+            session = await self._get_session(sid)
+            if session.get('user_id'):
+                logger.info(f"Usuário {session['email']} saiu do chat {chat_id}")
                 
                 # Notificar saída da sala
                 await self.emit('user_left', {
-                    'user': user.get_full_name(),
+                    'user': session['nome'],
                     'timestamp': self._get_timestamp()
                 }, room=room_name)
                 
@@ -124,7 +216,8 @@ class ChatNamespace(socketio.AsyncNamespace):
     async def on_send_message(self, sid, data):
         """Enviar nova mensagem"""
         try:
-            user_id = self.user_rooms.get(sid)
+            session = await self._get_session(sid)
+            user_id = session.get('user_id')
             if not user_id:
                 return
             
@@ -137,55 +230,63 @@ class ChatNamespace(socketio.AsyncNamespace):
                 }, room=sid)
                 return
             
-            # Verificar permissões e criar mensagem
-            user = await User.objects.aget(id=user_id)
-            chat_room = await ChatRoom.objects.select_related(
-                'cliente', 'fornecedor'
-            ).aget(id=chat_id, ativo=True)
-            
-            if user not in [chat_room.cliente, chat_room.fornecedor]:
+            # Verificar permissões (sessão da conexão) e criar mensagem
+            destinatario_id = await self._autorizar_chat(sid, session, chat_id)
+            if destinatario_id is None:
                 await self.emit('error', {
                     'message': 'Permissão negada'
                 }, room=sid)
                 return
             
-            # Criar mensagem
-            mensagem = await ChatMessage.objects.acreate(
-                chat_room=chat_room,
-                remetente=user,
-                conteudo=conteudo
-            )
-            
-            # Serializar mensagem
+            chat_id = int(chat_id)
+            if self.write_behind.ativo:
+                # Sequência + journal no Redis; gravação no banco em lote depois do broadcast
+                payload = await self.write_behind.enfileirar(chat_id, user_id, conteudo)
+                mensagem_id, seq = None, payload['seq']
+                data_envio = timezone.localtime(parse_datetime(payload['data_envio']))
+            else:
+                mensagem = await ChatMessage.objects.acreate(
+                    chat_room_id=chat_id,
+                    remetente_id=user_id,
+                    conteudo=conteudo
+                )
+                mensagem_id, seq = mensagem.id, mensagem.seq
+                data_envio = timezone.localtime(mensagem.data_envio)
+            
+            # Serializar mensagem (id fica disponível no message_saved quando gravada depois)
             message_data = {
-                'id': mensagem.id,
-                'conteudo': mensagem.conteudo,
-                'remetente': mensagem.remetente.get_full_name(),
-                'remetente_id': mensagem.remetente.id,
-                'data_envio': mensagem.data_envio.strftime('%d/%m/%Y %H:%M'),
+                'id': mensagem_id,
+                'seq': seq,
+                'chat_id': chat_id,
+                'conteudo': conteudo,
+                'remetente': session['nome'],
+                'remetente_id': user_id,
+                'data_envio': data_envio.strftime('%d/%m/%Y %H:%M'),
                 'timestamp': self._get_timestamp()
             }
             
             # Enviar para todos na sala
             room_name = f"chat_{chat_id}"
             await self.emit('new_message', message_data, room=room_name)
-            
-            # Enviar notificação de nova mensagem para usuários conectados
-            destinatario = chat_room.fornecedor if user == chat_room.cliente else chat_room.cliente
+            if mensagem_id is not None:
+                await self.emit('message_saved', {
+                    'chat_id': chat_id,
+                    'mensagens': [{'seq': seq, 'id': mensagem_id}],
+                }, room=room_name)
             
             # Emitir para a sala pessoal do destinatário
             await self.emit('new_notification', {
                 'type': 'chat_message',
-                'from_user': user.get_full_name(),
+                'from_user': session['nome'],
                 'chat_id': chat_id,
                 'message_preview': conteudo[:50] + "..." if len(conteudo) > 50 else conteudo,
                 'timestamp': self._get_timestamp()
-            }, room=f"user_{destinatario.id}")
+            }, room=f"user_{destinatario_id}")
             
-            # Log para debug
-            logger.info(f"Notificação enviada para sala user_{destinatario.id} - {destinatario.email}")
+            logger.debug(f"Nova mensagem enviada no chat {chat_id} por {session['email']}")
             
-            logger.info(f"Nova mensagem enviada no chat {chat_id} por {user.email}")
+            # Ack do envio (ordem garantida pela sequência da sala)
+            return {'status': 'accepted', 'chat_id': chat_id, 'seq': seq}
             
         except Exception as e:
             logger.error(f"Erro ao enviar mensagem: {e}")
@@ -196,18 +297,20 @@ class ChatNamespace(socketio.AsyncNamespace):
     async def on_typing_start(self, sid, data):
         """Usuário começou a digitar"""
         try:
-            user_id = self.user_rooms.get(sid)
+            session = await self._get_session(sid)
             chat_id = data.get('chat_id')
             
-            if not user_id or not chat_id:
+            if not session.get('user_id') or not chat_id:
                 return
             
-            user = await User.objects.aget(id=user_id)
+            # Só em memória: o socket precisa estar na sala do chat
             room_name = f"chat_{chat_id}"
+            if room_name not in self.rooms(sid):
+                return
             
             await self.emit('user_typing', {
-                'user': user.get_full_name(),
-                'user_id': user.id,
+                'user': session['nome'],
+                'user_id': session['user_id'],
                 'is_typing': True
             }, room=room_name, skip_sid=sid)
             
@@ -217,18 +320,20 @@ class ChatNamespace(socketio.AsyncNamespace):
     async def on_typing_stop(self, sid, data):
         """Usuário parou de digitar"""
         try:
-            user_id = self.user_rooms.get(sid)
+            session = await self._get_session(sid)
             chat_id = data.get('chat_id')
             
-            if not user_id or not chat_id:
+            if not session.get('user_id') or not chat_id:
                 return
             
-            user = await User.objects.aget(id=user_id)
+            # Só em memória: o socket precisa estar na sala do chat
             room_name = f"chat_{chat_id}"
+            if room_name not in self.rooms(sid):
+                return
             
             await self.emit('user_typing', {
-                'user': user.get_full_name(),
-                'user_id': user.id,
+                'user': session['nome'],
+                'user_id': session['user_id'],
                 'is_typing': False
             }, room=room_name, skip_sid=sid)
             
@@ -238,7 +343,7 @@ class ChatNamespace(socketio.AsyncNamespace):
     async def on_join_user_room(self, sid, data):
         """Usuário entra na sala pessoal para receber notificações"""
         try:
-            user_id = self.user_rooms.get(sid)
+            user_id = await self._get_user_id(sid)
             if not user_id:
                 return
             
@@ -257,6 +362,23 @@ class ChatNamespace(socketio.AsyncNamespace):
         except Exception as e:
             logger.error(f"Erro ao entrar na sala de notificações: {e}")
     
+    async def on_get_presence(self, sid, data):
+        """Status online do outro participante de um chat (resposta via ack)"""
+        try:
+            chat_id = data.get('chat_id')
+            session = await self._get_session(sid)
+            if not session.get('user_id') or not chat_id:
+                return None
+            
+            outro_id = await self._autorizar_chat(sid, session, chat_id)
+            if outro_id is None:
+                return None
+            return {'user_id': outro_id, 'online': await self.presence.esta_online(outro_id)}
+            
+        except Exception as e:
+            logger.error(f"Erro ao consultar presença: {e}")
+            return None
+    
     async def _get_user_from_environ(self, environ):
         """Extrair usuário autenticado do environ"""
         try:
@@ -280,20 +402,25 @@ class ChatNamespace(socketio.AsyncNamespace):
             return None
     
     async def _join_user_chat_rooms(self, sid, user):
-        """Entrar automaticamente nos chats do usuário"""
+        """
+        Entrar automaticamente nos chats do usuário.
+        Retorna {chat_id: id do outro participante} para a sessão da conexão.
+        """
+        chats = {}
         try:
             # Buscar chats ativos do usuário
-            chats = ChatRoom.objects.filter(
+            salas = ChatRoom.objects.filter(
                 Q(cliente=user) | Q(fornecedor=user),
                 ativo=True
-            )
+            ).values_list('id', 'cliente_id', 'fornecedor_id')
             
-            async for chat in chats:
-                room_name = f"chat_{chat.id}"
-                await self.enter_room(sid, room_name)
+            async for chat_id, cliente_id, fornecedor_id in salas:
+                chats[chat_id] = fornecedor_id if user.id == cliente_id else cliente_id
+                await self.enter_room(sid, f"chat_{chat_id}")
                 
         except Exception as e:
             logger.error(f"Erro ao entrar nas salas do usuário: {e}")
+        return chats
     
     def _get_timestamp(self):
         """Retorna timestamp atual"""
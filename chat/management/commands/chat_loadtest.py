@@ -0,0 +1,217 @@
+import asyncio
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+import socketio
+
+from chat.models import ChatMessage, ChatRoom
+
+
+class Command(BaseCommand):
+    help = (
+        "Teste de carga do chat: conecta N clientes distribuídos entre os workers "
+        "informados e mede a latência de fan-out de mensagens enviadas em um deles "
+        "(ou, com --modo digitacao, a vazão de eventos de digitação por segundo)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--urls',
+            nargs='+',
+            default=['http://localhost:8000'],
+            help='URL base de cada worker ASGI (ex.: http://chat1:8000 http://chat2:8000)',
+        )
+        parser.add_argument('--chat-id', type=int, required=True, help='ChatRoom usado no teste')
+        parser.add_argument(
+            '--modo',
+            choices=['mensagens', 'digitacao'],
+            default='mensagens',
+            help='mensagens: latência de fan-out; digitacao: eventos/s de typing (padrão: mensagens)',
+        )
+        parser.add_argument(
+            '--duracao', type=float, default=10.0,
+            help='Segundos de envio contínuo no modo digitacao (padrão: 10)',
+        )
+        parser.add_argument('--conexoes', type=int, default=50, help='Clientes receptores (padrão: 50)')
+        parser.add_argument('--mensagens', type=int, default=50, help='Mensagens enviadas (padrão: 50)')
+        parser.add_argument(
+            '--intervalo', type=float, default=0.05,
+            help='Segundos entre mensagens enviadas (padrão: 0.05)',
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=10.0,
+            help='Segundos de espera pelas últimas entregas (padrão: 10)',
+        )
+        parser.add_argument(
+            '--escalonar',
+            action='store_true',
+            help='Repete o teste com 1, 2, ..., N workers e compara as latências',
+        )
+        parser.add_argument(
+            '--limpar',
+            action='store_true',
+            help='Remove as mensagens geradas pelo teste ao final',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            chat_room = ChatRoom.objects.get(id=options['chat_id'], ativo=True)
+        except ChatRoom.DoesNotExist:
+            raise CommandError(f"ChatRoom {options['chat_id']} não encontrado ou inativo")
+
+        urls = options['urls']
+        cenarios = range(1, len(urls) + 1) if options['escalonar'] else [len(urls)]
+        marcador = f"loadtest:{uuid.uuid4().hex[:8]}"
+
+        if options['modo'] == 'digitacao':
+            self.stdout.write(f"{'workers':>7} {'conexões':>9} {'enviados/s':>11} {'processados/s':>14}")
+            for quantidade in cenarios:
+                enviados, processados = asyncio.run(self._executar_digitacao(chat_room, urls[:quantidade], options))
+                self.stdout.write(
+                    f"{quantidade:>7} {options['conexoes']:>9} {enviados:>11.0f} {processados:>14.0f}"
+                )
+            return
+
+        self.stdout.write(
+            f"{'workers':>7} {'conexões':>9} {'entregues':>12} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'máx ms':>8}"
+        )
+        try:
+            for quantidade in cenarios:
+                resultado = asyncio.run(self._executar(chat_room, urls[:quantidade], marcador, options))
+                self.stdout.write(self._formatar(quantidade, options['conexoes'], resultado))
+        finally:
+            if options['limpar']:
+                removidas, _ = ChatMessage.objects.filter(
+                    chat_room=chat_room, conteudo__startswith=marcador
+                ).delete()
+                self.stdout.write(f"{removidas} mensagens de teste removidas.")
+
+    async def _executar(self, chat_room, urls, marcador, options):
+        enviadas = {}
+        latencias = []
+        esperadas = options['conexoes'] * options['mensagens']
+        todas_entregues = asyncio.Event()
+
+        def receptor():
+            cliente = socketio.AsyncClient(reconnection=False)
+
+            @cliente.on('new_message', namespace='/chat')
+            async def on_new_message(data):
+                conteudo = data.get('conteudo', '')
+                if not conteudo.startswith(marcador):
+                    return
+                inicio = enviadas.get(conteudo)
+                if inicio is not None:
+                    latencias.append((time.perf_counter() - inicio) * 1000)
+                    if len(latencias) >= esperadas:
+                        todas_entregues.set()
+
+            return cliente
+
+        receptores = [receptor() for _ in range(options['conexoes'])]
+        remetente = socketio.AsyncClient(reconnection=False)
+        try:
+            # Receptores distribuídos entre os workers; remetente sempre no primeiro
+            await asyncio.gather(*(
+                self._conectar(cliente, urls[i % len(urls)], chat_room.cliente_id)
+                for i, cliente in enumerate(receptores)
+            ))
+            await self._conectar(remetente, urls[0], chat_room.fornecedor_id)
+
+            for seq in range(options['mensagens']):
+                conteudo = f"{marcador}:{seq}"
+                enviadas[conteudo] = time.perf_counter()
+                await remetente.emit('send_message', {
+                    'chat_id': chat_room.id, 'conteudo': conteudo,
+                }, namespace='/chat')
+                await asyncio.sleep(options['intervalo'])
+
+            try:
+                await asyncio.wait_for(todas_entregues.wait(), options['timeout'])
+            except asyncio.TimeoutError:
+                pass
+        finally:
+            await asyncio.gather(
+                *(cliente.disconnect() for cliente in receptores + [remetente]),
+                return_exceptions=True,
+            )
+
+        return {'esperadas': esperadas, 'latencias': sorted(latencias)}
+
+    async def _executar_digitacao(self, chat_room, urls, options):
+        """
+        Cada conexão do fornecedor dispara typing_start/typing_stop sem pausa;
+        um cliente conectado ao primeiro worker conta os user_typing recebidos
+        até a fila drenar, o que dá a vazão de eventos processados pelo servidor.
+        """
+        recebidos = 0
+
+        observador = socketio.AsyncClient(reconnection=False)
+
+        @observador.on('user_typing', namespace='/chat')
+        async def on_user_typing(data):
+            nonlocal recebidos
+            recebidos += 1
+
+        emissores = [socketio.AsyncClient(reconnection=False) for _ in range(options['conexoes'])]
+        enviados = 0
+        try:
+            await self._conectar(observador, urls[0], chat_room.cliente_id)
+            await observador.emit('join_chat', {'chat_id': chat_room.id}, namespace='/chat')
+            await asyncio.gather(*(
+                self._conectar(cliente, urls[i % len(urls)], chat_room.fornecedor_id)
+                for i, cliente in enumerate(emissores)
+            ))
+
+            inicio = time.perf_counter()
+            fim = inicio + options['duracao']
+
+            async def disparar(cliente):
+                nonlocal enviados
+                evento = 'typing_start'
+                while time.perf_counter() < fim:
+                    await cliente.emit(evento, {'chat_id': chat_room.id}, namespace='/chat')
+                    enviados += 1
+                    evento = 'typing_stop' if evento == 'typing_start' else 'typing_start'
+                    await asyncio.sleep(0)
+
+            await asyncio.gather(*(disparar(cliente) for cliente in emissores))
+
+            # Aguarda o servidor drenar a fila de eventos pendentes
+            anterior = -1
+            while recebidos != anterior:
+                anterior = recebidos
+                await asyncio.sleep(0.5)
+            duracao = time.perf_counter() - inicio - 0.5
+        finally:
+            await asyncio.gather(
+                *(cliente.disconnect() for cliente in emissores + [observador]),
+                return_exceptions=True,
+            )
+        return enviados / options['duracao'], recebidos / duracao
+
+    async def _conectar(self, cliente, url, user_id):
+        await cliente.connect(
+            f"{url}?user_id={user_id}",
+            transports=['websocket'],
+            namespaces=['/chat'],
+            socketio_path='ws/socket.io',
+        )
+
+    def _formatar(self, workers, conexoes, resultado):
+        latencias = resultado['latencias']
+        entregues = f"{len(latencias)}/{resultado['esperadas']}"
+        if not latencias:
+            return f"{workers:>7} {conexoes:>9} {entregues:>12} {'-':>8} {'-':>8} {'-':>8} {'-':>8}"
+
+        def percentil(p):
+            return latencias[min(len(latencias) - 1, int(len(latencias) * p))]
+
+        return (
+            f"{workers:>7} {conexoes:>9} {entregues:>12} "
+            f"{statistics.median(latencias):>8.1f} {percentil(0.95):>8.1f} "
+            f"{percentil(0.99):>8.1f} {latencias[-1]:>8.1f}"
+        )
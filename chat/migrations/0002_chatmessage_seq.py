@@ -0,0 +1,51 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+PREENCHER_SEQ = """
+UPDATE chat_chatmessage m
+SET seq = numeradas.seq
+FROM (
+    SELECT id, ROW_NUMBER() OVER (PARTITION BY chat_room_id ORDER BY data_envio, id) AS seq
+    FROM chat_chatmessage
+) numeradas
+WHERE m.id = numeradas.id;
+
+UPDATE chat_chatroom r
+SET ultimo_seq = COALESCE((SELECT MAX(seq) FROM chat_chatmessage m WHERE m.chat_room_id = r.id), 0);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatroom',
+            name='ultimo_seq',
+            field=models.PositiveBigIntegerField(default=0, editable=False, help_text='Última sequência alocada pelo banco (sem Redis configurado)'),
+        ),
+        migrations.AddField(
+            model_name='chatmessage',
+            name='seq',
+            field=models.PositiveBigIntegerField(editable=False, null=True, verbose_name='Sequência'),
+        ),
+        migrations.RunSQL(PREENCHER_SEQ, migrations.RunSQL.noop),
+        migrations.AlterField(
+            model_name='chatmessage',
+            name='seq',
+            field=models.PositiveBigIntegerField(editable=False, verbose_name='Sequência'),
+        ),
+        migrations.AlterField(
+            model_name='chatmessage',
+            name='data_envio',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddConstraint(
+            model_name='chatmessage',
+            constraint=models.UniqueConstraint(fields=('chat_room', 'seq'), name='chat_mensagem_sala_seq_unica'),
+        ),
+    ]
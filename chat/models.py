@@ -37,6 +37,11 @@ class ChatRoom(models.Model):
     )
     criado_em = models.DateTimeField(auto_now_add=True)
     ativo = models.BooleanField(default=True)
+    ultimo_seq = models.PositiveBigIntegerField(
+        default=0,
+        editable=False,
+        help_text='Última sequência alocada pelo banco (sem Redis configurado)'
+    )
     
     class Meta:
         unique_together = ['necessidade', 'cliente', 'fornecedor']
@@ -72,7 +77,10 @@ class ChatMessage(models.Model):
         verbose_name='Remetente'
     )
     conteudo = models.TextField(verbose_name='Conteúdo')
-    data_envio = models.DateTimeField(auto_now_add=True)
+    # Sequência monotônica por sala, atribuída pelo servidor antes do broadcast
+    seq = models.PositiveBigIntegerField('Sequência', editable=False)
+    # Definida no envio (e não no INSERT): a gravação pode ser adiada (write-behind)
+    data_envio = models.DateTimeField(default=timezone.now, editable=False)
     lida = models.BooleanField(default=False)
     editada = models.BooleanField(default=False)
     data_edicao = models.DateTimeField(null=True, blank=True)
@@ -98,10 +106,21 @@ class ChatMessage(models.Model):
         ordering = ['data_envio']
         verbose_name = 'Mensagem'
         verbose_name_plural = 'Mensagens'
+        constraints = [
+            models.UniqueConstraint(fields=['chat_room', 'seq'], name='chat_mensagem_sala_seq_unica'),
+        ]
     
     def __str__(self):
         return f"{self.remetente.get_full_name()}: {self.conteudo[:50]}..."
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Estado carregado do banco, usado para manter o contador de não lidas
+        if 'lida' in field_names:
+            instance._lida_original = instance.lida
+        return instance
+
     def marcar_como_lida(self):
         """Marca a mensagem como lida"""
         if not self.lida:
@@ -119,4 +138,9 @@ class ChatMessage(models.Model):
             else:
                 self.tipo_arquivo = 'outros'
         
-        super().save(*args, **kwargs)
\ No newline at end of file
+        if self.seq is None:
+            from .write_behind import alocar_seq
+            self.seq = alocar_seq(self.chat_room_id)
+        
+        super().save(*args, **kwargs)
+        self._lida_original = self.lida
\ No newline at end of file
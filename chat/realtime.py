@@ -0,0 +1,257 @@
+# chat/realtime.py
+"""
+Infraestrutura do Socket.IO para vários workers ASGI.
+
+- Client manager Redis (SOCKETIO_MESSAGE_QUEUE): um emit feito em qualquer
+  worker é publicado no canal e entregue pelos workers que têm os sockets.
+- PresenceRegistry: registro compartilhado de conexões (sid -> usuário) e de
+  usuários online, com heartbeat por nó para limpar conexões de workers que
+  morreram sem executar on_disconnect.
+- emitir: emit feito por código síncrono (signals, tasks, notificações).
+- revogar_sala: fecha a sala de um chat desativado em todos os workers,
+  invalidando a autorização guardada nas conexões abertas.
+- Sem fila configurada, tudo funciona em memória (um único processo).
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import uuid
+
+from django.conf import settings
+import socketio
+
+logger = logging.getLogger(__name__)
+
+
+def criar_client_manager():
+    """Manager para emits entre processos, ou None para o manager em memória."""
+    url = settings.SOCKETIO_MESSAGE_QUEUE
+    if not url:
+        return None
+    return socketio.AsyncRedisManager(url, channel=settings.SOCKETIO_CHANNEL)
+
+
+_emissor_externo = None
+
+
+def emissor_externo():
+    """
+    Emissor write-only para código síncrono fora do servidor ASGI (views WSGI,
+    tasks Celery). Retorna None quando não há fila configurada.
+    """
+    global _emissor_externo
+    if _emissor_externo is None and settings.SOCKETIO_MESSAGE_QUEUE:
+        _emissor_externo = socketio.RedisManager(
+            settings.SOCKETIO_MESSAGE_QUEUE, channel=settings.SOCKETIO_CHANNEL, write_only=True
+        )
+    return _emissor_externo
+
+
+_servidor_local = None
+
+
+def registrar_servidor(servidor, loop):
+    """Servidor Socket.IO deste processo (usado para revogar salas sem fila Redis)."""
+    global _servidor_local
+    _servidor_local = (servidor, loop)
+
+
+def emitir(evento, dados, room, namespace='/chat'):
+    """Emit a partir de código síncrono (signals, tasks) para uma sala, em qualquer worker."""
+    emissor = emissor_externo()
+    try:
+        if emissor is not None:
+            emissor.emit(evento, dados, room=room, namespace=namespace)
+        elif _servidor_local is not None:
+            servidor, loop = _servidor_local
+            if loop.is_running():
+                asyncio.run_coroutine_threadsafe(
+                    servidor.emit(evento, dados, room=room, namespace=namespace), loop
+                )
+    except Exception as e:
+        logger.error(f"Erro ao emitir '{evento}' para {room}: {e}")
+
+
+def revogar_sala(chat_id):
+    """
+    Fecha a sala `chat_<id>` em todos os workers: os sockets deixam de estar
+    autorizados no chat e a próxima ação nele volta a ser validada no banco.
+    Chamado de código síncrono (signals).
+    """
+    room = f"chat_{chat_id}"
+    emissor = emissor_externo()
+    try:
+        if emissor is not None:
+            emissor.emit('chat_closed', {'chat_id': chat_id}, room=room, namespace='/chat')
+            emissor.close_room(room, namespace='/chat')
+        elif _servidor_local is not None:
+            servidor, loop = _servidor_local
+            if loop.is_running():
+                asyncio.run_coroutine_threadsafe(servidor.close_room(room, namespace='/chat'), loop)
+    except Exception as e:
+        logger.error(f"Erro ao revogar sala {room}: {e}")
+
+
+class PresenceRegistry:
+    """
+    Registro de presença compartilhado entre os workers de chat.
+
+    Chaves Redis (prefixo `chat:presence`):
+        sids               hash  sid -> user_id
+        user:<id>          set   sids abertos do usuário
+        nodes              set   nós registrados
+        node:<nó>          set   sids abertos no nó
+        node:<nó>:alive    str   heartbeat do nó (expira em PRESENCE_NODE_TTL)
+    """
+
+    PREFIXO = 'chat:presence'
+
+    def __init__(self, url=None, node_id=None):
+        self.url = url if url is not None else settings.SOCKETIO_MESSAGE_QUEUE
+        self.node_id = node_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.ttl_no = settings.SOCKETIO_PRESENCE_NODE_TTL
+        self._redis = None
+        # Fallback em memória (processo único)
+        self._sids = {}
+        self._por_usuario = {}
+
+    def _chave(self, *partes):
+        return ':'.join((self.PREFIXO,) + tuple(str(p) for p in partes))
+
+    def _cliente(self):
+        if not self.url:
+            return None
+        if self._redis is None:
+            import redis.asyncio as aioredis
+            self._redis = aioredis.from_url(self.url, decode_responses=True)
+        return self._redis
+
+    # ==================== CONEXÕES ====================
+
+    async def registrar(self, sid, user_id):
+        """Registra a conexão. Retorna True se é a primeira conexão do usuário."""
+        redis = self._cliente()
+        if redis is None:
+            self._sids[sid] = user_id
+            sids = self._por_usuario.setdefault(user_id, set())
+            sids.add(sid)
+            return len(sids) == 1
+
+        pipe = redis.pipeline()
+        pipe.hset(self._chave('sids'), sid, user_id)
+        pipe.sadd(self._chave('user', user_id), sid)
+        pipe.sadd(self._chave('node', self.node_id), sid)
+        pipe.sadd(self._chave('nodes'), self.node_id)
+        pipe.set(self._chave('node', self.node_id, 'alive'), 1, ex=self.ttl_no)
+        pipe.scard(self._chave('user', user_id))
+        resultado = await pipe.execute()
+        return resultado[-1] == 1
+
+    async def remover(self, sid):
+        """
+        Remove a conexão.
+
+        Returns:
+            (user_id, ficou_offline) ou (None, False) se o sid não era conhecido
+        """
+        redis = self._cliente()
+        if redis is None:
+            user_id = self._sids.pop(sid, None)
+            if user_id is None:
+                return None, False
+            sids = self._por_usuario.get(user_id, set())
+            sids.discard(sid)
+            if not sids:
+                self._por_usuario.pop(user_id, None)
+            return user_id, not sids
+
+        user_id = await redis.hget(self._chave('sids'), sid)
+        if user_id is None:
+            return None, False
+        user_id = int(user_id)
+        pipe = redis.pipeline()
+        pipe.hdel(self._chave('sids'), sid)
+        pipe.srem(self._chave('user', user_id), sid)
+        pipe.srem(self._chave('node', self.node_id), sid)
+        pipe.scard(self._chave('user', user_id))
+        resultado = await pipe.execute()
+        return user_id, resultado[-1] == 0
+
+    async def usuario_de(self, sid):
+        redis = self._cliente()
+        if redis is None:
+            return self._sids.get(sid)
+        user_id = await redis.hget(self._chave('sids'), sid)
+        return int(user_id) if user_id is not None else None
+
+    # ==================== PRESENÇA ====================
+
+    async def esta_online(self, user_id):
+        redis = self._cliente()
+        if redis is None:
+            return bool(self._por_usuario.get(user_id))
+        return await redis.scard(self._chave('user', user_id)) > 0
+
+    async def usuarios_online(self, user_ids):
+        """Subconjunto de user_ids com ao menos uma conexão aberta em qualquer nó."""
+        user_ids = list(user_ids)
+        redis = self._cliente()
+        if redis is None:
+            return {user_id for user_id in user_ids if self._por_usuario.get(user_id)}
+
+        pipe = redis.pipeline()
+        for user_id in user_ids:
+            pipe.scard(self._chave('user', user_id))
+        contagens = await pipe.execute()
+        return {user_id for user_id, total in zip(user_ids, contagens) if total}
+
+    # ==================== HEARTBEAT ====================
+
+    async def heartbeat(self):
+        """Renova o heartbeat deste nó e limpa conexões de nós mortos."""
+        redis = self._cliente()
+        if redis is None:
+            return
+        await redis.set(self._chave('node', self.node_id, 'alive'), 1, ex=self.ttl_no)
+        await redis.sadd(self._chave('nodes'), self.node_id)
+        await self.limpar_nos_mortos()
+
+    async def limpar_nos_mortos(self):
+        redis = self._cliente()
+        for node_id in await redis.smembers(self._chave('nodes')):
+            if await redis.exists(self._chave('node', node_id, 'alive')):
+                continue
+            sids = await redis.smembers(self._chave('node', node_id))
+            if sids:
+                user_ids = await redis.hmget(self._chave('sids'), list(sids))
+                pipe = redis.pipeline()
+                for sid, user_id in zip(sids, user_ids):
+                    if user_id is not None:
+                        pipe.srem(self._chave('user', user_id), sid)
+                pipe.hdel(self._chave('sids'), *sids)
+                await pipe.execute()
+            await redis.delete(self._chave('node', node_id))
+            await redis.srem(self._chave('nodes'), node_id)
+            logger.warning(f"Presença: removidas {len(sids)} conexões do nó inativo {node_id}")
+
+    async def loop_heartbeat(self):
+        """Tarefa de fundo do servidor Socket.IO (sio.start_background_task)."""
+        if self._cliente() is None:
+            return
+        intervalo = max(1, self.ttl_no // 3)
+        while True:
+            try:
+                await self.heartbeat()
+            except Exception as e:
+                logger.error(f"Erro no heartbeat de presença: {e}")
+            await asyncio.sleep(intervalo)
+
+    async def encerrar(self):
+        """Remove as conexões deste nó (shutdown limpo)."""
+        redis = self._cliente()
+        if redis is None:
+            return
+        await redis.delete(self._chave('node', self.node_id, 'alive'))
+        await self.limpar_nos_mortos()
@@ -1,8 +1,12 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
-from .models import ChatMessage
-from notifications.models import Notification, NotificationType
+from django.db import transaction
+from core.services.unread_counter_service import UnreadCounterService
+from .models import ChatMessage, ChatRoom
+from .realtime import revogar_sala
+from .sync import invalidar_sala, registrar_ultima_seq
+from notifications.fanout import notificar
 
 User = get_user_model()
 
@@ -26,18 +30,92 @@ def notificar_nova_mensagem_chat(sender, instance, created, **kwargs):
         # Truncar mensagem se for muito longa
         conteudo_resumido = instance.conteudo[:100] + "..." if len(instance.conteudo) > 100 else instance.conteudo
         
-        # Criar notificação
-        Notification.objects.create(
-            user=destinatario,
-            message=(
-                f"<strong>Nova Mensagem no Chat</strong><br>"
-                f"<strong>{remetente.get_full_name()}</strong> ({papel_remetente}) enviou: <br>"
-                f"<em>'{conteudo_resumido}'</em><br>"
-                f"<small>Anúncio: {chat_room.necessidade.titulo}</small>"
-            ),
-            notification_type=NotificationType.NEW_CHAT_MESSAGE,
-            necessidade=chat_room.necessidade
+        # Criar notificação (em lote quando as mensagens são gravadas pelo write-behind)
+        notificar(
+            [destinatario],
+            'mensagem_chat',
+            {
+                'remetente': remetente.get_full_name(),
+                'papel': papel_remetente,
+                'conteudo': conteudo_resumido,
+                'titulo': chat_room.necessidade.titulo,
+            },
+            necessidade=chat_room.necessidade,
         )
         
         # Opcional: Enviar email se usuário estiver offline por muito tempo
-        # Implementar lógica de email aqui se necessário 
\ No newline at end of file
+        # Implementar lógica de email aqui se necessário
+
+
+def _destinatario_id(mensagem):
+    chat_room = mensagem.chat_room
+    if mensagem.remetente_id == chat_room.cliente_id:
+        return chat_room.fornecedor_id
+    return chat_room.cliente_id
+
+
+@receiver(post_save, sender=ChatMessage)
+def atualizar_contador_mensagens(sender, instance, created, **kwargs):
+    """Mantém o badge de mensagens não lidas do destinatário sem recontar no banco."""
+    if not instance.chat_room.ativo:
+        return
+
+    if created:
+        nao_lida_antes = False
+    else:
+        lida_original = getattr(instance, '_lida_original', None)
+        if lida_original is None:
+            UnreadCounterService.invalidar([_destinatario_id(instance)], UnreadCounterService.MENSAGENS)
+            return
+        nao_lida_antes = not lida_original
+
+    delta = int(not instance.lida) - int(nao_lida_antes)
+    UnreadCounterService.incrementar_apos_commit(
+        _destinatario_id(instance), UnreadCounterService.MENSAGENS, delta
+    )
+
+
+@receiver(post_save, sender=ChatMessage)
+def registrar_seq_sincronizacao(sender, instance, created, **kwargs):
+    """Última sequência gravada da sala, usada pelo sync HTTP para responder 204 sem consultar o banco."""
+    if created:
+        chat_id, seq = instance.chat_room_id, instance.seq
+        transaction.on_commit(lambda: registrar_ultima_seq(chat_id, seq))
+
+
+@receiver(post_delete, sender=ChatMessage)
+def descontar_mensagem_removida(sender, instance, **kwargs):
+    if instance.lida:
+        return
+    try:
+        destinatario_id = _destinatario_id(instance)
+    except ChatRoom.DoesNotExist:
+        # Sala removida em cascata: contadores invalidados pelo receiver da sala
+        return
+    UnreadCounterService.incrementar_apos_commit(destinatario_id, UnreadCounterService.MENSAGENS, -1)
+
+
+@receiver(post_save, sender=ChatRoom)
+@receiver(post_delete, sender=ChatRoom)
+def invalidar_contadores_sala(sender, instance, created=False, **kwargs):
+    """Ativar/desativar ou remover a sala muda o que conta como não lida."""
+    if not created:
+        UnreadCounterService.invalidar([instance.cliente_id, instance.fornecedor_id], UnreadCounterService.MENSAGENS)
+
+
+@receiver(post_save, sender=ChatRoom)
+@receiver(post_delete, sender=ChatRoom)
+def invalidar_sala_sincronizacao(sender, instance, **kwargs):
+    """Participantes/estado da sala em cache do sync HTTP."""
+    chat_id = instance.id
+    transaction.on_commit(lambda: invalidar_sala(chat_id))
+
+
+@receiver(post_save, sender=ChatRoom)
+@receiver(post_delete, sender=ChatRoom)
+def revogar_sala_socket(sender, instance, created=False, **kwargs):
+    """Sala desativada/removida deixa de ser autorizada nas conexões abertas."""
+    if created or (kwargs.get('signal') is post_save and instance.ativo):
+        return
+    chat_id = instance.id
+    transaction.on_commit(lambda: revogar_sala(chat_id))
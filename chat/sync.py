@@ -0,0 +1,160 @@
+# chat/sync.py
+"""
+Sincronização incremental do chat por HTTP (fallback do WebSocket).
+
+- Cursor opaco: codifica a última sequência (`ChatMessage.seq`) que o cliente
+  já recebeu na sala.
+- Caminho quente sem banco: a última sequência persistida de cada sala e os
+  participantes ficam no cache; se nada mudou, a view responde 204/304 sem
+  consultar mensagens.
+- Lacunas: como a sequência é alocada antes do commit (e o write-behind grava
+  em lotes por worker), uma sequência menor pode ser gravada depois de uma
+  maior. O cursor só avança sobre uma lacuna quando ela é mais antiga que
+  CHAT_SYNC_JANELA_LACUNA; até lá as mensagens seguintes são reenviadas e o
+  cliente descarta as repetidas pela sequência.
+"""
+
+import binascii
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from .models import ChatMessage, ChatRoom
+from .utils import marcar_mensagens_como_lidas
+
+PREFIXO_CURSOR = 's'
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+# ==================== CURSOR ====================
+
+def codificar_cursor(seq):
+    return urlsafe_base64_encode(force_bytes(f"{PREFIXO_CURSOR}{int(seq)}"))
+
+
+def decodificar_cursor(cursor):
+    """Sequência contida no cursor (0 para cursor vazio)."""
+    if not cursor:
+        return 0
+    try:
+        valor = force_str(urlsafe_base64_decode(cursor))
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise CursorInvalido(cursor)
+    if not valor.startswith(PREFIXO_CURSOR) or not valor[len(PREFIXO_CURSOR):].isdigit():
+        raise CursorInvalido(cursor)
+    return int(valor[len(PREFIXO_CURSOR):])
+
+
+# ==================== CACHE ====================
+
+def _chave_seq(chat_id):
+    return f"chat:sync:seq:{chat_id}"
+
+
+def _chave_sala(chat_id):
+    return f"chat:sync:sala:{chat_id}"
+
+
+def registrar_ultima_seq(chat_id, seq):
+    """Atualiza a última sequência persistida da sala (chamado após o commit)."""
+    atual = cache.get(_chave_seq(chat_id))
+    if atual is None or seq > atual:
+        cache.set(_chave_seq(chat_id), seq, settings.CHAT_SYNC_CACHE_TTL)
+
+
+def invalidar_sala(chat_id):
+    cache.delete_many([_chave_sala(chat_id), _chave_seq(chat_id)])
+
+
+def estado_sala(chat_id):
+    """
+    Participantes e última sequência persistida da sala, do cache quando possível.
+
+    Returns:
+        (participantes, ultima_seq): participantes é (cliente_id, fornecedor_id)
+        ou None se a sala não existe ou está inativa
+    """
+    encontrados = cache.get_many([_chave_sala(chat_id), _chave_seq(chat_id)])
+    participantes = encontrados.get(_chave_sala(chat_id))
+    if participantes is None:
+        sala = ChatRoom.objects.filter(pk=chat_id).values_list('cliente_id', 'fornecedor_id', 'ativo').first()
+        # Salas inativas também ficam no cache (lista vazia) para não bater no banco a cada poll
+        participantes = list(sala[:2]) if sala and sala[2] else []
+        cache.set(_chave_sala(chat_id), participantes, settings.CHAT_SYNC_CACHE_TTL)
+    if not participantes:
+        return None, 0
+
+    ultima_seq = encontrados.get(_chave_seq(chat_id))
+    if ultima_seq is None:
+        ultima_seq = ultima_seq_no_banco(chat_id)
+        # add: não sobrescreve um valor registrado por um commit concorrente
+        cache.add(_chave_seq(chat_id), ultima_seq, settings.CHAT_SYNC_CACHE_TTL)
+    return tuple(participantes), ultima_seq
+
+
+def ultima_seq_no_banco(chat_id):
+    return ChatMessage.objects.filter(chat_room_id=chat_id).aggregate(m=Max('seq'))['m'] or 0
+
+
+async def ultima_seq_em_cache(chat_id):
+    """Leitura usada pelo long-poll (None quando a chave expirou)."""
+    return await cache.aget(_chave_seq(chat_id))
+
+
+# ==================== SINCRONIZAÇÃO ====================
+
+def _serializar(mensagem):
+    return {
+        'id': mensagem.id,
+        'seq': mensagem.seq,
+        'remetente_id': mensagem.remetente_id,
+        'conteudo': mensagem.conteudo,
+        'data_envio': timezone.localtime(mensagem.data_envio).strftime('%d/%m/%Y %H:%M'),
+        'arquivo_url': mensagem.arquivo_anexo.url if mensagem.arquivo_anexo else None,
+        'tipo_arquivo': mensagem.tipo_arquivo,
+    }
+
+
+def buscar_desde(chat_id, user, cursor_seq, limite=None):
+    """
+    Mensagens da sala depois do cursor, marcando como lidas (um único UPDATE)
+    as recebidas pelo usuário.
+
+    Returns:
+        dict com `mensagens`, o novo `cursor` e `mais` (há outra página)
+    """
+    limite = limite or settings.CHAT_SYNC_LIMITE
+    mensagens = list(
+        ChatMessage.objects.filter(chat_room_id=chat_id, seq__gt=cursor_seq)
+        .only('id', 'seq', 'remetente_id', 'conteudo', 'data_envio', 'lida', 'arquivo_anexo', 'tipo_arquivo')
+        .order_by('seq')[:limite + 1]
+    )
+    tem_proxima = len(mensagens) > limite
+    mensagens = mensagens[:limite]
+
+    # O cursor para na primeira lacuna recente (mensagem ainda não gravada)
+    novo_cursor = cursor_seq
+    limite_lacuna = timezone.now() - timedelta(seconds=settings.CHAT_SYNC_JANELA_LACUNA)
+    for mensagem in mensagens:
+        if mensagem.seq != novo_cursor + 1 and mensagem.data_envio > limite_lacuna:
+            break
+        novo_cursor = mensagem.seq
+
+    nao_lidas = [m.id for m in mensagens if not m.lida and m.remetente_id != user.id]
+    if nao_lidas:
+        marcar_mensagens_como_lidas(ChatMessage.objects.filter(id__in=nao_lidas), user)
+
+    return {
+        'cursor': codificar_cursor(novo_cursor),
+        'mensagens': [_serializar(m) for m in mensagens],
+        # Só indica outra página se o cursor chegou ao fim desta (senão o cliente ficaria em loop)
+        'mais': tem_proxima and novo_cursor == mensagens[-1].seq,
+    }
@@ -0,0 +1,15 @@
+from celery import shared_task
+import logging
+
+from .write_behind import recuperar_pendentes
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def recuperar_mensagens_pendentes():
+    """
+    Regrava mensagens do journal de write-behind que nenhum worker de chat
+    confirmou (ex.: worker encerrado antes do flush).
+    """
+    return recuperar_pendentes()
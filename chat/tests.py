@@ -1,3 +1,173 @@
-from django.test import TestCase
+import asyncio
+import json
 
-# Create your tests here.
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+import fakeredis
+
+from ads.models import Necessidade
+from categories.models import Categoria, SubCategoria
+from chat.models import ChatMessage, ChatRoom
+from chat.realtime import PresenceRegistry
+from chat.sync import codificar_cursor
+from chat import write_behind
+from chat.write_behind import persistir_mensagens
+from notifications.models import Notification
+from users.models import User
+
+
+class PresenceRegistryTest(SimpleTestCase):
+    """
+    Testes do registro de presença (modo em memória, sem fila Redis).
+    """
+
+    def test_online_ate_a_ultima_conexao_fechar(self):
+        async def cenario():
+            registro = PresenceRegistry(url='')
+            self.assertTrue(await registro.registrar('sid-1', 10))
+            self.assertFalse(await registro.registrar('sid-2', 10))
+            self.assertEqual(await registro.usuario_de('sid-2'), 10)
+            self.assertEqual(await registro.usuarios_online([10, 20]), {10})
+
+            self.assertEqual(await registro.remover('sid-1'), (10, False))
+            self.assertTrue(await registro.esta_online(10))
+            self.assertEqual(await registro.remover('sid-2'), (10, True))
+            self.assertFalse(await registro.esta_online(10))
+            self.assertEqual(await registro.remover('sid-2'), (None, False))
+
+        asyncio.run(cenario())
+
+
+class SalaChatMixin:
+    """Cliente, fornecedor e uma sala ativa entre eles."""
+
+    def setUp(self):
+        self.cliente = User.objects.create_user(
+            email='cliente@exemplo.com', password='senha123',
+            first_name='Cliente', last_name='Teste', is_client=True
+        )
+        self.fornecedor = User.objects.create_user(
+            email='fornecedor@exemplo.com', password='senha123',
+            first_name='Fornecedor', last_name='Teste', is_supplier=True
+        )
+        categoria = Categoria.objects.create(nome='Serviços')
+        necessidade = Necessidade.objects.create(
+            titulo='Reparo', descricao='Reparo elétrico', cliente=self.cliente, categoria=categoria,
+            subcategoria=SubCategoria.objects.create(nome='Elétrica', categoria=categoria),
+            quantidade=1, unidade='un'
+        )
+        self.sala = ChatRoom.objects.create(
+            necessidade=necessidade, cliente=self.cliente, fornecedor=self.fornecedor
+        )
+
+
+class SequenciaMensagensTest(SalaChatMixin, TestCase):
+    """
+    Testes da sequência por sala e da gravação em lote (write-behind).
+    """
+
+    def test_sequencia_monotonica_por_sala(self):
+        primeira = ChatMessage.objects.create(chat_room=self.sala, remetente=self.cliente, conteudo='a')
+        segunda = ChatMessage.objects.create(chat_room=self.sala, remetente=self.fornecedor, conteudo='b')
+        self.assertEqual((primeira.seq, segunda.seq), (1, 2))
+
+    def test_lote_gravado_uma_vez_com_efeitos_do_create(self):
+        payloads = [
+            {'chat_id': self.sala.id, 'seq': seq, 'remetente_id': self.fornecedor.id,
+             'conteudo': f'mensagem {seq}', 'data_envio': timezone.now().isoformat()}
+            for seq in (1, 2)
+        ]
+        # Sala + conflitos + INSERT em lote + notificações (+ savepoint)
+        with self.assertNumQueries(7):
+            criadas = persistir_mensagens(payloads)
+        self.assertEqual([m.seq for m in criadas], [1, 2])
+        self.assertEqual(Notification.objects.filter(user=self.cliente).count(), 2)
+
+        # Reprocessar o journal (recuperação) não duplica
+        self.assertEqual(persistir_mensagens(payloads), [])
+        self.assertEqual(ChatMessage.objects.filter(chat_room=self.sala).count(), 2)
+
+    def test_recuperacao_isola_entrada_invalida_e_usa_dead_letter(self):
+        redis = fakeredis.FakeRedis(decode_responses=True)
+        for seq, data in ((1, timezone.now().isoformat()), (2, 'data inválida'), (3, timezone.now().isoformat())):
+            payload = {'chat_id': self.sala.id, 'seq': seq, 'remetente_id': self.cliente.id,
+                       'conteudo': f'mensagem {seq}', 'data_envio': data, 'enfileirado_em': 0}
+            redis.hset(write_behind.CHAVE_JOURNAL, f"{self.sala.id}:{seq}", json.dumps(payload))
+
+        with self.settings(SOCKETIO_MESSAGE_QUEUE='redis://fake', CHAT_WRITE_BEHIND_MAX_LOTE=2,
+                           CHAT_WRITE_BEHIND_TENTATIVAS=2), \
+                mock.patch('chat.write_behind._redis', return_value=redis):
+            self.assertEqual(write_behind.recuperar_pendentes(), 2)
+            self.assertEqual(list(redis.hkeys(write_behind.CHAVE_JOURNAL)), [f"{self.sala.id}:2"])
+            # Chave de sequência perdida: continua depois das seqs ainda no journal
+            ChatMessage.objects.filter(chat_room=self.sala, seq=3).delete()
+            self.assertEqual(write_behind._maior_seq_alocada(redis, self.sala.id), 2)
+
+            self.assertEqual(write_behind.recuperar_pendentes(), 0)
+            self.assertEqual(redis.hlen(write_behind.CHAVE_JOURNAL), 0)
+            self.assertEqual(json.loads(redis.hget(write_behind.CHAVE_MORTAS, f"{self.sala.id}:2"))['tentativas'], 2)
+            self.assertEqual(write_behind._maior_seq_alocada(redis, self.sala.id), 2)
+
+        self.assertEqual(
+            list(ChatMessage.objects.filter(chat_room=self.sala).values_list('seq', flat=True)), [1]
+        )
+
+
+class SincronizacaoChatTest(SalaChatMixin, TestCase):
+    """
+    Testes da sincronização incremental por cursor (fallback HTTP do WebSocket).
+    """
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.url = reverse('chat:sincronizar_mensagens', args=[self.sala.id])
+        self.client.force_login(self.cliente)
+
+    def test_entrega_incremental_e_204_sem_novidades(self):
+        for conteudo in ('a', 'b'):
+            ChatMessage.objects.create(chat_room=self.sala, remetente=self.fornecedor, conteudo=conteudo)
+
+        response = self.client.get(self.url, {'cursor': codificar_cursor(0)})
+        self.assertEqual(response.status_code, 200)
+        dados = response.json()
+        self.assertEqual([m['seq'] for m in dados['mensagens']], [1, 2])
+        self.assertEqual(dados['cursor'], codificar_cursor(2))
+        self.assertFalse(ChatMessage.objects.filter(chat_room=self.sala, lida=False).exists())
+
+        # Nada novo: responde pelo cache, sem consultar mensagens
+        response = self.client.get(self.url, {'cursor': dados['cursor']})
+        self.assertEqual(response.status_code, 204)
+        response = self.client.get(
+            self.url, {'cursor': dados['cursor']}, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ChatMessage.objects.create(chat_room=self.sala, remetente=self.fornecedor, conteudo='c')
+        response = self.client.get(self.url, {'cursor': dados['cursor']})
+        self.assertEqual([m['conteudo'] for m in response.json()['mensagens']], ['c'])
+
+    def test_cursor_nao_pula_lacuna_recente(self):
+        ChatMessage.objects.create(chat_room=self.sala, remetente=self.fornecedor, conteudo='a', seq=1)
+        terceira = ChatMessage.objects.create(chat_room=self.sala, remetente=self.fornecedor, conteudo='c', seq=3)
+
+        dados = self.client.get(self.url).json()
+        self.assertEqual([m['seq'] for m in dados['mensagens']], [1, 3])
+        self.assertEqual(dados['cursor'], codificar_cursor(1))
+
+        # A sequência 2 nunca foi gravada: depois da janela o cursor segue em frente
+        ChatMessage.objects.filter(pk=terceira.pk).update(data_envio=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self.client.get(self.url).json()['cursor'], codificar_cursor(3))
+
+    def test_parametros_e_permissao(self):
+        self.assertEqual(self.client.get(self.url, {'cursor': 'invalido'}).status_code, 400)
+
+        outro = User.objects.create_user(email='outro@exemplo.com', password='senha123', is_client=True)
+        self.client.force_login(outro)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
@@ -15,7 +15,7 @@ urlpatterns = [
     
     # APIs
     path('<int:chat_id>/enviar/', views.enviar_mensagem, name='enviar_mensagem'),
-    path('<int:chat_id>/buscar-novas/', views.buscar_mensagens_novas, name='buscar_mensagens_novas'),
+    path('<int:chat_id>/sincronizar/', views.sincronizar_mensagens, name='sincronizar_mensagens'),
     
     # Iniciar chat
     path('iniciar/<int:necessidade_id>/', views.iniciar_chat, name='iniciar_chat'),
@@ -1,31 +1,26 @@
 # chat/utils.py
 
-from django.core.cache import cache
-from django.db.models import Q, Count
+from django.db.models import Q
+from core.services.unread_counter_service import UnreadCounterService
 from .models import ChatRoom, ChatMessage
 
 def get_unread_messages_count(user):
     """Retorna número total de mensagens não lidas do usuário"""
-    cache_key = f'unread_messages_{user.id}'
-    count = cache.get(cache_key)
-    
-    if count is None:
-        count = ChatMessage.objects.filter(
-            chat_room__in=ChatRoom.objects.filter(
-                Q(cliente=user) | Q(fornecedor=user),
-                ativo=True
-            ),
-            lida=False
-        ).exclude(remetente=user).count()
-        
-        # Cache por 60 segundos
-        cache.set(cache_key, count, 60)
-    
-    return count
+    return UnreadCounterService.contadores(user)[UnreadCounterService.MENSAGENS]
 
 def invalidate_unread_cache(user):
     """Invalida o cache de mensagens não lidas"""
-    cache.delete(f'unread_messages_{user.id}')
+    UnreadCounterService.invalidar([user.id], UnreadCounterService.MENSAGENS)
+
+def marcar_mensagens_como_lidas(mensagens, user):
+    """
+    Marca as mensagens como lidas em um único UPDATE e desconta do badge do
+    usuário apenas as que contavam (não lidas em salas ativas).
+    """
+    contadas = mensagens.filter(lida=False, chat_room__ativo=True).update(lida=True)
+    mensagens.filter(lida=False).update(lida=True)
+    UnreadCounterService.incrementar_apos_commit(user.id, UnreadCounterService.MENSAGENS, -contadas)
+    return contadas
 
 def get_chat_stats(user):
     """Retorna estatísticas dos chats do usuário"""
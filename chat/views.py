@@ -2,18 +2,23 @@
 
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse
 from django.contrib import messages
 from django.core.paginator import Paginator
 from django.db.models import Q, Max, Count, Prefetch
 from django.views.decorators.http import require_http_methods
 from django.core.files.storage import default_storage
 from django.conf import settings
+from asgiref.sync import sync_to_async
+import asyncio
 import json
 import os
 import logging
+import time
 
 from .models import ChatRoom, ChatMessage
+from .sync import CursorInvalido, buscar_desde, codificar_cursor, decodificar_cursor, estado_sala, ultima_seq_em_cache
+from .utils import marcar_mensagens_como_lidas
 from ads.models import Necessidade
 from budgets.models import Orcamento
 
@@ -78,10 +83,10 @@ def chat_detail(request, chat_id):
         messages.warning(request, "Este chat está bloqueado. Novas mensagens só são permitidas quando o anúncio está 'Em Atendimento' ou 'Em Disputa'.")
     
     # Marcar mensagens como lidas
-    ChatMessage.objects.filter(
-        chat_room=chat_room,
-        lida=False
-    ).exclude(remetente=request.user).update(lida=True)
+    marcar_mensagens_como_lidas(
+        ChatMessage.objects.filter(chat_room=chat_room).exclude(remetente=request.user),
+        request.user
+    )
     
     # Buscar mensagens com paginação
     mensagens = chat_room.mensagens.select_related('remetente').order_by('data_envio')
@@ -97,6 +102,7 @@ def chat_detail(request, chat_id):
         'mensagens': mensagens_paginadas,
         'is_cliente': is_cliente,
         'outro_usuario': chat_room.fornecedor if is_cliente else chat_room.cliente,
+        'cursor_sync': codificar_cursor(mensagens_paginadas[-1].seq if mensagens_paginadas else 0),
     }
     
     return render(request, 'chat/chat_detail.html', context)
@@ -122,10 +128,10 @@ def chat_websocket(request, chat_id):
         return redirect('chat:lista_chats')
     
     # Marcar mensagens como lidas
-    ChatMessage.objects.filter(
-        chat_room=chat_room,
-        lida=False
-    ).exclude(remetente=request.user).update(lida=True)
+    marcar_mensagens_como_lidas(
+        ChatMessage.objects.filter(chat_room=chat_room).exclude(remetente=request.user),
+        request.user
+    )
     
     # Buscar mensagens com paginação
     mensagens = chat_room.mensagens.select_related('remetente').order_by('data_envio')
@@ -146,6 +152,7 @@ def chat_websocket(request, chat_id):
         'mensagens': mensagens_paginadas,
         'is_cliente': is_cliente,
         'outro_usuario': chat_room.fornecedor if is_cliente else chat_room.cliente,
+        'cursor_sync': codificar_cursor(mensagens_paginadas[-1].seq if mensagens_paginadas else 0),
         'use_websocket': True,  # Flag para ativar WebSocket
         'chat_disponivel': chat_disponivel,
     }
@@ -236,6 +243,7 @@ def enviar_mensagem(request, chat_id):
             'success': True,
             'mensagem': {
                 'id': mensagem.id,
+                'seq': mensagem.seq,
                 'conteudo': mensagem.conteudo,
                 'remetente': mensagem.remetente.get_full_name(),
                 'data_envio': mensagem.data_envio.strftime('%d/%m/%Y %H:%M'),
@@ -314,55 +322,41 @@ def iniciar_chat(request, necessidade_id):
     return redirect('chat:chat_detail', chat_id=chat_room.id)
 
 @login_required
-def buscar_mensagens_novas(request, chat_id):
-    """API para buscar novas mensagens (polling)"""
-    
-    import logging
-    logger = logging.getLogger(__name__)
-    
-    chat_room = get_object_or_404(ChatRoom, id=chat_id, ativo=True)
-    
-    # Verificar permissões
-    if request.user not in [chat_room.cliente, chat_room.fornecedor]:
+@require_http_methods(["GET"])
+async def sincronizar_mensagens(request, chat_id):
+    """
+    API de sincronização incremental (fallback do WebSocket).
+
+    GET ?cursor=<cursor opaco>&espera=<segundos de long-poll>
+    - 200 {cursor, mensagens, mais}: mensagens depois do cursor, já marcadas como lidas
+    - 204 (ou 304 com If-None-Match igual ao ETag): nada novo; sem consulta ao banco
+    """
+    user = await request.auser()
+    try:
+        cursor_seq = decodificar_cursor(request.GET.get('cursor', ''))
+        espera = int(request.GET.get('espera', 0))
+    except (CursorInvalido, ValueError):
+        return JsonResponse({'error': 'Parâmetros inválidos'}, status=400)
+
+    participantes, ultima_seq = await sync_to_async(estado_sala)(chat_id)
+    if participantes is None:
+        raise Http404("Chat não encontrado")
+    if user.id not in participantes:
         return JsonResponse({'error': 'Permissão negada'}, status=403)
-    
-    ultima_mensagem_id = int(request.GET.get('ultima_mensagem_id', 0))
-    
-    logger.info(f"=== DEBUG BUSCAR MENSAGENS NOVAS ===")
-    logger.info(f"Usuario atual: {request.user.email}")
-    logger.info(f"Ultima mensagem ID: {ultima_mensagem_id}")
-    
-    # Buscar mensagens mais recentes
-    mensagens_novas = ChatMessage.objects.filter(
-        chat_room=chat_room,
-        id__gt=ultima_mensagem_id
-    ).select_related('remetente').order_by('data_envio')
-    
-    logger.info(f"Encontradas {mensagens_novas.count()} mensagens novas")
-    
-    # Marcar como lidas (exceto as próprias)
-    mensagens_novas.exclude(remetente=request.user).update(lida=True)
-    
-    # Serializar mensagens
-    mensagens_data = []
-    for mensagem in mensagens_novas:
-        is_own = mensagem.remetente == request.user
-        logger.info(f"Mensagem ID {mensagem.id}: remetente={mensagem.remetente.email}, is_own={is_own}")
-        
-        mensagens_data.append({
-            'id': mensagem.id,
-            'conteudo': mensagem.conteudo,
-            'remetente': mensagem.remetente.get_full_name(),
-            'data_envio': mensagem.data_envio.strftime('%d/%m/%Y %H:%M'),
-            'is_own_message': is_own,
-            'tem_anexo': bool(mensagem.arquivo_anexo),
-            'arquivo_url': mensagem.arquivo_anexo.url if mensagem.arquivo_anexo else None,
-            'tipo_arquivo': mensagem.tipo_arquivo
-        })
-    
-    logger.info(f"Dados retornados: {mensagens_data}")
-    
-    return JsonResponse({
-        'mensagens': mensagens_data,
-        'total': len(mensagens_data)
-    })
\ No newline at end of file
+
+    # Long-poll opcional: aguarda uma nova sequência olhando só o cache
+    prazo = time.monotonic() + max(0, min(espera, settings.CHAT_SYNC_ESPERA_MAXIMA))
+    while ultima_seq <= cursor_seq and time.monotonic() < prazo:
+        await asyncio.sleep(1)
+        ultima_seq = await ultima_seq_em_cache(chat_id)
+        if ultima_seq is None:
+            _, ultima_seq = await sync_to_async(estado_sala)(chat_id)
+
+    etag = f'"{codificar_cursor(ultima_seq)}"'
+    if ultima_seq <= cursor_seq:
+        response = HttpResponse(status=304 if request.headers.get('If-None-Match') == etag else 204)
+    else:
+        response = JsonResponse(await sync_to_async(buscar_desde)(chat_id, user, cursor_seq))
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,366 @@
+# chat/write_behind.py
+"""
+Persistência write-behind das mensagens do chat.
+
+Fluxo (com SOCKETIO_MESSAGE_QUEUE configurado):
+1. A mensagem recebe uma sequência monotônica por sala (INCR no Redis) e é
+   registrada no journal `chat:wb:pendentes` (HSET) antes do broadcast.
+2. O broadcast acontece imediatamente; a mensagem entra no buffer do worker.
+3. Um único flusher por worker grava o buffer em lotes (bulk_create) limitados
+   por tamanho/tempo, na ordem de chegada, e emite `message_saved` após o commit.
+4. Após o commit, as entradas saem do journal. Se o worker morrer antes disso,
+   `chat.tasks.recuperar_mensagens_pendentes` regrava as entradas antigas
+   (idempotente pela unique (chat_room, seq)).
+5. Um lote que falha CHAT_WRITE_BEHIND_TENTATIVAS vezes é gravado uma
+   mensagem por vez; as que ainda falham saem do buffer e ficam no journal.
+   A recuperação faz o mesmo em blocos e, após CHAT_WRITE_BEHIND_TENTATIVAS
+   rodadas sem sucesso, move a entrada para `chat:wb:mortas` (dead letter).
+
+Sem Redis, a sequência é alocada no banco e a gravação é síncrona.
+"""
+
+import asyncio
+import json
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+from django.db.models.signals import post_save
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+CHAVE_JOURNAL = 'chat:wb:pendentes'
+CHAVE_MORTAS = 'chat:wb:mortas'
+
+# Incrementa a sequência da sala; nil se a chave ainda não foi inicializada
+SCRIPT_INCREMENTAR = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return nil
+end
+return redis.call('INCR', KEYS[1])
+"""
+
+# Inicializa a sequência com o máximo já alocado (se ninguém o fez antes) e incrementa
+SCRIPT_INICIALIZAR = """
+redis.call('SET', KEYS[1], ARGV[1], 'NX')
+return redis.call('INCR', KEYS[1])
+"""
+
+
+def _chave_seq(chat_id):
+    return f"chat:seq:{chat_id}"
+
+
+def write_behind_ativo():
+    return bool(settings.SOCKETIO_MESSAGE_QUEUE)
+
+
+def _maior_seq_persistida(chat_id):
+    from .models import ChatMessage, ChatRoom
+
+    maior = ChatMessage.objects.filter(chat_room_id=chat_id).aggregate(m=Max('seq'))['m'] or 0
+    ultimo = ChatRoom.objects.filter(pk=chat_id).values_list('ultimo_seq', flat=True).first() or 0
+    return max(maior, ultimo)
+
+
+def _seq_do_campo(campo):
+    return int(campo.rsplit(':', 1)[1])
+
+
+def _maior_seq_alocada(redis, chat_id):
+    """
+    Maior sequência já usada pela sala: persistida ou ainda no journal/dead letter.
+    Sem as do journal, uma chave de sequência perdida reutilizaria números de
+    mensagens ainda não gravadas (e uma das duas seria descartada como existente).
+    """
+    maior = _maior_seq_persistida(chat_id)
+    for chave in (CHAVE_JOURNAL, CHAVE_MORTAS):
+        for campo, _ in redis.hscan_iter(chave, match=f"{chat_id}:*", count=500):
+            maior = max(maior, _seq_do_campo(campo))
+    return maior
+
+
+_redis_sync = None
+
+
+def _redis():
+    global _redis_sync
+    if _redis_sync is None:
+        import redis
+        _redis_sync = redis.Redis.from_url(settings.SOCKETIO_MESSAGE_QUEUE, decode_responses=True)
+    return _redis_sync
+
+
+def alocar_seq(chat_id):
+    """Próxima sequência da sala (código síncrono: views HTTP, tasks)."""
+    if not write_behind_ativo():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE chat_chatroom SET ultimo_seq = GREATEST(ultimo_seq, "
+                "(SELECT COALESCE(MAX(seq), 0) FROM chat_chatmessage WHERE chat_room_id = %s)) + 1 "
+                "WHERE id = %s RETURNING ultimo_seq",
+                [chat_id, chat_id],
+            )
+            return cursor.fetchone()[0]
+
+    redis = _redis()
+    seq = redis.eval(SCRIPT_INCREMENTAR, 1, _chave_seq(chat_id))
+    if seq is None:
+        seq = redis.eval(SCRIPT_INICIALIZAR, 1, _chave_seq(chat_id), _maior_seq_alocada(redis, chat_id))
+    return int(seq)
+
+
+# ==================== PERSISTÊNCIA ====================
+
+def persistir_mensagens(payloads):
+    """
+    Grava mensagens (dicts do journal) em um único bulk_create e dispara o
+    post_save de cada uma (notificações, contadores), como um create() faria.
+    Mensagens já gravadas (mesma sala + seq) são ignoradas.
+
+    Returns:
+        list[ChatMessage]: mensagens efetivamente gravadas, na ordem recebida
+    """
+    from notifications.fanout import agrupar
+    from .models import ChatMessage, ChatRoom
+
+    if not payloads:
+        return []
+
+    salas = ChatRoom.objects.select_related('necessidade', 'cliente', 'fornecedor').order_by().in_bulk(
+        {p['chat_id'] for p in payloads}
+    )
+    existentes = set(
+        ChatMessage.objects.filter(
+            chat_room_id__in=salas.keys(), seq__in={p['seq'] for p in payloads}
+        ).order_by().values_list('chat_room_id', 'seq')
+    )
+
+    novas = []
+    for p in payloads:
+        sala = salas.get(p['chat_id'])
+        if sala is None or (p['chat_id'], p['seq']) in existentes:
+            continue
+        remetente = sala.cliente if p['remetente_id'] == sala.cliente_id else sala.fornecedor
+        novas.append(ChatMessage(
+            chat_room=sala,
+            remetente=remetente,
+            conteudo=p['conteudo'],
+            seq=p['seq'],
+            data_envio=parse_datetime(p['data_envio']),
+        ))
+
+    with transaction.atomic():
+        criadas = ChatMessage.objects.bulk_create(novas)
+        # As notificações das mensagens do lote saem em um único envio
+        with agrupar():
+            for mensagem in criadas:
+                mensagem._lida_original = mensagem.lida
+                post_save.send(
+                    sender=ChatMessage, instance=mensagem, created=True,
+                    update_fields=None, raw=False, using=connection.alias,
+                )
+    return criadas
+
+
+def persistir_uma_a_uma(payloads):
+    """
+    Grava cada mensagem na própria transação, isolando as que falham.
+
+    Returns:
+        tuple: (mensagens gravadas, [(payload, erro)] das que falharam)
+    """
+    criadas, falhas = [], []
+    for payload in payloads:
+        try:
+            criadas += persistir_mensagens([payload])
+        except Exception as e:
+            falhas.append((payload, e))
+    return criadas, falhas
+
+
+def _campo(payload):
+    return f"{payload['chat_id']}:{payload['seq']}"
+
+
+def _recuperar_bloco(redis, payloads):
+    """Regrava um bloco do journal; entradas com falha contam uma rodada ou vão para o dead letter."""
+    # Ordem por sala/sequência preserva a ordem original de cada chat
+    payloads.sort(key=lambda p: (p['chat_id'], p['seq']))
+    try:
+        criadas, falhas = persistir_mensagens(payloads), []
+    except Exception:
+        criadas, falhas = persistir_uma_a_uma(payloads)
+
+    com_falha = {_campo(payload) for payload, _ in falhas}
+    pipe = redis.pipeline()
+    gravadas = [_campo(payload) for payload in payloads if _campo(payload) not in com_falha]
+    if gravadas:
+        pipe.hdel(CHAVE_JOURNAL, *gravadas)
+    for payload, erro in falhas:
+        payload['tentativas'] = payload.get('tentativas', 0) + 1
+        if payload['tentativas'] >= settings.CHAT_WRITE_BEHIND_TENTATIVAS:
+            logger.error(f"Write-behind do chat: mensagem {_campo(payload)} movida para o dead letter: {erro}")
+            pipe.hset(CHAVE_MORTAS, _campo(payload), json.dumps({**payload, 'erro': str(erro)[:500]}))
+            pipe.hdel(CHAVE_JOURNAL, _campo(payload))
+        else:
+            pipe.hset(CHAVE_JOURNAL, _campo(payload), json.dumps(payload))
+    pipe.execute()
+    return len(criadas), len(falhas)
+
+
+def recuperar_pendentes(idade_minima=None):
+    """
+    Regrava mensagens do journal que nenhum worker confirmou (ex.: crash antes
+    do flush). Só considera entradas mais antigas que `idade_minima` segundos
+    para não competir com flushes em andamento. O journal é lido e gravado em
+    blocos de CHAT_WRITE_BEHIND_MAX_LOTE; uma entrada inválida não impede as demais.
+
+    Returns:
+        int: mensagens regravadas
+    """
+    if not write_behind_ativo():
+        return 0
+    if idade_minima is None:
+        idade_minima = settings.CHAT_WRITE_BEHIND_RECUPERAR_APOS
+
+    redis = _redis()
+    limite = time.time() - idade_minima
+    lidas = recuperadas = falhas = 0
+    bloco = []
+    for _, valor in redis.hscan_iter(CHAVE_JOURNAL, count=500):
+        payload = json.loads(valor)
+        if payload['enfileirado_em'] > limite:
+            continue
+        bloco.append(payload)
+        if len(bloco) == settings.CHAT_WRITE_BEHIND_MAX_LOTE:
+            lidas += len(bloco)
+            criadas, erros = _recuperar_bloco(redis, bloco)
+            recuperadas, falhas, bloco = recuperadas + criadas, falhas + erros, []
+    if bloco:
+        lidas += len(bloco)
+        criadas, erros = _recuperar_bloco(redis, bloco)
+        recuperadas, falhas = recuperadas + criadas, falhas + erros
+
+    if lidas:
+        logger.warning(
+            f"Write-behind do chat: {recuperadas} mensagens recuperadas do journal "
+            f"({lidas - recuperadas - falhas} já estavam gravadas, {falhas} com erro)"
+        )
+    return recuperadas
+
+
+# ==================== PIPELINE ASSÍNCRONO ====================
+
+class ChatWriteBehind:
+    """
+    Buffer de mensagens de um worker ASGI.
+
+    `ao_persistir(mensagens)` é chamado (corrotina) após cada commit com as
+    mensagens gravadas, para emitir os acks duráveis.
+    """
+
+    def __init__(self, ao_persistir=None, url=None):
+        self.url = url if url is not None else settings.SOCKETIO_MESSAGE_QUEUE
+        self.max_lote = settings.CHAT_WRITE_BEHIND_MAX_LOTE
+        self.intervalo = settings.CHAT_WRITE_BEHIND_INTERVALO_MS / 1000
+        self.ao_persistir = ao_persistir
+        self._buffer = []
+        self._sinal = asyncio.Event()
+        self._redis = None
+
+    @property
+    def ativo(self):
+        return bool(self.url)
+
+    def _cliente(self):
+        if self._redis is None:
+            import redis.asyncio as aioredis
+            self._redis = aioredis.from_url(self.url, decode_responses=True)
+        return self._redis
+
+    async def alocar_seq(self, chat_id):
+        if not self.ativo:
+            return await sync_to_async(alocar_seq)(chat_id)
+
+        redis = self._cliente()
+        seq = await redis.eval(SCRIPT_INCREMENTAR, 1, _chave_seq(chat_id))
+        if seq is None:
+            maior = await sync_to_async(_maior_seq_persistida)(chat_id)
+            for chave in (CHAVE_JOURNAL, CHAVE_MORTAS):
+                async for campo, _ in redis.hscan_iter(chave, match=f"{chat_id}:*", count=500):
+                    maior = max(maior, _seq_do_campo(campo))
+            seq = await redis.eval(SCRIPT_INICIALIZAR, 1, _chave_seq(chat_id), maior)
+        return int(seq)
+
+    async def enfileirar(self, chat_id, remetente_id, conteudo):
+        """
+        Aloca a sequência e registra a mensagem no journal (durável no Redis).
+        O chamador faz o broadcast logo em seguida.
+
+        Returns:
+            dict com chat_id, seq, remetente_id, conteudo e data_envio (ISO)
+        """
+        seq = await self.alocar_seq(chat_id)
+        payload = {
+            'chat_id': chat_id,
+            'seq': seq,
+            'remetente_id': remetente_id,
+            'conteudo': conteudo,
+            'data_envio': timezone.now().isoformat(),
+            'enfileirado_em': time.time(),
+        }
+        await self._cliente().hset(CHAVE_JOURNAL, f"{chat_id}:{seq}", json.dumps(payload))
+        self._buffer.append(payload)
+        self._sinal.set()
+        return payload
+
+    async def loop_flush(self):
+        """Tarefa de fundo do servidor Socket.IO (sio.start_background_task)."""
+        while True:
+            await self._sinal.wait()
+            if len(self._buffer) < self.max_lote:
+                # Janela curta para agrupar rajadas no mesmo INSERT
+                await asyncio.sleep(self.intervalo)
+            self._sinal.clear()
+            while self._buffer:
+                lote = self._buffer[:self.max_lote]
+                criadas, falhas = await self._persistir(lote)
+                del self._buffer[:len(lote)]
+                com_falha = {_campo(payload) for payload, _ in falhas}
+                gravadas = [_campo(payload) for payload in lote if _campo(payload) not in com_falha]
+                try:
+                    if gravadas:
+                        await self._cliente().hdel(CHAVE_JOURNAL, *gravadas)
+                except Exception as e:
+                    logger.error(f"Erro ao limpar journal do chat: {e}")
+                if self.ao_persistir and criadas:
+                    try:
+                        await self.ao_persistir(criadas)
+                    except Exception as e:
+                        logger.error(f"Erro ao emitir acks duráveis: {e}")
+
+    async def _persistir(self, lote):
+        """
+        Grava o lote com até CHAT_WRITE_BEHIND_TENTATIVAS tentativas; depois,
+        uma mensagem por vez. As que ainda falham ficam só no journal, para a
+        recuperação (e o dead letter), sem bloquear o restante do buffer.
+        """
+        tentativas = settings.CHAT_WRITE_BEHIND_TENTATIVAS
+        for tentativa in range(1, tentativas + 1):
+            try:
+                return await sync_to_async(persistir_mensagens)(lote), []
+            except Exception as e:
+                logger.error(f"Erro ao gravar lote do chat ({len(lote)} mensagens, tentativa {tentativa}): {e}")
+                if tentativa < tentativas:
+                    await asyncio.sleep(tentativa)
+
+        criadas, falhas = await sync_to_async(persistir_uma_a_uma)(lote)
+        for payload, erro in falhas:
+            logger.error(f"Mensagem {_campo(payload)} do chat deixada para a recuperação do journal: {erro}")
+        return criadas, falhas
@@ -4,12 +4,20 @@ import socketio
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
 
-# Criar servidor Socket.IO
-sio = socketio.AsyncServer(async_mode="asgi", cors_allowed_origins="*")
-
 # Importar e registrar namespaces após criação do Django
 django_asgi = get_asgi_application()
 
+from chat.realtime import criar_client_manager
+
+# Criar servidor Socket.IO
+# Com SOCKETIO_MESSAGE_QUEUE definido, os emits passam pelo Redis e vários
+# workers podem atender o chat atrás do nginx.
+sio = socketio.AsyncServer(
+    async_mode="asgi",
+    cors_allowed_origins="*",
+    client_manager=criar_client_manager(),
+)
+
 # Importar namespace do chat
 from chat.consumers import ChatNamespace
 sio.register_namespace(ChatNamespace('/chat'))
@@ -1,8 +1,16 @@
-from notifications.models import Notification
+from core.services.unread_counter_service import UnreadCounterService
+
+
+def _contadores_nao_lidos(request):
+    """Um único acesso ao cache por request, compartilhado pelos dois badges."""
+    if not hasattr(request, '_contadores_nao_lidos'):
+        request._contadores_nao_lidos = UnreadCounterService.contadores(request.user)
+    return request._contadores_nao_lidos
+
 
 def unread_notifications(request):
     if request.user.is_authenticated:
-        count = Notification.objects.filter(user=request.user, is_read=False).count()
+        count = _contadores_nao_lidos(request)[UnreadCounterService.NOTIFICACOES]
     else:
         count = 0
     return {
@@ -11,23 +19,9 @@ def unread_notifications(request):
 
 def unread_messages(request):
     """Context processor para contar mensagens não lidas do chat"""
-    if request.user.is_authenticated:
+    if request.user.is_authenticated and request.user.id:
         try:
-            # Importar aqui para evitar problemas de dependência circular
-            from django.db.models import Q
-            from chat.models import ChatRoom, ChatMessage
-            
-            # Verificação adicional: se user não tem id, não pode fazer query
-            if not request.user.id:
-                count = 0
-            else:
-                count = ChatMessage.objects.filter(
-                    chat_room__in=ChatRoom.objects.filter(
-                        Q(cliente=request.user) | Q(fornecedor=request.user),
-                        ativo=True
-                    ),
-                    lida=False
-                ).exclude(remetente=request.user).count()
+            count = _contadores_nao_lidos(request)[UnreadCounterService.MENSAGENS]
         except Exception:
             # Se houver qualquer erro, retornar 0
             count = 0
@@ -0,0 +1,46 @@
+"""
+rate_limit_middleware.py - Core App
+Aplica as políticas de rate limiting por prefixo de caminho (settings.RATE_LIMIT_CAMINHOS)
+"""
+
+from django.conf import settings
+
+from core.services.rate_limit_service import RateLimitService
+
+
+class RateLimitMiddleware:
+    """
+    Limita as requisições das páginas mapeadas em RATE_LIMIT_CAMINHOS
+    (prefixo mais longo vence). Views com o decorator `limitar` já contam
+    a própria requisição e são ignoradas; a API usa as throttle classes do DRF.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        resultado = getattr(request, '_rate_limit', None)
+        if resultado is not None:
+            RateLimitService.cabecalhos(response, resultado)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if hasattr(view_func, 'rate_limit_grupo'):
+            return None
+        grupo = self._grupo(request.path)
+        if grupo is None:
+            return None
+
+        resultado = RateLimitService.verificar(request, grupo)
+        if not resultado.permitido:
+            return RateLimitService.resposta_excedido(resultado)
+        request._rate_limit = resultado
+        return None
+
+    @staticmethod
+    def _grupo(caminho):
+        for prefixo in sorted(settings.RATE_LIMIT_CAMINHOS, key=len, reverse=True):
+            if caminho.startswith(prefixo):
+                return settings.RATE_LIMIT_CAMINHOS[prefixo]
+        return None
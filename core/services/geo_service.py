@@ -0,0 +1,175 @@
+"""
+Serviço de proximidade geográfica
+- Geohash: célula pré-computada usada como pré-filtro indexado (prefixo)
+- Bounding box + haversine apenas sobre os candidatos do pré-filtro
+"""
+
+import math
+from typing import List, Optional, Tuple
+
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import ASin, Cos, Least, Power, Radians, Sin, Sqrt
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class GeoService:
+    """Cálculos de geohash e filtros por raio reutilizáveis em QuerySets"""
+
+    RAIO_TERRA_KM = 6371.0
+    KM_POR_GRAU_LAT = 111.32
+    BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+    PRECISAO_MAXIMA = 9
+
+    @classmethod
+    def encode(cls, lat: float, lon: float, precisao: int = PRECISAO_MAXIMA) -> str:
+        """Codifica (lat, lon) em geohash com a precisão informada"""
+        lat_min, lat_max = -90.0, 90.0
+        lon_min, lon_max = -180.0, 180.0
+        geohash = []
+        bits = 0
+        bit = 0
+        usar_lon = True
+
+        while len(geohash) < precisao:
+            if usar_lon:
+                meio = (lon_min + lon_max) / 2
+                if lon >= meio:
+                    bits = (bits << 1) | 1
+                    lon_min = meio
+                else:
+                    bits <<= 1
+                    lon_max = meio
+            else:
+                meio = (lat_min + lat_max) / 2
+                if lat >= meio:
+                    bits = (bits << 1) | 1
+                    lat_min = meio
+                else:
+                    bits <<= 1
+                    lat_max = meio
+            usar_lon = not usar_lon
+            bit += 1
+            if bit == 5:
+                geohash.append(cls.BASE32[bits])
+                bits = 0
+                bit = 0
+
+        return ''.join(geohash)
+
+    @classmethod
+    def encode_or_empty(cls, lat: Optional[float], lon: Optional[float]) -> str:
+        """Geohash para coordenadas opcionais ('' quando ausentes)"""
+        if lat is None or lon is None:
+            return ''
+        return cls.encode(lat, lon)
+
+    @classmethod
+    def tamanho_celula(cls, precisao: int) -> Tuple[float, float]:
+        """Retorna (altura em graus de latitude, largura em graus de longitude) da célula"""
+        total_bits = 5 * precisao
+        bits_lon = (total_bits + 1) // 2
+        bits_lat = total_bits // 2
+        return 180.0 / (2 ** bits_lat), 360.0 / (2 ** bits_lon)
+
+    @classmethod
+    def precisao_para_raio(cls, raio_km: float, lat: float) -> int:
+        """
+        Maior precisão cuja célula é pelo menos do tamanho do raio,
+        garantindo que a célula central + 8 vizinhas cubram o círculo.
+        Retorna 0 quando nem a precisão 1 cobre o raio.
+        """
+        cos_lat = max(math.cos(math.radians(lat)), 0.01)
+        for precisao in range(cls.PRECISAO_MAXIMA, 0, -1):
+            alt_graus, larg_graus = cls.tamanho_celula(precisao)
+            altura_km = alt_graus * cls.KM_POR_GRAU_LAT
+            largura_km = larg_graus * cls.KM_POR_GRAU_LAT * cos_lat
+            if min(altura_km, largura_km) >= raio_km:
+                return precisao
+        return 0
+
+    @classmethod
+    def celulas_vizinhas(cls, lat: float, lon: float, precisao: int) -> List[str]:
+        """Célula que contém o ponto e as 8 vizinhas (sem repetições)"""
+        alt_graus, larg_graus = cls.tamanho_celula(precisao)
+        celulas = []
+        for dlat in (-1, 0, 1):
+            lat_vizinha = lat + dlat * alt_graus
+            if lat_vizinha > 90 or lat_vizinha < -90:
+                continue
+            for dlon in (-1, 0, 1):
+                lon_vizinha = (lon + dlon * larg_graus + 180) % 360 - 180
+                celula = cls.encode(lat_vizinha, lon_vizinha, precisao)
+                if celula not in celulas:
+                    celulas.append(celula)
+        return celulas
+
+    @classmethod
+    def bounding_box(cls, lat: float, lon: float, raio_km: float) -> Tuple[float, float, float, float]:
+        """Retorna (lat_min, lat_max, lon_min, lon_max) do quadrado que contém o raio"""
+        delta_lat = raio_km / cls.KM_POR_GRAU_LAT
+        cos_lat = max(math.cos(math.radians(lat)), 0.01)
+        delta_lon = min(raio_km / (cls.KM_POR_GRAU_LAT * cos_lat), 180.0)
+        return lat - delta_lat, lat + delta_lat, lon - delta_lon, lon + delta_lon
+
+    @classmethod
+    def distancia_km(cls, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+        """Distância haversine em km entre dois pontos"""
+        dlat = math.radians(lat2 - lat1)
+        dlon = math.radians(lon2 - lon1)
+        a = (
+            math.sin(dlat / 2) ** 2
+            + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon / 2) ** 2
+        )
+        return 2 * cls.RAIO_TERRA_KM * math.asin(min(1.0, math.sqrt(a)))
+
+    @classmethod
+    def expressao_distancia(cls, lat: float, lon: float, lat_field: str, lon_field: str):
+        """Expressão SQL (haversine) da distância em km até o ponto informado"""
+        lat_ponto = Value(math.radians(lat), output_field=FloatField())
+        lon_ponto = Value(math.radians(lon), output_field=FloatField())
+        lat_linha = Radians(F(lat_field))
+        lon_linha = Radians(F(lon_field))
+
+        a = (
+            Power(Sin((lat_linha - lat_ponto) / 2), 2)
+            + Cos(lat_ponto) * Cos(lat_linha) * Power(Sin((lon_linha - lon_ponto) / 2), 2)
+        )
+        return Value(2 * cls.RAIO_TERRA_KM, output_field=FloatField()) * ASin(
+            Least(Sqrt(a), Value(1.0, output_field=FloatField()))
+        )
+
+    @classmethod
+    def filtrar_por_raio(cls, queryset, lat: float, lon: float, raio_km: float,
+                         lat_field: str = 'geo_lat', lon_field: str = 'geo_lon',
+                         geohash_field: str = 'geohash'):
+        """
+        Filtra o queryset pelos registros a até `raio_km` do ponto e anota `distancia_km`.
+
+        Etapas (da mais barata para a mais cara):
+            1. prefixo de geohash nas 9 células ao redor do ponto (índice)
+            2. bounding box sobre lat/lon
+            3. haversine apenas para os candidatos restantes
+        """
+        precisao = cls.precisao_para_raio(raio_km, lat)
+        if precisao:
+            prefixos = Q()
+            for celula in cls.celulas_vizinhas(lat, lon, precisao):
+                prefixos |= Q(**{f'{geohash_field}__startswith': celula})
+            queryset = queryset.filter(prefixos)
+
+        lat_min, lat_max, lon_min, lon_max = cls.bounding_box(lat, lon, raio_km)
+        queryset = queryset.filter(**{
+            f'{lat_field}__gte': lat_min,
+            f'{lat_field}__lte': lat_max,
+        })
+        if lon_min >= -180 and lon_max <= 180:
+            queryset = queryset.filter(**{
+                f'{lon_field}__gte': lon_min,
+                f'{lon_field}__lte': lon_max,
+            })
+
+        return queryset.annotate(
+            distancia_km=cls.expressao_distancia(lat, lon, lat_field, lon_field)
+        ).filter(distancia_km__lte=raio_km)
@@ -0,0 +1,212 @@
+"""
+Rate limiting por janela deslizante, compartilhado por busca, autocomplete e API
+- Política por grupo de endpoints (settings.RATE_LIMIT_POLITICAS, "requisições/segundos")
+- Chave: usuário autenticado ou IP do cliente (X-Forwarded-For só é considerado
+  quando vem de um proxy em settings.PROXIES_CONFIAVEIS)
+- Janela deslizante aproximada: contador da janela fixa atual + contador da
+  anterior ponderado pelo tempo que ainda falta; memória O(1) por cliente
+- Redis: um EVALSHA por verificação (incrementa, compara e desfaz se excedeu)
+- Sem django-redis (dev/testes), usa add/incr do cache padrão do Django
+- Falhas do backend liberam a requisição (o limite nunca derruba o site)
+"""
+
+from functools import lru_cache, wraps
+import ipaddress
+import logging
+import math
+import time
+from typing import NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+
+logger = logging.getLogger(__name__)
+
+
+class Resultado(NamedTuple):
+    permitido: bool
+    limite: int
+    restantes: int
+    reset: int  # segundos até a janela liberar a próxima requisição
+
+
+@lru_cache(maxsize=8)
+def _redes(proxies: Tuple[str, ...]):
+    return tuple(ipaddress.ip_network(rede, strict=False) for rede in proxies)
+
+
+class RateLimitService:
+    """Verificação atômica do limite de requisições por grupo e cliente"""
+
+    GRUPO_PADRAO = 'padrao'
+
+    # KEYS: janela atual, janela anterior | ARGV: limite, ttl, peso da anterior
+    SCRIPT_VERIFICAR = """
+    local atual = redis.call('INCR', KEYS[1])
+    if atual == 1 then
+        redis.call('EXPIRE', KEYS[1], ARGV[2])
+    end
+    local anterior = tonumber(redis.call('GET', KEYS[2]) or '0')
+    if anterior * tonumber(ARGV[3]) + atual > tonumber(ARGV[1]) then
+        redis.call('DECR', KEYS[1])
+        return {0, atual - 1, anterior}
+    end
+    return {1, atual, anterior}
+    """
+
+    _script = None
+
+    # ==================== INFRA ====================
+
+    @classmethod
+    def _redis(cls):
+        """Cliente Redis cru quando o cache padrão é django-redis, senão None"""
+        if not settings.CACHES['default']['BACKEND'].startswith('django_redis'):
+            return None
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+
+    @classmethod
+    def _prefixo(cls) -> str:
+        return settings.CACHES['default'].get('KEY_PREFIX', '')
+
+    @classmethod
+    def politica(cls, grupo: str) -> Tuple[int, int]:
+        """(limite, período em segundos) do grupo; grupos sem política usam a padrão"""
+        politicas = settings.RATE_LIMIT_POLITICAS
+        limite, periodo = politicas.get(grupo, politicas[cls.GRUPO_PADRAO]).split('/')
+        return int(limite), int(periodo)
+
+    # ==================== IDENTIDADE ====================
+
+    @classmethod
+    def _confiavel(cls, ip: str) -> bool:
+        try:
+            endereco = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+        return any(endereco in rede for rede in _redes(tuple(settings.PROXIES_CONFIAVEIS)))
+
+    @classmethod
+    def ip_cliente(cls, request) -> str:
+        """
+        IP do cliente. O X-Forwarded-For é lido da direita para a esquerda e só
+        enquanto os saltos forem proxies confiáveis: o primeiro endereço que não
+        é proxy foi anotado pelo nosso próprio proxy e não pode ser forjado.
+        """
+        remoto = request.META.get('REMOTE_ADDR', '')
+        if not cls._confiavel(remoto):
+            return remoto
+
+        encaminhados = [ip.strip() for ip in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if ip.strip()]
+        for ip in reversed(encaminhados):
+            if not cls._confiavel(ip):
+                return ip
+        return encaminhados[0] if encaminhados else remoto
+
+    @classmethod
+    def identidade(cls, request) -> str:
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return f"u:{user.pk}"
+        return f"ip:{cls.ip_cliente(request)}"
+
+    # ==================== VERIFICAÇÃO ====================
+
+    @classmethod
+    def _contar_redis(cls, redis, chaves, limite, periodo, peso):
+        if cls._script is None:
+            cls._script = redis.register_script(cls.SCRIPT_VERIFICAR)
+        prefixo = cls._prefixo()
+        permitido, atual, anterior = cls._script(
+            keys=[f"{prefixo}:{chave}" for chave in chaves], args=[limite, periodo * 2, peso]
+        )
+        return bool(permitido), int(atual), int(anterior)
+
+    @classmethod
+    def _contar_cache(cls, chaves, limite, periodo, peso):
+        atual_chave, anterior_chave = chaves
+        cache.add(atual_chave, 0, periodo * 2)
+        atual = cache.incr(atual_chave)
+        anterior = cache.get(anterior_chave, 0)
+        if anterior * peso + atual > limite:
+            cache.decr(atual_chave)
+            return False, atual - 1, anterior
+        return True, atual, anterior
+
+    @staticmethod
+    def _espera(limite, periodo, peso, atual, anterior) -> int:
+        """Segundos até a estimativa da janela voltar a caber mais uma requisição"""
+        livre = limite - 1 - atual
+        if livre >= 0:
+            # Basta a janela anterior perder peso
+            return math.ceil(periodo * (peso - livre / anterior)) if anterior else 0
+        # A janela atual sozinha já estourou: espera ela virar a anterior e perder peso
+        return math.ceil(periodo * (peso + 1 - (limite - 1) / atual))
+
+    @classmethod
+    def verificar(cls, request, grupo: str) -> Resultado:
+        """Conta a requisição no grupo (se couber no limite) e informa o saldo"""
+        limite, periodo = cls.politica(grupo)
+        janela, decorrido = divmod(time.time(), periodo)
+        peso = 1 - decorrido / periodo
+        base = f"ratelimit:{grupo}:{cls.identidade(request)}"
+        chaves = (f"{base}:{int(janela)}", f"{base}:{int(janela) - 1}")
+
+        try:
+            redis = cls._redis()
+            if redis is None:
+                permitido, atual, anterior = cls._contar_cache(chaves, limite, periodo, peso)
+            else:
+                permitido, atual, anterior = cls._contar_redis(redis, chaves, limite, periodo, peso)
+        except Exception as e:
+            logger.warning(f"Rate limit indisponível para o grupo {grupo}; liberando: {e}")
+            return Resultado(True, limite, limite, 0)
+
+        estimado = anterior * peso + atual
+        if not permitido:
+            logger.warning(f"Rate limit excedido no grupo {grupo} por {base.split(':', 2)[2]}")
+            return Resultado(False, limite, 0, max(1, cls._espera(limite, periodo, peso, atual, anterior)))
+        return Resultado(True, limite, max(0, int(limite - estimado)), math.ceil(periodo * peso))
+
+    # ==================== RESPOSTA ====================
+
+    @staticmethod
+    def cabecalhos(response, resultado: Resultado):
+        response['X-RateLimit-Limit'] = str(resultado.limite)
+        response['X-RateLimit-Remaining'] = str(resultado.restantes)
+        response['X-RateLimit-Reset'] = str(int(time.time()) + resultado.reset)
+        return response
+
+    @classmethod
+    def resposta_excedido(cls, resultado: Resultado):
+        response = JsonResponse({
+            'error': 'Rate limit exceeded. Please try again later.',
+            'retry_after': resultado.reset,
+        }, status=429)
+        response['Retry-After'] = str(resultado.reset)
+        return cls.cabecalhos(response, resultado)
+
+
+def limitar(grupo: Optional[str] = None):
+    """
+    Decorator de views com a política do grupo. Views decoradas são ignoradas
+    pelo RateLimitMiddleware, então a requisição nunca é contada duas vezes.
+    """
+    grupo = grupo or RateLimitService.GRUPO_PADRAO
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            resultado = RateLimitService.verificar(request, grupo)
+            if not resultado.permitido:
+                return RateLimitService.resposta_excedido(resultado)
+            response = view_func(request, *args, **kwargs)
+            if hasattr(response, 'headers'):
+                RateLimitService.cabecalhos(response, resultado)
+            return response
+
+        wrapper.rate_limit_grupo = grupo
+        return wrapper
+    return decorator
@@ -0,0 +1,42 @@
+"""
+Cache local (por processo) de dados de referência estáticos
+- Ex.: lista de estados usada em todos os templates
+- Sem ida ao Redis nem ao banco no caminho quente; expira por TTL e é
+  invalidado por signals no processo que alterou o dado
+"""
+
+import threading
+import time
+from typing import Any, Callable, Optional
+
+
+class ReferenceCacheService:
+    """Memoização em memória com TTL, segura entre threads"""
+
+    TTL_SEGUNDOS = 60 * 60
+
+    _dados = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def obter(cls, chave: str, carregar: Callable[[], Any], ttl: Optional[int] = None) -> Any:
+        """Retorna o valor em cache ou carrega (uma única vez por processo) e guarda"""
+        item = cls._dados.get(chave)
+        if item is not None and item[0] > time.monotonic():
+            return item[1]
+
+        with cls._lock:
+            item = cls._dados.get(chave)
+            if item is not None and item[0] > time.monotonic():
+                return item[1]
+            valor = carregar()
+            cls._dados[chave] = (time.monotonic() + (ttl or cls.TTL_SEGUNDOS), valor)
+            return valor
+
+    @classmethod
+    def invalidar(cls, chave: Optional[str] = None):
+        with cls._lock:
+            if chave is None:
+                cls._dados.clear()
+            else:
+                cls._dados.pop(chave, None)
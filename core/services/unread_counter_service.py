@@ -0,0 +1,252 @@
+"""
+Contadores de itens não lidos (badges de notificações e mensagens do chat)
+- Redis: um hash por usuário (`<prefixo>:unread:<user_id>`) com um campo por contador
+- Incrementos/decrementos atômicos via signals; o banco só é consultado no aquecimento
+- Reconciliação periódica (notifications.tasks) corrige qualquer desvio
+- Sem django-redis (dev/testes), usa o cache padrão do Django com a mesma API
+"""
+
+import time
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class UnreadCounterService:
+    """Leitura e manutenção dos contadores de não lidos por usuário"""
+
+    NOTIFICACOES = 'notifications'
+    MENSAGENS = 'messages'
+    CAMPOS = (NOTIFICACOES, MENSAGENS)
+
+    TTL_SEGUNDOS = 60 * 60 * 24
+    JANELA_RECONCILIACAO_SEGUNDOS = 60 * 60
+
+    # Incrementa somente se o contador já estiver aquecido e nunca fica negativo
+    SCRIPT_INCREMENTAR = """
+    if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 0 then
+        return nil
+    end
+    local valor = redis.call('HINCRBY', KEYS[1], ARGV[1], ARGV[2])
+    if valor < 0 then
+        redis.call('HSET', KEYS[1], ARGV[1], 0)
+        valor = 0
+    end
+    return valor
+    """
+
+    _script = None
+
+    # ==================== INFRA ====================
+
+    @classmethod
+    def _redis(cls):
+        """Cliente Redis cru quando o cache padrão é django-redis, senão None"""
+        if not settings.CACHES['default']['BACKEND'].startswith('django_redis'):
+            return None
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+
+    @classmethod
+    def _prefixo(cls) -> str:
+        return settings.CACHES['default'].get('KEY_PREFIX', '')
+
+    @classmethod
+    def _chave(cls, user_id: int) -> str:
+        return f"{cls._prefixo()}:unread:{user_id}"
+
+    @classmethod
+    def _chave_ativos(cls) -> str:
+        return f"{cls._prefixo()}:unread:ativos"
+
+    @classmethod
+    def _chave_cache(cls, user_id: int, campo: str) -> str:
+        return f"unread:{user_id}:{campo}"
+
+    # ==================== CONTAGEM NO BANCO ====================
+
+    @classmethod
+    def contar_no_banco(cls, campo: str, user_ids: Iterable[int]) -> Dict[int, int]:
+        """Contagem real de não lidos para vários usuários (consultas agrupadas)"""
+        from chat.models import ChatMessage
+        from notifications.models import Notification
+
+        user_ids = list(user_ids)
+        contagem = dict.fromkeys(user_ids, 0)
+        if not user_ids:
+            return contagem
+
+        if campo == cls.NOTIFICACOES:
+            linhas = (
+                Notification.objects.filter(user_id__in=user_ids, is_read=False)
+                .values_list('user_id').annotate(total=Count('id')).order_by()
+            )
+            contagem.update(dict(linhas))
+            return contagem
+
+        # Mensagens de outros participantes em salas ativas, pelos dois lados da sala
+        nao_lidas = ChatMessage.objects.filter(lida=False, chat_room__ativo=True)
+        for lado in ('cliente', 'fornecedor'):
+            linhas = (
+                nao_lidas.filter(**{f'chat_room__{lado}_id__in': user_ids})
+                .exclude(remetente_id=F(f'chat_room__{lado}_id'))
+                .values_list(f'chat_room__{lado}_id').annotate(total=Count('id')).order_by()
+            )
+            for user_id, total in linhas:
+                contagem[user_id] += total
+        return contagem
+
+    # ==================== LEITURA ====================
+
+    @classmethod
+    def contadores(cls, user) -> Dict[str, int]:
+        """
+        Contadores do usuário: um HMGET no caminho quente; o banco só é
+        consultado para os campos ainda não aquecidos.
+        """
+        redis = cls._redis()
+        if redis is None:
+            return cls._contadores_cache(user.id)
+
+        chave = cls._chave(user.id)
+        try:
+            # Mesma ida ao Redis marca o usuário como ativo para a reconciliação
+            pipe = redis.pipeline(transaction=False)
+            pipe.hmget(chave, cls.CAMPOS)
+            pipe.zadd(cls._chave_ativos(), {user.id: time.time()})
+            valores = pipe.execute()[0]
+        except Exception as e:
+            logger.warning(f"Redis indisponível para contadores de não lidos: {e}")
+            return {campo: cls.contar_no_banco(campo, [user.id])[user.id] for campo in cls.CAMPOS}
+
+        resultado = {}
+        faltando = {}
+        for campo, valor in zip(cls.CAMPOS, valores):
+            if valor is None:
+                faltando[campo] = cls.contar_no_banco(campo, [user.id])[user.id]
+            else:
+                resultado[campo] = int(valor)
+
+        if faltando:
+            try:
+                pipe = redis.pipeline()
+                pipe.hset(chave, mapping=faltando)
+                pipe.expire(chave, cls.TTL_SEGUNDOS)
+                pipe.execute()
+            except Exception as e:
+                logger.warning(f"Erro ao aquecer contadores de não lidos: {e}")
+            resultado.update(faltando)
+        return resultado
+
+    @classmethod
+    def _contadores_cache(cls, user_id: int) -> Dict[str, int]:
+        chaves = {cls._chave_cache(user_id, campo): campo for campo in cls.CAMPOS}
+        encontrados = cache.get_many(list(chaves))
+        resultado = {chaves[chave]: valor for chave, valor in encontrados.items()}
+
+        faltando = {}
+        for chave, campo in chaves.items():
+            if campo not in resultado:
+                resultado[campo] = faltando[chave] = cls.contar_no_banco(campo, [user_id])[user_id]
+        if faltando:
+            cache.set_many(faltando, cls.TTL_SEGUNDOS)
+        return resultado
+
+    # ==================== ESCRITA ====================
+
+    @classmethod
+    def incrementar(cls, user_id: int, campo: str, delta: int = 1) -> Optional[int]:
+        """
+        Aplica um delta ao contador (negativo para decrementar).
+        Contadores ainda não aquecidos são ignorados: a próxima leitura conta no banco.
+        """
+        if not delta or not user_id:
+            return None
+
+        redis = cls._redis()
+        if redis is None:
+            chave = cls._chave_cache(user_id, campo)
+            try:
+                valor = cache.incr(chave, delta)
+            except ValueError:
+                return None
+            if valor < 0:
+                cache.set(chave, 0, cls.TTL_SEGUNDOS)
+                valor = 0
+            return valor
+
+        try:
+            if cls._script is None:
+                cls._script = redis.register_script(cls.SCRIPT_INCREMENTAR)
+            valor = cls._script(keys=[cls._chave(user_id)], args=[campo, delta])
+        except Exception as e:
+            logger.warning(f"Erro ao atualizar contador de não lidos; invalidando: {e}")
+            cls.invalidar([user_id], campo)
+            return None
+        return None if valor is None else int(valor)
+
+    @classmethod
+    def incrementar_apos_commit(cls, user_id: int, campo: str, delta: int = 1):
+        """Aplica o delta somente se a transação corrente for confirmada"""
+        if delta and user_id:
+            transaction.on_commit(lambda: cls.incrementar(user_id, campo, delta))
+
+    @classmethod
+    def invalidar(cls, user_ids: Iterable[int], campo: Optional[str] = None):
+        """Descarta contadores (recontados na próxima leitura)"""
+        user_ids = [user_id for user_id in user_ids if user_id]
+        if not user_ids:
+            return
+        campos = [campo] if campo else list(cls.CAMPOS)
+
+        redis = cls._redis()
+        if redis is None:
+            cache.delete_many([cls._chave_cache(u, c) for u in user_ids for c in campos])
+            return
+
+        try:
+            pipe = redis.pipeline()
+            for user_id in user_ids:
+                pipe.hdel(cls._chave(user_id), *campos)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Erro ao invalidar contadores de não lidos: {e}")
+
+    # ==================== RECONCILIAÇÃO ====================
+
+    @classmethod
+    def reconciliar(cls, batch_size: int = 500) -> int:
+        """
+        Regrava os contadores dos usuários que leram badges recentemente com a
+        contagem real do banco. Usuários inativos saem do conjunto e seus
+        hashes expiram pelo TTL.
+
+        Returns:
+            int: quantidade de usuários reconciliados
+        """
+        redis = cls._redis()
+        if redis is None:
+            return 0
+
+        chave_ativos = cls._chave_ativos()
+        limite = time.time() - cls.JANELA_RECONCILIACAO_SEGUNDOS
+        redis.zremrangebyscore(chave_ativos, '-inf', limite)
+        user_ids = [int(user_id) for user_id in redis.zrange(chave_ativos, 0, -1)]
+
+        for inicio in range(0, len(user_ids), batch_size):
+            lote = user_ids[inicio:inicio + batch_size]
+            contagens = {campo: cls.contar_no_banco(campo, lote) for campo in cls.CAMPOS}
+            pipe = redis.pipeline()
+            for user_id in lote:
+                chave = cls._chave(user_id)
+                pipe.hset(chave, mapping={campo: contagens[campo][user_id] for campo in cls.CAMPOS})
+                pipe.expire(chave, cls.TTL_SEGUNDOS)
+            pipe.execute()
+
+        return len(user_ids)
@@ -53,6 +53,7 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     "django.contrib.sites",  # Necessário para envio de e-mails
+    "django.contrib.postgres",  # Busca textual (SearchVector/SearchQuery)
     "django_recaptcha",
     "corsheaders",  # CORS headers
     "core",
@@ -89,6 +90,7 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "allauth.account.middleware.AccountMiddleware", # Adicionado para allauth
+    "core.middleware.rate_limit_middleware.RateLimitMiddleware",  # Rate limiting por caminho
     "api.middleware.APIVersionMiddleware",  # Middleware de versionamento da API
     "core.middleware.ProfileCompleteMiddleware",  # Reativado com melhorias
     "core.middleware.lgpd_middleware.LGPDConsentMiddleware",  # LGPD Compliance
@@ -226,6 +228,9 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttles.GrupoRateThrottle',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
@@ -491,6 +496,108 @@ CACHES = {
     }
 }
 
+# Socket.IO (chat em tempo real)
+# URL Redis da fila de mensagens entre workers ASGI; vazio = processo único em memória.
+# Com vários workers, os clientes devem usar apenas o transporte websocket
+# (long-polling exige sticky session).
+SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE', '')
+SOCKETIO_CHANNEL = os.environ.get('SOCKETIO_CHANNEL', 'indicai-socketio')
+SOCKETIO_PRESENCE_NODE_TTL = int(os.environ.get('SOCKETIO_PRESENCE_NODE_TTL', '30'))
+
+# Write-behind das mensagens do chat (ativo quando SOCKETIO_MESSAGE_QUEUE está definido)
+CHAT_WRITE_BEHIND_MAX_LOTE = int(os.environ.get('CHAT_WRITE_BEHIND_MAX_LOTE', '100'))
+CHAT_WRITE_BEHIND_INTERVALO_MS = int(os.environ.get('CHAT_WRITE_BEHIND_INTERVALO_MS', '50'))
+CHAT_WRITE_BEHIND_RECUPERAR_APOS = int(os.environ.get('CHAT_WRITE_BEHIND_RECUPERAR_APOS', '60'))
+# Tentativas de um lote no flush (e rodadas da recuperação antes do dead letter)
+CHAT_WRITE_BEHIND_TENTATIVAS = int(os.environ.get('CHAT_WRITE_BEHIND_TENTATIVAS', '3'))
+
+# Sincronização do chat por HTTP (chat.sync, fallback do WebSocket)
+CHAT_SYNC_LIMITE = int(os.environ.get('CHAT_SYNC_LIMITE', '100'))
+CHAT_SYNC_CACHE_TTL = int(os.environ.get('CHAT_SYNC_CACHE_TTL', '3600'))
+# Segundos até o cursor pular uma sequência que nunca foi gravada
+CHAT_SYNC_JANELA_LACUNA = int(os.environ.get('CHAT_SYNC_JANELA_LACUNA', '120'))
+# Long-poll: espera máxima por requisição. Mantenha 0 com workers WSGI síncronos
+# (cada espera prende um worker); habilite apenas servindo HTTP pelo ASGI.
+CHAT_SYNC_ESPERA_MAXIMA = int(os.environ.get('CHAT_SYNC_ESPERA_MAXIMA', '0'))
+
+# Varredura de anúncios expirados (ads.expiracao)
+EXPIRACAO_LOTE = int(os.environ.get('EXPIRACAO_LOTE', '500'))
+# Por quanto tempo o checkpoint de uma varredura interrompida fica disponível para retomada
+EXPIRACAO_CHECKPOINT_TTL = int(os.environ.get('EXPIRACAO_CHECKPOINT_TTL', str(60 * 60 * 24)))
+
+# Prazos agendados (ads.prazos): intervalo da verificação de vencidos e prazos por execução
+PRAZOS_INTERVALO_SEGUNDOS = int(os.environ.get('PRAZOS_INTERVALO_SEGUNDOS', '15'))
+PRAZOS_LOTE = int(os.environ.get('PRAZOS_LOTE', '100'))
+
+# Resumos de e-mail (notifications.digest): hora local do envio, dia do semanal (0 = segunda) e lote
+DIGEST_HORA = int(os.environ.get('DIGEST_HORA', '8'))
+DIGEST_DIA_SEMANA = int(os.environ.get('DIGEST_DIA_SEMANA', '0'))
+DIGEST_LOTE = int(os.environ.get('DIGEST_LOTE', '500'))
+
+# Campanhas de notificação (notifications.campanhas)
+CAMPANHA_LOTE = int(os.environ.get('CAMPANHA_LOTE', '1000'))
+# Duração de cada execução da task antes de devolver o worker e se reagendar
+CAMPANHA_FATIA_SEGUNDOS = int(os.environ.get('CAMPANHA_FATIA_SEGUNDOS', '20'))
+CAMPANHA_EMAILS_POR_MINUTO = int(os.environ.get('CAMPANHA_EMAILS_POR_MINUTO', '600'))
+
+# Ranking de fornecedores (rankings.leaderboard): meia-vida do peso das avaliações,
+# peso do prior (em avaliações), prior sem avaliações no sistema e tamanho da página
+RANKING_MEIA_VIDA_DIAS = int(os.environ.get('RANKING_MEIA_VIDA_DIAS', '180'))
+RANKING_PESO_PRIOR = float(os.environ.get('RANKING_PESO_PRIOR', '5'))
+RANKING_MEDIA_PADRAO = float(os.environ.get('RANKING_MEDIA_PADRAO', '4.0'))
+RANKING_POR_PAGINA = int(os.environ.get('RANKING_POR_PAGINA', '20'))
+
+# Feed da home (ads.feed): validade das seções em cache; escritas em
+# Necessidade trocam a versão do feed antes disso
+FEED_CACHE_TTL = int(os.environ.get('FEED_CACHE_TTL', '300'))
+
+# Recomendações da home (ads.recomendacoes): candidatos por balde (categoria, UF),
+# validade dos baldes/perfis em cache e pesos da pontuação
+RECOMENDACAO_CANDIDATOS = int(os.environ.get('RECOMENDACAO_CANDIDATOS', '100'))
+RECOMENDACAO_CACHE_TTL = int(os.environ.get('RECOMENDACAO_CACHE_TTL', '3600'))
+RECOMENDACAO_MEIA_VIDA_DIAS = float(os.environ.get('RECOMENDACAO_MEIA_VIDA_DIAS', '7'))
+RECOMENDACAO_PESO_PREFERIDA = float(os.environ.get('RECOMENDACAO_PESO_PREFERIDA', '3'))
+RECOMENDACAO_PESO_BASE = float(os.environ.get('RECOMENDACAO_PESO_BASE', '0.2'))
+RECOMENDACAO_PESO_PROXIMIDADE = float(os.environ.get('RECOMENDACAO_PESO_PROXIMIDADE', '1'))
+
+# Aviso de anúncios novos aos fornecedores compatíveis (ads.fornecedores): raio além
+# da UF, validade do índice por categoria, lote por transação e avisos por fornecedor/dia
+FORNECEDORES_RAIO_KM = float(os.environ.get('FORNECEDORES_RAIO_KM', '50'))
+FORNECEDORES_INDICE_TTL = int(os.environ.get('FORNECEDORES_INDICE_TTL', '21600'))
+FORNECEDORES_LOTE = int(os.environ.get('FORNECEDORES_LOTE', '1000'))
+FORNECEDORES_AVISOS_POR_DIA = int(os.environ.get('FORNECEDORES_AVISOS_POR_DIA', '20'))
+
+# Buscas salvas com alerta de novos anúncios (search.buscas_salvas)
+BUSCAS_SALVAS_POR_USUARIO = int(os.environ.get('BUSCAS_SALVAS_POR_USUARIO', '20'))
+
+# Autocomplete (search.sugestoes): títulos ativos mais frequentes no índice em memória
+# e validade dos dados de cada versão no cache
+AUTOCOMPLETE_TITULOS = int(os.environ.get('AUTOCOMPLETE_TITULOS', '2000'))
+AUTOCOMPLETE_INDICE_TTL = int(os.environ.get('AUTOCOMPLETE_INDICE_TTL', '3600'))
+
+# Rate limiting (core.services.rate_limit_service): janela deslizante por grupo de
+# endpoints em "requisições/segundos", por usuário autenticado ou IP do cliente
+RATE_LIMIT_POLITICAS = {
+    'padrao': os.environ.get('RATE_LIMIT_PADRAO', '60/60'),
+    'autocomplete': os.environ.get('RATE_LIMIT_AUTOCOMPLETE', '30/60'),
+    'busca': os.environ.get('RATE_LIMIT_BUSCA', '60/60'),
+    'api': os.environ.get('RATE_LIMIT_API', '120/60'),
+    'auth': os.environ.get('RATE_LIMIT_AUTH', '20/60'),
+}
+# Páginas limitadas pelo RateLimitMiddleware (prefixo -> grupo); a API usa as throttle classes do DRF
+RATE_LIMIT_CAMINHOS = {
+    '/buscar/': 'busca',
+    '/users/login/': 'auth',
+    '/users/register/': 'auth',
+    '/users/password_reset/': 'auth',
+}
+# Proxies cujo X-Forwarded-For é aceito para obter o IP do cliente (nginx na rede do Docker)
+PROXIES_CONFIAVEIS = [
+    rede.strip() for rede in os.environ.get(
+        'PROXIES_CONFIAVEIS', '127.0.0.0/8,::1/128,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16'
+    ).split(',') if rede.strip()
+]
+
 # Configurações do Celery
 CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://redis:6379/2')
 CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', 'redis://redis:6379/3')
@@ -502,18 +609,23 @@ CELERY_TASK_ALWAYS_EAGER = os.environ.get('CELERY_TASK_ALWAYS_EAGER', 'False') =
 CELERY_TASK_EAGER_PROPAGATES = os.environ.get('CELERY_TASK_EAGER_PROPAGATES', 'True') == 'True'
 CELERY_WORKER_CONCURRENCY = int(os.environ.get('CELERY_WORKER_CONCURRENCY', '2'))
 CELERY_BEAT_SCHEDULER = os.environ.get('CELERY_BEAT_SCHEDULER', 'django_celery_beat.schedulers:DatabaseScheduler')
+# Campanhas e avisos em massa em fila própria, consumida por um worker dedicado (docker-compose)
+CELERY_TASK_ROUTES = {
+    'notifications.tasks.processar_campanha': {'queue': 'campanhas'},
+    'ads.tasks.notificar_fornecedores_compativeis': {'queue': 'campanhas'},
+    'search.tasks.avaliar_buscas_salvas': {'queue': 'campanhas'},
+}
 
 # Celery Beat Schedule
+from datetime import timedelta
+
 from celery.schedules import crontab
 
 CELERY_BEAT_SCHEDULE = {
     'handle-confirmation-timeouts': {
         'task': 'ads.tasks.handle_confirmation_timeouts',
-        'schedule': crontab(minute=0),  # Every hour
-    },
-    'send-timeout-notifications': {
-        'task': 'ads.tasks.send_timeout_notifications',
-        'schedule': crontab(minute=0, hour='*/6'),  # Every 6 hours
+        # Avisos e timeouts de confirmação vencidos (ads.prazos)
+        'schedule': timedelta(seconds=PRAZOS_INTERVALO_SEGUNDOS),
     },
     'cleanup-expired-necessidades': {
         'task': 'ads.tasks.cleanup_expired_necessidades',
@@ -523,6 +635,38 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'ads.tasks.verificar_anuncios_expirados',
         'schedule': crontab(minute=0, hour=0),  # Daily at midnight
     },
+    'atualizar-rollups-dashboard': {
+        'task': 'ads.tasks.atualizar_rollups_dashboard',
+        'schedule': crontab(minute=30, hour=3),  # Daily at 3:30 AM
+    },
+    'reconciliar-reputacao': {
+        'task': 'rankings.tasks.reconciliar_reputacao',
+        'schedule': crontab(minute=45, hour=3),  # Daily at 3:45 AM
+    },
+    'reconstruir-rankings': {
+        'task': 'rankings.tasks.reconstruir_rankings',
+        'schedule': crontab(minute=15, hour=4),  # Daily at 4:15 AM
+    },
+    'processar-outbox-email': {
+        'task': 'notifications.tasks.processar_outbox_email',
+        'schedule': crontab(),  # Every minute
+    },
+    'enviar-resumos-email': {
+        'task': 'notifications.tasks.enviar_resumos_email',
+        'schedule': crontab(minute=0),  # Hourly (each timezone at its DIGEST_HORA)
+    },
+    'iniciar-campanhas': {
+        'task': 'notifications.tasks.iniciar_campanhas',
+        'schedule': crontab(),  # Every minute
+    },
+    'reconciliar-contadores-nao-lidos': {
+        'task': 'notifications.tasks.reconciliar_contadores_nao_lidos',
+        'schedule': crontab(minute='*/10'),  # Every 10 minutes
+    },
+    'recuperar-mensagens-chat-pendentes': {
+        'task': 'chat.tasks.recuperar_mensagens_pendentes',
+        'schedule': crontab(),  # Every minute
+    },
 }
 
 # Configuração de logging
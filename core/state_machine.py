@@ -21,44 +21,80 @@ class StateTransitionError(Exception):
     pass
 
 
+class StateTransitionConflict(StateTransitionError):
+    """
+    Raised when the row changed (status) between loading the instance and
+    locking it for the transition, e.g. two users confirming the same budget.
+    The caller should reload the instance and decide again.
+    """
+
+    def __init__(self, instance, expected: str, current: Optional[str]):
+        self.instance = instance
+        self.expected = expected
+        self.current = current
+        super().__init__(
+            f"Conflito de status em {instance.__class__.__name__} {instance.pk}: "
+            f"esperado '{expected}', atual '{current}'. Recarregue e tente novamente."
+        )
+
+
 class StateMachineBase:
     """
     Base class for state machines with transaction safety and audit trail.
+
+    The transition graph, conditions and side effects are compiled once per
+    class (``__init_subclass__``); instances only hold the model instance, so
+    building a machine per row (templates, sweeper tasks) is cheap.
+    Conditions and side effects are stored as plain functions and called
+    with the machine as first argument.
     """
     
+    transitions: Dict[str, Tuple[str, ...]] = {}
+    conditions: Dict[Tuple[str, str], Callable] = {}
+    side_effects: Dict[Tuple[str, str], Callable] = {}
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.transitions = {}
+        cls.conditions = {}
+        cls.side_effects = {}
+        cls._setup_transitions()
+        cls._setup_conditions()
+        cls._setup_side_effects()
+        cls.transitions = {
+            from_state: tuple(to_states) for from_state, to_states in cls.transitions.items()
+        }
+    
     def __init__(self, instance):
         self.instance = instance
-        self.transitions = {}
-        self.side_effects = {}
-        self.conditions = {}
-        self._setup_transitions()
-        self._setup_conditions()
-        self._setup_side_effects()
-    
-    def _setup_transitions(self):
+    
+    @classmethod
+    def _setup_transitions(cls):
         """Override in subclasses to define valid transitions."""
         raise NotImplementedError("Subclasses must implement _setup_transitions")
     
-    def _setup_conditions(self):
+    @classmethod
+    def _setup_conditions(cls):
         """Override in subclasses to define transition conditions."""
         pass
     
-    def _setup_side_effects(self):
+    @classmethod
+    def _setup_side_effects(cls):
         """Override in subclasses to define transition side effects."""
         pass
     
-    def add_transition(self, from_state: str, to_state: str, condition: Optional[Callable] = None):
-        """Add a valid transition between states."""
-        if from_state not in self.transitions:
-            self.transitions[from_state] = []
-        self.transitions[from_state].append(to_state)
+    @classmethod
+    def add_transition(cls, from_state: str, to_state: str, condition: Optional[Callable] = None):
+        """Add a valid transition between states (while compiling the class)."""
+        cls.transitions.setdefault(from_state, []).append(to_state)
         
         if condition:
-            self.conditions[(from_state, to_state)] = condition
+            cls.conditions[(from_state, to_state)] = condition
     
-    def add_side_effect(self, transition: Tuple[str, str], effect: Callable):
-        """Add a side effect to be executed after a transition."""
-        self.side_effects[transition] = effect
+    @classmethod
+    def add_side_effect(cls, transition: Tuple[str, str], effect: Callable):
+        """Add a side effect to be executed after a transition (while compiling the class)."""
+        cls.side_effects[transition] = effect
     
     def can_transition(self, to_state: str, user: Optional[User] = None, **kwargs) -> Tuple[bool, str]:
         """
@@ -77,7 +113,7 @@ class StateMachineBase:
         # Check conditions
         condition_key = (current_state, to_state)
         if condition_key in self.conditions:
-            condition_result = self.conditions[condition_key](user=user, **kwargs)
+            condition_result = self.conditions[condition_key](self, user=user, **kwargs)
             if isinstance(condition_result, tuple):
                 is_valid, message = condition_result
                 if not is_valid:
@@ -87,40 +123,70 @@ class StateMachineBase:
         
         return True, ""
     
+    def lock(self):
+        """
+        Lock the instance row (SELECT ... FOR UPDATE) inside the current
+        transaction and check that the in-memory status is still current.
+        Raises StateTransitionConflict otherwise.
+        """
+        if self.instance.pk is None:
+            return
+        current = (
+            type(self.instance)._base_manager.select_for_update()
+            .filter(pk=self.instance.pk)
+            .values_list('status', flat=True)
+            .first()
+        )
+        if current != self.get_current_state():
+            raise StateTransitionConflict(self.instance, self.get_current_state(), current)
+    
     def transition_to(self, to_state: str, user: Optional[User] = None, **kwargs) -> bool:
         """
         Execute a state transition with transaction safety.
-        Returns True if successful, raises StateTransitionError if invalid.
+
+        The row is locked before validating, so concurrent transitions on the
+        same instance are serialized: the first wins and the others get
+        StateTransitionConflict. Returns True if successful, raises
+        StateTransitionError if invalid.
         """
-        current_state = self.get_current_state()
-        
-        # Validate transition
-        can_transition, error_message = self.can_transition(to_state, user, **kwargs)
-        if not can_transition:
-            logger.warning(f"Invalid transition attempt: {error_message}")
-            raise StateTransitionError(error_message)
+        old_state = self.get_current_state()
         
         try:
             with transaction.atomic():
-                # Update state
-                old_state = current_state
-                self.set_state(to_state)
+                self.lock()
+                
+                # Validate transition (under the lock)
+                can_transition, error_message = self.can_transition(to_state, user, **kwargs)
+                if not can_transition:
+                    logger.warning(f"Invalid transition attempt: {error_message}")
+                    raise StateTransitionError(error_message)
                 
                 # Update timestamps
                 self._update_timestamps(old_state, to_state)
                 
-                # Execute side effects
+                # Execute side effects (before the status changes in memory, so
+                # nested transitions still see the instance in its old state)
                 transition_key = (old_state, to_state)
                 if transition_key in self.side_effects:
-                    self.side_effects[transition_key](user=user, **kwargs)
+                    self.side_effects[transition_key](self, user=user, **kwargs)
                 
-                # Save instance (skip validation for automatic state transitions)
+                # Update state
+                self.set_state(to_state)
+                
+                # Save instance (skip validation for automatic state transitions);
+                # the user is recorded by the status history (post_save)
+                self.instance._transicao_usuario = user
                 self.instance.save(skip_validation=True)
+                self.instance._transicao_usuario = None
                 
                 logger.info(f"State transition successful: {old_state} -> {to_state} for {self.instance}")
                 return True
-                
+        
+        except StateTransitionError:
+            self.set_state(old_state)
+            raise
         except Exception as e:
+            self.set_state(old_state)
             logger.error(f"State transition failed: {old_state} -> {to_state} for {self.instance}. Error: {str(e)}")
             raise StateTransitionError(f"Transition failed: {str(e)}")
     
@@ -140,12 +206,12 @@ class StateMachineBase:
     def get_valid_transitions(self) -> List[str]:
         """Get list of valid transitions from current state."""
         current_state = self.get_current_state()
-        return self.transitions.get(current_state, [])
+        return list(self.transitions.get(current_state, ()))
     
     def get_transition_history(self) -> List[Dict]:
-        """Get the history of state transitions (if audit model exists)."""
-        # This would be implemented if we had a StateTransitionLog model
-        return []
+        """Get the history of state transitions (ads.models.StateTransitionLog)."""
+        from ads import historico_status
+        return historico_status.historico(self.instance)
 
 
 class NecessidadeStateMachine(StateMachineBase):
@@ -156,65 +222,68 @@ class NecessidadeStateMachine(StateMachineBase):
     # Timeout configuration (in hours)
     CONFIRMATION_TIMEOUT = 48
     
-    def _setup_transitions(self):
+    @classmethod
+    def _setup_transitions(cls):
         """Define valid state transitions for Necessidade."""
         # From ativo
-        self.add_transition('ativo', 'analisando_orcamentos')
-        self.add_transition('ativo', 'cancelado')
-        self.add_transition('ativo', 'expirado')
+        cls.add_transition('ativo', 'analisando_orcamentos')
+        cls.add_transition('ativo', 'cancelado')
+        cls.add_transition('ativo', 'expirado')
         
         # From analisando_orcamentos
-        self.add_transition('analisando_orcamentos', 'aguardando_confirmacao')
-        self.add_transition('analisando_orcamentos', 'cancelado')
-        self.add_transition('analisando_orcamentos', 'expirado')
+        cls.add_transition('analisando_orcamentos', 'aguardando_confirmacao')
+        cls.add_transition('analisando_orcamentos', 'cancelado')
+        cls.add_transition('analisando_orcamentos', 'expirado')
         
         # From aguardando_confirmacao
-        self.add_transition('aguardando_confirmacao', 'em_atendimento')
-        self.add_transition('aguardando_confirmacao', 'analisando_orcamentos')
-        self.add_transition('aguardando_confirmacao', 'cancelado')
-        self.add_transition('aguardando_confirmacao', 'expirado')
+        cls.add_transition('aguardando_confirmacao', 'em_atendimento')
+        cls.add_transition('aguardando_confirmacao', 'analisando_orcamentos')
+        cls.add_transition('aguardando_confirmacao', 'cancelado')
+        cls.add_transition('aguardando_confirmacao', 'expirado')
         
         # From em_atendimento
-        self.add_transition('em_atendimento', 'finalizado')
-        self.add_transition('em_atendimento', 'cancelado')
-        self.add_transition('em_atendimento', 'em_disputa')
+        cls.add_transition('em_atendimento', 'finalizado')
+        cls.add_transition('em_atendimento', 'cancelado')
+        cls.add_transition('em_atendimento', 'em_disputa')
         
         
         # From em_disputa
-        self.add_transition('em_disputa', 'em_atendimento')
-        self.add_transition('em_disputa', 'finalizado')
-        self.add_transition('em_disputa', 'cancelado')
+        cls.add_transition('em_disputa', 'em_atendimento')
+        cls.add_transition('em_disputa', 'finalizado')
+        cls.add_transition('em_disputa', 'cancelado')
         
         # From expirado (terminal state - can only be cancelled)
-        self.add_transition('expirado', 'cancelado')
+        cls.add_transition('expirado', 'cancelado')
     
-    def _setup_conditions(self):
+    @classmethod
+    def _setup_conditions(cls):
         """Define transition conditions."""
-        self.conditions[('ativo', 'analisando_orcamentos')] = self._condition_first_budget_received
-        self.conditions[('analisando_orcamentos', 'aguardando_confirmacao')] = self._condition_budget_accepted_by_client
-        self.conditions[('aguardando_confirmacao', 'em_atendimento')] = self._condition_budget_confirmed_by_supplier
-        self.conditions[('aguardando_confirmacao', 'analisando_orcamentos')] = self._condition_budget_refused_by_supplier
-        self.conditions[('em_atendimento', 'finalizado')] = self._condition_service_completed
-        self.conditions[('em_atendimento', 'em_disputa')] = self._condition_can_open_dispute
-        self.conditions[('em_disputa', 'em_atendimento')] = self._condition_dispute_resolved_continue
-        self.conditions[('em_disputa', 'finalizado')] = self._condition_dispute_resolved_complete
-        self.conditions[('em_disputa', 'cancelado')] = self._condition_dispute_resolved_cancel
-    
-    def _setup_side_effects(self):
+        cls.conditions[('ativo', 'analisando_orcamentos')] = cls._condition_first_budget_received
+        cls.conditions[('analisando_orcamentos', 'aguardando_confirmacao')] = cls._condition_budget_accepted_by_client
+        cls.conditions[('aguardando_confirmacao', 'em_atendimento')] = cls._condition_budget_confirmed_by_supplier
+        cls.conditions[('aguardando_confirmacao', 'analisando_orcamentos')] = cls._condition_budget_refused_by_supplier
+        cls.conditions[('em_atendimento', 'finalizado')] = cls._condition_service_completed
+        cls.conditions[('em_atendimento', 'em_disputa')] = cls._condition_can_open_dispute
+        cls.conditions[('em_disputa', 'em_atendimento')] = cls._condition_dispute_resolved_continue
+        cls.conditions[('em_disputa', 'finalizado')] = cls._condition_dispute_resolved_complete
+        cls.conditions[('em_disputa', 'cancelado')] = cls._condition_dispute_resolved_cancel
+    
+    @classmethod
+    def _setup_side_effects(cls):
         """Define side effects for transitions."""
-        self.side_effects[('ativo', 'analisando_orcamentos')] = self._effect_first_budget_received
-        self.side_effects[('analisando_orcamentos', 'aguardando_confirmacao')] = self._effect_budget_accepted
-        self.side_effects[('aguardando_confirmacao', 'em_atendimento')] = self._effect_service_started
-        self.side_effects[('aguardando_confirmacao', 'analisando_orcamentos')] = self._effect_budget_refused
-        self.side_effects[('em_atendimento', 'finalizado')] = self._effect_service_completed
-        self.side_effects[('ativo', 'cancelado')] = self._effect_cancelled
-        self.side_effects[('analisando_orcamentos', 'cancelado')] = self._effect_cancelled
-        self.side_effects[('aguardando_confirmacao', 'cancelado')] = self._effect_cancelled
-        self.side_effects[('em_atendimento', 'cancelado')] = self._effect_cancelled
-        self.side_effects[('em_atendimento', 'em_disputa')] = self._effect_dispute_opened
-        self.side_effects[('em_disputa', 'em_atendimento')] = self._effect_dispute_resolved_continue
-        self.side_effects[('em_disputa', 'finalizado')] = self._effect_dispute_resolved_complete
-        self.side_effects[('em_disputa', 'cancelado')] = self._effect_dispute_resolved_cancel
+        cls.side_effects[('ativo', 'analisando_orcamentos')] = cls._effect_first_budget_received
+        cls.side_effects[('analisando_orcamentos', 'aguardando_confirmacao')] = cls._effect_budget_accepted
+        cls.side_effects[('aguardando_confirmacao', 'em_atendimento')] = cls._effect_service_started
+        cls.side_effects[('aguardando_confirmacao', 'analisando_orcamentos')] = cls._effect_budget_refused
+        cls.side_effects[('em_atendimento', 'finalizado')] = cls._effect_service_completed
+        cls.side_effects[('ativo', 'cancelado')] = cls._effect_cancelled
+        cls.side_effects[('analisando_orcamentos', 'cancelado')] = cls._effect_cancelled
+        cls.side_effects[('aguardando_confirmacao', 'cancelado')] = cls._effect_cancelled
+        cls.side_effects[('em_atendimento', 'cancelado')] = cls._effect_cancelled
+        cls.side_effects[('em_atendimento', 'em_disputa')] = cls._effect_dispute_opened
+        cls.side_effects[('em_disputa', 'em_atendimento')] = cls._effect_dispute_resolved_continue
+        cls.side_effects[('em_disputa', 'finalizado')] = cls._effect_dispute_resolved_complete
+        cls.side_effects[('em_disputa', 'cancelado')] = cls._effect_dispute_resolved_cancel
     
     # Conditions
     def _condition_first_budget_received(self, **kwargs) -> Tuple[bool, str]:
@@ -250,8 +319,13 @@ class NecessidadeStateMachine(StateMachineBase):
         
         return True, ""
     
-    def _condition_budget_refused_by_supplier(self, user=None, budget=None, **kwargs) -> Tuple[bool, str]:
-        """Check if supplier is refusing the budget."""
+    def _condition_budget_refused_by_supplier(self, user=None, budget=None, timeout=False, **kwargs) -> Tuple[bool, str]:
+        """Check if supplier is refusing the budget (or the confirmation timed out)."""
+        if timeout:
+            if not self.is_confirmation_expired():
+                return False, "O prazo de confirmação ainda não expirou"
+            return True, ""
+        
         if not user or not budget:
             return False, "Usuário e orçamento são obrigatórios"
         
@@ -352,7 +426,10 @@ class NecessidadeStateMachine(StateMachineBase):
         """Execute when budget is accepted by client."""
         if budget:
             # Reject all other budgets
-            self.instance.orcamentos.exclude(id=budget.id).update(status='rejeitado_pelo_cliente')
+            from ads.rollups import atualizar_status_orcamentos
+            atualizar_status_orcamentos(
+                self.instance.orcamentos.exclude(id=budget.id), 'rejeitado_pelo_cliente'
+            )
             
             # Update budget status
             budget.status = 'aceito_pelo_cliente'
@@ -405,9 +482,11 @@ class NecessidadeStateMachine(StateMachineBase):
     def _effect_cancelled(self, **kwargs):
         """Execute when necessidade is cancelled."""
         # Update all pending budgets to anuncio_cancelado
-        self.instance.orcamentos.filter(
-            status__in=['enviado', 'aceito_pelo_cliente']
-        ).update(status='anuncio_cancelado')
+        from ads.rollups import atualizar_status_orcamentos
+        atualizar_status_orcamentos(
+            self.instance.orcamentos.filter(status__in=['enviado', 'aceito_pelo_cliente']),
+            'anuncio_cancelado'
+        )
         
         self._send_notification('NECESSIDADE_CANCELLED')
     
@@ -418,14 +497,14 @@ class NecessidadeStateMachine(StateMachineBase):
         if confirmed_budget:
             if user == self.instance.cliente:
                 # Cliente abriu disputa, notificar fornecedor
-                target_user = confirmed_budget.fornecedor
-                message = f'O cliente abriu uma disputa sobre o serviço "{self.instance.titulo}".'
+                target_user = confirmed_budget.fornecedor_id
+                autor = 'cliente'
             else:
                 # Fornecedor abriu disputa, notificar cliente
-                target_user = self.instance.cliente
-                message = f'O fornecedor abriu uma disputa sobre o serviço "{self.instance.titulo}".'
+                target_user = self.instance.cliente_id
+                autor = 'fornecedor'
             
-            self._send_notification_to_user(target_user, 'DISPUTE_OPENED', message)
+            self._send_notification_to_user(target_user, 'disputa_aberta', {'autor': autor})
         
         # Notificar administradores
         self._notify_admins_new_dispute(disputa)
@@ -445,16 +524,19 @@ class NecessidadeStateMachine(StateMachineBase):
     def _effect_dispute_resolved_cancel(self, user=None, disputa=None, **kwargs):
         """Execute when dispute is resolved and service is cancelled."""
         # Cancelar orçamentos relacionados
-        self.instance.orcamentos.filter(
-            status__in=['confirmado']
-        ).update(status='anuncio_cancelado')
+        from ads.rollups import atualizar_status_orcamentos
+        atualizar_status_orcamentos(
+            self.instance.orcamentos.filter(status__in=['confirmado']),
+            'anuncio_cancelado'
+        )
         
         self._send_notification('DISPUTE_RESOLVED_CANCEL')
     
     def _send_notification(self, notification_type: str):
         """Send notification for state transition."""
         try:
-            from notifications.models import Notification, NotificationType
+            from notifications.fanout import notificar
+            from notifications.models import NotificationType
             
             type_mapping = {
                 'FIRST_BUDGET_RECEIVED': NotificationType.NEW_BUDGET,
@@ -470,30 +552,21 @@ class NecessidadeStateMachine(StateMachineBase):
             }
             
             if notification_type in type_mapping:
-                Notification.objects.create(
-                    user=self.instance.cliente,
-                    message=f"Status da necessidade '{self.instance.titulo}' foi atualizado.",
+                notificar(
+                    [self.instance.cliente_id], 'status_necessidade', {'titulo': self.instance.titulo},
                     notification_type=type_mapping[notification_type],
-                    necessidade=self.instance
+                    necessidade=self.instance,
                 )
         except ImportError:
             logger.warning("Notification system not available")
     
-    def _send_notification_to_user(self, user, notification_type: str, message: str):
-        """Send notification to a specific user."""
+    def _send_notification_to_user(self, user, modelo: str, contexto: Dict):
+        """Send notification to a specific user (template from notifications.fanout.MODELOS)."""
         try:
-            from notifications.models import Notification, NotificationType
-            
-            type_mapping = {
-                'DISPUTE_OPENED': NotificationType.SYSTEM_MESSAGE,
-            }
+            from notifications.fanout import notificar
             
-            Notification.objects.create(
-                user=user,
-                title='Nova Disputa',
-                message=message,
-                notification_type=type_mapping.get(notification_type, NotificationType.SYSTEM_MESSAGE),
-                necessidade=self.instance
+            notificar(
+                [user], modelo, {'titulo': self.instance.titulo, **contexto}, necessidade=self.instance
             )
         except ImportError:
             logger.warning("Notification system not available")
@@ -501,21 +574,17 @@ class NecessidadeStateMachine(StateMachineBase):
     def _notify_admins_new_dispute(self, disputa=None):
         """Notify administrators about new dispute."""
         try:
-            from notifications.models import Notification, NotificationType
+            from notifications.fanout import notificar
             from django.contrib.auth import get_user_model
             
             User = get_user_model()
-            admins = User.objects.filter(is_staff=True)
+            admins = User.objects.filter(is_staff=True).values_list('pk', flat=True)
             
-            for admin in admins:
-                Notification.objects.create(
-                    user=admin,
-                    title='Nova Disputa Requer Atenção',
-                    message=f'Uma nova disputa foi aberta para "{self.instance.titulo}" e requer análise administrativa.',
-                    notification_type=NotificationType.SYSTEM_MESSAGE,
-                    necessidade=self.instance,
-                    metadata={'disputa_id': disputa.pk if disputa else None, 'urgente': True}
-                )
+            notificar(
+                admins, 'disputa_admin', {'titulo': self.instance.titulo},
+                necessidade=self.instance,
+                metadata={'disputa_id': disputa.pk if disputa else None, 'urgente': True},
+            )
         except ImportError:
             logger.warning("Notification system not available")
     
@@ -556,14 +625,15 @@ class NecessidadeStateMachine(StateMachineBase):
         """Handle confirmation timeout automatically."""
         if self.is_confirmation_expired():
             try:
-                # Transition back to analisando_orcamentos
-                self.transition_to('analisando_orcamentos')
-                
-                # Reset the accepted budget to enviado
-                accepted_budget = self.instance.orcamentos.filter(status='aceito_pelo_cliente').first()
-                if accepted_budget:
-                    accepted_budget.status = 'enviado'
-                    accepted_budget.save()
+                with transaction.atomic():
+                    # Transition back to analisando_orcamentos
+                    self.transition_to('analisando_orcamentos', timeout=True)
+                    
+                    # Reset the accepted budget to enviado
+                    accepted_budget = self.instance.orcamentos.filter(status='aceito_pelo_cliente').first()
+                    if accepted_budget:
+                        accepted_budget.status = 'enviado'
+                        accepted_budget.save()
                 
                 logger.info(f"Confirmation timeout handled for necessidade {self.instance.id}")
                 return True
@@ -580,41 +650,54 @@ class OrcamentoStateMachine(StateMachineBase):
     State machine for Orçamento model.
     """
     
-    def _setup_transitions(self):
+    def lock(self):
+        """
+        Lock the necessidade before the budget: accepting/confirming a budget
+        also moves the necessidade, and two budgets of the same necessidade
+        must not be accepted concurrently. The order (necessidade, then
+        budgets) is the same used by the necessidade's own side effects.
+        """
+        NecessidadeStateMachine(self.instance.anuncio).lock()
+        super().lock()
+    
+    @classmethod
+    def _setup_transitions(cls):
         """Define valid state transitions for Orçamento."""
         # From enviado
-        self.add_transition('enviado', 'aceito_pelo_cliente')
-        self.add_transition('enviado', 'rejeitado_pelo_cliente')
-        self.add_transition('enviado', 'cancelado_pelo_fornecedor')
-        self.add_transition('enviado', 'anuncio_cancelado')
-        self.add_transition('enviado', 'anuncio_expirado')
+        cls.add_transition('enviado', 'aceito_pelo_cliente')
+        cls.add_transition('enviado', 'rejeitado_pelo_cliente')
+        cls.add_transition('enviado', 'cancelado_pelo_fornecedor')
+        cls.add_transition('enviado', 'anuncio_cancelado')
+        cls.add_transition('enviado', 'anuncio_expirado')
         
         # From aceito_pelo_cliente
-        self.add_transition('aceito_pelo_cliente', 'confirmado')
-        self.add_transition('aceito_pelo_cliente', 'recusado_pelo_fornecedor')
-        self.add_transition('aceito_pelo_cliente', 'anuncio_cancelado')
-        self.add_transition('aceito_pelo_cliente', 'anuncio_expirado')
+        cls.add_transition('aceito_pelo_cliente', 'confirmado')
+        cls.add_transition('aceito_pelo_cliente', 'recusado_pelo_fornecedor')
+        cls.add_transition('aceito_pelo_cliente', 'anuncio_cancelado')
+        cls.add_transition('aceito_pelo_cliente', 'anuncio_expirado')
         
         # From confirmado
-        self.add_transition('confirmado', 'finalizado')
-        self.add_transition('confirmado', 'anuncio_cancelado')
+        cls.add_transition('confirmado', 'finalizado')
+        cls.add_transition('confirmado', 'anuncio_cancelado')
         
         # Status terminais (não têm transições de saída)
         # rejeitado_pelo_cliente, recusado_pelo_fornecedor, cancelado_pelo_fornecedor, 
         # finalizado, anuncio_cancelado, anuncio_expirado são estados finais
     
-    def _setup_conditions(self):
+    @classmethod
+    def _setup_conditions(cls):
         """Define transition conditions."""
-        self.conditions[('enviado', 'aceito_pelo_cliente')] = self._condition_client_accepts
-        self.conditions[('enviado', 'rejeitado_pelo_cliente')] = self._condition_client_rejects
-        self.conditions[('aceito_pelo_cliente', 'confirmado')] = self._condition_supplier_confirms
-        self.conditions[('aceito_pelo_cliente', 'recusado_pelo_fornecedor')] = self._condition_supplier_refuses
+        cls.conditions[('enviado', 'aceito_pelo_cliente')] = cls._condition_client_accepts
+        cls.conditions[('enviado', 'rejeitado_pelo_cliente')] = cls._condition_client_rejects
+        cls.conditions[('aceito_pelo_cliente', 'confirmado')] = cls._condition_supplier_confirms
+        cls.conditions[('aceito_pelo_cliente', 'recusado_pelo_fornecedor')] = cls._condition_supplier_refuses
     
-    def _setup_side_effects(self):
+    @classmethod
+    def _setup_side_effects(cls):
         """Define side effects for transitions."""
-        self.side_effects[('enviado', 'aceito_pelo_cliente')] = self._effect_accepted_by_client
-        self.side_effects[('aceito_pelo_cliente', 'confirmado')] = self._effect_confirmed_by_supplier
-        self.side_effects[('aceito_pelo_cliente', 'recusado_pelo_fornecedor')] = self._effect_refused_by_supplier
+        cls.side_effects[('enviado', 'aceito_pelo_cliente')] = cls._effect_accepted_by_client
+        cls.side_effects[('aceito_pelo_cliente', 'confirmado')] = cls._effect_confirmed_by_supplier
+        cls.side_effects[('aceito_pelo_cliente', 'recusado_pelo_fornecedor')] = cls._effect_refused_by_supplier
     
     # Conditions
     def _condition_client_accepts(self, user=None, **kwargs) -> Tuple[bool, str]:
@@ -668,6 +751,8 @@ class OrcamentoStateMachine(StateMachineBase):
         necessidade_sm = NecessidadeStateMachine(self.instance.anuncio)
         try:
             necessidade_sm.transition_to('aguardando_confirmacao', user=user, budget=self.instance)
+        except StateTransitionConflict:
+            raise
         except StateTransitionError as e:
             logger.error(f"Failed to update necessidade state when budget accepted: {e}")
         
@@ -679,6 +764,8 @@ class OrcamentoStateMachine(StateMachineBase):
         necessidade_sm = NecessidadeStateMachine(self.instance.anuncio)
         try:
             necessidade_sm.transition_to('em_atendimento', user=user, budget=self.instance)
+        except StateTransitionConflict:
+            raise
         except StateTransitionError as e:
             logger.error(f"Failed to update necessidade state when budget confirmed: {e}")
         
@@ -690,6 +777,8 @@ class OrcamentoStateMachine(StateMachineBase):
         necessidade_sm = NecessidadeStateMachine(self.instance.anuncio)
         try:
             necessidade_sm.transition_to('analisando_orcamentos', user=user, budget=self.instance)
+        except StateTransitionConflict:
+            raise
         except StateTransitionError as e:
             logger.error(f"Failed to update necessidade state when budget refused: {e}")
         
@@ -698,29 +787,27 @@ class OrcamentoStateMachine(StateMachineBase):
     def _send_notification(self, notification_type: str):
         """Send notification for budget state transition."""
         try:
-            from notifications.models import Notification, NotificationType
+            from notifications.fanout import notificar
             
             # Notify the relevant user based on the transition
             if notification_type == 'BUDGET_ACCEPTED_BY_CLIENT':
                 # Notify supplier
-                user_to_notify = self.instance.fornecedor
-                message = f"Seu orçamento para '{self.instance.anuncio.titulo}' foi aceito pelo cliente."
+                user_to_notify = self.instance.fornecedor_id
+                modelo = 'orcamento_aceito'
             elif notification_type == 'BUDGET_CONFIRMED_BY_SUPPLIER':
                 # Notify client
-                user_to_notify = self.instance.anuncio.cliente
-                message = f"Orçamento para '{self.instance.anuncio.titulo}' foi confirmado pelo fornecedor."
+                user_to_notify = self.instance.anuncio.cliente_id
+                modelo = 'orcamento_confirmado'
             elif notification_type == 'BUDGET_REFUSED_BY_SUPPLIER':
                 # Notify client
-                user_to_notify = self.instance.anuncio.cliente
-                message = f"Orçamento para '{self.instance.anuncio.titulo}' foi recusado pelo fornecedor."
+                user_to_notify = self.instance.anuncio.cliente_id
+                modelo = 'orcamento_recusado'
             else:
                 return
             
-            Notification.objects.create(
-                user=user_to_notify,
-                message=message,
-                notification_type=NotificationType.NEW_BUDGET,
-                necessidade=self.instance.anuncio
+            notificar(
+                [user_to_notify], modelo, {'titulo': self.instance.anuncio.titulo},
+                necessidade=self.instance.anuncio,
             )
         except ImportError:
             logger.warning("Notification system not available")
@@ -0,0 +1,185 @@
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.db import close_old_connections, connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from ads.models import Necessidade
+from budgets.models import Orcamento
+from categories.models import Categoria, SubCategoria
+from core.services.rate_limit_service import RateLimitService, limitar
+from core.state_machine import (
+    NecessidadeStateMachine,
+    OrcamentoStateMachine,
+    StateTransitionConflict,
+    StateTransitionError,
+)
+from users.models import User
+
+
+class TabelasCompiladasTest(SimpleTestCase):
+    """
+    O grafo de transições é montado uma vez por classe, não por instância.
+    """
+
+    def test_tabelas_compartilhadas_entre_instancias(self):
+        primeira = NecessidadeStateMachine(Necessidade(status='ativo'))
+        segunda = NecessidadeStateMachine(Necessidade(status='ativo'))
+        self.assertIs(primeira.transitions, segunda.transitions)
+        self.assertIsNot(NecessidadeStateMachine.transitions, OrcamentoStateMachine.transitions)
+        self.assertEqual(
+            primeira.get_valid_transitions(), ['analisando_orcamentos', 'cancelado', 'expirado']
+        )
+        self.assertEqual(OrcamentoStateMachine(Orcamento(status='finalizado')).get_valid_transitions(), [])
+
+
+class TransicoesConcorrentesTest(TransactionTestCase):
+    """
+    Aceite/confirmação disparados em paralelo: as linhas são travadas na
+    transição, então só uma requisição vence e as demais recebem erro.
+    """
+
+    THREADS = 6
+
+    def setUp(self):
+        self.cliente = User.objects.create_user(
+            email='cliente@exemplo.com', password='senha123', is_client=True
+        )
+        categoria = Categoria.objects.create(nome='Serviços')
+        self.necessidade = Necessidade.objects.create(
+            titulo='Reforma', descricao='Reforma da cozinha', cliente=self.cliente, categoria=categoria,
+            subcategoria=SubCategoria.objects.create(nome='Reformas', categoria=categoria),
+            quantidade=1, unidade='un', status='analisando_orcamentos',
+        )
+        self.orcamentos = [
+            Orcamento.objects.create(
+                fornecedor=User.objects.create_user(
+                    email=f'fornecedor{i}@exemplo.com', password='senha123', is_supplier=True
+                ),
+                anuncio=self.necessidade,
+                prazo_validade=timezone.now().date() + timedelta(days=10),
+                prazo_entrega=timezone.now().date() + timedelta(days=20),
+            )
+            for i in range(self.THREADS)
+        ]
+
+    def _em_paralelo(self, acoes):
+        """Executa as ações ao mesmo tempo; retorna 'ok' ou a exceção de cada uma."""
+        barreira = threading.Barrier(len(acoes))
+        resultados = [None] * len(acoes)
+
+        def executar(indice, acao):
+            try:
+                barreira.wait()
+                acao()
+                resultados[indice] = 'ok'
+            except Exception as e:
+                resultados[indice] = e
+            finally:
+                close_old_connections()
+                connection.close()
+
+        threads = [threading.Thread(target=executar, args=item) for item in enumerate(acoes)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return resultados
+
+    def test_aceites_e_confirmacoes_simultaneos(self):
+        def aceitar(orcamento_id):
+            def acao():
+                orcamento = Orcamento.objects.get(pk=orcamento_id)
+                orcamento.transition_to('aceito_pelo_cliente', user=self.cliente)
+            return acao
+
+        resultados = self._em_paralelo([aceitar(o.pk) for o in self.orcamentos])
+        self.assertEqual(resultados.count('ok'), 1)
+        for resultado in resultados:
+            if resultado != 'ok':
+                self.assertIsInstance(resultado, StateTransitionError)
+
+        aceitos = Orcamento.objects.filter(anuncio=self.necessidade, status='aceito_pelo_cliente')
+        self.assertEqual(aceitos.count(), 1)
+        self.necessidade.refresh_from_db()
+        self.assertEqual(self.necessidade.status, 'aguardando_confirmacao')
+
+        # O fornecedor confirma o mesmo orçamento em várias abas ao mesmo tempo
+        aceito = aceitos.get()
+
+        def confirmar():
+            orcamento = Orcamento.objects.get(pk=aceito.pk)
+            orcamento.transition_to('confirmado', user=aceito.fornecedor)
+
+        resultados = self._em_paralelo([confirmar] * self.THREADS)
+        self.assertEqual(resultados.count('ok'), 1)
+        for resultado in resultados:
+            if resultado != 'ok':
+                self.assertIsInstance(resultado, StateTransitionConflict)
+
+        aceito.refresh_from_db()
+        self.necessidade.refresh_from_db()
+        self.assertEqual(aceito.status, 'confirmado')
+        self.assertEqual(self.necessidade.status, 'em_atendimento')
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'rate-limit'}},
+    RATE_LIMIT_POLITICAS={'padrao': '5/60', 'teste': '5/60'},
+    PROXIES_CONFIAVEIS=['10.0.0.0/8'],
+)
+class RateLimitTest(SimpleTestCase):
+    """
+    Janela deslizante do RateLimitService (caminho sem Redis: add/incr do cache).
+    """
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def test_x_forwarded_for_so_de_proxy_confiavel(self):
+        forjado = {'HTTP_X_FORWARDED_FOR': '1.1.1.1, 200.0.0.1'}
+        self.assertEqual(RateLimitService.ip_cliente(self.factory.get('/', REMOTE_ADDR='10.0.0.2', **forjado)), '200.0.0.1')
+        self.assertEqual(RateLimitService.ip_cliente(self.factory.get('/', REMOTE_ADDR='200.0.0.9', **forjado)), '200.0.0.9')
+
+    def test_limite_com_requisicoes_concorrentes(self):
+        resultados = []
+        barreira = threading.Barrier(20)
+
+        def verificar():
+            barreira.wait()
+            resultados.append(RateLimitService.verificar(self.factory.get('/', REMOTE_ADDR='200.0.0.1'), 'teste'))
+
+        threads = [threading.Thread(target=verificar) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sum(resultado.permitido for resultado in resultados), 5)
+        self.assertTrue(all(resultado.reset >= 1 for resultado in resultados if not resultado.permitido))
+        # Outro cliente tem a própria janela
+        self.assertTrue(RateLimitService.verificar(self.factory.get('/', REMOTE_ADDR='200.0.0.2'), 'teste').permitido)
+
+    def test_janela_anterior_pesa_na_atual(self):
+        with mock.patch('core.services.rate_limit_service.time.time', return_value=600.0):
+            for _ in range(5):
+                RateLimitService.verificar(self.factory.get('/', REMOTE_ADDR='200.0.0.1'), 'teste')
+        # Na metade da janela seguinte, as 5 da anterior ainda contam como 2,5
+        with mock.patch('core.services.rate_limit_service.time.time', return_value=690.0):
+            permitidos = [
+                RateLimitService.verificar(self.factory.get('/', REMOTE_ADDR='200.0.0.1'), 'teste').permitido
+                for _ in range(4)
+            ]
+        self.assertEqual(permitidos, [True, True, False, False])
+
+    def test_decorator_responde_429(self):
+        view = limitar('teste')(lambda request: HttpResponse('ok'))
+        respostas = [view(self.factory.get('/', REMOTE_ADDR='200.0.0.1')) for _ in range(6)]
+        self.assertEqual(respostas[0]['X-RateLimit-Remaining'], '4')
+        self.assertEqual(respostas[-1].status_code, 429)
+        self.assertIn('Retry-After', respostas[-1])
@@ -0,0 +1,304 @@
+"""
+Processamento de campanhas (NotificationBatch).
+
+Ciclo de vida (transições em `agendar`, `pausar`, `retomar` e `cancelar`):
+    draft -> scheduled -> processing -> completed
+    scheduled/processing -> paused -> scheduled (continua do checkpoint)
+    qualquer status não final -> cancelled
+
+- Os destinatários (target_users ou target_criteria) são lidos por id
+  crescente com cursor no servidor (`iterator`), sem carregar a lista em
+  memória; `last_user_id` é o checkpoint para retomar.
+- Cada bloco de usuários é uma transação: notificações (um bulk_create via
+  `notifications.fanout`), e-mails na outbox e contadores de progresso (F()).
+  A linha da campanha fica travada durante o bloco, então pausar ou cancelar
+  vale a partir do bloco seguinte.
+- A task `processar_campanha` roda em fatias de CAMPANHA_FATIA_SEGUNDOS na
+  fila `campanhas` (CELERY_TASK_ROUTES), sem ocupar os workers da fila
+  padrão, e se reagenda até terminar; uma trava no cache impede dois
+  workers na mesma campanha.
+- Os e-mails são distribuídos no tempo (next_attempt_at da outbox) para no
+  máximo CAMPANHA_EMAILS_POR_MINUTO.
+"""
+
+from datetime import date, timedelta
+import logging
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+
+from .models import EmailOutbox, Notification, NotificationBatch, UserNotificationPreferences
+
+logger = logging.getLogger(__name__)
+
+
+# ==================== DESTINATÁRIOS ====================
+
+def _por_categorias(queryset, categorias):
+    User = get_user_model()
+    preferidas = User.preferred_categories.through.objects.filter(
+        user_id=OuterRef('pk'), categoria_id__in=categorias
+    )
+    return queryset.filter(Exists(preferidas))
+
+
+# Critérios aceitos em target_criteria: {chave: filtro(queryset, valor)}
+CRITERIOS = {
+    'is_client': lambda qs, valor: qs.filter(is_client=bool(valor)),
+    'is_supplier': lambda qs, valor: qs.filter(is_supplier=bool(valor)),
+    'estado': lambda qs, valor: qs.filter(estado__in=valor if isinstance(valor, list) else [valor]),
+    'cidade': lambda qs, valor: qs.filter(cidade__iexact=valor),
+    'categorias': _por_categorias,
+    'cadastrados_desde': lambda qs, valor: qs.filter(date_joined__date__gte=date.fromisoformat(valor)),
+    'cadastrados_ate': lambda qs, valor: qs.filter(date_joined__date__lte=date.fromisoformat(valor)),
+}
+
+
+def destinatarios(campanha):
+    """
+    Queryset dos usuários ativos alvo da campanha.
+
+    Raises:
+        ValueError: critério desconhecido ou valor inválido
+    """
+    User = get_user_model()
+    usuarios = User.objects.filter(is_active=True)
+    alvos = NotificationBatch.target_users.through.objects.filter(notificationbatch_id=campanha.pk)
+    if alvos.exists():
+        return usuarios.filter(Exists(alvos.filter(user_id=OuterRef('pk'))))
+
+    desconhecidos = set(campanha.target_criteria) - set(CRITERIOS)
+    if desconhecidos:
+        raise ValueError(f"Critérios desconhecidos: {', '.join(sorted(desconhecidos))}")
+    for chave, valor in campanha.target_criteria.items():
+        usuarios = CRITERIOS[chave](usuarios, valor)
+    return usuarios
+
+
+def _blocos_de_ids(queryset, ultimo_id, tamanho):
+    """Ids em blocos, por id crescente após `ultimo_id` (cursor no servidor)."""
+    ids = (
+        queryset.filter(pk__gt=ultimo_id)
+        .order_by('pk')
+        .values_list('pk', flat=True)
+        .iterator(chunk_size=tamanho)
+    )
+    bloco = []
+    for pk in ids:
+        bloco.append(pk)
+        if len(bloco) == tamanho:
+            yield bloco
+            bloco = []
+    if bloco:
+        yield bloco
+
+
+# ==================== CONTROLE ====================
+
+def _mudar_status(campanha, de, para, **campos):
+    """Transição condicional (UPDATE ... WHERE status IN): segura contra corridas com o worker."""
+    alterou = NotificationBatch.objects.filter(pk=campanha.pk, status__in=de).update(status=para, **campos)
+    if alterou:
+        campanha.status = para
+        for campo, valor in campos.items():
+            setattr(campanha, campo, valor)
+    return bool(alterou)
+
+
+def _disparar(campanha_id):
+    from .tasks import processar_campanha
+
+    try:
+        processar_campanha.delay(campanha_id)
+    except Exception as e:
+        # O beat de `iniciar_campanhas` tenta de novo
+        logger.warning(f"Não foi possível agendar a campanha {campanha_id}: {e}")
+
+
+def _iniciar_se_vencida(campanha):
+    if campanha.scheduled_for <= timezone.now():
+        transaction.on_commit(iniciar_agendadas)
+
+
+def agendar(campanha, quando=None):
+    """
+    Agenda uma campanha em rascunho (agora, se `quando` não for informado).
+
+    Raises:
+        ValueError: target_criteria inválido
+    """
+    destinatarios(campanha)
+    if not _mudar_status(campanha, ['draft'], 'scheduled', scheduled_for=quando or timezone.now()):
+        return False
+    _iniciar_se_vencida(campanha)
+    return True
+
+
+def pausar(campanha):
+    return _mudar_status(campanha, ['scheduled', 'processing'], 'paused')
+
+
+def retomar(campanha):
+    """Volta a agendar uma campanha pausada; o processamento continua do checkpoint."""
+    if not _mudar_status(campanha, ['paused'], 'scheduled'):
+        return False
+    _iniciar_se_vencida(campanha)
+    return True
+
+
+def cancelar(campanha):
+    """Cancela a campanha; o que já foi enviado permanece."""
+    return _mudar_status(
+        campanha, ['draft', 'scheduled', 'processing', 'paused'], 'cancelled', sent_at=timezone.now()
+    )
+
+
+def iniciar_agendadas():
+    """
+    Inicia as campanhas agendadas que venceram e reagenda as que estão em
+    processamento (a trava descarta duplicatas; cobre workers que morreram).
+
+    Returns:
+        int: campanhas disparadas
+    """
+    NotificationBatch.objects.filter(status='scheduled', scheduled_for__lte=timezone.now()).update(
+        status='processing'
+    )
+    ids = list(NotificationBatch.objects.filter(status='processing').values_list('pk', flat=True))
+    for campanha_id in ids:
+        _disparar(campanha_id)
+    return len(ids)
+
+
+# ==================== PROCESSAMENTO ====================
+
+def _emails(campanha, user_ids, notificacoes, agora):
+    """E-mails da outbox (não salvos) para quem aceita e-mail do tipo, espaçados pelo limite por minuto."""
+    User = get_user_model()
+    preferencias = UserNotificationPreferences.objects.in_bulk(user_ids, field_name='user_id')
+    por_usuario = {n.user_id: n for n in notificacoes}
+    enderecos = [
+        (pk, email)
+        for pk, email in User.objects.filter(pk__in=user_ids).exclude(email='').values_list('pk', 'email')
+        if pk not in preferencias or preferencias[pk].should_send_email(campanha.notification_type)
+    ]
+
+    intervalo = 60 / settings.CAMPANHA_EMAILS_POR_MINUTO
+    inicio = max(agora, campanha.next_email_at or agora)
+    emails = [
+        EmailOutbox(
+            dedup_key=f"campanha:{campanha.pk}:{pk}",
+            subject=campanha.title,
+            body=campanha.message,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            recipients=[email],
+            notification=por_usuario.get(pk),
+            next_attempt_at=inicio + timedelta(seconds=i * intervalo),
+        )
+        for i, (pk, email) in enumerate(enderecos)
+    ]
+    return emails, inicio + timedelta(seconds=len(emails) * intervalo)
+
+
+def _processar_bloco(campanha_id, user_ids):
+    """
+    Envia um bloco (uma transação).
+
+    Returns:
+        False se a campanha deixou de estar em processamento (pausada/cancelada)
+    """
+    from .fanout import enviar
+
+    agora = timezone.now()
+    with transaction.atomic():
+        campanha = NotificationBatch.objects.select_for_update().filter(pk=campanha_id).first()
+        if campanha is None or campanha.status != 'processing':
+            return False
+
+        criadas = enviar([
+            Notification(
+                user_id=user_id,
+                notification_type=campanha.notification_type,
+                title=campanha.title,
+                message=campanha.message,
+                metadata={**campanha.metadata, 'batch_id': campanha.pk},
+            )
+            for user_id in user_ids
+        ])
+
+        emails, proximo_email = [], campanha.next_email_at
+        if campanha.send_email:
+            emails, proximo_email = _emails(campanha, user_ids, criadas, agora)
+            # dedup_key: no máximo um e-mail por usuário em cada campanha
+            EmailOutbox.objects.bulk_create(emails, ignore_conflicts=True)
+
+        NotificationBatch.objects.filter(pk=campanha_id).update(
+            last_user_id=user_ids[-1],
+            total_notifications=F('total_notifications') + len(user_ids),
+            successful_notifications=F('successful_notifications') + len(criadas),
+            emails_queued=F('emails_queued') + len(emails),
+            next_email_at=proximo_email,
+        )
+    return True
+
+
+def _registrar_falha(campanha_id, user_ids, erro):
+    """Pula um bloco que falhou (contado em failed_notifications) para não travar a campanha."""
+    logger.error(f"Campanha {campanha_id}: erro no bloco até o usuário {user_ids[-1]}: {erro}")
+    NotificationBatch.objects.filter(pk=campanha_id, status='processing').update(
+        last_user_id=user_ids[-1],
+        total_notifications=F('total_notifications') + len(user_ids),
+        failed_notifications=F('failed_notifications') + len(user_ids),
+    )
+
+
+def processar(campanha_id, segundos=None, tamanho_bloco=None):
+    """
+    Processa uma fatia da campanha a partir do checkpoint.
+
+    Returns:
+        'continuar' (fatia esgotada), 'concluida', 'interrompida' (pausada,
+        cancelada ou inexistente) ou 'ocupada' (outro worker tem a trava)
+    """
+    segundos = segundos or settings.CAMPANHA_FATIA_SEGUNDOS
+    tamanho_bloco = tamanho_bloco or settings.CAMPANHA_LOTE
+    trava = f"notifications:campanha:{campanha_id}"
+    if not cache.add(trava, 1, segundos * 2):
+        return 'ocupada'
+
+    try:
+        campanha = NotificationBatch.objects.filter(pk=campanha_id, status='processing').first()
+        if campanha is None:
+            return 'interrompida'
+        try:
+            usuarios = destinatarios(campanha)
+        except ValueError as e:
+            logger.error(f"Campanha {campanha_id} com target_criteria inválido: {e}")
+            _mudar_status(campanha, ['processing'], 'failed')
+            return 'interrompida'
+
+        inicio = time.monotonic()
+        for user_ids in _blocos_de_ids(usuarios, campanha.last_user_id, tamanho_bloco):
+            try:
+                if not _processar_bloco(campanha_id, user_ids):
+                    return 'interrompida'
+            except Exception as e:
+                _registrar_falha(campanha_id, user_ids, e)
+            if time.monotonic() - inicio >= segundos:
+                return 'continuar'
+
+        if _mudar_status(campanha, ['processing'], 'completed', sent_at=timezone.now()):
+            campanha.refresh_from_db(fields=['total_notifications', 'successful_notifications'])
+            logger.info(
+                f"Campanha {campanha_id} concluída: {campanha.successful_notifications} de "
+                f"{campanha.total_notifications} destinatários notificados"
+            )
+            return 'concluida'
+        return 'interrompida'
+    finally:
+        cache.delete(trava)
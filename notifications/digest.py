@@ -0,0 +1,194 @@
+"""
+Entrega de e-mails conforme as preferências do usuário (UserNotificationPreferences).
+
+Uso (e-mails de eventos destinados a um usuário):
+    enviar_email_usuario(cliente, "Novo Orçamento Recebido", corpo,
+                         notification_type=NotificationType.NEW_BUDGET,
+                         resumo=f"Novo orçamento para '{anuncio.titulo}'",
+                         dedup_key=f"orcamento:{pk}:novo")
+
+- Envio imediato: vai para a outbox; no horário silencioso, é agendado para
+  o fim dele (next_attempt_at) em vez de descartado.
+- Resumo diário/semanal: o evento vira uma linha (DigestEntry) acumulada.
+- `enviar_resumos` (beat de hora em hora) agrupa os usuários por fuso
+  horário; um fuso vence quando a hora local é DIGEST_HORA (o semanal,
+  também no DIGEST_DIA_SEMANA). Cada fuso vencido é lido com uma consulta
+  agregada por usuário e enfileirado na outbox em lotes de DIGEST_LOTE
+  (bulk_create), entregues com uma conexão SMTP por lote.
+"""
+
+from collections import Counter
+from functools import reduce
+import logging
+import operator
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .models import DigestEntry, EmailOutbox, UserNotificationPreferences, fuso_horario
+from .outbox import agendar_processamento, enfileirar_email
+
+logger = logging.getLogger(__name__)
+
+DIARIO = UserNotificationPreferences.EMAIL_DIARIO
+SEMANAL = UserNotificationPreferences.EMAIL_SEMANAL
+
+
+# ==================== EVENTOS ====================
+
+def enviar_email_usuario(usuario, assunto, corpo, *, notification_type, resumo=None, dedup_key=None):
+    """
+    Envia (ou acumula para o resumo) um e-mail de evento para o usuário.
+
+    Args:
+        resumo: linha do evento no resumo (padrão: o assunto)
+
+    Returns:
+        EmailOutbox, DigestEntry ou None (e-mail desativado, sem endereço ou duplicado)
+    """
+    if not usuario.email:
+        return None
+    try:
+        preferencias = usuario.notification_preferences
+    except UserNotificationPreferences.DoesNotExist:
+        return enfileirar_email([usuario.email], assunto, corpo, dedup_key=dedup_key)
+
+    modo = preferencias.modo_email(notification_type)
+    if modo is None:
+        return None
+    if modo == UserNotificationPreferences.EMAIL_IMEDIATO:
+        return enfileirar_email(
+            [usuario.email], assunto, corpo,
+            dedup_key=dedup_key, enviar_em=preferencias.fim_horario_silencioso(),
+        )
+
+    try:
+        with transaction.atomic():
+            return DigestEntry.objects.create(
+                user=usuario, notification_type=notification_type,
+                summary=(resumo or assunto)[:255], dedup_key=dedup_key,
+            )
+    except IntegrityError:
+        logger.info(f"Item de resumo com dedup_key '{dedup_key}' já registrado; ignorando")
+        return None
+
+
+# ==================== RESUMOS ====================
+
+def _filtro_frequencia(frequencia, prefixo='user__notification_preferences__'):
+    """Preferências que recebem o resumo da frequência (mesmas regras de `modo_email`)."""
+    def q(**campos):
+        return Q(**{f"{prefixo}{campo}": valor for campo, valor in campos.items()})
+
+    if frequencia == DIARIO:
+        # Sem envio instantâneo e sem resumo escolhido também acumula no diário
+        return q(daily_digest=True) | q(weekly_digest=False, instant_notifications=False)
+    return q(daily_digest=False, weekly_digest=True)
+
+
+def _corpo(nome, frequencia, total, linhas):
+    periodo = 'diário' if frequencia == DIARIO else 'semanal'
+    itens = [
+        f"- {linha}" + (f" ({vezes}x)" if vezes > 1 else '')
+        for linha, vezes in Counter(linhas).items()
+    ]
+    return (
+        f"Olá, {nome}!\n\n"
+        f"Seu resumo {periodo} tem {total} novidade{'s' if total > 1 else ''}:\n\n"
+        + "\n".join(itens)
+        + "\n\nAcesse a plataforma para ver os detalhes.\n\n"
+        "Atenciosamente,\nIndicaai"
+    )
+
+
+def _enfileirar_lote(linhas, frequencia, agora):
+    """
+    Enfileira os resumos de um lote de usuários e consome os itens incluídos (uma transação).
+
+    A dedup_key leva o último item do resumo: se ela já existe, aqueles itens já
+    saíram em um resumo anterior e podem ser consumidos sem perda.
+    """
+    user_ids = [linha['user_id'] for linha in linhas]
+    preferencias = UserNotificationPreferences.objects.in_bulk(user_ids, field_name='user_id')
+    periodo = 'diário' if frequencia == DIARIO else 'semanal'
+    emails = [
+        EmailOutbox(
+            dedup_key=f"resumo:{frequencia}:{linha['user_id']}:{linha['ultimo_id']}",
+            subject=f"Seu resumo {periodo} do Indicaai",
+            body=_corpo(linha['user__first_name'], frequencia, linha['total'], linha['linhas']),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            recipients=[linha['user__email']],
+            next_attempt_at=preferencias[linha['user_id']].fim_horario_silencioso(agora) or agora,
+        )
+        for linha in linhas
+    ]
+    with transaction.atomic():
+        EmailOutbox.objects.bulk_create(emails, ignore_conflicts=True)
+        # Só os itens lidos na consulta: os que chegaram depois ficam para o próximo resumo
+        DigestEntry.objects.filter(
+            reduce(operator.or_, (Q(user_id=linha['user_id'], id__lte=linha['ultimo_id']) for linha in linhas))
+        ).delete()
+        transaction.on_commit(agendar_processamento)
+    return len(emails)
+
+
+def _enviar_fuso(nome, frequencia, agora):
+    """Resumos de um fuso e frequência: uma consulta agregada, enfileirados em lotes."""
+    linhas = (
+        DigestEntry.objects.filter(
+            _filtro_frequencia(frequencia),
+            user__notification_preferences__timezone=nome,
+            user__is_active=True,
+        )
+        .exclude(user__email='')
+        .values('user_id', 'user__email', 'user__first_name')
+        .annotate(total=Count('id'), ultimo_id=Max('id'), linhas=ArrayAgg('summary', ordering='id'))
+        .order_by('user_id')
+    )
+
+    enviados = 0
+    lote = []
+    for linha in linhas.iterator(chunk_size=settings.DIGEST_LOTE):
+        lote.append(linha)
+        if len(lote) == settings.DIGEST_LOTE:
+            enviados += _enfileirar_lote(lote, frequencia, agora)
+            lote = []
+    if lote:
+        enviados += _enfileirar_lote(lote, frequencia, agora)
+    return enviados
+
+
+def enviar_resumos(agora=None):
+    """
+    Enfileira os resumos dos fusos horários cuja hora local é DIGEST_HORA.
+
+    Rodar mais de uma vez na mesma hora não duplica: os itens enviados são
+    consumidos e a dedup_key do resumo inclui o último item incluído.
+
+    Returns:
+        int: resumos enfileirados
+    """
+    agora = agora or timezone.now()
+    fusos = (
+        UserNotificationPreferences.objects.filter(
+            _filtro_frequencia(DIARIO, prefixo='') | _filtro_frequencia(SEMANAL, prefixo='')
+        )
+        .values_list('timezone', flat=True)
+        .distinct()
+    )
+
+    total = 0
+    for nome in fusos:
+        local = agora.astimezone(fuso_horario(nome))
+        if local.hour != settings.DIGEST_HORA:
+            continue
+        total += _enviar_fuso(nome, DIARIO, agora)
+        if local.weekday() == settings.DIGEST_DIA_SEMANA:
+            total += _enviar_fuso(nome, SEMANAL, agora)
+
+    if total:
+        logger.info(f"Resumos de e-mail enfileirados: {total}")
+    return total
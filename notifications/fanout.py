@@ -0,0 +1,196 @@
+"""
+Fan-out de notificações no app.
+
+Uso:
+    notificar(destinatarios, 'disputa_resolvida', {'titulo': necessidade.titulo}, necessidade=necessidade)
+
+- Um único bulk_create por chamada, qualquer que seja o número de destinatários.
+- As preferências (UserNotificationPreferences) dos destinatários são lidas
+  em uma consulta; quem desativou o tipo não recebe.
+- bulk_create não dispara post_save: os badges de não lidas recebem um delta
+  por usuário e o push em tempo real (`new_notification` na sala pessoal
+  `user_<id>`) é emitido somente depois do commit.
+- `agrupar()` junta todas as chamadas de um bloco (ex.: um lote de mensagens
+  do chat) em um único envio.
+"""
+
+from collections import Counter
+from contextlib import contextmanager
+import logging
+import threading
+from typing import NamedTuple
+
+from django.db import transaction
+
+from core.services.unread_counter_service import UnreadCounterService
+from .models import Notification, NotificationPriority, NotificationType, UserNotificationPreferences
+
+logger = logging.getLogger(__name__)
+
+
+class Modelo(NamedTuple):
+    """Template de notificação: `mensagem` e `titulo` são formatados com o contexto (str.format)."""
+    tipo: str
+    mensagem: str
+    titulo: str = ''
+    prioridade: str = NotificationPriority.NORMAL
+
+
+MODELOS = {
+    'anuncio_criado': Modelo(NotificationType.SYSTEM_MESSAGE, "<strong>Novo Anúncio Criado</strong><br>"),
+    'anuncio_compativel': Modelo(
+        NotificationType.NEW_AD,
+        'Novo anúncio em {categoria}: "{titulo}" ({local}).',
+        'Novo Anúncio na Sua Categoria',
+    ),
+    'busca_salva': Modelo(
+        NotificationType.NEW_AD,
+        'Novo anúncio para a sua busca "{nome}": "{titulo}".',
+        'Novo Resultado na Busca Salva',
+    ),
+    'anuncio_expirado_cliente': Modelo(
+        NotificationType.NEW_END_AD, 'Seu anúncio "{titulo}" expirou sem fechar negócio.'
+    ),
+    'anuncio_expirado_fornecedor': Modelo(NotificationType.NEW_END_AD, 'O anúncio "{titulo}" expirou.'),
+    'status_necessidade': Modelo(NotificationType.NEW_BUDGET, "Status da necessidade '{titulo}' foi atualizado."),
+    'aviso_confirmacao': Modelo(
+        NotificationType.NEW_BUDGET,
+        "ATENÇÃO: O orçamento para '{titulo}' expirará em breve. Confirme ou recuse até {limite}.",
+    ),
+    'orcamento_aceito': Modelo(NotificationType.NEW_BUDGET, "Seu orçamento para '{titulo}' foi aceito pelo cliente."),
+    'orcamento_confirmado': Modelo(
+        NotificationType.NEW_BUDGET, "Orçamento para '{titulo}' foi confirmado pelo fornecedor."
+    ),
+    'orcamento_recusado': Modelo(NotificationType.NEW_BUDGET, "Orçamento para '{titulo}' foi recusado pelo fornecedor."),
+    'disputa_aberta': Modelo(
+        NotificationType.SYSTEM_MESSAGE, 'O {autor} abriu uma disputa sobre o serviço "{titulo}".', 'Nova Disputa'
+    ),
+    'disputa_admin': Modelo(
+        NotificationType.SYSTEM_MESSAGE,
+        'Uma nova disputa foi aberta para "{titulo}" e requer análise administrativa.',
+        'Nova Disputa Requer Atenção',
+    ),
+    'disputa_resolvida': Modelo(
+        NotificationType.SYSTEM_MESSAGE,
+        'A disputa sobre "{titulo}" foi resolvida pela administração.',
+        'Disputa Resolvida',
+    ),
+    'mensagem_chat': Modelo(
+        NotificationType.NEW_CHAT_MESSAGE,
+        "<strong>Nova Mensagem no Chat</strong><br>"
+        "<strong>{remetente}</strong> ({papel}) enviou: <br>"
+        "<em>'{conteudo}'</em><br>"
+        "<small>Anúncio: {titulo}</small>",
+    ),
+}
+
+
+# ==================== MONTAGEM ====================
+
+def montar(destinatario, modelo, contexto=None, **campos):
+    """
+    Notificação (não salva) para um destinatário.
+
+    Args:
+        destinatario: usuário ou id
+        modelo: nome em MODELOS ou um Modelo
+        campos: demais campos da Notification (necessidade, orcamento, metadata...);
+                notification_type/priority sobrescrevem os do modelo
+    """
+    if isinstance(modelo, str):
+        modelo = MODELOS[modelo]
+    contexto = contexto or {}
+    campos.setdefault('notification_type', modelo.tipo)
+    campos.setdefault('priority', modelo.prioridade)
+    return Notification(
+        user_id=getattr(destinatario, 'pk', destinatario),
+        title=modelo.titulo.format(**contexto),
+        message=modelo.mensagem.format(**contexto),
+        **campos,
+    )
+
+
+# ==================== ENVIO ====================
+
+_agrupamento = threading.local()
+
+
+@contextmanager
+def agrupar():
+    """Acumula as notificações enviadas no bloco e as grava em um único envio ao final."""
+    if getattr(_agrupamento, 'pendentes', None) is not None:
+        # Já dentro de um agrupamento: o mais externo envia
+        yield
+        return
+    _agrupamento.pendentes = []
+    try:
+        yield
+        pendentes = _agrupamento.pendentes
+    finally:
+        _agrupamento.pendentes = None
+    enviar(pendentes)
+
+
+def _filtrar_preferencias(notificacoes):
+    """Remove as notificações que o destinatário desativou (uma consulta)."""
+    preferencias = UserNotificationPreferences.objects.in_bulk(
+        {n.user_id for n in notificacoes}, field_name='user_id'
+    )
+    return [
+        n for n in notificacoes
+        if n.user_id not in preferencias or preferencias[n.user_id].permite_no_app(n.notification_type)
+    ]
+
+
+def _payload(notificacao):
+    return {
+        'type': 'notification',
+        'id': notificacao.id,
+        'notification_type': notificacao.notification_type,
+        'title': notificacao.title,
+        'message': notificacao.message,
+        'necessidade_id': notificacao.necessidade_id,
+        'timestamp': notificacao.created_at.isoformat() if notificacao.created_at else None,
+    }
+
+
+def _emitir(notificacoes):
+    from chat.realtime import emitir
+
+    for notificacao in notificacoes:
+        emitir('new_notification', _payload(notificacao), room=f"user_{notificacao.user_id}")
+
+
+def enviar(notificacoes):
+    """
+    Grava as notificações montadas em um único bulk_create.
+
+    Returns:
+        list[Notification]: notificações gravadas (vazia se foram acumuladas por `agrupar`)
+    """
+    notificacoes = [n for n in notificacoes if n.user_id]
+    pendentes = getattr(_agrupamento, 'pendentes', None)
+    if pendentes is not None:
+        pendentes.extend(notificacoes)
+        return []
+    notificacoes = _filtrar_preferencias(notificacoes) if notificacoes else []
+    if not notificacoes:
+        return []
+
+    criadas = Notification.objects.bulk_create(notificacoes, batch_size=1000)
+    for notificacao in criadas:
+        notificacao._is_read_original = notificacao.is_read
+    for user_id, quantidade in Counter(n.user_id for n in criadas if not n.is_read).items():
+        UnreadCounterService.incrementar_apos_commit(user_id, UnreadCounterService.NOTIFICACOES, quantidade)
+    transaction.on_commit(lambda: _emitir(criadas))
+    return criadas
+
+
+def notificar(destinatarios, modelo, contexto=None, **campos):
+    """
+    Notifica vários destinatários com o mesmo template e contexto.
+
+    Returns:
+        list[Notification]: notificações gravadas
+    """
+    return enviar([montar(destinatario, modelo, contexto, **campos) for destinatario in destinatarios])
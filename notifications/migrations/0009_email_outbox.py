@@ -0,0 +1,153 @@
+# Generated by Django 5.1.14 on 2026-10-17 19:26
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        (
+            "notifications",
+            "0008_usernotificationpreferences_dispute_notifications_and_more",
+        ),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="notificationlog",
+            name="notification",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="delivery_logs",
+                to="notifications.notification",
+                verbose_name="Notificação",
+            ),
+        ),
+        migrations.CreateModel(
+            name="EmailOutbox",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "dedup_key",
+                    models.CharField(
+                        blank=True,
+                        help_text="Evita enfileirar o mesmo e-mail duas vezes para o mesmo evento",
+                        max_length=200,
+                        null=True,
+                        unique=True,
+                        verbose_name="Chave de deduplicação",
+                    ),
+                ),
+                ("subject", models.CharField(max_length=255, verbose_name="Assunto")),
+                ("body", models.TextField(verbose_name="Corpo")),
+                ("html_body", models.TextField(blank=True, verbose_name="Corpo HTML")),
+                (
+                    "from_email",
+                    models.CharField(max_length=254, verbose_name="Remetente"),
+                ),
+                (
+                    "recipients",
+                    models.JSONField(default=list, verbose_name="Destinatários"),
+                ),
+                (
+                    "reply_to",
+                    models.JSONField(
+                        blank=True, default=list, verbose_name="Responder para"
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pendente"),
+                            ("sent", "Enviado"),
+                            ("failed", "Falhou"),
+                        ],
+                        default="pending",
+                        max_length=20,
+                        verbose_name="Status",
+                    ),
+                ),
+                (
+                    "attempts",
+                    models.PositiveSmallIntegerField(
+                        default=0, verbose_name="Tentativas"
+                    ),
+                ),
+                (
+                    "max_attempts",
+                    models.PositiveSmallIntegerField(
+                        default=5, verbose_name="Máximo de tentativas"
+                    ),
+                ),
+                (
+                    "next_attempt_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now,
+                        verbose_name="Próxima tentativa",
+                    ),
+                ),
+                (
+                    "last_error",
+                    models.TextField(blank=True, verbose_name="Último erro"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Criado em"),
+                ),
+                (
+                    "sent_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Enviado em"
+                    ),
+                ),
+                (
+                    "notification",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="emails",
+                        to="notifications.notification",
+                        verbose_name="Notificação",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "E-mail na fila",
+                "verbose_name_plural": "Fila de e-mails",
+                "ordering": ["next_attempt_at"],
+            },
+        ),
+        migrations.AddField(
+            model_name="notificationlog",
+            name="email",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="delivery_logs",
+                to="notifications.emailoutbox",
+                verbose_name="E-mail",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="emailoutbox",
+            index=models.Index(
+                fields=["status", "next_attempt_at"],
+                name="notificatio_status_1fc719_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.1.14 on 2026-10-17 20:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("notifications", "0009_email_outbox"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="notificationbatch",
+            name="emails_queued",
+            field=models.PositiveIntegerField(
+                default=0, verbose_name="E-mails enfileirados"
+            ),
+        ),
+        migrations.AddField(
+            model_name="notificationbatch",
+            name="last_user_id",
+            field=models.PositiveBigIntegerField(
+                default=0, verbose_name="Último usuário processado"
+            ),
+        ),
+        migrations.AddField(
+            model_name="notificationbatch",
+            name="next_email_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="Próximo e-mail"
+            ),
+        ),
+        migrations.AddField(
+            model_name="notificationbatch",
+            name="send_email",
+            field=models.BooleanField(
+                default=False, verbose_name="Enviar também por e-mail"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="notificationbatch",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("draft", "Rascunho"),
+                    ("scheduled", "Agendado"),
+                    ("processing", "Processando"),
+                    ("paused", "Pausado"),
+                    ("completed", "Concluído"),
+                    ("cancelled", "Cancelado"),
+                    ("failed", "Falhou"),
+                ],
+                default="draft",
+                max_length=20,
+                verbose_name="Status",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="notificationbatch",
+            name="target_criteria",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                help_text="Critérios para seleção automática de usuários (ver notifications.campanhas.CRITERIOS); ignorados quando há usuários alvo",
+                verbose_name="Critérios de alvo",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notificationbatch",
+            index=models.Index(
+                fields=["status", "scheduled_for"], name="notificatio_status_80ba48_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,117 @@
+# Generated by Django 5.1.14 on 2026-10-17 20:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("notifications", "0010_notification_batch_progresso"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="usernotificationpreferences",
+            name="timezone",
+            field=models.CharField(
+                default="America/Sao_Paulo",
+                help_text="Fuso horário do horário silencioso e do envio dos resumos",
+                max_length=50,
+                verbose_name="Fuso horário",
+            ),
+        ),
+        migrations.CreateModel(
+            name="DigestEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "notification_type",
+                    models.CharField(
+                        choices=[
+                            ("NEW_AD", "Nova Necessidade Criada"),
+                            ("NEW_END_AD", "Necessidade Finalizada"),
+                            ("AD_CANCELLED", "Necessidade Cancelada"),
+                            ("NECESSIDADE_EXPIRADA", "Necessidade Expirada"),
+                            ("NEW_BUDGET", "Novo Orçamento Recebido"),
+                            ("NOVO_ORCAMENTO", "Orçamento Enviado"),
+                            ("BUDGET_ACCEPTED", "Orçamento Aceito pelo Cliente"),
+                            ("ORCAMENTO_ACEITO", "Seu Orçamento foi Aceito"),
+                            (
+                                "BUDGET_CONFIRMED",
+                                "Orçamento Confirmado pelo Fornecedor",
+                            ),
+                            ("ORCAMENTO_CONFIRMADO", "Orçamento Confirmado"),
+                            ("BUDGET_REFUSED", "Orçamento Recusado"),
+                            ("ORCAMENTO_REJEITADO", "Orçamento Rejeitado"),
+                            (
+                                "ORCAMENTO_RECUSADO",
+                                "Orçamento Recusado pelo Fornecedor",
+                            ),
+                            ("SERVICE_STARTED", "Serviço Iniciado"),
+                            ("SERVICE_COMPLETED", "Serviço Finalizado"),
+                            ("AVALIACAO_LIBERADA", "Avaliação Liberada"),
+                            ("TIMEOUT_WARNING", "Aviso de Timeout"),
+                            ("CONFIRMATION_TIMEOUT", "Timeout de Confirmação"),
+                            ("NEW_CHAT_MESSAGE", "Nova Mensagem no Chat"),
+                            ("DISPUTE_OPENED", "Nova Disputa Aberta"),
+                            ("DISPUTE_RESOLVED", "Disputa Resolvida"),
+                            ("DISPUTE_ADMIN_ALERT", "Nova Disputa para Análise"),
+                            ("SYSTEM_MESSAGE", "Mensagem do Sistema"),
+                            ("WELCOME", "Bem-vindo"),
+                            ("ACCOUNT_VERIFIED", "Conta Verificada"),
+                        ],
+                        max_length=30,
+                        verbose_name="Tipo de Notificação",
+                    ),
+                ),
+                (
+                    "summary",
+                    models.CharField(max_length=255, verbose_name="Linha do resumo"),
+                ),
+                (
+                    "dedup_key",
+                    models.CharField(
+                        blank=True,
+                        max_length=200,
+                        null=True,
+                        unique=True,
+                        verbose_name="Chave de deduplicação",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Criado em"),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="digest_entries",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Usuário",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Item de resumo",
+                "verbose_name_plural": "Itens de resumo",
+                "ordering": ["created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["user", "id"], name="notificatio_user_id_1f4374_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -1,4 +1,8 @@
+from datetime import timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
 from django.db import models
+from django.utils import timezone
 from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
@@ -129,18 +133,30 @@ class Notification(models.Model):
     def __str__(self):
         return f"{self.title} - {self.user.get_full_name()}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Estado carregado do banco, usado para manter o contador de não lidas
+        if 'is_read' in field_names:
+            instance._is_read_original = instance.is_read
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._is_read_original = self.is_read
+
     def mark_as_read(self):
         """Mark notification as read."""
         if not self.is_read:
             self.is_read = True
-            self.read_at = models.timezone.now()
+            self.read_at = timezone.now()
             self.save(update_fields=['is_read', 'read_at'])
     
     def mark_action_taken(self):
         """Mark that user took action on this notification."""
         if not self.action_taken:
             self.action_taken = True
-            self.action_taken_at = models.timezone.now()
+            self.action_taken_at = timezone.now()
             self.save(update_fields=['action_taken', 'action_taken_at'])
     
     @property
@@ -156,6 +172,14 @@ class Notification(models.Model):
         return delta.total_seconds() / 3600
 
 
+def fuso_horario(nome):
+    """ZoneInfo do fuso; nomes inválidos usam o fuso padrão do projeto."""
+    try:
+        return ZoneInfo(nome)
+    except (ValueError, ZoneInfoNotFoundError):
+        return ZoneInfo(settings.TIME_ZONE)
+
+
 class UserNotificationPreferences(models.Model):
     """User preferences for notifications."""
     user = models.OneToOneField(
@@ -199,7 +223,7 @@ class UserNotificationPreferences(models.Model):
         'Fuso horário',
         max_length=50,
         default='America/Sao_Paulo',
-        help_text='Fuso horário para controle de horário silencioso'
+        help_text='Fuso horário do horário silencioso e do envio dos resumos'
     )
     
     created_at = models.DateTimeField('Criado em', auto_now_add=True)
@@ -216,8 +240,16 @@ class UserNotificationPreferences(models.Model):
         """Check if email should be sent for this notification type."""
         if not self.enabled or not self.email_enabled:
             return False
-        
-        # Check specific type preferences
+        return self.permite_tipo(notification_type)
+
+    def permite_no_app(self, notification_type=None):
+        """Notificação no app (e push em tempo real) permitida para o tipo."""
+        if not self.enabled or not self.in_app_enabled:
+            return False
+        return self.permite_tipo(notification_type)
+
+    def permite_tipo(self, notification_type):
+        """Preferência específica do tipo (tipos sem preferência são sempre permitidos)."""
         type_mapping = {
             NotificationType.NEW_BUDGET: self.new_budget_notifications,
             NotificationType.NOVO_ORCAMENTO: self.new_budget_notifications,
@@ -240,25 +272,50 @@ class UserNotificationPreferences(models.Model):
         
         return True
     
-    def is_quiet_hours(self):
+    # Modos de entrega de e-mail (notifications.digest)
+    EMAIL_IMEDIATO = 'imediato'
+    EMAIL_DIARIO = 'diario'
+    EMAIL_SEMANAL = 'semanal'
+
+    def modo_email(self, notification_type=None):
+        """Como o e-mail deste tipo é entregue: imediato, em resumo diário/semanal ou None (não enviar)."""
+        if not self.should_send_email(notification_type):
+            return None
+        if self.daily_digest:
+            return self.EMAIL_DIARIO
+        if self.weekly_digest:
+            return self.EMAIL_SEMANAL
+        # Sem envio instantâneo e sem resumo escolhido: acumula no diário em vez de descartar
+        return self.EMAIL_IMEDIATO if self.instant_notifications else self.EMAIL_DIARIO
+
+    def fuso(self):
+        return fuso_horario(self.timezone)
+
+    def is_quiet_hours(self, agora=None):
         """Check if current time is within quiet hours."""
+        return self.fim_horario_silencioso(agora) is not None
+
+    def fim_horario_silencioso(self, agora=None):
+        """Fim do horário silencioso em andamento (datetime) ou None fora dele."""
         if not self.quiet_hours_enabled or not self.quiet_start_time or not self.quiet_end_time:
-            return False
-        
-        from django.utils import timezone
-        import pytz
-        
-        try:
-            tz = pytz.timezone(self.timezone)
-            now = timezone.now().astimezone(tz).time()
-            
-            if self.quiet_start_time <= self.quiet_end_time:
-                return self.quiet_start_time <= now <= self.quiet_end_time
-            else:
-                # Spans midnight
-                return now >= self.quiet_start_time or now <= self.quiet_end_time
-        except:
-            return False
+            return None
+
+        local = (agora or timezone.now()).astimezone(self.fuso())
+        hora = local.time()
+        if self.quiet_start_time <= self.quiet_end_time:
+            silencioso = self.quiet_start_time <= hora <= self.quiet_end_time
+        else:
+            # Spans midnight
+            silencioso = hora >= self.quiet_start_time or hora <= self.quiet_end_time
+        if not silencioso:
+            return None
+
+        fim = local.replace(
+            hour=self.quiet_end_time.hour, minute=self.quiet_end_time.minute, second=0, microsecond=0
+        )
+        if fim <= local:
+            fim += timedelta(days=1)
+        return fim
 
 
 class NotificationTemplate(models.Model):
@@ -312,7 +369,10 @@ class NotificationBatch(models.Model):
         'Critérios de alvo',
         default=dict,
         blank=True,
-        help_text='Critérios para seleção automática de usuários'
+        help_text=(
+            'Critérios para seleção automática de usuários (ver notifications.campanhas.CRITERIOS); '
+            'ignorados quando há usuários alvo'
+        )
     )
     
     # Content
@@ -325,13 +385,21 @@ class NotificationBatch(models.Model):
         ('draft', 'Rascunho'),
         ('scheduled', 'Agendado'),
         ('processing', 'Processando'),
+        ('paused', 'Pausado'),
         ('completed', 'Concluído'),
+        ('cancelled', 'Cancelado'),
         ('failed', 'Falhou'),
     ]
     status = models.CharField('Status', max_length=20, choices=STATUS_CHOICES, default='draft')
     
     # Scheduling
     scheduled_for = models.DateTimeField('Agendado para', null=True, blank=True)
+    send_email = models.BooleanField('Enviar também por e-mail', default=False)
+    
+    # Progresso (notifications.campanhas): usuários são percorridos por id crescente
+    last_user_id = models.PositiveBigIntegerField('Último usuário processado', default=0)
+    emails_queued = models.PositiveIntegerField('E-mails enfileirados', default=0)
+    next_email_at = models.DateTimeField('Próximo e-mail', null=True, blank=True)
     
     # Tracking
     created_at = models.DateTimeField('Criado em', auto_now_add=True)
@@ -344,19 +412,92 @@ class NotificationBatch(models.Model):
         verbose_name = 'Lote de Notificações'
         verbose_name_plural = 'Lotes de Notificações'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'scheduled_for']),
+        ]
     
     def __str__(self):
         return f"{self.name} ({self.get_status_display()})"
 
 
+class EmailOutbox(models.Model):
+    """
+    Outbox transacional de e-mails.
+    As mensagens são gravadas na mesma transação do evento que as originou e
+    entregues em lote por `notifications.tasks.processar_outbox_email`.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pendente'),
+        (STATUS_SENT, 'Enviado'),
+        (STATUS_FAILED, 'Falhou'),
+    ]
+
+    dedup_key = models.CharField(
+        'Chave de deduplicação',
+        max_length=200,
+        unique=True,
+        null=True,
+        blank=True,
+        help_text='Evita enfileirar o mesmo e-mail duas vezes para o mesmo evento'
+    )
+    subject = models.CharField('Assunto', max_length=255)
+    body = models.TextField('Corpo')
+    html_body = models.TextField('Corpo HTML', blank=True)
+    from_email = models.CharField('Remetente', max_length=254)
+    recipients = models.JSONField('Destinatários', default=list)
+    reply_to = models.JSONField('Responder para', default=list, blank=True)
+
+    notification = models.ForeignKey(
+        Notification,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='emails',
+        verbose_name='Notificação'
+    )
+
+    status = models.CharField('Status', max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField('Tentativas', default=0)
+    max_attempts = models.PositiveSmallIntegerField('Máximo de tentativas', default=5)
+    next_attempt_at = models.DateTimeField('Próxima tentativa', default=timezone.now)
+    last_error = models.TextField('Último erro', blank=True)
+
+    created_at = models.DateTimeField('Criado em', auto_now_add=True)
+    sent_at = models.DateTimeField('Enviado em', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'E-mail na fila'
+        verbose_name_plural = 'Fila de e-mails'
+        ordering = ['next_attempt_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} → {', '.join(self.recipients)} ({self.get_status_display()})"
+
+
 class NotificationLog(models.Model):
     """Log of all notification delivery attempts."""
     notification = models.ForeignKey(
         Notification,
         on_delete=models.CASCADE,
+        null=True,
+        blank=True,
         related_name='delivery_logs',
         verbose_name='Notificação'
     )
+    email = models.ForeignKey(
+        EmailOutbox,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='delivery_logs',
+        verbose_name='E-mail'
+    )
     
     delivery_method = models.CharField(
         'Método de entrega',
@@ -388,5 +529,34 @@ class NotificationLog(models.Model):
         ordering = ['-attempted_at']
     
     def __str__(self):
-        return f"{self.delivery_method} - {self.notification.title} ({self.get_status_display()})"
+        referencia = self.notification.title if self.notification else self.email.subject if self.email else '-'
+        return f"{self.delivery_method} - {referencia} ({self.get_status_display()})"
+
+
+
+class DigestEntry(models.Model):
+    """
+    E-mail retido para o resumo diário/semanal do usuário (notifications.digest).
+    Consumido (excluído) quando o resumo é enfileirado na outbox.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='digest_entries',
+        verbose_name='Usuário'
+    )
+    notification_type = models.CharField('Tipo de Notificação', max_length=30, choices=NotificationType.choices)
+    summary = models.CharField('Linha do resumo', max_length=255)
+    dedup_key = models.CharField('Chave de deduplicação', max_length=200, unique=True, null=True, blank=True)
+    created_at = models.DateTimeField('Criado em', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Item de resumo'
+        verbose_name_plural = 'Itens de resumo'
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['user', 'id']),
+        ]
 
+    def __str__(self):
+        return f"{self.summary} → {self.user_id}"
@@ -0,0 +1,186 @@
+"""
+Outbox transacional de e-mails.
+
+Uso:
+    enfileirar_email([usuario.email], "Assunto", "Corpo", dedup_key=f"orcamento:{pk}:novo")
+
+O registro é gravado na transação corrente; a entrega acontece de forma
+assíncrona (Celery) somente depois do commit, em lotes e com retentativas.
+"""
+
+from datetime import timedelta
+import logging
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import DeliveryMethod, EmailOutbox, NotificationLog
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_BASE_SEGUNDOS = 60
+BACKOFF_MAXIMO_SEGUNDOS = 60 * 60
+# Tempo que um lote reservado fica fora da fila enquanto é enviado
+RESERVA_SEGUNDOS = 10 * 60
+
+
+def enfileirar_email(destinatarios, assunto, corpo, *, dedup_key=None, remetente=None,
+                     reply_to=None, html=None, notification=None, enviar_em=None):
+    """
+    Grava um e-mail na outbox (na transação corrente).
+
+    Returns:
+        EmailOutbox criado ou None se já existia um e-mail com a mesma dedup_key
+    """
+    destinatarios = [email for email in destinatarios if email]
+    if not destinatarios:
+        return None
+
+    try:
+        with transaction.atomic():
+            email = EmailOutbox.objects.create(
+                dedup_key=dedup_key,
+                subject=assunto,
+                body=corpo,
+                html_body=html or '',
+                from_email=remetente or settings.DEFAULT_FROM_EMAIL,
+                recipients=destinatarios,
+                reply_to=list(reply_to or []),
+                notification=notification,
+                next_attempt_at=enviar_em or timezone.now(),
+            )
+    except IntegrityError:
+        logger.info(f"E-mail com dedup_key '{dedup_key}' já enfileirado; ignorando")
+        return None
+
+    if enviar_em is None:
+        transaction.on_commit(agendar_processamento)
+    return email
+
+
+def agendar_processamento():
+    """Agenda a drenagem da outbox; o beat periódico cobre falhas do broker."""
+    from .tasks import processar_outbox_email
+
+    try:
+        processar_outbox_email.delay()
+    except Exception as e:
+        logger.warning(f"Não foi possível agendar processar_outbox_email: {e}")
+
+
+def calcular_proxima_tentativa(tentativas, agora=None):
+    """Backoff exponencial: 1min, 2min, 4min... limitado a 1h."""
+    agora = agora or timezone.now()
+    segundos = min(BACKOFF_BASE_SEGUNDOS * (2 ** max(tentativas - 1, 0)), BACKOFF_MAXIMO_SEGUNDOS)
+    return agora + timedelta(seconds=segundos)
+
+
+def _montar_mensagem(email, connection):
+    mensagem = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email,
+        to=email.recipients,
+        reply_to=email.reply_to or None,
+        connection=connection,
+    )
+    if email.html_body:
+        mensagem.attach_alternative(email.html_body, 'text/html')
+    return mensagem
+
+
+def _registrar_falha(email, erro, resultado, logs):
+    email.last_error = str(erro)[:2000]
+    if email.attempts >= email.max_attempts:
+        email.status = EmailOutbox.STATUS_FAILED
+        resultado['failed'] += 1
+    else:
+        email.next_attempt_at = calcular_proxima_tentativa(email.attempts)
+        resultado['retry'] += 1
+    logs.append(NotificationLog(
+        email=email, notification_id=email.notification_id,
+        delivery_method=DeliveryMethod.EMAIL, status='failed',
+        error_message=email.last_error,
+    ))
+
+
+def _reservar_lote(batch_size):
+    """
+    Reserva um lote de pendentes em uma transação curta (SELECT ... FOR UPDATE
+    SKIP LOCKED): a tentativa já é contada e o next_attempt_at vira uma
+    concessão de RESERVA_SEGUNDOS. Se o worker cair durante o envio, o lote
+    volta para a fila quando a concessão vence, sem passar do max_attempts.
+    """
+    agora = timezone.now()
+    with transaction.atomic():
+        lote = list(
+            EmailOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status=EmailOutbox.STATUS_PENDING, next_attempt_at__lte=agora)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        for email in lote:
+            email.attempts += 1
+            email.next_attempt_at = agora + timedelta(seconds=RESERVA_SEGUNDOS)
+        EmailOutbox.objects.bulk_update(lote, ['attempts', 'next_attempt_at'])
+    return lote
+
+
+def processar_lote(batch_size=100):
+    """
+    Entrega um lote de e-mails pendentes usando uma única conexão SMTP.
+
+    O lote é reservado e a transação confirmada antes da conversa SMTP, então
+    um servidor lento não segura transação nem locks no banco; vários workers
+    drenam a outbox em paralelo sem duplicar envios.
+
+    Returns:
+        dict com contadores do lote (vazio quando não há pendências)
+    """
+    lote = _reservar_lote(batch_size)
+    if not lote:
+        return {}
+
+    resultado = {'sent': 0, 'retry': 0, 'failed': 0}
+    logs = []
+    tratados = set()
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+        for email in lote:
+            try:
+                _montar_mensagem(email, connection).send()
+            except Exception as e:
+                _registrar_falha(email, e, resultado, logs)
+                logger.warning(f"Falha ao enviar e-mail {email.pk} (tentativa {email.attempts}): {e}")
+            else:
+                email.status = EmailOutbox.STATUS_SENT
+                email.sent_at = timezone.now()
+                email.last_error = ''
+                resultado['sent'] += 1
+                logs.append(NotificationLog(
+                    email=email, notification_id=email.notification_id,
+                    delivery_method=DeliveryMethod.EMAIL, status='sent',
+                    delivered_at=email.sent_at,
+                ))
+            tratados.add(email.pk)
+    except Exception as e:
+        # Falha na conexão: o que não foi tentado volta para a fila com backoff
+        logger.error(f"Erro ao conectar no servidor de e-mail: {e}")
+        for email in lote:
+            if email.pk not in tratados:
+                _registrar_falha(email, e, resultado, logs)
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    with transaction.atomic():
+        EmailOutbox.objects.bulk_update(
+            lote, ['status', 'next_attempt_at', 'last_error', 'sent_at']
+        )
+        NotificationLog.objects.bulk_create(logs)
+
+    return resultado
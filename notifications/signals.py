@@ -0,0 +1,29 @@
+# notifications/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.services.unread_counter_service import UnreadCounterService
+from .models import Notification
+
+
+@receiver(post_save, sender=Notification)
+def atualizar_contador_notificacoes(sender, instance, created, **kwargs):
+    """Mantém o badge de notificações não lidas sem recontar no banco."""
+    if created:
+        nao_lida_antes = False
+    else:
+        is_read_original = getattr(instance, '_is_read_original', None)
+        if is_read_original is None:
+            # Instância não carregada do banco: estado anterior desconhecido
+            UnreadCounterService.invalidar([instance.user_id], UnreadCounterService.NOTIFICACOES)
+            return
+        nao_lida_antes = not is_read_original
+
+    delta = int(not instance.is_read) - int(nao_lida_antes)
+    UnreadCounterService.incrementar_apos_commit(instance.user_id, UnreadCounterService.NOTIFICACOES, delta)
+
+
+@receiver(post_delete, sender=Notification)
+def descontar_notificacao_removida(sender, instance, **kwargs):
+    if not instance.is_read:
+        UnreadCounterService.incrementar_apos_commit(instance.user_id, UnreadCounterService.NOTIFICACOES, -1)
@@ -0,0 +1,71 @@
+from celery import shared_task
+import logging
+
+from .outbox import processar_lote
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def processar_outbox_email(batch_size=100, max_lotes=20):
+    """
+    Drena a outbox de e-mails em lotes (uma conexão SMTP por lote).
+    Agendada após cada commit que enfileira e-mails e, via beat, a cada minuto.
+    """
+    totais = {'sent': 0, 'retry': 0, 'failed': 0}
+    for _ in range(max_lotes):
+        resultado = processar_lote(batch_size)
+        if not resultado:
+            break
+        for chave, valor in resultado.items():
+            totais[chave] += valor
+
+    if any(totais.values()):
+        logger.info(
+            f"Outbox de e-mails: {totais['sent']} enviados, {totais['retry']} reagendados, "
+            f"{totais['failed']} com falha definitiva"
+        )
+    return totais
+
+
+@shared_task
+def reconciliar_contadores_nao_lidos():
+    """
+    Regrava os contadores de não lidas (Redis) dos usuários ativos com a
+    contagem real do banco, corrigindo desvios de updates fora do ORM.
+    """
+    from core.services.unread_counter_service import UnreadCounterService
+
+    total = UnreadCounterService.reconciliar()
+    logger.info(f"Contadores de não lidas reconciliados para {total} usuários")
+    return total
+
+
+@shared_task
+def enviar_resumos_email():
+    """Enfileira os resumos diários/semanais dos fusos horários em que é DIGEST_HORA (beat de hora em hora)."""
+    from .digest import enviar_resumos
+
+    return enviar_resumos()
+
+
+@shared_task
+def iniciar_campanhas():
+    """Inicia as campanhas (NotificationBatch) agendadas que venceram e retoma as interrompidas."""
+    from .campanhas import iniciar_agendadas
+
+    return iniciar_agendadas()
+
+
+@shared_task(ignore_result=True)
+def processar_campanha(campanha_id):
+    """
+    Processa uma fatia da campanha e, se ainda houver destinatários, agenda a
+    próxima (fila `campanhas`, ver CELERY_TASK_ROUTES).
+    """
+    from .campanhas import processar
+
+    resultado = processar(campanha_id)
+    if resultado == 'continuar':
+        processar_campanha.delay(campanha_id)
+    return resultado
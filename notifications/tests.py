@@ -1,3 +1,324 @@
-from django.test import TestCase
+from datetime import datetime, time, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from ads.models import Necessidade
+from categories.models import Categoria, SubCategoria
+from chat.models import ChatMessage, ChatRoom
+from chat.utils import marcar_mensagens_como_lidas
+from core.context_processors import unread_messages, unread_notifications
+from notifications import campanhas
+from notifications.digest import enviar_email_usuario, enviar_resumos
+from notifications.fanout import notificar
+from notifications.models import (
+    DigestEntry, EmailOutbox, Notification, NotificationBatch, NotificationLog, NotificationType, UserNotificationPreferences,
+    fuso_horario,
+)
+from notifications.outbox import enfileirar_email, processar_lote
+from users.models import User
+
+
+class EmailOutboxTest(TestCase):
+    """
+    Testes da outbox transacional de e-mails.
+    """
+
+    def test_dedup_key_enfileira_uma_vez(self):
+        primeiro = enfileirar_email(['a@exemplo.com'], 'Assunto', 'Corpo', dedup_key='evento:1')
+        segundo = enfileirar_email(['a@exemplo.com'], 'Assunto', 'Corpo', dedup_key='evento:1')
+        self.assertIsNotNone(primeiro)
+        self.assertIsNone(segundo)
+        self.assertEqual(EmailOutbox.objects.count(), 1)
+
+    def test_processa_lote_e_registra_entrega(self):
+        email = enfileirar_email(
+            ['a@exemplo.com', 'b@exemplo.com'], 'Assunto', 'Corpo',
+            reply_to=['contato@exemplo.com'], html='<p>Corpo</p>'
+        )
+        enfileirar_email(['c@exemplo.com'], 'Outro', 'Corpo')
+
+        self.assertEqual(processar_lote(), {'sent': 2, 'retry': 0, 'failed': 0})
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[0].to, ['a@exemplo.com', 'b@exemplo.com'])
+        self.assertEqual(mail.outbox[0].reply_to, ['contato@exemplo.com'])
+
+        email.refresh_from_db()
+        self.assertEqual(email.status, EmailOutbox.STATUS_SENT)
+        self.assertIsNotNone(email.sent_at)
+        self.assertEqual(NotificationLog.objects.filter(status='sent').count(), 2)
+
+        # Nada pendente: não reenvia
+        self.assertEqual(processar_lote(), {})
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_falha_reagenda_com_backoff_ate_desistir(self):
+        email = enfileirar_email(['a@exemplo.com'], 'Assunto', 'Corpo')
+        EmailOutbox.objects.filter(pk=email.pk).update(max_attempts=2)
+
+        with mock.patch('notifications.outbox.EmailMultiAlternatives.send', side_effect=OSError('smtp fora')):
+            self.assertEqual(processar_lote(), {'sent': 0, 'retry': 1, 'failed': 0})
+            email.refresh_from_db()
+            self.assertEqual(email.attempts, 1)
+            self.assertGreater(email.next_attempt_at, timezone.now() + timedelta(seconds=50))
+
+            # Ainda não venceu o backoff
+            self.assertEqual(processar_lote(), {})
+
+            EmailOutbox.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+            self.assertEqual(processar_lote(), {'sent': 0, 'retry': 0, 'failed': 1})
+
+        email.refresh_from_db()
+        self.assertEqual(email.status, EmailOutbox.STATUS_FAILED)
+        self.assertEqual(email.last_error, 'smtp fora')
+        self.assertEqual(NotificationLog.objects.filter(email=email, status='failed').count(), 2)
+
+    def test_falha_de_conexao_conta_tentativa_mesmo_apos_erro_anterior(self):
+        email = enfileirar_email(['a@exemplo.com'], 'Assunto', 'Corpo')
+        EmailOutbox.objects.filter(pk=email.pk).update(attempts=1, max_attempts=2, last_error='erro anterior')
+
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.open', side_effect=OSError('sem conexão')):
+            self.assertEqual(processar_lote(), {'sent': 0, 'retry': 0, 'failed': 1})
+
+        email.refresh_from_db()
+        self.assertEqual(email.status, EmailOutbox.STATUS_FAILED)
+        self.assertEqual(email.attempts, 2)
+        self.assertEqual(email.last_error, 'sem conexão')
+        self.assertEqual(NotificationLog.objects.filter(email=email, status='failed').count(), 1)
+
+
+class ContadoresNaoLidosTest(TestCase):
+    """
+    Testes dos contadores de não lidas usados pelos badges (context processors).
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.cliente = User.objects.create_user(
+            email='cliente@exemplo.com', password='senha123',
+            first_name='Cliente', last_name='Teste', is_client=True
+        )
+        self.fornecedor = User.objects.create_user(
+            email='fornecedor@exemplo.com', password='senha123',
+            first_name='Fornecedor', last_name='Teste', is_supplier=True
+        )
+        categoria = Categoria.objects.create(nome='Serviços')
+        necessidade = Necessidade.objects.create(
+            titulo='Reparo', descricao='Reparo elétrico', cliente=self.cliente,
+            categoria=categoria, subcategoria=SubCategoria.objects.create(nome='Elétrica', categoria=categoria),
+            quantidade=1, unidade='un'
+        )
+        self.sala = ChatRoom.objects.create(
+            necessidade=necessidade, cliente=self.cliente, fornecedor=self.fornecedor
+        )
+
+    def _badges(self, user):
+        request = RequestFactory().get('/')
+        request.user = user
+        return {**unread_notifications(request), **unread_messages(request)}
+
+    def test_contadores_acompanham_criacao_e_leitura_sem_consultas(self):
+        self.assertEqual(self._badges(self.cliente), {
+            'unread_notifications_count': 0, 'unread_messages_count': 0,
+        })
+
+        with self.captureOnCommitCallbacks(execute=True):
+            # A mensagem também gera uma notificação para o cliente
+            ChatMessage.objects.create(chat_room=self.sala, remetente=self.fornecedor, conteudo='Olá')
+            ChatMessage.objects.create(chat_room=self.sala, remetente=self.fornecedor, conteudo='Tudo bem?')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self._badges(self.cliente), {
+                'unread_notifications_count': 2, 'unread_messages_count': 2,
+            })
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.filter(user=self.cliente).first().mark_as_read()
+            marcar_mensagens_como_lidas(
+                ChatMessage.objects.filter(chat_room=self.sala).exclude(remetente=self.cliente),
+                self.cliente
+            )
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self._badges(self.cliente), {
+                'unread_notifications_count': 1, 'unread_messages_count': 0,
+            })
+
+    def test_sala_desativada_recontada(self):
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ChatMessage.objects.create(chat_room=self.sala, remetente=self.cliente, conteudo='Olá')
+        self.assertEqual(self._badges(self.fornecedor)['unread_messages_count'], 1)
+
+        self.sala.ativo = False
+        self.sala.save()
+        self.assertEqual(self._badges(self.fornecedor)['unread_messages_count'], 0)
+
+
+class FanoutNotificacoesTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.usuarios = [
+            User.objects.create_user(
+                email=f'usuario{i}@exemplo.com', password='senha123', first_name='Usuario', last_name=str(i)
+            )
+            for i in range(3)
+        ]
+        UserNotificationPreferences.objects.create(user=self.usuarios[2], system_notifications=False)
+
+    def _badge(self, user):
+        request = RequestFactory().get('/')
+        request.user = user
+        return unread_notifications(request)['unread_notifications_count']
+
+    def test_um_insert_respeita_preferencias_e_atualiza_badges(self):
+        self.assertEqual(self._badge(self.usuarios[0]), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            # Preferências (1) + bulk_create (1)
+            with self.assertNumQueries(2):
+                criadas = notificar(self.usuarios, 'disputa_resolvida', {'titulo': 'Reparo'})
+
+        self.assertEqual(len(criadas), 2)
+        self.assertEqual(
+            set(Notification.objects.values_list('user_id', flat=True)),
+            {self.usuarios[0].pk, self.usuarios[1].pk},
+        )
+        self.assertEqual(criadas[0].message, 'A disputa sobre "Reparo" foi resolvida pela administração.')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self._badge(self.usuarios[0]), 1)
+
+
+class CampanhasTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.fornecedores = [
+            User.objects.create_user(
+                email=f'fornecedor{i}@exemplo.com', password='senha123',
+                first_name='Fornecedor', last_name=str(i), is_supplier=True
+            )
+            for i in range(5)
+        ]
+        User.objects.create_user(
+            email='cliente@exemplo.com', password='senha123', first_name='Cliente', last_name='Teste', is_client=True
+        )
+        UserNotificationPreferences.objects.create(user=self.fornecedores[4], enabled=False)
+        self.campanha = NotificationBatch.objects.create(
+            name='Novidades', notification_type=NotificationType.SYSTEM_MESSAGE,
+            title='Novidade', message='Conheça os novos recursos', send_email=True,
+            target_criteria={'is_supplier': True},
+        )
+
+    def test_envia_em_blocos_respeitando_preferencias_e_limite_de_emails(self):
+        with self.settings(CAMPANHA_LOTE=2, CAMPANHA_EMAILS_POR_MINUTO=2):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertTrue(campanhas.agendar(self.campanha))
+
+        self.campanha.refresh_from_db()
+        self.assertEqual(self.campanha.status, 'completed')
+        self.assertEqual(self.campanha.last_user_id, self.fornecedores[-1].pk)
+        self.assertEqual(self.campanha.total_notifications, 5)
+        self.assertEqual(self.campanha.successful_notifications, 4)
+        self.assertEqual(self.campanha.emails_queued, 4)
+        self.assertEqual(
+            set(Notification.objects.values_list('user_id', flat=True)),
+            {u.pk for u in self.fornecedores[:4]},
+        )
+
+        envios = list(EmailOutbox.objects.order_by('next_attempt_at').values_list('next_attempt_at', flat=True))
+        self.assertEqual([(b - a).total_seconds() for a, b in zip(envios, envios[1:])], [30.0, 30.0, 30.0])
+
+    def test_pausa_e_retoma_do_checkpoint(self):
+        with self.settings(CAMPANHA_LOTE=2):
+            with self.captureOnCommitCallbacks(execute=True):
+                campanhas.agendar(self.campanha, timezone.now() + timedelta(hours=1))
+            self.assertTrue(campanhas.pausar(self.campanha))
+            self.assertEqual(campanhas.processar(self.campanha.pk), 'interrompida')
+            self.assertFalse(Notification.objects.exists())
+
+            # Checkpoint de uma execução anterior: os dois primeiros já foram notificados
+            NotificationBatch.objects.filter(pk=self.campanha.pk).update(
+                last_user_id=self.fornecedores[1].pk, scheduled_for=timezone.now()
+            )
+            self.campanha.refresh_from_db()
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertTrue(campanhas.retomar(self.campanha))
+
+        self.campanha.refresh_from_db()
+        self.assertEqual(self.campanha.status, 'completed')
+        self.assertEqual(
+            set(Notification.objects.values_list('user_id', flat=True)),
+            {u.pk for u in self.fornecedores[2:4]},
+        )
+        self.assertFalse(campanhas.cancelar(self.campanha))
+
+
+class ResumosEmailTest(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user(
+            email='resumo@exemplo.com', password='senha123', first_name='Ana', last_name='Teste'
+        )
+        self.preferencias = UserNotificationPreferences.objects.create(
+            user=self.usuario, daily_digest=True, timezone='America/Manaus'
+        )
+
+    def _as(self, hora, fuso='America/Manaus'):
+        return datetime(2026, 10, 14, hora, 0, tzinfo=fuso_horario(fuso))
+
+    def test_acumula_e_envia_um_resumo_na_hora_local(self):
+        for pk in (1, 2, 3):
+            enviar_email_usuario(
+                self.usuario, 'Novo Orçamento Recebido', 'corpo', notification_type=NotificationType.NEW_BUDGET,
+                resumo="Novo orçamento para 'Reparo'", dedup_key=f"orcamento:{pk}:novo",
+            )
+        self.assertFalse(EmailOutbox.objects.exists())
+        self.assertEqual(DigestEntry.objects.count(), 3)
+
+        # 8h em São Paulo ainda são 7h em Manaus
+        self.assertEqual(enviar_resumos(self._as(8, 'America/Sao_Paulo')), 0)
+
+        with self.captureOnCommitCallbacks():
+            self.assertEqual(enviar_resumos(self._as(8)), 1)
+        self.assertEqual(enviar_resumos(self._as(8)), 0)
+        self.assertFalse(DigestEntry.objects.exists())
+
+        email = EmailOutbox.objects.get()
+        self.assertEqual(email.recipients, ['resumo@exemplo.com'])
+        self.assertIn("- Novo orçamento para 'Reparo' (3x)", email.body)
+
+    def test_sem_instantaneo_nem_resumo_recebe_o_diario(self):
+        self.preferencias.daily_digest = False
+        self.preferencias.instant_notifications = False
+        self.preferencias.save()
+
+        for pk in (1, 2):
+            enviar_email_usuario(
+                self.usuario, 'Novo Orçamento Recebido', 'corpo', notification_type=NotificationType.NEW_BUDGET,
+                dedup_key=f"orcamento:{pk}:novo",
+            )
+            # Segunda rodada no mesmo dia local: resumo novo, nenhum item perdido
+            with self.captureOnCommitCallbacks():
+                self.assertEqual(enviar_resumos(self._as(8)), 1)
+
+        self.assertFalse(DigestEntry.objects.exists())
+        self.assertEqual(EmailOutbox.objects.count(), 2)
+
+    def test_horario_silencioso_adia_envio_imediato(self):
+        self.preferencias.daily_digest = False
+        self.preferencias.quiet_hours_enabled = True
+        self.preferencias.quiet_start_time = time(22, 0)
+        self.preferencias.quiet_end_time = time(7, 0)
+        self.preferencias.save()
+
+        with mock.patch('django.utils.timezone.now', return_value=self._as(23)):
+            email = enviar_email_usuario(
+                self.usuario, 'Orçamento aceito', 'corpo', notification_type=NotificationType.BUDGET_ACCEPTED
+            )
+        self.assertEqual(email.next_attempt_at, self._as(7) + timedelta(days=1))
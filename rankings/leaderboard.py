@@ -0,0 +1,330 @@
+"""
+Ranking de fornecedores por categoria e UF.
+
+Pontuação (PontuacaoFornecedor.score) de um fornecedor em uma categoria:
+
+    score = (C * m + Σ wᵢ·rᵢ) / (C + Σ wᵢ),   wᵢ = 0.5 ^ (idadeᵢ / RANKING_MEIA_VIDA_DIAS)
+
+- rᵢ: media_estrelas das avaliações recebidas como fornecedor em anúncios
+  da categoria; avaliações antigas pesam menos (meia-vida).
+- m: média global das avaliações de fornecedores (prior); C =
+  RANKING_PESO_PRIOR. Poucas avaliações ficam próximas de m; o volume
+  (Σ wᵢ) aproxima o score da média real do fornecedor.
+
+Leitura: sorted sets do Redis `<prefixo>:ranking:<categoria>:<UF>` e
+`<prefixo>:ranking:<categoria>:BR` (todo o país), paginados com ZREVRANGE
+(O(log n) por página). Sem Redis (dev/testes), a mesma página sai da tabela
+pelo índice (categoria, uf, -score); com Redis, um sorted set ausente
+(deploy, reinício, eviction) é servido pela tabela e recomposto dela.
+
+Atualização: cada avaliação de fornecedor recalcula o par (fornecedor,
+categoria) após o commit; `reconstruir` (task noturna) recalcula tudo,
+aplica o decaimento do dia e troca os sorted sets atomicamente (RENAME).
+"""
+
+from collections import defaultdict
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg
+from django.utils import timezone
+
+from .models import Avaliacao, PontuacaoFornecedor
+
+logger = logging.getLogger(__name__)
+
+TODO_PAIS = 'BR'
+CHAVE_MEDIA_GLOBAL = 'rankings:media_global'
+
+
+# ==================== INFRA ====================
+
+def _redis():
+    """Cliente Redis cru quando o cache padrão é django-redis, senão None"""
+    if not settings.CACHES['default']['BACKEND'].startswith('django_redis'):
+        return None
+    from django_redis import get_redis_connection
+    return get_redis_connection('default')
+
+
+def _chave(categoria_id, uf):
+    prefixo = settings.CACHES['default'].get('KEY_PREFIX', '')
+    return f"{prefixo}:ranking:{categoria_id}:{uf or TODO_PAIS}"
+
+
+def _chaves(pontuacao):
+    chaves = [_chave(pontuacao.categoria_id, TODO_PAIS)]
+    if pontuacao.uf:
+        chaves.append(_chave(pontuacao.categoria_id, pontuacao.uf))
+    return chaves
+
+
+# ==================== CÁLCULO ====================
+
+def media_global():
+    """Prior m: média das avaliações de fornecedores (em cache; atualizada na reconstrução)."""
+    media = cache.get(CHAVE_MEDIA_GLOBAL)
+    if media is None:
+        media = Avaliacao.objects.filter(
+            tipo_avaliacao='fornecedor', media_estrelas__isnull=False
+        ).aggregate(media=Avg('media_estrelas'))['media']
+        media = float(media) if media is not None else settings.RANKING_MEDIA_PADRAO
+        cache.set(CHAVE_MEDIA_GLOBAL, media, None)
+    return media
+
+
+def _avaliacoes(**filtros):
+    """(fornecedor, categoria, média, data) das avaliações de fornecedores com média."""
+    return (
+        Avaliacao.objects.filter(tipo_avaliacao='fornecedor', media_estrelas__isnull=False, **filtros)
+        .values_list('avaliado_id', 'anuncio__categoria_id', 'media_estrelas', 'data_avaliacao')
+        .order_by()
+    )
+
+
+def _pontuacoes(linhas, prior, agora):
+    """Agrega as avaliações em PontuacaoFornecedor (não salvas), por (fornecedor, categoria)."""
+    meia_vida = settings.RANKING_MEIA_VIDA_DIAS
+    peso_prior = settings.RANKING_PESO_PRIOR
+    acumulado = defaultdict(lambda: [0, 0.0, 0.0, 0.0, None])  # total, soma, Σw·r, Σw, última
+    for fornecedor_id, categoria_id, media, data in linhas:
+        nota = float(media)
+        peso = 0.5 ** (max((agora - data).total_seconds(), 0) / 86400 / meia_vida)
+        item = acumulado[(fornecedor_id, categoria_id)]
+        item[0] += 1
+        item[1] += nota
+        item[2] += peso * nota
+        item[3] += peso
+        item[4] = data if item[4] is None else max(item[4], data)
+
+    return [
+        PontuacaoFornecedor(
+            fornecedor_id=fornecedor_id, categoria_id=categoria_id,
+            avaliacoes=total, media=soma / total,
+            score=(peso_prior * prior + soma_ponderada) / (peso_prior + soma_pesos),
+            ultima_avaliacao=ultima,
+        )
+        for (fornecedor_id, categoria_id), (total, soma, soma_ponderada, soma_pesos, ultima) in acumulado.items()
+    ]
+
+
+def _gravar(pontuacoes):
+    """Preenche a UF atual dos fornecedores e grava (upsert) as pontuações."""
+    from users.models import User
+
+    ufs = dict(
+        User.objects.filter(pk__in={p.fornecedor_id for p in pontuacoes}).values_list('pk', 'estado')
+    )
+    for pontuacao in pontuacoes:
+        pontuacao.uf = (ufs.get(pontuacao.fornecedor_id) or '').upper()
+    return PontuacaoFornecedor.objects.bulk_create(
+        pontuacoes,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['fornecedor', 'categoria'],
+        update_fields=['uf', 'avaliacoes', 'media', 'score', 'ultima_avaliacao', 'atualizado_em'],
+    )
+
+
+# ==================== ATUALIZAÇÃO INCREMENTAL ====================
+
+def atualizar(fornecedor_id, categoria_id):
+    """Recalcula o par (fornecedor, categoria) e atualiza os sorted sets."""
+    anterior = PontuacaoFornecedor.objects.filter(
+        fornecedor_id=fornecedor_id, categoria_id=categoria_id
+    ).first()
+    pontuacoes = _pontuacoes(
+        _avaliacoes(avaliado_id=fornecedor_id, anuncio__categoria_id=categoria_id),
+        media_global(), timezone.now(),
+    )
+
+    redis = _redis()
+    if not pontuacoes:
+        if anterior:
+            anterior.delete()
+            if redis is not None:
+                pipe = redis.pipeline()
+                for chave in _chaves(anterior):
+                    pipe.zrem(chave, fornecedor_id)
+                pipe.execute()
+        return None
+
+    pontuacao = _gravar(pontuacoes)[0]
+    if redis is not None:
+        try:
+            chaves = _chaves(pontuacao)
+            pipe = redis.pipeline(transaction=False)
+            for chave in chaves:
+                pipe.exists(chave)
+            existentes = pipe.execute()
+
+            pipe = redis.pipeline()
+            if anterior and anterior.uf and anterior.uf != pontuacao.uf:
+                pipe.zrem(_chave(categoria_id, anterior.uf), fornecedor_id)
+            # Sorted set ausente não é criado aqui (ficaria só com este fornecedor):
+            # a próxima leitura o recompõe inteiro a partir do banco
+            for chave, existe in zip(chaves, existentes):
+                if existe:
+                    pipe.zadd(chave, {fornecedor_id: pontuacao.score})
+            pipe.execute()
+        except Exception as e:
+            # A reconstrução noturna recompõe os sorted sets
+            logger.warning(f"Erro ao atualizar ranking no Redis: {e}")
+    return pontuacao
+
+
+_pendentes = threading.local()
+
+
+def _pares_pendentes():
+    if not hasattr(_pendentes, 'pares'):
+        _pendentes.pares = set()
+    return _pendentes.pares
+
+
+def _atualizar_pendentes():
+    pares = _pares_pendentes()
+    while pares:
+        atualizar(*pares.pop())
+
+
+def agendar_atualizacao(avaliacao):
+    """Atualiza o ranking após o commit (uma vez por par na transação)."""
+    if avaliacao.tipo_avaliacao != 'fornecedor':
+        return
+    _pares_pendentes().add((avaliacao.avaliado_id, avaliacao.anuncio.categoria_id))
+    transaction.on_commit(_atualizar_pendentes)
+
+
+# ==================== RECONSTRUÇÃO ====================
+
+def reconstruir():
+    """
+    Recalcula todas as pontuações (prior e decaimento do dia) e recria os
+    sorted sets, trocando cada um atomicamente.
+
+    Returns:
+        int: pontuações gravadas
+    """
+    cache.delete(CHAVE_MEDIA_GLOBAL)
+    agora = timezone.now()
+    pontuacoes = _pontuacoes(_avaliacoes().iterator(chunk_size=2000), media_global(), agora)
+
+    with transaction.atomic():
+        gravadas = _gravar(pontuacoes)
+        # Fornecedores que não têm mais avaliações na categoria
+        PontuacaoFornecedor.objects.filter(atualizado_em__lt=agora).delete()
+
+    redis = _redis()
+    if redis is not None:
+        _reconstruir_redis(redis, gravadas)
+    logger.info(f"Rankings reconstruídos: {len(gravadas)} pontuações")
+    return len(gravadas)
+
+
+def _reconstruir_redis(redis, pontuacoes):
+    por_chave = defaultdict(dict)
+    for pontuacao in pontuacoes:
+        for chave in _chaves(pontuacao):
+            por_chave[chave][pontuacao.fornecedor_id] = pontuacao.score
+
+    prefixo = settings.CACHES['default'].get('KEY_PREFIX', '')
+    existentes = {chave.decode() if isinstance(chave, bytes) else chave
+                  for chave in redis.scan_iter(match=f"{prefixo}:ranking:*", count=1000)}
+
+    pipe = redis.pipeline()
+    for chave, membros in por_chave.items():
+        _substituir(pipe, chave, membros)
+    obsoletas = existentes - set(por_chave)
+    if obsoletas:
+        pipe.delete(*obsoletas)
+    pipe.execute()
+
+
+def _substituir(pipe, chave, membros):
+    """Grava os membros em uma chave temporária e a troca pela definitiva (RENAME atômico)."""
+    temporaria = f"{chave}:novo"
+    pipe.delete(temporaria)
+    itens = list(membros.items())
+    for inicio in range(0, len(itens), 1000):
+        pipe.zadd(temporaria, dict(itens[inicio:inicio + 1000]))
+    pipe.rename(temporaria, chave)
+
+
+def _recompor(redis, categoria_id, uf):
+    """Recria a partir do banco um sorted set ausente (deploy, reinício ou eviction do Redis)."""
+    consulta = PontuacaoFornecedor.objects.filter(categoria_id=categoria_id)
+    if uf:
+        consulta = consulta.filter(uf=uf)
+    membros = dict(consulta.values_list('fornecedor_id', 'score'))
+    if membros:
+        pipe = redis.pipeline()
+        _substituir(pipe, _chave(categoria_id, uf), membros)
+        pipe.execute()
+
+
+# ==================== LEITURA ====================
+
+def pagina(categoria_id, uf=None, numero=1, por_pagina=None):
+    """
+    Página do ranking de fornecedores da categoria (opcionalmente de uma UF).
+
+    Returns:
+        dict com total, pagina, por_pagina e fornecedores (posição, id, nome,
+        uf, score, media, avaliacoes)
+    """
+    por_pagina = por_pagina or settings.RANKING_POR_PAGINA
+    numero = max(1, numero)
+    inicio = (numero - 1) * por_pagina
+    uf = (uf or '').upper()
+
+    redis = _redis()
+    existe = False
+    if redis is not None:
+        pipe = redis.pipeline(transaction=False)
+        chave = _chave(categoria_id, uf)
+        pipe.exists(chave)
+        pipe.zcard(chave)
+        pipe.zrevrange(chave, inicio, inicio + por_pagina - 1)
+        existe, total, membros = pipe.execute()
+        if not existe:
+            # Esta página sai do banco; as próximas, do sorted set recomposto
+            _recompor(redis, categoria_id, uf)
+
+    if existe:
+        ids = [int(membro) for membro in membros]
+        por_id = {
+            p.fornecedor_id: p
+            for p in PontuacaoFornecedor.objects.filter(categoria_id=categoria_id, fornecedor_id__in=ids)
+            .select_related('fornecedor')
+        }
+        pontuacoes = [por_id[pk] for pk in ids if pk in por_id]
+    else:
+        consulta = PontuacaoFornecedor.objects.filter(categoria_id=categoria_id)
+        if uf:
+            consulta = consulta.filter(uf=uf)
+        total = consulta.count()
+        pontuacoes = list(
+            consulta.select_related('fornecedor').order_by('-score', 'fornecedor_id')[inicio:inicio + por_pagina]
+        )
+
+    return {
+        'total': total,
+        'pagina': numero,
+        'por_pagina': por_pagina,
+        'fornecedores': [
+            {
+                'posicao': inicio + i + 1,
+                'id': p.fornecedor_id,
+                'nome': p.fornecedor.get_full_name(),
+                'uf': p.uf,
+                'score': round(p.score, 3),
+                'media': round(p.media, 2),
+                'avaliacoes': p.avaliacoes,
+            }
+            for i, p in enumerate(pontuacoes)
+        ],
+    }
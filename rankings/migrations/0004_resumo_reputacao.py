@@ -0,0 +1,52 @@
+# Generated by Django 5.1.14 on 2026-10-17 20:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rankings", "0003_alter_avaliacao_unique_together"),
+        ("users", "0013_add_endereco_fields"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ResumoReputacao",
+            fields=[
+                (
+                    "usuario",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="reputacao",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("avaliacoes_fornecedor", models.PositiveIntegerField(default=0)),
+                ("avaliacoes_cliente", models.PositiveIntegerField(default=0)),
+                (
+                    "soma_estrelas_fornecedor",
+                    models.DecimalField(decimal_places=1, default=0, max_digits=12),
+                ),
+                ("notas_fornecedor", models.PositiveIntegerField(default=0)),
+                (
+                    "soma_estrelas_cliente",
+                    models.DecimalField(decimal_places=1, default=0, max_digits=12),
+                ),
+                ("notas_cliente", models.PositiveIntegerField(default=0)),
+                ("criterios", models.JSONField(blank=True, default=dict)),
+                ("total_necessidades", models.PositiveIntegerField(default=0)),
+                ("total_orcamentos", models.PositiveIntegerField(default=0)),
+                ("trust_score", models.FloatField(db_index=True, default=0)),
+                ("atualizado_em", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Resumo de Reputação",
+                "verbose_name_plural": "Resumos de Reputação",
+            },
+        ),
+    ]
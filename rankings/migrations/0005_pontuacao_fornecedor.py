@@ -0,0 +1,67 @@
+# Generated by Django 5.1.14 on 2026-10-17 20:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("categories", "0003_categoria_icone"),
+        ("rankings", "0004_resumo_reputacao"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PontuacaoFornecedor",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("uf", models.CharField(blank=True, max_length=2)),
+                ("avaliacoes", models.PositiveIntegerField(default=0)),
+                ("media", models.FloatField(default=0)),
+                ("score", models.FloatField(default=0)),
+                ("ultima_avaliacao", models.DateTimeField(blank=True, null=True)),
+                ("atualizado_em", models.DateTimeField(auto_now=True)),
+                (
+                    "categoria",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="pontuacoes_ranking",
+                        to="categories.categoria",
+                    ),
+                ),
+                (
+                    "fornecedor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="pontuacoes_ranking",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Pontuação de Fornecedor",
+                "verbose_name_plural": "Pontuações de Fornecedores",
+                "indexes": [
+                    models.Index(
+                        fields=["categoria", "uf", "-score"],
+                        name="ranking_categoria_uf_idx",
+                    ),
+                    models.Index(
+                        fields=["categoria", "-score"], name="ranking_categoria_idx"
+                    ),
+                ],
+                "unique_together": {("fornecedor", "categoria")},
+            },
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from users.models import User  
 from ads.models import Necessidade  
+from categories.models import Categoria
 
 class AvaliacaoCriterio(models.Model):
     """Armazena as avaliações detalhadas por critério específico"""
@@ -90,3 +91,130 @@ class Avaliacao(models.Model):
             self.media_estrelas = total / criterios.count()
             self.save(update_fields=['media_estrelas'])
         return self.media_estrelas
+
+
+class ResumoReputacao(models.Model):
+    """
+    Reputação materializada do usuário (lida por User.get_badges / trust_score).
+    Recalculada após o commit de avaliações, com contadores de anúncios e
+    orçamentos incrementais e reconciliação noturna (rankings.reputacao).
+    Somas e quantidades (em vez de médias) mantêm as médias exatas.
+    """
+
+    usuario = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='reputacao'
+    )
+
+    avaliacoes_fornecedor = models.PositiveIntegerField(default=0)
+    avaliacoes_cliente = models.PositiveIntegerField(default=0)
+    # Soma e quantidade de médias (Avaliacao.media_estrelas não nulas) por tipo
+    soma_estrelas_fornecedor = models.DecimalField(max_digits=12, decimal_places=1, default=0)
+    notas_fornecedor = models.PositiveIntegerField(default=0)
+    soma_estrelas_cliente = models.DecimalField(max_digits=12, decimal_places=1, default=0)
+    notas_cliente = models.PositiveIntegerField(default=0)
+    # {tipo_avaliacao: {criterio: [soma de estrelas, quantidade]}}
+    criterios = models.JSONField(default=dict, blank=True)
+
+    total_necessidades = models.PositiveIntegerField(default=0)
+    total_orcamentos = models.PositiveIntegerField(default=0)
+
+    # Mesmo cálculo de User.trust_score, gravado para ordenação em listagens
+    trust_score = models.FloatField(default=0, db_index=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Resumo de Reputação'
+        verbose_name_plural = 'Resumos de Reputação'
+
+    def _tipos(self, tipo):
+        return [tipo] if tipo else ['fornecedor', 'cliente']
+
+    def total_avaliacoes(self, tipo=None):
+        return sum(getattr(self, f'avaliacoes_{t}') for t in self._tipos(tipo))
+
+    def media(self, tipo=None):
+        """Média das médias de estrelas recebidas (None sem notas), como Avg('media_estrelas')."""
+        notas = sum(getattr(self, f'notas_{t}') for t in self._tipos(tipo))
+        if not notas:
+            return None
+        return sum(getattr(self, f'soma_estrelas_{t}') for t in self._tipos(tipo)) / notas
+
+    def criterios_media(self, tipo=None):
+        somas = {}
+        for t in self._tipos(tipo):
+            for criterio, (soma, total) in self.criterios.get(t, {}).items():
+                acumulado = somas.setdefault(criterio, [0, 0])
+                acumulado[0] += soma
+                acumulado[1] += total
+        return {
+            criterio: {'label': label, 'media': somas[criterio][0] / somas[criterio][1]}
+            for criterio, label in AvaliacaoCriterio.CRITERIO_CHOICES
+            if criterio in somas
+        }
+
+    def calcular_trust_score(self, usuario, agora=None):
+        """Score de confiança entre 0 e 100 (sem consultas: usa este resumo e campos do usuário)."""
+        from django.utils import timezone
+
+        score = 0
+
+        # Base score por estar verificado
+        if usuario.email_verified:
+            score += 20
+
+        # Score por documentos
+        if usuario.cpf:
+            score += 15
+        if usuario.cnpj:
+            score += 10
+
+        # Score por avaliações
+        media = self.media()
+        if media:
+            score += min(float(media) * 10, 30)  # máximo 30 pontos
+
+        # Score por atividade
+        score += min(self.total_avaliacoes() * 2, 20)  # máximo 20 pontos
+
+        # Score por tempo de cadastro
+        dias_cadastrado = ((agora or timezone.now()) - usuario.date_joined).days
+        score += min(dias_cadastrado / 10, 15)  # máximo 15 pontos
+
+        return float(min(score, 100))  # máximo 100 pontos
+
+
+class PontuacaoFornecedor(models.Model):
+    """
+    Pontuação de ranking do fornecedor em uma categoria (rankings.leaderboard).
+    Fonte dos sorted sets do Redis servidos por categoria e UF.
+    """
+
+    fornecedor = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='pontuacoes_ranking'
+    )
+    categoria = models.ForeignKey(
+        Categoria,
+        on_delete=models.CASCADE,
+        related_name='pontuacoes_ranking'
+    )
+    uf = models.CharField(max_length=2, blank=True)  # UF do fornecedor no último cálculo
+
+    avaliacoes = models.PositiveIntegerField(default=0)
+    media = models.FloatField(default=0)  # Média simples das avaliações na categoria
+    score = models.FloatField(default=0)  # Média bayesiana ponderada pela recência
+    ultima_avaliacao = models.DateTimeField(null=True, blank=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('fornecedor', 'categoria')
+        verbose_name = 'Pontuação de Fornecedor'
+        verbose_name_plural = 'Pontuações de Fornecedores'
+        indexes = [
+            models.Index(fields=['categoria', 'uf', '-score'], name='ranking_categoria_uf_idx'),
+            models.Index(fields=['categoria', '-score'], name='ranking_categoria_idx'),
+        ]
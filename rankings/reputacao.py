@@ -0,0 +1,156 @@
+"""
+Manutenção do resumo de reputação (ResumoReputacao).
+
+- Avaliações e critérios: o avaliado é recalculado após o commit, uma vez
+  por transação, com consultas agrupadas (`recalcular`).
+- Anúncios e orçamentos criados/excluídos: contadores incrementais (F()).
+- `reconciliar` (task noturna) recalcula todos os usuários em lotes,
+  corrigindo desvios e atualizando a parcela do trust_score que depende do
+  tempo de cadastro.
+- `obter` cria o resumo na primeira leitura de um usuário sem resumo.
+"""
+
+import threading
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .models import Avaliacao, AvaliacaoCriterio, ResumoReputacao
+
+CAMPOS_ATUALIZADOS = [
+    'avaliacoes_fornecedor', 'avaliacoes_cliente',
+    'soma_estrelas_fornecedor', 'notas_fornecedor', 'soma_estrelas_cliente', 'notas_cliente',
+    'criterios', 'total_necessidades', 'total_orcamentos', 'trust_score', 'atualizado_em',
+]
+
+
+# ==================== RECÁLCULO ====================
+
+def recalcular(user_ids):
+    """Recalcula e grava o resumo dos usuários (consultas agrupadas, independentes da quantidade)."""
+    from ads.models import Necessidade
+    from budgets.models import Orcamento
+    from users.models import User
+
+    user_ids = list(user_ids)
+    usuarios = User.objects.filter(pk__in=user_ids).only('email_verified', 'cpf', 'cnpj', 'date_joined')
+    resumos = {usuario.pk: ResumoReputacao(usuario=usuario) for usuario in usuarios}
+    if not resumos:
+        return []
+
+    avaliacoes = (
+        Avaliacao.objects.filter(avaliado_id__in=resumos)
+        .values_list('avaliado_id', 'tipo_avaliacao')
+        .annotate(total=Count('id'), soma=Sum('media_estrelas'), notas=Count('media_estrelas'))
+        .order_by()
+    )
+    for user_id, tipo, total, soma, notas in avaliacoes:
+        resumo = resumos[user_id]
+        setattr(resumo, f'avaliacoes_{tipo}', total)
+        setattr(resumo, f'soma_estrelas_{tipo}', soma or 0)
+        setattr(resumo, f'notas_{tipo}', notas)
+
+    criterios = (
+        AvaliacaoCriterio.objects.filter(avaliacao__avaliado_id__in=resumos)
+        .values_list('avaliacao__avaliado_id', 'avaliacao__tipo_avaliacao', 'criterio')
+        .annotate(soma=Sum('estrelas'), total=Count('id'))
+        .order_by()
+    )
+    for user_id, tipo, criterio, soma, total in criterios:
+        resumos[user_id].criterios.setdefault(tipo, {})[criterio] = [soma, total]
+
+    necessidades = (
+        Necessidade.objects.filter(cliente_id__in=resumos)
+        .values_list('cliente_id').annotate(total=Count('id')).order_by()
+    )
+    for user_id, total in necessidades:
+        resumos[user_id].total_necessidades = total
+
+    orcamentos = (
+        Orcamento.objects.filter(fornecedor_id__in=resumos)
+        .values_list('fornecedor_id').annotate(total=Count('id')).order_by()
+    )
+    for user_id, total in orcamentos:
+        resumos[user_id].total_orcamentos = total
+
+    agora = timezone.now()
+    for resumo in resumos.values():
+        resumo.trust_score = resumo.calcular_trust_score(resumo.usuario, agora)
+        resumo.atualizado_em = agora
+
+    return ResumoReputacao.objects.bulk_create(
+        resumos.values(),
+        update_conflicts=True,
+        unique_fields=['usuario'],
+        update_fields=CAMPOS_ATUALIZADOS,
+    )
+
+
+def obter(usuario):
+    """Resumo do usuário (em cache na instância), criado na primeira leitura."""
+    try:
+        return usuario.reputacao
+    except ResumoReputacao.DoesNotExist:
+        recalcular([usuario.pk])
+        usuario.reputacao = ResumoReputacao.objects.get(pk=usuario.pk)
+        return usuario.reputacao
+
+
+def reconciliar(batch_size=500):
+    """
+    Recalcula o resumo de todos os usuários, em lotes por id.
+
+    Returns:
+        int: usuários recalculados
+    """
+    from users.models import User
+
+    total = 0
+    ultimo_id = 0
+    while True:
+        ids = list(
+            User.objects.filter(pk__gt=ultimo_id).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        recalcular(ids)
+        total += len(ids)
+        ultimo_id = ids[-1]
+    return total
+
+
+# ==================== ATUALIZAÇÃO INCREMENTAL ====================
+
+_pendentes = threading.local()
+
+
+def _ids_pendentes():
+    if not hasattr(_pendentes, 'ids'):
+        _pendentes.ids = set()
+    return _pendentes.ids
+
+
+def _recalcular_pendentes():
+    ids = _ids_pendentes()
+    if ids:
+        lote = list(ids)
+        ids.clear()
+        recalcular(lote)
+
+
+def agendar_recalculo(user_id):
+    """
+    Recalcula o usuário após o commit. Várias alterações na mesma transação
+    (avaliação, critérios, média) geram um único recálculo.
+    """
+    _ids_pendentes().add(user_id)
+    transaction.on_commit(_recalcular_pendentes)
+
+
+def incrementar(user_id, campo, delta):
+    """Aplica um delta a total_necessidades/total_orcamentos (resumos ainda não criados são ignorados)."""
+    resumos = ResumoReputacao.objects.filter(pk=user_id)
+    if delta < 0:
+        resumos = resumos.filter(**{f'{campo}__gte': -delta})
+    resumos.update(**{campo: F(campo) + delta})
@@ -0,0 +1,48 @@
+# rankings/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from ads.models import Necessidade
+from budgets.models import Orcamento
+from .models import Avaliacao, AvaliacaoCriterio
+from . import leaderboard, reputacao
+
+
+@receiver(post_save, sender=Avaliacao)
+@receiver(post_delete, sender=Avaliacao)
+def recalcular_reputacao_avaliacao(sender, instance, **kwargs):
+    reputacao.agendar_recalculo(instance.avaliado_id)
+    leaderboard.agendar_atualizacao(instance)
+
+
+@receiver(post_save, sender=AvaliacaoCriterio)
+@receiver(post_delete, sender=AvaliacaoCriterio)
+def recalcular_reputacao_criterio(sender, instance, **kwargs):
+    try:
+        avaliado_id = instance.avaliacao.avaliado_id
+    except Avaliacao.DoesNotExist:
+        # Excluído junto com a avaliação, que já agenda o recálculo
+        return
+    reputacao.agendar_recalculo(avaliado_id)
+
+
+@receiver(post_save, sender=Necessidade)
+def contar_necessidade_reputacao(sender, instance, created, **kwargs):
+    if created:
+        reputacao.incrementar(instance.cliente_id, 'total_necessidades', 1)
+
+
+@receiver(post_delete, sender=Necessidade)
+def descontar_necessidade_reputacao(sender, instance, **kwargs):
+    reputacao.incrementar(instance.cliente_id, 'total_necessidades', -1)
+
+
+@receiver(post_save, sender=Orcamento)
+def contar_orcamento_reputacao(sender, instance, created, **kwargs):
+    if created:
+        reputacao.incrementar(instance.fornecedor_id, 'total_orcamentos', 1)
+
+
+@receiver(post_delete, sender=Orcamento)
+def descontar_orcamento_reputacao(sender, instance, **kwargs):
+    reputacao.incrementar(instance.fornecedor_id, 'total_orcamentos', -1)
@@ -0,0 +1,22 @@
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def reconciliar_reputacao():
+    """Recalcula o resumo de reputação de todos os usuários (desvios e trust_score por tempo de cadastro)."""
+    from .reputacao import reconciliar
+
+    total = reconciliar()
+    logger.info(f"Resumo de reputação reconciliado para {total} usuários")
+    return total
+
+
+@shared_task
+def reconstruir_rankings():
+    """Recalcula as pontuações dos fornecedores (decaimento por recência) e recria os rankings no Redis."""
+    from .leaderboard import reconstruir
+
+    return reconstruir()
@@ -1,3 +1,155 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+import fakeredis
+
+from ads.models import Necessidade
+from categories.models import Categoria, SubCategoria
+from rankings import leaderboard
+from rankings.models import Avaliacao, AvaliacaoCriterio, PontuacaoFornecedor, ResumoReputacao
+from rankings.reputacao import reconciliar
+from users.models import User
+
+
+class ResumoReputacaoTest(TestCase):
+
+    def setUp(self):
+        self.cliente = User.objects.create_user(
+            email='cliente@exemplo.com', password='senha123',
+            first_name='Cliente', last_name='Teste', is_client=True
+        )
+        self.fornecedor = User.objects.create_user(
+            email='fornecedor@exemplo.com', password='senha123',
+            first_name='Fornecedor', last_name='Teste', is_supplier=True, cpf='52998224725'
+        )
+        categoria = Categoria.objects.create(nome='Serviços')
+        self.subcategoria = SubCategoria.objects.create(nome='Elétrica', categoria=categoria)
+        self.categoria = categoria
+
+    def _necessidade(self, titulo):
+        return Necessidade.objects.create(
+            titulo=titulo, descricao='Reparo elétrico', cliente=self.cliente,
+            categoria=self.categoria, subcategoria=self.subcategoria, quantidade=1, unidade='un'
+        )
+
+    def _avaliar(self, necessidade, notas):
+        with self.captureOnCommitCallbacks(execute=True):
+            avaliacao = Avaliacao.objects.create(
+                usuario=self.cliente, avaliado=self.fornecedor, anuncio=necessidade, tipo_avaliacao='fornecedor'
+            )
+            for criterio, estrelas in notas.items():
+                AvaliacaoCriterio.objects.create(avaliacao=avaliacao, criterio=criterio, estrelas=estrelas)
+            avaliacao.calcular_media()
+
+    def test_resumo_acompanha_avaliacoes_e_le_sem_consultas(self):
+        self._avaliar(self._necessidade('Reparo'), {'qualidade_produto': 5, 'atendimento': 4})
+        self._avaliar(self._necessidade('Instalação'), {'qualidade_produto': 3, 'atendimento': 4})
+
+        resumo = ResumoReputacao.objects.get(pk=self.fornecedor.pk)
+        self.assertEqual(resumo.avaliacoes_fornecedor, 2)
+        self.assertEqual(resumo.media(), Decimal('4.0'))
+        self.assertIsNone(resumo.media('cliente'))
+
+        fornecedor = User.objects.select_related('reputacao').get(pk=self.fornecedor.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(fornecedor.get_criterios_media('fornecedor'), {
+                'qualidade_produto': {'label': 'Qualidade do Produto', 'media': 4.0},
+                'atendimento': {'label': 'Atendimento', 'media': 4.0},
+            })
+            self.assertEqual([badge['label'] for badge in fornecedor.get_badges()], ['Identidade Verificada'])
+            self.assertEqual(fornecedor.trust_score, resumo.trust_score)
+
+    def test_contador_de_necessidades_incremental_e_reconciliacao(self):
+        # Primeira leitura cria o resumo
+        self.assertEqual(self.cliente.reputacao_resumo().total_necessidades, 0)
+        for i in range(5):
+            self._necessidade(f'Anúncio {i}')
+        cliente = User.objects.select_related('reputacao').get(pk=self.cliente.pk)
+        self.assertIn('Cliente Frequente', [badge['label'] for badge in cliente.get_badges()])
+
+        ResumoReputacao.objects.filter(pk=self.cliente.pk).update(total_necessidades=0)
+        self.assertEqual(reconciliar(), 2)
+        self.assertEqual(ResumoReputacao.objects.get(pk=self.cliente.pk).total_necessidades, 5)
+
+
+class RankingFornecedoresTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.cliente = User.objects.create_user(
+            email='cliente@exemplo.com', password='senha123', first_name='Cliente', last_name='Teste', is_client=True
+        )
+        self.categoria = Categoria.objects.create(nome='Serviços')
+        self.subcategoria = SubCategoria.objects.create(nome='Elétrica', categoria=self.categoria)
+        self.fornecedores = {
+            nome: User.objects.create_user(
+                email=f'{nome}@exemplo.com', password='senha123',
+                first_name=nome, last_name='Fornecedor', is_supplier=True, estado=uf
+            )
+            for nome, uf in (('ana', 'SP'), ('bruno', 'CE'), ('carla', 'SP'))
+        }
+
+    def _avaliar(self, nome, notas):
+        with self.captureOnCommitCallbacks(execute=True):
+            for nota in notas:
+                necessidade = Necessidade.objects.create(
+                    titulo='Reparo', descricao='Reparo elétrico', cliente=self.cliente,
+                    categoria=self.categoria, subcategoria=self.subcategoria, quantidade=1, unidade='un'
+                )
+                Avaliacao.objects.create(
+                    usuario=self.cliente, avaliado=self.fornecedores[nome], anuncio=necessidade,
+                    tipo_avaliacao='fornecedor', media_estrelas=nota
+                )
+
+    def test_ranking_bayesiano_por_categoria_e_uf(self):
+        self._avaliar('ana', [5, 5])
+        self._avaliar('bruno', [5])
+        self._avaliar('carla', [3, 3, 3])
+        # Atualização incremental após o commit
+        self.assertEqual(PontuacaoFornecedor.objects.filter(categoria=self.categoria).count(), 3)
+
+        # Prior = média global (4.0): (5·4 + Σ notas) / (5 + n)
+        self.assertEqual(leaderboard.reconstruir(), 3)
+        pagina = leaderboard.pagina(self.categoria.pk)
+        self.assertEqual(pagina['total'], 3)
+        self.assertEqual([f['nome'] for f in pagina['fornecedores']], [
+            'ana Fornecedor', 'bruno Fornecedor', 'carla Fornecedor',
+        ])
+        self.assertAlmostEqual(pagina['fornecedores'][0]['score'], 30 / 7, places=2)
+
+        resposta = self.client.get(
+            reverse('rankings:ranking_fornecedores', args=[self.categoria.pk]), {'uf': 'sp', 'page': 2}
+        )
+        self.assertEqual(resposta.json()['total'], 2)
+
+        pagina = leaderboard.pagina(self.categoria.pk, uf='SP', numero=2, por_pagina=1)
+        self.assertEqual([(f['posicao'], f['nome']) for f in pagina['fornecedores']], [(2, 'carla Fornecedor')])
+
+    def test_redis_sem_sorted_set_recompoe_do_banco(self):
+        redis = fakeredis.FakeRedis()
+        with mock.patch('rankings.leaderboard._redis', return_value=redis):
+            self._avaliar('ana', [5, 5])
+            self._avaliar('carla', [3, 3, 3])
+            # Incrementais não criam sorted sets parciais
+            self.assertEqual(redis.keys('*'), [])
+
+            # Sorted set ausente (deploy, reinício do Redis): lê do banco e recompõe
+            pagina = leaderboard.pagina(self.categoria.pk)
+            self.assertEqual(pagina['total'], 2)
+            self.assertEqual(redis.zcard(leaderboard._chave(self.categoria.pk, None)), 2)
+
+            self._avaliar('bruno', [5])
+            pagina = leaderboard.pagina(self.categoria.pk)
+            self.assertEqual(pagina['total'], 3)
+            self.assertEqual({f['id'] for f in pagina['fornecedores']}, {f.pk for f in self.fornecedores.values()})
+            self.assertEqual(leaderboard.pagina(self.categoria.pk, uf='CE')['total'], 1)
 
-# Create your tests here.
+            # Eviction depois da reconstrução
+            self.assertEqual(leaderboard.reconstruir(), 3)
+            redis.delete(leaderboard._chave(self.categoria.pk, 'SP'))
+            pagina = leaderboard.pagina(self.categoria.pk, uf='SP')
+            self.assertEqual([f['nome'] for f in pagina['fornecedores']], ['ana Fornecedor', 'carla Fornecedor'])
+            self.assertEqual(redis.zcard(leaderboard._chave(self.categoria.pk, 'SP')), 2)
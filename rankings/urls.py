@@ -1,8 +1,9 @@
 from django.urls import path
-from .views import AvaliacaoCreateView
+from .views import AvaliacaoCreateView, RankingFornecedoresView
 
 app_name = 'rankings'
 
 urlpatterns = [
     path('avaliar/<int:pk>/', AvaliacaoCreateView.as_view(), name='avaliar_negociacao'),
+    path('fornecedores/<int:categoria_id>/', RankingFornecedoresView.as_view(), name='ranking_fornecedores'),
 ]
@@ -6,6 +6,7 @@ from django.db import transaction
 import logging
 
 from rankings.forms import AvaliacaoForm
+from rankings import leaderboard
 from .models import Avaliacao, AvaliacaoCriterio
 from ads.models import Necessidade
 from budgets.models import Orcamento  # Importando o modelo correto
@@ -234,3 +235,14 @@ class AvaliacaoCreateView(View):
         return render(request, 'avaliacao_form.html', context)
 
 
+
+
+class RankingFornecedoresView(View):
+    """Ranking paginado de fornecedores de uma categoria (JSON), opcionalmente filtrado por UF."""
+
+    def get(self, request, categoria_id):
+        try:
+            numero = int(request.GET.get('page', 1))
+        except ValueError:
+            return JsonResponse({'error': 'Página inválida'}, status=400)
+        return JsonResponse(leaderboard.pagina(categoria_id, uf=request.GET.get('uf'), numero=numero))
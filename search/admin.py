@@ -1,7 +1,16 @@
 from django.contrib import admin
-from .models import State
+from .models import BuscaSalva, State
 
 @admin.register(State)
 class StateAdmin(admin.ModelAdmin):
     list_display = ('abbreviation', 'name')
     search_fields = ('name', 'abbreviation')
+
+
+
+@admin.register(BuscaSalva)
+class BuscaSalvaAdmin(admin.ModelAdmin):
+    list_display = ('nome', 'user', 'termo', 'estado', 'alertas_ativos', 'criado_em', 'ultimo_alerta_em')
+    list_filter = ('alertas_ativos', 'estado')
+    search_fields = ('nome', 'termo', 'user__email')
+    raw_id_fields = ('user',)
@@ -0,0 +1,226 @@
+"""
+Buscas salvas com alerta de novos anúncios.
+
+Avaliação no estilo percolator: em vez de rodar cada busca salva contra os
+anúncios, cada anúncio novo é testado contra as buscas que podem casar com ele.
+
+- Ao salvar, a busca recebe as chaves do índice invertido (GIN em
+  BuscaSalva.chaves): os lexemas positivos do termo (querytree da mesma
+  tsquery da busca) ou, sem termo, 'uf:<UF>' / '*'.
+- Anúncio novo (task após o commit): uma consulta lê os lexemas do
+  search_vector (título, categoria, subcategoria e descrição), outra busca
+  as candidatas por sobreposição de chaves. Os filtros simples (UF, status,
+  local, anunciante, raio) são conferidos em Python e os termos das
+  restantes em uma consulta (um booleano por termo distinto).
+- Cada usuário recebe no máximo uma notificação por anúncio.
+"""
+
+import logging
+import re
+
+from django.conf import settings
+from django.contrib.postgres.fields import ArrayField
+from django.db import connection, transaction
+from django.db.models import BooleanField, CharField, ExpressionWrapper, F, Func
+from django.utils import timezone
+
+from core.services.geo_service import GeoService
+from .fulltext import SEARCH_CONFIG, condicao_busca
+from .models import BuscaSalva
+from .security_utils import (
+    validate_client_name, validate_coordinates, validate_location, validate_radius,
+    validate_search_fields, validate_search_term, validate_status_list,
+)
+
+logger = logging.getLogger(__name__)
+
+ORIGEM = 'busca_salva'
+TODAS = '*'
+ESTADOS = {
+    'AC', 'AL', 'AP', 'AM', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 'MT', 'MS', 'MG', 'PA',
+    'PB', 'PR', 'PE', 'PI', 'RJ', 'RN', 'RS', 'RO', 'RR', 'SC', 'SP', 'SE', 'TO',
+}
+LEXEMA = re.compile(r"'((?:[^']|'')+)'")
+
+
+# ==================== SALVAR ====================
+
+def parametros(dados):
+    """Filtros validados a partir dos parâmetros da NecessidadeSearchAllView (QueryDict)."""
+    _, termo, _ = validate_search_term(dados.get('q', '').strip())
+    _, local, _ = validate_location(dados.get('local', '').strip())
+    _, cliente, _ = validate_client_name(dados.get('cliente', '').strip())
+    valido, lat, lon, _ = validate_coordinates(dados.get('lat'), dados.get('lon'))
+    estado = dados.get('state', '').strip().upper()
+
+    filtros = {
+        'termo': termo or '',
+        'campos': validate_search_fields(dados.getlist('campos')),
+        'estado': estado if estado in ESTADOS else '',
+        'status': validate_status_list(dados.getlist('status')) or [],
+        'local': local or '',
+        'cliente': cliente or '',
+    }
+    if valido and lat is not None and lon is not None:
+        filtros.update(lat=lat, lon=lon, raio=validate_radius(dados.get('raio'))[1])
+    return filtros
+
+
+def chaves(termo, estado=''):
+    """Chaves do índice: lexemas positivos do termo; sem termo, a UF ou '*'."""
+    lexemas = []
+    if termo:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT querytree(websearch_to_tsquery(%s::regconfig, %s))", [SEARCH_CONFIG, termo]
+            )
+            arvore = cursor.fetchone()[0]
+        lexemas = sorted({lexema.replace("''", "'") for lexema in LEXEMA.findall(arvore)})
+    if lexemas:
+        return [f"t:{lexema}" for lexema in lexemas]
+    # Termo vazio ou só com exclusões: candidata de todo anúncio da UF (ou de todos)
+    return [f"uf:{estado}" if estado else TODAS]
+
+
+def salvar(usuario, dados, nome=''):
+    """
+    Salva a busca descrita pelos parâmetros.
+
+    Raises:
+        ValueError: limite de buscas salvas do usuário atingido
+    """
+    if usuario.buscas_salvas.count() >= settings.BUSCAS_SALVAS_POR_USUARIO:
+        raise ValueError(f"Limite de {settings.BUSCAS_SALVAS_POR_USUARIO} buscas salvas atingido")
+    filtros = parametros(dados)
+    nome = nome.strip()[:100] or filtros['termo'][:100] or 'Todos os anúncios'
+    return BuscaSalva.objects.create(
+        user=usuario, nome=nome, chaves=chaves(filtros['termo'], filtros['estado']), **filtros
+    )
+
+
+# ==================== AVALIAÇÃO ====================
+
+def _anuncio(necessidade_id):
+    from ads.models import Necessidade
+
+    return (
+        Necessidade.objects.filter(pk=necessidade_id)
+        .annotate(lexemas=Func(
+            F('search_vector'), function='tsvector_to_array', output_field=ArrayField(CharField())
+        ))
+        .values(
+            'pk', 'titulo', 'status', 'cliente_id', 'geo_lat', 'geo_lon', 'lexemas',
+            'cliente__estado', 'cliente__cidade', 'cliente__bairro', 'cliente__first_name',
+        )
+        .first()
+    )
+
+
+def _contem(texto, trecho):
+    return trecho.lower() in (texto or '').lower()
+
+
+def _atende_filtros(busca, anuncio):
+    """Filtros da busca que não dependem do texto (mesmas regras da view)."""
+    if busca.estado and busca.estado != anuncio['cliente__estado']:
+        return False
+    if busca.status and anuncio['status'] not in busca.status:
+        return False
+    if busca.local and not (
+        _contem(anuncio['cliente__cidade'], busca.local) or _contem(anuncio['cliente__bairro'], busca.local)
+    ):
+        return False
+    if busca.cliente and not _contem(anuncio['cliente__first_name'], busca.cliente):
+        return False
+    if busca.lat is not None and busca.lon is not None:
+        if anuncio['geo_lat'] is None or anuncio['geo_lon'] is None:
+            return False
+        distancia = GeoService.distancia_km(busca.lat, busca.lon, anuncio['geo_lat'], anuncio['geo_lon'])
+        if distancia > (busca.raio or 0):
+            return False
+    return True
+
+
+def _termos_atendidos(necessidade_id, buscas):
+    """{(termo, campos)} que casam com o anúncio: uma consulta para todos os termos distintos."""
+    from ads.models import Necessidade
+
+    termos = list({(busca.termo, tuple(busca.campos)) for busca in buscas if busca.termo})
+    if not termos:
+        return set()
+    resultado = Necessidade.objects.filter(pk=necessidade_id).values(**{
+        f't{i}': ExpressionWrapper(condicao_busca(termo, campos), output_field=BooleanField())
+        for i, (termo, campos) in enumerate(termos)
+    }).first() or {}
+    return {termo for i, termo in enumerate(termos) if resultado.get(f't{i}')}
+
+
+def buscas_atendidas(necessidade_id):
+    """Buscas salvas (com alerta ativo, de outros usuários) que casam com o anúncio."""
+    anuncio = _anuncio(necessidade_id)
+    if anuncio is None:
+        return None, []
+
+    chaves_anuncio = [f"t:{lexema}" for lexema in anuncio['lexemas'] or ()] + [TODAS]
+    if anuncio['cliente__estado']:
+        chaves_anuncio.append(f"uf:{anuncio['cliente__estado']}")
+    candidatas = [
+        busca for busca in
+        BuscaSalva.objects.filter(alertas_ativos=True, chaves__overlap=chaves_anuncio)
+        .exclude(user_id=anuncio['cliente_id'])
+        if _atende_filtros(busca, anuncio)
+    ]
+    termos = _termos_atendidos(necessidade_id, candidatas)
+    return anuncio, [
+        busca for busca in candidatas
+        if not busca.termo or (busca.termo, tuple(busca.campos)) in termos
+    ]
+
+
+def avaliar(necessidade_id):
+    """
+    Alerta os donos das buscas salvas que casam com o anúncio. Reexecutar
+    não duplica alertas.
+
+    Returns:
+        int: usuários notificados
+    """
+    from notifications.fanout import enviar, montar
+    from notifications.models import Notification
+
+    anuncio, buscas = buscas_atendidas(necessidade_id)
+    if not buscas:
+        return 0
+
+    por_usuario = {}
+    for busca in buscas:
+        por_usuario.setdefault(busca.user_id, busca)
+    ja_avisados = set(
+        Notification.objects.filter(
+            necessidade_id=necessidade_id, user_id__in=por_usuario, metadata__origem=ORIGEM
+        ).values_list('user_id', flat=True)
+    )
+
+    with transaction.atomic():
+        criadas = enviar([
+            montar(
+                user_id, 'busca_salva', {'nome': busca.nome, 'titulo': anuncio['titulo']},
+                necessidade_id=necessidade_id, metadata={'origem': ORIGEM, 'busca_id': busca.pk},
+            )
+            for user_id, busca in por_usuario.items() if user_id not in ja_avisados
+        ])
+        BuscaSalva.objects.filter(pk__in=[busca.pk for busca in buscas]).update(ultimo_alerta_em=timezone.now())
+    return len(criadas)
+
+
+def agendar_avaliacao(necessidade):
+    """Avalia as buscas salvas após o commit da criação do anúncio."""
+    from .tasks import avaliar_buscas_salvas
+
+    def disparar():
+        try:
+            avaliar_buscas_salvas.delay(necessidade.pk)
+        except Exception as e:
+            logger.warning(f"Não foi possível agendar as buscas salvas do anúncio {necessidade.pk}: {e}")
+
+    transaction.on_commit(disparar)
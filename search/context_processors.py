@@ -1,12 +1,21 @@
 # search/context_processors.py
+from core.services.reference_cache_service import ReferenceCacheService
 from .models import State
 
+CHAVE_ESTADOS = 'search:states'
+
+
+def estados_cacheados():
+    """Lista de estados mantida em memória no processo (dado de referência)."""
+    return ReferenceCacheService.obter(CHAVE_ESTADOS, lambda: list(State.objects.all()))
+
+
 def states_list(request):
     """
     Deixa 'states' e 'selected_state' disponíveis em todos os templates.
     - 'selected_state' vem da querystring (?state=XX) ou assume 'CE'.
     """
     return {
-        "states": State.objects.all(),
+        "states": estados_cacheados(),
         "selected_state": request.GET.get("state", "CE").upper()
     }
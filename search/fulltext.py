@@ -0,0 +1,90 @@
+"""
+Busca textual (PostgreSQL full-text search) sobre Necessidade.
+
+O vetor `Necessidade.search_vector` é mantido por trigger no banco com os pesos:
+    A = título, B = categoria, C = subcategoria, D = descrição
+Isso permite restringir a busca aos campos selecionados (ts_filter) e ordenar
+por relevância usando um único índice GIN.
+"""
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorExact, SearchVectorField
+from django.db.models import F, Func, Q
+
+SEARCH_CONFIG = 'portuguese_unaccent'
+
+# Letra de peso de cada campo no vetor de busca
+PESO_POR_CAMPO = {
+    'titulo': 'A',
+    'categoria': 'B',
+    'subcategoria': 'C',
+    'descricao': 'D',
+}
+
+# Relevância de cada peso no ranking (título > categoria/subcategoria > descrição)
+RELEVANCIA_POR_PESO = {
+    'A': 1.0,
+    'B': 0.4,
+    'C': 0.4,
+    'D': 0.2,
+}
+
+
+class TsFilter(Func):
+    """ts_filter(vetor, pesos): mantém apenas os lexemas dos pesos informados."""
+    function = 'ts_filter'
+    template = "%(function)s(%(expressions)s, '{%(pesos)s}'::\"char\"[])"
+    output_field = SearchVectorField()
+
+
+def build_search_query(term):
+    """Converte o termo digitado em tsquery (sintaxe websearch: aspas, OR, -exclusão)."""
+    return SearchQuery(term, config=SEARCH_CONFIG, search_type='websearch')
+
+
+def _pesos_selecionados(campos):
+    if not campos:
+        return list(PESO_POR_CAMPO.values())
+    return [PESO_POR_CAMPO[campo] for campo in campos if campo in PESO_POR_CAMPO]
+
+
+def condicao_busca(term, campos=None):
+    """
+    Condição (Q) de o termo casar com os campos selecionados do anúncio.
+    Usada pela página de busca e pelas buscas salvas, que assim não divergem.
+    """
+    query = build_search_query(term)
+    pesos = _pesos_selecionados(campos)
+
+    # O filtro sobre o vetor completo usa o índice GIN; o ts_filter só reavalia
+    # as linhas já encontradas quando a busca é restrita a alguns campos.
+    condicao = Q(search_vector=query)
+    if len(pesos) < len(PESO_POR_CAMPO):
+        condicao &= Q(SearchVectorExact(
+            TsFilter(F('search_vector'), pesos=','.join(pesos).lower()), query
+        ))
+    return condicao
+
+
+def aplicar_busca_textual(qs, term, campos=None):
+    """
+    Filtra o queryset pelo termo e anota `rank` (relevância).
+
+    Args:
+        qs: QuerySet de Necessidade
+        term: termo já validado
+        campos: lista de campos válidos (titulo, descricao, categoria, subcategoria);
+                vazio/None significa todos
+
+    Returns:
+        QuerySet filtrado e anotado com `rank` (não ordenado)
+    """
+    query = build_search_query(term)
+    pesos = _pesos_selecionados(campos)
+    qs = qs.filter(condicao_busca(term, campos))
+
+    # SearchRank recebe os pesos na ordem [D, C, B, A]
+    relevancia = [
+        RELEVANCIA_POR_PESO[letra] if letra in pesos else 0.0
+        for letra in ('D', 'C', 'B', 'A')
+    ]
+    return qs.annotate(rank=SearchRank(F('search_vector'), query, weights=relevancia))
@@ -0,0 +1,84 @@
+"""
+Management command to (re)build Necessidade.search_vector in batches.
+Run it once after applying ads migration 0019 and whenever the text search
+configuration changes. New writes are kept up to date by database triggers.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from ads.models import Necessidade
+
+SQL_ATUALIZAR_LOTE = """
+UPDATE ads_necessidade
+   SET search_vector = ads_necessidade_search_vector(titulo, descricao, categoria_id, subcategoria_id)
+ WHERE id = ANY(%s)
+"""
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search vectors of Necessidade in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of rows updated per transaction (default: 1000)',
+        )
+        parser.add_argument(
+            '--only-missing',
+            action='store_true',
+            help='Only rows without a search vector',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show how many rows would be updated without changing anything',
+        )
+        parser.add_argument(
+            '--verbose',
+            action='store_true',
+            help='Show detailed output',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        verbose = options['verbose']
+
+        queryset = Necessidade.objects.order_by('id')
+        if options['only_missing']:
+            queryset = queryset.filter(search_vector__isnull=True)
+
+        if options['dry_run']:
+            self.stdout.write(
+                self.style.WARNING(f'DRY RUN: {queryset.count()} rows would be updated')
+            )
+            return
+
+        inicio = time.monotonic()
+        total = 0
+        ultimo_id = 0
+
+        # Paginação por chave (id) para não depender de OFFSET em tabelas grandes
+        while True:
+            ids = list(
+                queryset.filter(id__gt=ultimo_id).values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(SQL_ATUALIZAR_LOTE, [ids])
+                total += cursor.rowcount
+
+            ultimo_id = ids[-1]
+            if verbose:
+                self.stdout.write(f'Updated rows up to id {ultimo_id} ({total} so far)')
+
+        elapsed = time.monotonic() - inicio
+        self.stdout.write(
+            self.style.SUCCESS(f'Search vectors rebuilt for {total} rows in {elapsed:.1f}s')
+        )
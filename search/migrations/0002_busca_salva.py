@@ -0,0 +1,125 @@
+# Generated by Django 5.1.14 on 2026-10-17 20:22
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("search", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BuscaSalva",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("nome", models.CharField(max_length=100, verbose_name="Nome")),
+                (
+                    "termo",
+                    models.CharField(blank=True, max_length=200, verbose_name="Termo"),
+                ),
+                (
+                    "campos",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.CharField(max_length=20),
+                        blank=True,
+                        default=list,
+                        size=None,
+                        verbose_name="Campos",
+                    ),
+                ),
+                (
+                    "estado",
+                    models.CharField(blank=True, max_length=2, verbose_name="UF"),
+                ),
+                (
+                    "status",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.CharField(max_length=30),
+                        blank=True,
+                        default=list,
+                        size=None,
+                        verbose_name="Status",
+                    ),
+                ),
+                (
+                    "local",
+                    models.CharField(blank=True, max_length=100, verbose_name="Local"),
+                ),
+                (
+                    "cliente",
+                    models.CharField(
+                        blank=True, max_length=100, verbose_name="Anunciante"
+                    ),
+                ),
+                (
+                    "lat",
+                    models.FloatField(blank=True, null=True, verbose_name="Latitude"),
+                ),
+                (
+                    "lon",
+                    models.FloatField(blank=True, null=True, verbose_name="Longitude"),
+                ),
+                (
+                    "raio",
+                    models.FloatField(blank=True, null=True, verbose_name="Raio (km)"),
+                ),
+                (
+                    "chaves",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.CharField(max_length=120),
+                        default=list,
+                        editable=False,
+                        size=None,
+                    ),
+                ),
+                (
+                    "alertas_ativos",
+                    models.BooleanField(default=True, verbose_name="Alertas ativos"),
+                ),
+                (
+                    "criado_em",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Criada em"),
+                ),
+                (
+                    "ultimo_alerta_em",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Último alerta em"
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="buscas_salvas",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Usuário",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Busca salva",
+                "verbose_name_plural": "Buscas salvas",
+                "ordering": ["-criado_em"],
+                "indexes": [
+                    django.contrib.postgres.indexes.GinIndex(
+                        fields=["chaves"], name="busca_salva_chaves_gin"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -1,3 +1,8 @@
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
 
 class State(models.Model):
@@ -8,4 +13,51 @@ class State(models.Model):
         ordering = ['name']
     
     def __str__(self):
-        return f"{self.name} ({self.abbreviation})"
\ No newline at end of file
+        return f"{self.name} ({self.abbreviation})"
+
+class BuscaSalva(models.Model):
+    """
+    Busca de anúncios salva pelo usuário, com alerta de novos resultados
+    (search.buscas_salvas). Os filtros são os da NecessidadeSearchAllView.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='buscas_salvas', verbose_name='Usuário'
+    )
+    nome = models.CharField('Nome', max_length=100)
+    termo = models.CharField('Termo', max_length=200, blank=True)
+    campos = ArrayField(models.CharField(max_length=20), default=list, blank=True, verbose_name='Campos')
+    estado = models.CharField('UF', max_length=2, blank=True)
+    # Vazio: todos os status
+    status = ArrayField(models.CharField(max_length=30), default=list, blank=True, verbose_name='Status')
+    local = models.CharField('Local', max_length=100, blank=True)
+    cliente = models.CharField('Anunciante', max_length=100, blank=True)
+    lat = models.FloatField('Latitude', null=True, blank=True)
+    lon = models.FloatField('Longitude', null=True, blank=True)
+    raio = models.FloatField('Raio (km)', null=True, blank=True)
+
+    # Chaves do índice invertido: lexemas do termo ou, sem termo, a UF (ou '*')
+    chaves = ArrayField(models.CharField(max_length=120), default=list, editable=False)
+    alertas_ativos = models.BooleanField('Alertas ativos', default=True)
+    criado_em = models.DateTimeField('Criada em', auto_now_add=True)
+    ultimo_alerta_em = models.DateTimeField('Último alerta em', null=True, blank=True)
+
+    class Meta:
+        ordering = ['-criado_em']
+        verbose_name = 'Busca salva'
+        verbose_name_plural = 'Buscas salvas'
+        indexes = [
+            GinIndex(fields=['chaves'], name='busca_salva_chaves_gin'),
+        ]
+
+    def __str__(self):
+        return f"{self.nome} ({self.user_id})"
+
+    def querystring(self):
+        """Parâmetros da busca na NecessidadeSearchAllView."""
+        parametros = [('q', self.termo), ('state', self.estado or 'todos'), ('local', self.local),
+                      ('cliente', self.cliente)]
+        parametros += [('campos', campo) for campo in self.campos]
+        parametros += [('status', status) for status in self.status]
+        if self.lat is not None and self.lon is not None:
+            parametros += [('lat', self.lat), ('lon', self.lon), ('raio', self.raio or '')]
+        return urlencode([(chave, valor) for chave, valor in parametros if valor != ''])
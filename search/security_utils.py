@@ -6,10 +6,8 @@ Implementa validações de entrada, sanitização XSS e rate limiting.
 import re
 import logging
 import html
-from functools import wraps
-from django.core.cache import cache
-from django.http import JsonResponse
-from django.utils import timezone
+
+from core.services.rate_limit_service import RateLimitService, limitar
 
 # Configurar logger de segurança
 security_logger = logging.getLogger('search.security')
@@ -24,10 +22,6 @@ SAFE_SEARCH_PATTERN = re.compile(r'^[a-zA-Z0-9À-ÿ\s\-_,.()&]+$', re.UNICODE)
 SAFE_LOCATION_PATTERN = re.compile(r'^[a-zA-Z0-9À-ÿ\s\-_,.()]+$', re.UNICODE)
 SAFE_CLIENT_PATTERN = re.compile(r'^[a-zA-ZÀ-ÿ\s\-_]+$', re.UNICODE)
 
-# Rate limiting
-RATE_LIMIT_REQUESTS = 30  # máximo de requests por período
-RATE_LIMIT_PERIOD = 60   # período em segundos
-
 
 def sanitize_html(text):
     """
@@ -181,71 +175,59 @@ def validate_coordinates(lat, lon):
         return False, None, None, "Coordenadas devem ser números válidos"
 
 
+def validate_radius(raio, default=50, maximo=500):
+    """
+    Valida o raio de busca por proximidade (em km).
+    
+    Args:
+        raio (str): Raio informado
+        default (int): Raio usado quando não informado
+        maximo (int): Raio máximo permitido
+        
+    Returns:
+        tuple: (is_valid, raio_float, error_message)
+    """
+    if not raio:
+        return True, float(default), None
+    
+    try:
+        raio_float = float(raio)
+    except (ValueError, TypeError):
+        return False, float(default), "Raio deve ser um número válido"
+    
+    if not (0 < raio_float <= maximo):
+        return False, float(default), f"Raio deve estar entre 0 e {maximo} km"
+    
+    return True, raio_float, None
+
+
 def get_client_ip(request):
     """
-    Obtém o IP real do cliente considerando proxies.
+    Obtém o IP real do cliente (X-Forwarded-For só vale atrás de proxy confiável).
     """
-    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded_for:
-        ip = x_forwarded_for.split(',')[0].strip()
-    else:
-        ip = request.META.get('REMOTE_ADDR')
-    return ip
+    return RateLimitService.ip_cliente(request)
 
 
 def rate_limit_check(request, endpoint_name='autocomplete'):
     """
-    Verifica se o cliente excedeu o rate limit.
+    Verifica se o cliente excedeu o rate limit (conta a requisição se couber).
     
     Args:
         request: Django request object
-        endpoint_name (str): Nome do endpoint para cache
+        endpoint_name (str): Grupo de endpoints (settings.RATE_LIMIT_POLITICAS)
         
     Returns:
         tuple: (is_allowed, remaining_requests)
     """
-    ip = get_client_ip(request)
-    cache_key = f"rate_limit:{endpoint_name}:{ip}"
-    
-    # Verificar número atual de requests
-    current_requests = cache.get(cache_key, 0)
-    
-    if current_requests >= RATE_LIMIT_REQUESTS:
-        security_logger.warning(f"Rate limit exceeded for IP {ip} on {endpoint_name}")
-        return False, 0
-    
-    # Incrementar contador
-    cache.set(cache_key, current_requests + 1, RATE_LIMIT_PERIOD)
-    
-    remaining = RATE_LIMIT_REQUESTS - (current_requests + 1)
-    return True, remaining
+    resultado = RateLimitService.verificar(request, endpoint_name)
+    return resultado.permitido, resultado.restantes
 
 
 def rate_limit_decorator(endpoint_name='default'):
     """
     Decorator para aplicar rate limiting automaticamente.
     """
-    def decorator(view_func):
-        @wraps(view_func)
-        def wrapper(request, *args, **kwargs):
-            allowed, remaining = rate_limit_check(request, endpoint_name)
-            
-            if not allowed:
-                return JsonResponse({
-                    'error': 'Rate limit exceeded. Please try again later.',
-                    'retry_after': RATE_LIMIT_PERIOD
-                }, status=429)
-            
-            # Adicionar headers informativos
-            response = view_func(request, *args, **kwargs)
-            if hasattr(response, 'headers'):
-                response.headers['X-RateLimit-Remaining'] = str(remaining)
-                response.headers['X-RateLimit-Limit'] = str(RATE_LIMIT_REQUESTS)
-                response.headers['X-RateLimit-Reset'] = str(int(timezone.now().timestamp()) + RATE_LIMIT_PERIOD)
-            
-            return response
-        return wrapper
-    return decorator
+    return limitar(endpoint_name)
 
 
 def log_suspicious_activity(request, activity_type, details):
@@ -0,0 +1,49 @@
+# search/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from ads.models import Necessidade
+from categories.models import Categoria, SubCategoria
+from core.services.reference_cache_service import ReferenceCacheService
+from . import buscas_salvas, sugestoes
+from .context_processors import CHAVE_ESTADOS
+from .models import State
+
+
+@receiver(post_save, sender=State)
+@receiver(post_delete, sender=State)
+def invalidar_cache_estados(sender, **kwargs):
+    ReferenceCacheService.invalidar(CHAVE_ESTADOS)
+
+
+@receiver(post_save, sender=Necessidade)
+def avaliar_buscas_salvas(sender, instance, created, **kwargs):
+    if created:
+        buscas_salvas.agendar_avaliacao(instance)
+
+
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+@receiver(post_save, sender=SubCategoria)
+@receiver(post_delete, sender=SubCategoria)
+def invalidar_sugestoes_taxonomia(sender, **kwargs):
+    sugestoes.invalidar(sugestoes.TAXONOMIA)
+
+
+@receiver(post_save, sender=Necessidade)
+def invalidar_sugestoes_titulos(sender, instance, created, **kwargs):
+    """Só quando muda o conjunto de títulos ativos (criação, título ou entrada/saída de 'ativo')."""
+    status_anterior = getattr(instance, '_status_original', None)
+    ativo = instance.status == 'ativo'
+    if (
+        (created and ativo)
+        or (ativo != (status_anterior == 'ativo'))
+        or (ativo and getattr(instance, '_titulo_original', instance.titulo) != instance.titulo)
+    ):
+        sugestoes.invalidar(sugestoes.TITULOS)
+
+
+@receiver(post_delete, sender=Necessidade)
+def invalidar_sugestoes_exclusao(sender, instance, **kwargs):
+    if instance.status == 'ativo':
+        sugestoes.invalidar(sugestoes.TITULOS)
@@ -0,0 +1,176 @@
+"""
+Índice em memória das sugestões do autocomplete (autocomplete_search).
+
+- Conteúdo: categorias, subcategorias e os AUTOCOMPLETE_TITULOS títulos mais
+  frequentes entre os anúncios ativos, com o texto normalizado (minúsculas,
+  sem acentos).
+- Busca: prefixo de palavra por busca binária em uma lista ordenada de
+  (sufixo a partir de cada palavra, posição); se faltarem resultados,
+  completa com ocorrências no meio do texto (mesmo efeito do icontains).
+  Nenhuma consulta ao banco por tecla.
+- Versões: duas partes independentes, cada uma com um contador no cache,
+  incrementado após o commit (`invalidar`, O(1)): a taxonomia (alterações em
+  Categoria/SubCategoria) e os títulos (mudanças nos títulos ativos de
+  Necessidade). Cada processo guarda cada parte com a versão em que foi
+  montada e remonta só a que mudou, então um anúncio novo não refaz as
+  consultas da taxonomia. Os dados de cada versão ficam no cache em
+  `search:autocomplete:<parte>:<versão>:dados`, então só um processo consulta o banco.
+"""
+
+from bisect import bisect_left
+import threading
+import time
+import unicodedata
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+TAXONOMIA = 'taxonomia'
+TITULOS = 'titulos'
+PARTES = (TAXONOMIA, TITULOS)
+
+_indice = {}  # {parte: (versão, {grupo: (itens, textos normalizados, prefixos ordenados)})}
+_montagem = threading.Lock()
+
+
+# ==================== VERSÃO ====================
+
+def _chave_versao(parte):
+    return f"search:autocomplete:versao:{parte}"
+
+
+def versoes():
+    """Versão atual de cada parte (uma leitura do cache)."""
+    chaves = {_chave_versao(parte): parte for parte in PARTES}
+    valores = cache.get_many(chaves)
+    for chave in chaves.keys() - valores.keys():
+        # Começa do relógio, não de 1: após um flush do cache, os índices já
+        # montados nos processos não coincidem com a nova versão
+        cache.add(chave, time.time_ns(), None)
+        valores[chave] = cache.get(chave)
+    return {parte: valores[chave] for chave, parte in chaves.items()}
+
+
+def _incrementar_versao(parte):
+    try:
+        cache.incr(_chave_versao(parte))
+    except ValueError:
+        versoes()
+
+
+def invalidar(*partes):
+    """
+    Nova versão das partes (todas, se nenhuma for informada) após o commit;
+    os processos remontam só essas partes na próxima busca.
+    """
+    for parte in partes or PARTES:
+        transaction.on_commit(lambda parte=parte: _incrementar_versao(parte))
+
+
+# ==================== MONTAGEM ====================
+
+def normalizar(texto):
+    decomposto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in decomposto if not unicodedata.combining(c)).lower()
+
+
+def _dados(parte):
+    from ads.models import Necessidade
+    from categories.models import Categoria, SubCategoria
+
+    if parte == TAXONOMIA:
+        return {
+            'categorias': [
+                {'id': pk, 'nome': nome, 'icone': icone}
+                for pk, nome, icone in Categoria.objects.values_list('id', 'nome', 'icone')
+            ],
+            'subcategorias': [
+                {'id': pk, 'nome': nome, 'categoria': categoria, 'icone': icone}
+                for pk, nome, categoria, icone in SubCategoria.objects.values_list(
+                    'id', 'nome', 'categoria__nome', 'categoria__icone'
+                )
+            ],
+        }
+    return {
+        # Mais frequentes primeiro: é a ordem das sugestões
+        'titulos': [
+            {'nome': titulo}
+            for titulo in Necessidade.objects.filter(status='ativo')
+            .values('titulo').annotate(total=Count('id')).order_by('-total', 'titulo')
+            .values_list('titulo', flat=True)[:settings.AUTOCOMPLETE_TITULOS]
+        ],
+    }
+
+
+def _grupo(itens):
+    textos = [normalizar(item['nome']) for item in itens]
+    prefixos = []
+    for posicao, texto in enumerate(textos):
+        inicio = 0
+        for palavra in texto.split():
+            inicio = texto.index(palavra, inicio)
+            prefixos.append((texto[inicio:], posicao))
+            inicio += len(palavra)
+    prefixos.sort()
+    return itens, textos, prefixos
+
+
+def _parte(parte, versao):
+    atual = _indice.get(parte)
+    if atual is not None and atual[0] == versao:
+        return atual[1]
+
+    with _montagem:
+        atual = _indice.get(parte)
+        if atual is not None and atual[0] == versao:
+            return atual[1]
+        chave = f"search:autocomplete:{parte}:{versao}:dados"
+        dados = cache.get(chave)
+        if dados is None:
+            dados = _dados(parte)
+            cache.set(chave, dados, settings.AUTOCOMPLETE_INDICE_TTL)
+        _indice[parte] = (versao, {grupo: _grupo(itens) for grupo, itens in dados.items()})
+    return _indice[parte][1]
+
+
+def indice():
+    """Índice das versões atuais (cada parte remontada no processo quando a sua versão muda)."""
+    grupos = {}
+    for parte, versao in versoes().items():
+        grupos.update(_parte(parte, versao))
+    return grupos
+
+
+# ==================== BUSCA ====================
+
+def _buscar(grupo, termo, limite):
+    """Itens do grupo que contêm o termo: início de palavra primeiro, na ordem do grupo."""
+    itens, textos, prefixos = grupo
+
+    inicio_palavra = set()
+    i = bisect_left(prefixos, (termo,))
+    while i < len(prefixos) and prefixos[i][0].startswith(termo):
+        inicio_palavra.add(prefixos[i][1])
+        i += 1
+    posicoes = sorted(inicio_palavra)[:limite]
+
+    if len(posicoes) < limite:
+        for posicao, texto in enumerate(textos):
+            if termo in texto and posicao not in inicio_palavra:
+                posicoes.append(posicao)
+                if len(posicoes) == limite:
+                    break
+    return [itens[posicao] for posicao in posicoes]
+
+
+def sugerir(termo, limite=5):
+    """
+    Sugestões para o termo (uma leitura da versão no cache, nenhuma consulta ao banco).
+
+    Returns:
+        dict com as listas 'categorias', 'subcategorias' e 'titulos'
+    """
+    termo = normalizar(termo)
+    return {nome: _buscar(grupo, termo, limite) for nome, grupo in indice().items()}
@@ -0,0 +1,15 @@
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def avaliar_buscas_salvas(necessidade_id):
+    """Alerta as buscas salvas que casam com um anúncio recém-criado (search.buscas_salvas)."""
+    try:
+        from search.buscas_salvas import avaliar
+        return {'status': 'completed', 'notificados': avaliar(necessidade_id)}
+    except Exception as e:
+        logger.error(f"Erro na task avaliar_buscas_salvas: {str(e)}")
+        return {'status': 'error', 'message': str(e)}
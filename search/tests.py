@@ -0,0 +1,319 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.http import QueryDict
+from django.test import TestCase
+from django.urls import reverse
+
+from ads.models import Necessidade
+from categories.models import Categoria, SubCategoria
+from core.services.geo_service import GeoService
+from notifications.models import Notification
+from search import buscas_salvas, sugestoes
+from search.fulltext import aplicar_busca_textual
+from users.models import User
+
+
+class BuscaTextualTest(TestCase):
+    """
+    Testes da busca textual ranqueada sobre Necessidade.
+    """
+
+    def setUp(self):
+        self.cliente = User.objects.create_user(
+            email='cliente@exemplo.com',
+            password='senha123',
+            first_name='Cliente',
+            last_name='Teste',
+            is_client=True
+        )
+        self.categoria = Categoria.objects.create(nome='Construção')
+        self.subcategoria = SubCategoria.objects.create(
+            nome='Pintura', categoria=self.categoria
+        )
+        self.no_titulo = self._criar('Pintura de parede externa', 'Serviço completo')
+        self.na_descricao = self._criar('Reforma de cozinha', 'Inclui pintura dos armários')
+
+    def _criar(self, titulo, descricao):
+        return Necessidade.objects.create(
+            titulo=titulo,
+            descricao=descricao,
+            cliente=self.cliente,
+            categoria=self.categoria,
+            subcategoria=self.subcategoria,
+            quantidade=1,
+            unidade='un'
+        )
+
+    def test_vetor_mantido_pelo_banco(self):
+        Necessidade.objects.filter(pk=self.na_descricao.pk).update(titulo='Troca de telhado')
+        resultado = aplicar_busca_textual(Necessidade.objects.all(), 'telhado')
+        self.assertEqual(list(resultado), [self.na_descricao])
+
+    def test_titulo_tem_mais_relevancia_que_descricao(self):
+        resultado = aplicar_busca_textual(
+            Necessidade.objects.all(), 'pintura', ['titulo', 'descricao']
+        ).order_by('-rank')
+        self.assertEqual(list(resultado), [self.no_titulo, self.na_descricao])
+
+    def test_respeita_campos_selecionados(self):
+        resultado = aplicar_busca_textual(Necessidade.objects.all(), 'cozinha', ['descricao'])
+        self.assertFalse(resultado.exists())
+
+        resultado = aplicar_busca_textual(Necessidade.objects.all(), 'armários', ['descricao'])
+        self.assertEqual(list(resultado), [self.na_descricao])
+
+    def test_rebuild_only_missing_atualiza_so_vetores_ausentes(self):
+        Necessidade.objects.filter(pk=self.na_descricao.pk).update(search_vector=None)
+        saida = StringIO()
+        call_command('rebuild_search_vectors', '--only-missing', stdout=saida)
+        self.assertIn('for 1 rows', saida.getvalue())
+        resultado = aplicar_busca_textual(Necessidade.objects.all(), 'armários', ['descricao'])
+        self.assertEqual(list(resultado), [self.na_descricao])
+
+    def test_view_de_busca(self):
+        response = self.client.get(
+            reverse('search:necessidade_search_all'), {'q': 'cozinha'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['anuncios']), [self.na_descricao])
+
+
+class BuscaPorProximidadeTest(TestCase):
+    """
+    Testes do filtro por raio (geohash + bounding box + haversine).
+    """
+
+    def setUp(self):
+        self.cliente = User.objects.create_user(
+            email='vizinho@exemplo.com',
+            password='senha123',
+            first_name='Cliente',
+            last_name='Fortaleza',
+            is_client=True,
+            lat=-3.7319,
+            lon=-38.5267
+        )
+        categoria = Categoria.objects.create(nome='Serviços')
+        subcategoria = SubCategoria.objects.create(nome='Elétrica', categoria=categoria)
+        base = dict(
+            descricao='Instalação',
+            categoria=categoria,
+            subcategoria=subcategoria,
+            quantidade=1,
+            unidade='un',
+            usar_endereco_usuario=False,
+        )
+        # Centro de Fortaleza, Caucaia (~16 km) e Recife (~630 km)
+        self.centro = Necessidade.objects.create(
+            titulo='Centro', cliente=self.cliente, lat_servico=-3.7310, lon_servico=-38.5260, **base
+        )
+        self.caucaia = Necessidade.objects.create(
+            titulo='Caucaia', cliente=self.cliente, lat_servico=-3.7361, lon_servico=-38.6531, **base
+        )
+        self.recife = Necessidade.objects.create(
+            titulo='Recife', cliente=self.cliente, lat_servico=-8.0476, lon_servico=-34.8770, **base
+        )
+
+    def test_geohash_conhecido(self):
+        self.assertEqual(GeoService.encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+
+    def test_filtra_por_raio_e_ordena_por_distancia(self):
+        resultado = GeoService.filtrar_por_raio(
+            Necessidade.objects.all(), -3.7319, -38.5267, 50
+        ).order_by('distancia_km')
+        self.assertEqual(list(resultado), [self.centro, self.caucaia])
+
+        resultado = GeoService.filtrar_por_raio(Necessidade.objects.all(), -3.7319, -38.5267, 5)
+        self.assertEqual(list(resultado), [self.centro])
+
+    def test_anuncio_com_endereco_do_usuario_acompanha_coordenadas(self):
+        anuncio = Necessidade.objects.create(
+            titulo='Em casa', descricao='Reparo', cliente=self.cliente,
+            categoria=self.centro.categoria, subcategoria=self.centro.subcategoria,
+            quantidade=1, unidade='un', usar_endereco_usuario=True
+        )
+        self.assertEqual(anuncio.geohash, GeoService.encode(-3.7319, -38.5267))
+
+        self.cliente.lat, self.cliente.lon = -8.0476, -34.8770
+        self.cliente.save()
+        anuncio.refresh_from_db()
+        self.assertEqual(anuncio.geohash, GeoService.encode(-8.0476, -34.8770))
+
+    def test_view_ordena_mais_proximos(self):
+        response = self.client.get(
+            reverse('search:necessidade_search_all'),
+            {'lat': '-3.7319', 'lon': '-38.5267', 'raio': '100'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['anuncios']), [self.centro, self.caucaia])
+
+    def test_paginacao_mantem_raio(self):
+        base = dict(
+            descricao='Instalação', cliente=self.cliente, categoria=self.centro.categoria,
+            subcategoria=self.centro.subcategoria, quantidade=1, unidade='un',
+            usar_endereco_usuario=False,
+        )
+        for i in range(20):
+            Necessidade.objects.create(titulo=f'Centro {i}', lat_servico=-3.7310, lon_servico=-38.5260, **base)
+        # Quixadá (~145 km): fora do raio padrão de 50 km
+        quixada = Necessidade.objects.create(titulo='Quixadá', lat_servico=-4.9710, lon_servico=-39.0150, **base)
+
+        url = reverse('search:necessidade_search_all')
+        filtros = {'lat': '-3.7319', 'lon': '-38.5267', 'raio': '200'}
+        response = self.client.get(url, filtros)
+        self.assertContains(response, '&lat=-3.7319&lon=-38.5267&raio=200.0&page=2')
+        self.assertContains(response, 'name="raio" value="200.0"')
+
+        response = self.client.get(url, {**filtros, 'raio': '200.0', 'page': '2'})
+        self.assertEqual(list(response.context['anuncios'])[-1], quixada)
+
+
+class BuscasSalvasTest(TestCase):
+    """
+    Buscas salvas: cada anúncio novo é avaliado só contra as buscas
+    candidatas do índice (lexemas do termo, UF) e alerta uma vez por usuário.
+    """
+
+    def setUp(self):
+        self.cliente = User.objects.create_user(
+            email='cliente@exemplo.com', password='senha123', first_name='Cliente',
+            is_client=True, cidade='Fortaleza', estado='CE',
+        )
+        self.categoria = Categoria.objects.create(nome='Construção')
+        self.subcategoria = SubCategoria.objects.create(nome='Reforma', categoria=self.categoria)
+        self.usuarios = [
+            User.objects.create_user(email=f'usuario{i}@exemplo.com', password='senha123', is_supplier=True)
+            for i in range(4)
+        ]
+
+    def _salvar(self, usuario, **parametros):
+        dados = QueryDict(mutable=True)
+        for chave, valor in parametros.items():
+            dados.setlist(chave, valor if isinstance(valor, list) else [valor])
+        return buscas_salvas.salvar(usuario, dados)
+
+    def _criar(self, titulo, descricao):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Necessidade.objects.create(
+                titulo=titulo, descricao=descricao, cliente=self.cliente, categoria=self.categoria,
+                subcategoria=self.subcategoria, quantidade=1, unidade='un',
+            )
+
+    def _alertados(self, anuncio):
+        return set(
+            Notification.objects.filter(necessidade=anuncio, metadata__origem=buscas_salvas.ORIGEM)
+            .values_list('user_id', flat=True)
+        )
+
+    def test_alerta_buscas_que_casam(self):
+        a, b, c, d = self.usuarios
+        busca = self._salvar(a, q='pintura parede', state='ce')
+        self.assertEqual(busca.chaves, ['t:pared', 't:pintur'])
+        self._salvar(a, q='"parede externa"')
+        self._salvar(b, q='telhado')
+        self._salvar(c, state='SP')
+        self._salvar(d, q='pintura', campos=['descricao'])
+        sem_termo = self._salvar(d, local='fortal')
+        self.assertEqual(sem_termo.chaves, ['*'])
+
+        anuncio = self._criar('Pintura de parede externa', 'Serviço completo')
+        self.assertEqual(self._alertados(anuncio), {a.pk, d.pk})
+
+        # Reexecução não duplica; anúncio, candidatas e termos distintos em três consultas
+        with self.assertNumQueries(3):
+            _, atendidas = buscas_salvas.buscas_atendidas(anuncio.pk)
+        self.assertEqual(len(atendidas), 3)
+        self.assertEqual(buscas_salvas.avaliar(anuncio.pk), 0)
+
+    def test_views(self):
+        usuario = self.usuarios[0]
+        self.client.force_login(usuario)
+        resposta = self.client.post(
+            reverse('search:salvar_busca'), {'parametros': 'q=telhado&state=CE', 'nome': 'Telhados'}
+        )
+        self.assertEqual(resposta.status_code, 302)
+        busca = usuario.buscas_salvas.get()
+        self.assertEqual((busca.nome, busca.termo, busca.estado), ('Telhados', 'telhado', 'CE'))
+
+        self.client.post(reverse('search:alternar_alerta_busca_salva', args=[busca.pk]))
+        busca.refresh_from_db()
+        self.assertFalse(busca.alertas_ativos)
+        self.assertEqual(self._alertados(self._criar('Troca de telhado', 'Urgente')), set())
+
+        resposta = self.client.get(reverse('search:buscas_salvas'))
+        self.assertContains(resposta, 'Telhados')
+
+
+class AutocompleteTest(TestCase):
+    """
+    Sugestões do autocomplete a partir do índice em memória, remontado
+    quando a versão muda.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.cliente = User.objects.create_user(
+            email='cliente@exemplo.com', password='senha123', is_client=True
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.construcao = Categoria.objects.create(nome='Construção Civil')
+            self.pintura = Categoria.objects.create(nome='Pintura')
+            self.subcategoria = SubCategoria.objects.create(nome='Pintura residencial', categoria=self.construcao)
+            for titulo in ['Pintar muro', 'Pintar muro', 'Pintar portão', 'Reparo no telhado']:
+                Necessidade.objects.create(
+                    titulo=titulo, descricao='Descrição', cliente=self.cliente, categoria=self.construcao,
+                    subcategoria=self.subcategoria, quantidade=1, unidade='un', status='ativo',
+                )
+
+    def _sugestoes(self, termo):
+        resposta = self.client.get(reverse('search:autocomplete_search'), {'term': termo})
+        self.assertEqual(resposta.status_code, 200)
+        return {
+            grupo: [item['text'] for item in itens]
+            for grupo, itens in resposta.json()['results'].items()
+        }
+
+    def test_prefixo_e_trecho(self):
+        self.assertEqual(self._sugestoes('pint'), {
+            'Categorias': ['Pintura'],
+            'Subcategorias': ['Pintura residencial (Construção Civil)'],
+            # Mais frequentes primeiro
+            'Anúncios Similares': ['Pintar muro', 'Pintar portão'],
+        })
+        # Sem acento, início de outra palavra e meio da palavra
+        self.assertEqual(self._sugestoes('construcao')['Categorias'], ['Construção Civil'])
+        self.assertEqual(self._sugestoes('resid')['Subcategorias'], ['Pintura residencial (Construção Civil)'])
+        self.assertEqual(self._sugestoes('lhad')['Anúncios Similares'], ['Reparo no telhado'])
+
+        # Índice já montado: nenhuma consulta
+        with self.assertNumQueries(0):
+            sugestoes.sugerir('pint')
+
+    def test_alteracoes_trocam_a_versao(self):
+        self._sugestoes('pint')
+        with self.captureOnCommitCallbacks(execute=True):
+            Categoria.objects.create(nome='Pintura automotiva')
+            self.pintura.delete()
+        self.assertEqual(self._sugestoes('pint')['Categorias'], ['Pintura automotiva'])
+
+        # Saída de 'ativo' remove o título
+        with self.captureOnCommitCallbacks(execute=True):
+            for anuncio in Necessidade.objects.filter(titulo='Pintar portão'):
+                anuncio.status = 'cancelado'
+                anuncio.save()
+        self.assertEqual(self._sugestoes('portao'), {})
+
+    def test_anuncio_novo_remonta_so_os_titulos(self):
+        sugestoes.sugerir('pint')
+        with self.captureOnCommitCallbacks(execute=True):
+            Necessidade.objects.create(
+                titulo='Pintar grade', descricao='Descrição', cliente=self.cliente, categoria=self.construcao,
+                subcategoria=self.subcategoria, quantidade=1, unidade='un', status='ativo',
+            )
+        # Só a consulta dos títulos; categorias e subcategorias seguem montadas
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                [item['nome'] for item in sugestoes.sugerir('grade')['titulos']], ['Pintar grade']
+            )
@@ -1,5 +1,8 @@
 from django.urls import path
-from .views import NecessidadeSearchAllView, autocomplete_search
+from .views import (
+    AlternarAlertaBuscaSalvaView, BuscasSalvasView, ExcluirBuscaSalvaView, NecessidadeSearchAllView,
+    SalvarBuscaView, autocomplete_search,
+)
 
 app_name = "search"
 
@@ -8,4 +11,10 @@ urlpatterns = [
          name="necessidade_search_all"),
     path("autocomplete/", autocomplete_search, 
          name="autocomplete_search"),
+    path("buscas-salvas/", BuscasSalvasView.as_view(), name="buscas_salvas"),
+    path("buscas-salvas/salvar/", SalvarBuscaView.as_view(), name="salvar_busca"),
+    path("buscas-salvas/<int:pk>/alertas/", AlternarAlertaBuscaSalvaView.as_view(),
+         name="alternar_alerta_busca_salva"),
+    path("buscas-salvas/<int:pk>/excluir/", ExcluirBuscaSalvaView.as_view(),
+         name="excluir_busca_salva"),
 ]
\ No newline at end of file
@@ -1,15 +1,22 @@
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import QueryDict
+from django.shortcuts import get_object_or_404, redirect
+from django.urls import reverse
+from django.views import View
 from django.views.generic import ListView
 from django.contrib import messages
 from django.db.models import Q, Prefetch
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
-from django.core.cache import cache
 from django.views.decorators.cache import cache_page
 from ads.models import Necessidade, Categoria, AnuncioImagem
-from categories.models import SubCategoria
+from core.services.geo_service import GeoService
+from . import buscas_salvas, sugestoes
+from .fulltext import aplicar_busca_textual
+from .models import BuscaSalva
 from .security_utils import (
     validate_search_term, validate_location, validate_client_name,
-    validate_coordinates, validate_status_list, validate_search_fields,
+    validate_coordinates, validate_status_list, validate_search_fields, validate_radius,
     rate_limit_decorator, log_suspicious_activity
 )
 import math
@@ -88,18 +95,11 @@ class NecessidadeSearchAllView(ListView):
         if self.cliente:
             qs = qs.filter(cliente__first_name__icontains=self.cliente)
 
-        # Aplicar filtro de termo de busca se válido
+        # Aplicar busca textual (ranqueada) se o termo for válido
+        ordenacao = ["-data_criacao"]
         if self.term:
-            conditions = Q()
-            if not self.campos or "titulo" in self.campos:
-                conditions |= Q(titulo__icontains=self.term)
-            if not self.campos or "descricao" in self.campos:
-                conditions |= Q(descricao__icontains=self.term)
-            if not self.campos or "categoria" in self.campos:
-                conditions |= Q(categoria__nome__icontains=self.term)
-            if not self.campos or "subcategoria" in self.campos:
-                conditions |= Q(subcategoria__nome__icontains=self.term)
-            qs = qs.filter(conditions)
+            qs = aplicar_busca_textual(qs, self.term, self.campos)
+            ordenacao = ["-rank", "-data_criacao"]
 
         # Validação segura da localização
         local_raw = self.request.GET.get("local", "").strip()
@@ -126,7 +126,17 @@ class NecessidadeSearchAllView(ListView):
             log_suspicious_activity(self.request, "invalid_coordinates", f"lat={lat_raw}, lon={lon_raw}")
             self.lat = self.lon = None
 
-        return qs.order_by("-data_criacao")
+        # Busca por proximidade: filtra pelo raio e ordena do mais próximo
+        raio_raw = self.request.GET.get("raio")
+        raio_valid, self.raio, raio_error = validate_radius(raio_raw)
+        if not raio_valid:
+            search_logger.warning(f"Invalid radius rejected: {raio_raw} - Error: {raio_error}")
+
+        if self.lat is not None and self.lon is not None:
+            qs = GeoService.filtrar_por_raio(qs, self.lat, self.lon, self.raio)
+            ordenacao = ["distancia_km"] + ordenacao
+
+        return qs.order_by(*ordenacao)
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
@@ -137,8 +147,11 @@ class NecessidadeSearchAllView(ListView):
         ctx["local"] = getattr(self, 'local', '')
         ctx["campos"] = getattr(self, 'campos', [])
         ctx["cliente"] = getattr(self, 'cliente', '')
-        ctx["lat"] = getattr(self, 'lat', None) or ""
-        ctx["lon"] = getattr(self, 'lon', None) or ""
+        # Coordenadas e raio vão como texto: floats seriam localizados ("200,0")
+        # nos links e campos ocultos e não passariam na validação da próxima página
+        ctx["lat"] = str(getattr(self, 'lat', None) or "")
+        ctx["lon"] = str(getattr(self, 'lon', None) or "")
+        ctx["raio"] = str(getattr(self, 'raio', None) or "")
         
         # Otimizar consulta de categorias - apenas campos necessários
         ctx["menu_categorias"] = Categoria.objects.only('id', 'nome', 'icone').all()
@@ -154,14 +167,50 @@ class NecessidadeSearchAllView(ListView):
         return ctx
 
 
+class SalvarBuscaView(LoginRequiredMixin, View):
+    """Salva a busca atual (parâmetros da NecessidadeSearchAllView) com alerta de novos anúncios."""
+
+    def post(self, request):
+        dados = QueryDict(request.POST.get('parametros', ''))
+        try:
+            busca = buscas_salvas.salvar(request.user, dados, request.POST.get('nome', ''))
+        except ValueError as e:
+            messages.error(request, str(e))
+            return redirect(f"{reverse('search:necessidade_search_all')}?{dados.urlencode()}")
+        messages.success(request, f'Busca "{busca.nome}" salva. Você será avisado dos novos anúncios.')
+        return redirect(f"{reverse('search:necessidade_search_all')}?{busca.querystring()}")
+
+
+class BuscasSalvasView(LoginRequiredMixin, ListView):
+    template_name = "buscas_salvas.html"
+    context_object_name = "buscas"
+
+    def get_queryset(self):
+        return BuscaSalva.objects.filter(user=self.request.user)
+
+
+class AlternarAlertaBuscaSalvaView(LoginRequiredMixin, View):
+    def post(self, request, pk):
+        busca = get_object_or_404(BuscaSalva, pk=pk, user=request.user)
+        busca.alertas_ativos = not busca.alertas_ativos
+        busca.save(update_fields=['alertas_ativos'])
+        return redirect('search:buscas_salvas')
+
+
+class ExcluirBuscaSalvaView(LoginRequiredMixin, View):
+    def post(self, request, pk):
+        get_object_or_404(BuscaSalva, pk=pk, user=request.user).delete()
+        messages.success(request, "Busca salva excluída.")
+        return redirect('search:buscas_salvas')
+
+
 # Limpar cache de autocomplete quando houver atualizações relevantes
 def clear_autocomplete_cache():
     """
-    Função utilitária para limpar o cache de autocomplete.
-    Deve ser chamada quando categorias ou necessidades são criadas/atualizadas.
+    Invalida as sugestões do autocomplete (nova versão do índice em memória).
+    Os signals já chamam em alterações de categorias, subcategorias e anúncios.
     """
-    # Limpar todos os caches que começam com 'autocomplete:'
-    cache.delete_many(cache.get_many(['*']).keys())
+    sugestoes.invalidar()
     search_logger.info("Autocomplete cache cleared")
 
 
@@ -170,7 +219,7 @@ def clear_autocomplete_cache():
 def autocomplete_search(request):
     """
     Endpoint AJAX para autocomplete inteligente com sugestões agrupadas por categoria.
-    Implementa segurança contra XSS, rate limiting e cache para performance.
+    Implementa segurança contra XSS, rate limiting e índice de sugestões em memória.
     """
     term_raw = request.GET.get('term', '').strip()
     
@@ -189,14 +238,6 @@ def autocomplete_search(request):
     if len(term) < 2:
         return JsonResponse({'results': []})
     
-    # Verificar cache primeiro
-    cache_key = f"autocomplete:{term.lower()}"  # termo já sanitizado
-    cached_results = cache.get(cache_key)
-    
-    if cached_results:
-        search_logger.info(f"Autocomplete cache hit for term: {term}")
-        return JsonResponse(cached_results)
-    
     # Log da busca para monitoramento
     search_logger.info(f"Autocomplete search for term: {term}")
     
@@ -205,46 +246,31 @@ def autocomplete_search(request):
     results = []
     
     try:
-        # Buscar em categorias - apenas campos necessários
-        categorias = Categoria.objects.filter(
-            nome__icontains=term
-        ).only('id', 'nome', 'icone')[:max_results_per_type]
-        
-        for cat in categorias:
+        # Sugestões do índice em memória (search.sugestoes): sem consultas por tecla
+        sugeridos = sugestoes.sugerir(term, max_results_per_type)
+        for cat in sugeridos['categorias']:
             results.append({
-                'id': f"categoria_{cat.id}",
-                'text': cat.nome,
+                'id': f"categoria_{cat['id']}",
+                'text': cat['nome'],
                 'type': 'categoria',
-                'icon': cat.icone or 'fas fa-tags',
+                'icon': cat['icone'] or 'fas fa-tags',
                 'group': 'Categorias'
             })
         
-        # Buscar em subcategorias - otimizada
-        subcategorias = SubCategoria.objects.filter(
-            nome__icontains=term
-        ).select_related('categoria').only(
-            'id', 'nome', 'categoria__nome', 'categoria__icone'
-        )[:max_results_per_type]
-        
-        for subcat in subcategorias:
+        for subcat in sugeridos['subcategorias']:
             results.append({
-                'id': f"subcategoria_{subcat.id}",
-                'text': f"{subcat.nome} ({subcat.categoria.nome})",
+                'id': f"subcategoria_{subcat['id']}",
+                'text': f"{subcat['nome']} ({subcat['categoria']})",
                 'type': 'subcategoria',
-                'icon': subcat.categoria.icone or 'fas fa-tag',
+                'icon': subcat['icone'] or 'fas fa-tag',
                 'group': 'Subcategorias'
             })
         
-        # Buscar títulos de necessidades populares - otimizada
-        necessidades = Necessidade.objects.filter(
-            titulo__icontains=term,
-            status='ativo'
-        ).only('titulo').distinct()[:max_results_per_type]
-        
-        for nec in necessidades:
+        # Títulos mais frequentes entre os anúncios ativos
+        for nec in sugeridos['titulos']:
             results.append({
-                'id': f"titulo_{nec.titulo}",
-                'text': nec.titulo,
+                'id': f"titulo_{nec['nome']}",
+                'text': nec['nome'],
                 'type': 'titulo',
                 'icon': 'fas fa-search',
                 'group': 'Anúncios Similares'
@@ -263,9 +289,6 @@ def autocomplete_search(request):
             'total': len(results)
         }
         
-        # Cache por 5 minutos
-        cache.set(cache_key, response_data, 300)
-        
         return JsonResponse(response_data)
         
     except Exception as e:
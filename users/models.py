@@ -11,7 +11,6 @@ from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.core.validators import RegexValidator
 from django.db import models
 from django.forms import ValidationError
-from django.db.models import Avg 
 from categories.models import Categoria
 from django.conf import settings
 from users.utils import validate_cpf
@@ -206,6 +205,14 @@ class User(AbstractUser):
         """
         return "user"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Papéis carregados do banco, usados para calcular deltas do rollup de usuários
+        if 'is_client' in field_names and 'is_supplier' in field_names:
+            instance._papeis_originais = (instance.is_client, instance.is_supplier)
+        return instance
+
     class Meta:
         verbose_name = "Usuário"
         verbose_name_plural = "Usuários"
@@ -214,20 +221,18 @@ class User(AbstractUser):
 # ---------------------------------------------------------------------
     #  MÉTRICAS DE AVALIAÇÃO
     # ---------------------------------------------------------------------
+    def reputacao_resumo(self):
+        """Resumo de reputação materializado (rankings.ResumoReputacao); use select_related('reputacao') em listas."""
+        from rankings.reputacao import obter  # import local evita ciclos
+        return obter(self)
+
     def get_media_avaliacoes(self, tipo=None):
         """
         Retorna a média geral (estrelas) das avaliações recebidas.
         Se `tipo` for informado ('cliente' ou 'fornecedor'),
         filtra apenas essas avaliações.
         """
-        avaliacoes = self.avaliacoes_recebidas.all()
-        if tipo:
-            avaliacoes = avaliacoes.filter(tipo_avaliacao=tipo)
-
-        if not avaliacoes.exists():
-            return None
-
-        return avaliacoes.aggregate(Avg("media_estrelas"))["media_estrelas__avg"]
+        return self.reputacao_resumo().media(tipo)
 
     def get_criterios_media(self, tipo=None):
         """
@@ -240,27 +245,7 @@ class User(AbstractUser):
             …
         }
         """
-        avaliacoes = self.avaliacoes_recebidas.all()
-        if tipo:
-            avaliacoes = avaliacoes.filter(tipo_avaliacao=tipo)
-
-        if not avaliacoes.exists():
-            return {}
-
-        from rankings.models import AvaliacaoCriterio  # import local evita ciclos
-
-        criterios = AvaliacaoCriterio.objects.filter(avaliacao__in=avaliacoes)
-
-        resultado = {}
-        for criterio_value, criterio_label in AvaliacaoCriterio.CRITERIO_CHOICES:
-            criterios_filtrados = criterios.filter(criterio=criterio_value)
-            if criterios_filtrados.exists():
-                media = criterios_filtrados.aggregate(Avg("estrelas"))["estrelas__avg"]
-                resultado[criterio_value] = {
-                    "label": criterio_label,
-                    "media": media,
-                }
-        return resultado
+        return self.reputacao_resumo().criterios_media(tipo)
     
     # ---------------------------------------------------------------------
     #  SISTEMA DE BADGES DE CONFIANÇA
@@ -301,8 +286,10 @@ class User(AbstractUser):
                 'color': 'info'
             })
         
+        reputacao = self.reputacao_resumo()
+
         # Badge: Avaliação Alta (média >= 4.5)
-        media_avaliacoes = self.get_media_avaliacoes()
+        media_avaliacoes = reputacao.media()
         if media_avaliacoes and media_avaliacoes >= 4.5:
             badges.append({
                 'icon': 'fas fa-trophy',
@@ -312,7 +299,7 @@ class User(AbstractUser):
             })
         
         # Badge: Muitas avaliações (mais de 10)
-        num_avaliacoes = self.avaliacoes_recebidas.count()
+        num_avaliacoes = reputacao.total_avaliacoes()
         if num_avaliacoes >= 10:
             badges.append({
                 'icon': 'fas fa-users',
@@ -323,7 +310,7 @@ class User(AbstractUser):
         
         # Badge: Cliente Frequente (mais de 5 necessidades)
         if self.is_client:
-            num_necessidades = self.necessidades.count()
+            num_necessidades = reputacao.total_necessidades
             if num_necessidades >= 5:
                 badges.append({
                     'icon': 'fas fa-medal',
@@ -334,7 +321,7 @@ class User(AbstractUser):
         
         # Badge: Fornecedor Ativo (mais de 10 orçamentos)
         if self.is_supplier:
-            num_orcamentos = self.orcamentos.count()
+            num_orcamentos = reputacao.total_orcamentos
             if num_orcamentos >= 10:
                 badges.append({
                     'icon': 'fas fa-hammer',
@@ -351,31 +338,4 @@ class User(AbstractUser):
         Calcula um score de confiança baseado nos badges e atividade.
         Retorna um valor entre 0 e 100.
         """
-        score = 0
-        
-        # Base score por estar verificado
-        if self.email_verified:
-            score += 20
-        
-        # Score por documentos
-        if self.cpf:
-            score += 15
-        if self.cnpj:
-            score += 10
-            
-        # Score por avaliações
-        media_avaliacoes = self.get_media_avaliacoes()
-        if media_avaliacoes:
-            score += min(media_avaliacoes * 10, 30)  # máximo 30 pontos
-        
-        # Score por atividade
-        num_avaliacoes = self.avaliacoes_recebidas.count()
-        score += min(num_avaliacoes * 2, 20)  # máximo 20 pontos
-        
-        # Score por tempo de cadastro
-        from datetime import timedelta
-        from django.utils import timezone
-        days_since_joined = (timezone.now() - self.date_joined).days
-        score += min(days_since_joined / 10, 15)  # máximo 15 pontos
-        
-        return min(score, 100)  # máximo 100 pontos
+        return self.reputacao_resumo().calcular_trust_score(self)